@@ -3,6 +3,7 @@ from rest_framework import viewsets, filters, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from django_filters.rest_framework import DjangoFilterBackend
+from reportes.exportacion import ExportacionMixin
 from django.utils import timezone
 from django.db import transaction
 from compras.models import (
@@ -208,7 +209,7 @@ class orden_compra_materia_primaViewSet(viewsets.ModelViewSet):
 
 
 
-class HistorialOrdenCompraViewSet(viewsets.ReadOnlyModelViewSet):
+class HistorialOrdenCompraViewSet(ExportacionMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint para ver el historial de cambios de las Órdenes de Compra.
     """
@@ -4,6 +4,7 @@ from rest_framework import viewsets, filters, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from django_filters.rest_framework import DjangoFilterBackend
+from reportes.exportacion import ExportacionMixin
 
 from ventas.models import EstadoVenta
 from .models import EstadoDespacho, Repartidor, OrdenDespacho, DespachoOrenVenta
@@ -130,7 +131,7 @@ class OrdenDespachoViewSet(viewsets.ViewSet):
 
 
 
-class HistorialOrdenDespachoViewSet(viewsets.ReadOnlyModelViewSet):
+class HistorialOrdenDespachoViewSet(ExportacionMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint para ver el historial de cambios de las Órdenes de Despacho.
     """
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -168,6 +169,21 @@ REST_FRAMEWORK = {
 }
 
 
+# Caché de resultados de reportes (ver reportes/cache_reportes.py).
+# En disco para que lo compartan los workers de gunicorn y el de planificación:
+# las señales de un proceso invalidan los reportes que cacheó otro.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'reportes': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': str(Path(tempfile.gettempdir()) / 'frozen_back_reportes'),
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
+
 
 # Configuración del servidor SMTP para enviar correos
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
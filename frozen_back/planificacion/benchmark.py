@@ -0,0 +1,261 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from compras.models import EstadoOrdenCompra, OrdenCompra, OrdenCompraMateriaPrima
+from materias_primas.models import MateriaPrima, Proveedor, TipoMateriaPrima
+from produccion.models import (
+    CalendarioProduccion,
+    EstadoOrdenProduccion,
+    EstadoOrdenTrabajo,
+    LineaProduccion,
+    OrdenDeTrabajo,
+    OrdenProduccion,
+    estado_linea_produccion,
+)
+from productos.models import Producto, TipoProducto, Unidad
+from recetas.models import ProductoLinea, Receta, RecetaMateriaPrima
+from stock.models import (
+    EstadoLoteMateriaPrima,
+    EstadoLoteProduccion,
+    EstadoReserva,
+    EstadoReservaMateria,
+    LoteMateriaPrima,
+    LoteProduccion,
+)
+from trazabilidad.models import Configuracion
+from ventas.models import Cliente, EstadoVenta, OrdenVenta, OrdenVentaProducto, Prioridad
+
+from .cache_capacidad import invalidar_capacidades
+from .models import SolucionPlanificador
+from .planificador import ejecutar_planificacion_diaria_mrp
+from .planner_service import ejecutar_planificador
+from .replanificador import replanificar_ops_por_capacidad
+
+
+# ===================================================================
+# BENCHMARK DE PLANIFICACIÓN
+# Genera una fábrica sintética (productos, recetas, líneas, lotes, OVs y OCs)
+# de tamaño parametrizable y mide el MRP, el solver táctico y el replanificador:
+# tiempo, consultas, estado y objetivo del solver. Con la misma semilla la
+# fábrica es siempre la misma: los resultados se comparan entre commits.
+# Se corre con 'manage.py benchmark_planificacion' (sobre la BD de test).
+# ===================================================================
+
+# Estados que buscan por descripción el MRP, el solver y el replanificador
+ESTADOS_BASE = {
+    EstadoVenta: ["Creada", "En Preparación", "Pendiente de Pago", "Pagada", "Cancelada"],
+    EstadoOrdenProduccion: ["En espera", "Pendiente de inicio", "En proceso", "Planificada", "Finalizada", "Cancelado"],
+    EstadoOrdenTrabajo: ["Pendiente", "En progreso", "Completada"],
+    EstadoOrdenCompra: ["En proceso"],
+    EstadoLoteProduccion: ["Disponible", "En espera", "Agotado"],
+    EstadoLoteMateriaPrima: ["disponible", "Agotado"],
+    EstadoReserva: ["Activa", "Utilizada", "Cancelada"],
+    EstadoReservaMateria: ["Activa", "Consumida"],
+    estado_linea_produccion: ["Disponible", "Ocupada"],
+}
+
+# Fases medidas, en orden
+FASES = ["mrp", "planificador", "replanificador"]
+
+
+class ContadorConsultas:
+    """ connection.execute_wrapper que cuenta las consultas de una fase. """
+
+    def __init__(self):
+        self.consultas = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.consultas += 1
+        return execute(sql, params, many, context)
+
+
+def _crear_estados():
+    estados = {}
+    for modelo, descripciones in ESTADOS_BASE.items():
+        for descripcion in descripciones:
+            estados[(modelo, descripcion)], _ = modelo.objects.get_or_create(descripcion=descripcion)
+    return estados
+
+
+def generar_fabrica(ops, semilla=1, hoy=None):
+    """
+    Crea una fábrica sintética pensada para que el MRP genere del orden de 'ops'
+    órdenes de producción: ~ops/5 productos con receta de 2 MPs y 2 líneas,
+    ~ops/20 líneas, lotes de MP y PT, OCs en tránsito y ~ops OVs de 2 productos
+    con entrega en las próximas dos semanas. Devuelve el resumen de lo creado.
+    """
+    rnd = random.Random(semilla)
+    hoy = hoy or timezone.localdate()
+    estados = _crear_estados()
+
+    n_productos = max(5, ops // 5)
+    n_lineas = max(3, ops // 20)
+    n_mps = max(6, n_productos)
+    n_ovs = max(2, ops)
+
+    unidad, _ = Unidad.objects.get_or_create(descripcion="Unidad")
+    tipo_mp, _ = TipoMateriaPrima.objects.get_or_create(descripcion="Benchmark")
+    tipo_producto, _ = TipoProducto.objects.get_or_create(descripcion="Benchmark")
+    prioridad, _ = Prioridad.objects.get_or_create(descripcion="Normal")
+    cliente = Cliente.objects.create(nombre="Cliente benchmark")
+
+    lineas = LineaProduccion.objects.bulk_create([
+        LineaProduccion(
+            descripcion=f"Línea {i + 1}",
+            id_estado_linea_produccion=estados[(estado_linea_produccion, "Disponible")]
+        )
+        for i in range(n_lineas)
+    ])
+    proveedores = Proveedor.objects.bulk_create([
+        Proveedor(nombre=f"Proveedor {i + 1}", lead_time_days=rnd.randint(1, 5))
+        for i in range(max(3, n_mps // 5))
+    ])
+    mps = MateriaPrima.objects.bulk_create([
+        MateriaPrima(
+            nombre=f"MP {i + 1}", precio=rnd.randint(1, 50), id_tipo_materia_prima=tipo_mp,
+            id_unidad=unidad, id_proveedor=rnd.choice(proveedores), cantidad_minima_pedido=10
+        )
+        for i in range(n_mps)
+    ])
+    for mp in mps:
+        for _ in range(2):
+            LoteMateriaPrima.objects.create(
+                id_materia_prima=mp, cantidad=rnd.randint(200, 2000),
+                id_estado_lote_materia_prima=estados[(EstadoLoteMateriaPrima, "disponible")],
+                fecha_vencimiento=hoy + timedelta(days=rnd.randint(10, 90))
+            )
+
+    # OCs en tránsito (una por proveedor, con algunas de sus MPs)
+    for proveedor in proveedores:
+        mps_proveedor = [mp for mp in mps if mp.id_proveedor_id == proveedor.id_proveedor]
+        if not mps_proveedor:
+            continue
+        orden_compra = OrdenCompra.objects.create(
+            id_estado_orden_compra=estados[(EstadoOrdenCompra, "En proceso")], id_proveedor=proveedor,
+            fecha_solicitud=hoy, fecha_entrega_estimada=hoy + timedelta(days=proveedor.lead_time_days)
+        )
+        OrdenCompraMateriaPrima.objects.bulk_create([
+            OrdenCompraMateriaPrima(id_orden_compra=orden_compra, id_materia_prima=mp, cantidad=rnd.randint(50, 500))
+            for mp in rnd.sample(mps_proveedor, max(1, len(mps_proveedor) // 2))
+        ])
+
+    productos = Producto.objects.bulk_create([
+        Producto(
+            nombre=f"Producto {i + 1}", precio=rnd.randint(100, 1000), id_tipo_producto=tipo_producto,
+            id_unidad=unidad, dias_duracion=30, umbral_minimo=0
+        )
+        for i in range(n_productos)
+    ])
+    recetas = Receta.objects.bulk_create([Receta(id_producto=producto) for producto in productos])
+    RecetaMateriaPrima.objects.bulk_create([
+        RecetaMateriaPrima(id_receta=receta, id_materia_prima=mp, cantidad=rnd.randint(1, 3))
+        for receta in recetas
+        for mp in rnd.sample(mps, 2)
+    ])
+    ProductoLinea.objects.bulk_create([
+        ProductoLinea(id_producto=producto, id_linea_produccion=linea, cant_por_hora=rnd.randint(5, 20))
+        for producto in productos
+        for linea in rnd.sample(lineas, 2)
+    ])
+    # Sin señales: ver planificacion/signals.py
+    invalidar_capacidades()
+    for producto in productos:
+        LoteProduccion.objects.create(
+            id_producto=producto, cantidad=rnd.randint(0, 50),
+            id_estado_lote_produccion=estados[(EstadoLoteProduccion, "Disponible")],
+            fecha_produccion=hoy, fecha_vencimiento=hoy + timedelta(days=30)
+        )
+
+    for _ in range(n_ovs):
+        entrega = datetime.combine(hoy + timedelta(days=rnd.randint(2, 14)), datetime.min.time())
+        orden_venta = OrdenVenta.objects.create(
+            id_cliente=cliente, id_estado_venta=estados[(EstadoVenta, "Creada")],
+            id_prioridad=prioridad, fecha_entrega=timezone.make_aware(entrega)
+        )
+        OrdenVentaProducto.objects.bulk_create([
+            OrdenVentaProducto(id_orden_venta=orden_venta, id_producto=producto, cantidad=rnd.randint(10, 200))
+            for producto in rnd.sample(productos, 2)
+        ])
+
+    return {
+        "productos": n_productos,
+        "lineas": n_lineas,
+        "materias_primas": n_mps,
+        "ordenes_venta": n_ovs,
+    }
+
+
+def _medir(funcion, *args, **kwargs):
+    contador = ContadorConsultas()
+    inicio = time.perf_counter()
+    with connection.execute_wrapper(contador):
+        funcion(*args, **kwargs)
+    return {
+        "ms": round((time.perf_counter() - inicio) * 1000, 1),
+        "consultas": contador.consultas,
+    }
+
+
+def ejecutar_benchmark(ops, semilla=1):
+    """
+    Genera la fábrica y corre MRP -> solver -> replanificador midiendo cada fase.
+    Todo corre en una transacción que se deshace al final: la BD queda como estaba.
+    """
+    with transaction.atomic():
+        # Siempre un lunes: el solver planifica el martes (día con turno) sin importar cuándo se corre
+        hoy = timezone.localdate()
+        hoy += timedelta(days=-hoy.weekday() % 7)
+        # El perfilado por PASO suma consultas propias: se apaga para medir solo la planificación
+        Configuracion.objects.update_or_create(nombre_clave='PLANIFICACION_PERFILADO', defaults={'valor': '0'})
+        fabrica = generar_fabrica(ops, semilla=semilla, hoy=hoy)
+
+        resultado = {"ops_pedidas": ops, "semilla": semilla, "fabrica": fabrica, "fases": {}}
+        resultado["fases"]["mrp"] = _medir(ejecutar_planificacion_diaria_mrp, hoy)
+        resultado["ops_generadas"] = OrdenProduccion.objects.count()
+        resultado["tareas_calendario"] = CalendarioProduccion.objects.count()
+
+        resultado["fases"]["planificador"] = _medir(ejecutar_planificador, hoy)
+        solucion = SolucionPlanificador.objects.order_by('-id_solucion').first()
+        resultado["fases"]["planificador"].update({
+            "estado_solver": solucion.estado_solver if solucion else None,
+            "objetivo": solucion.objetivo if solucion else None,
+            "tiempo_solver_seg": round(solucion.tiempo_solver_seg, 3) if solucion else None,
+            "ots_creadas": OrdenDeTrabajo.objects.count(),
+        })
+
+        resultado["fases"]["replanificador"] = _medir(replanificar_ops_por_capacidad, hoy)
+
+        transaction.set_rollback(True)
+    return resultado
+
+
+def comparar_resultados(actuales, base):
+    """
+    Filas (ops, fase, ms, consultas, Δ ms, Δ consultas) de los resultados actuales
+    contra los de otra corrida (mismo tamaño de fábrica). Sin base, Δ = None.
+    """
+    base_por_clave = {
+        (resultado["ops_pedidas"], fase): medicion
+        for resultado in (base or {}).get("resultados", [])
+        for fase, medicion in resultado["fases"].items()
+    }
+    filas = []
+    for resultado in actuales["resultados"]:
+        for fase in FASES:
+            medicion = resultado["fases"][fase]
+            anterior = base_por_clave.get((resultado["ops_pedidas"], fase))
+            filas.append({
+                "ops": resultado["ops_pedidas"],
+                "fase": fase,
+                "ms": medicion["ms"],
+                "consultas": medicion["consultas"],
+                "delta_ms": round(medicion["ms"] - anterior["ms"], 1) if anterior else None,
+                "delta_consultas": medicion["consultas"] - anterior["consultas"] if anterior else None,
+                "estado_solver": medicion.get("estado_solver"),
+                "objetivo": medicion.get("objetivo"),
+            })
+    return filas
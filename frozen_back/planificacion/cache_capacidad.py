@@ -0,0 +1,125 @@
+from collections import defaultdict, namedtuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import CharField, F, IntegerField
+from django.db.models.functions import Cast
+
+from produccion.models import LineaProduccion
+from recetas.models import ProductoLinea
+from trazabilidad.models import Configuracion
+
+
+# ===================================================================
+# CACHÉ DE CAPACIDAD (reglas Producto ↔ Línea y líneas activas)
+# El MRP, el replanificador y el solver táctico leen las capacidades de acá
+# en vez de consultar ProductoLinea por cada OP. La foto vive en memoria del
+# proceso y tiene una versión: un contador en 'Configuracion' que las señales
+# incrementan en cada alta, cambio o baja de ProductoLinea y cuando una línea se
+# crea, se borra o entra / sale de ESTADOS_LINEA_ACTIVOS (ver signals.py).
+# Así, un cambio hecho desde la API (p.ej. ActualizarCapacidadLineaView) invalida
+# también la foto del worker de planificación, que corre en otro proceso.
+# Pedir la foto cuesta 1 consulta (la versión); recargarla, 2 más.
+# ===================================================================
+
+CLAVE_VERSION = 'CAPACIDAD_REGLAS_VERSION'
+
+# Estados en los que la línea puede recibir trabajo
+ESTADOS_LINEA_ACTIVOS = ("Disponible", "Ocupada")
+
+# Regla Producto ↔ Línea. Mismos nombres que los campos de ProductoLinea:
+# el código que usaba las instancias del modelo la lee igual.
+ReglaCapacidad = namedtuple(
+    "ReglaCapacidad",
+    ["id_producto_linea", "id_producto_id", "id_linea_produccion_id", "cant_por_hora", "cantidad_minima"]
+)
+
+
+class CapacidadLineas:
+    """
+    Foto de solo lectura de las reglas Producto ↔ Línea (por producto, en orden
+    de id) y de las líneas activas. No se modifica: si cambia la BD se arma otra.
+    """
+
+    def __init__(self, version):
+        self.version = version
+
+        self._reglas_por_producto = defaultdict(list)
+        self._regla_por_par = {}
+        for fila in ProductoLinea.objects.order_by('id_producto_linea').values_list(
+            'id_producto_linea', 'id_producto_id', 'id_linea_produccion_id', 'cant_por_hora', 'cantidad_minima'
+        ):
+            regla = ReglaCapacidad(*fila)
+            self._reglas_por_producto[regla.id_producto_id].append(regla)
+            self._regla_por_par[(regla.id_producto_id, regla.id_linea_produccion_id)] = regla
+
+        self.lineas_activas = frozenset(
+            LineaProduccion.objects.filter(
+                id_estado_linea_produccion__descripcion__in=ESTADOS_LINEA_ACTIVOS
+            ).values_list('id_linea_produccion', flat=True)
+        )
+
+    def reglas(self, producto_id):
+        """ Reglas del producto (lista vacía si no tiene líneas asignadas). """
+        return self._reglas_por_producto.get(producto_id, [])
+
+    def regla(self, producto_id, linea_id):
+        """ Regla del par producto / línea, o None. """
+        return self._regla_por_par.get((producto_id, linea_id))
+
+    def capacidad_total_por_hora(self, producto_id):
+        """ Σ cant_por_hora de todas las líneas del producto (lo que antes era un aggregate por OP). """
+        return sum(regla.cant_por_hora or 0 for regla in self.reglas(producto_id))
+
+    def lineas_de(self, producto_id):
+        return [regla.id_linea_produccion_id for regla in self.reglas(producto_id)]
+
+
+_foto = None
+
+
+def _version_actual():
+    valor = Configuracion.objects.filter(nombre_clave=CLAVE_VERSION).values_list('valor', flat=True).first()
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return 0
+
+
+def obtener_capacidades():
+    """
+    Devuelve la foto de capacidades al día. Se pide una vez por corrida (no por OP):
+    si la versión de la BD no cambió, reutiliza la del proceso.
+    """
+    global _foto
+    # La versión se lee ANTES que las reglas: si alguien confirma un cambio en el medio,
+    # la foto queda con la versión vieja y la próxima lectura la recarga.
+    version = _version_actual()
+    foto = _foto
+    if foto is None or foto.version != version:
+        foto = CapacidadLineas(version)
+        _foto = foto
+    return foto
+
+
+def invalidar_capacidades():
+    """
+    Descarta la foto del proceso e incrementa la versión en la BD (para los demás procesos).
+    Corre dentro de la transacción de quien guardó: si se deshace, la versión tampoco cambia.
+    """
+    global _foto
+    _foto = None
+
+    actualizadas = Configuracion.objects.filter(nombre_clave=CLAVE_VERSION).update(
+        valor=Cast(Cast(F('valor'), IntegerField()) + 1, CharField())
+    )
+    if actualizadas:
+        return
+    try:
+        with transaction.atomic():
+            Configuracion.objects.create(
+                nombre_clave=CLAVE_VERSION, valor='1',
+                descripcion="Versión de las reglas Producto ↔ Línea (la incrementa el sistema en cada cambio)."
+            )
+    except IntegrityError:
+        # Otro proceso la creó al mismo tiempo: solo falta incrementarla
+        invalidar_capacidades()
@@ -0,0 +1,145 @@
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+
+from .models import DiaNoLaborable
+
+
+# ===================================================================
+# CALENDARIO LABORAL
+# Días hábiles = lunes a viernes, menos los feriados y paradas de planta de
+# 'dia_no_laborable'. Reemplaza los "while fecha.weekday() >= 5" del MRP, del
+# replanificador y de la verificación de OVs: los días hábiles desde el origen
+# quedan en una lista ordenada (índice -> fecha) y las consultas son búsquedas
+# binarias. El índice se extiende solo (duplicando el rango, 1 consulta a los
+# feriados cada vez) si una consulta cae más allá de lo cargado.
+# Antes del origen (raro: ej. fecha de pedido de una OC) se camina día por día.
+# ===================================================================
+
+DIAS_INICIALES = 120  # Rango mínimo que se indexa desde el origen (días corridos)
+DIAS_CARGA_HACIA_ATRAS = 31  # Feriados que se cargan de una vez al consultar antes del origen
+
+
+class CalendarioLaboral:
+
+    def __init__(self, origen: date, hasta: date = None):
+        self.origen = origen
+        self._dias = []  # Días hábiles desde el origen, en orden (la posición es el índice)
+        self._no_laborables = set()
+        self._cargado_desde = origen
+        self._cargado_hasta = origen - timedelta(days=1)
+        self._extender(max(hasta or origen, origen + timedelta(days=DIAS_INICIALES)))
+
+    # ------------------------------------------------------------------
+    # Carga
+    # ------------------------------------------------------------------
+    def _cargar_no_laborables(self, desde, hasta):
+        self._no_laborables.update(
+            DiaNoLaborable.objects.filter(fecha__range=[desde, hasta]).values_list('fecha', flat=True)
+        )
+
+    def _extender(self, hasta):
+        """ Indexa los días hábiles hasta 'hasta' (como mínimo duplica el rango cargado). """
+        if hasta <= self._cargado_hasta:
+            return
+        hasta = max(hasta, self._cargado_hasta + (self._cargado_hasta - self.origen))
+        desde = self._cargado_hasta + timedelta(days=1)
+        self._cargar_no_laborables(desde, hasta)
+        self._cargado_hasta = hasta
+
+        fecha = desde
+        while fecha <= hasta:
+            if fecha.weekday() < 5 and fecha not in self._no_laborables:
+                self._dias.append(fecha)
+            fecha += timedelta(days=1)
+
+    def _asegurar(self, fecha):
+        """ Deja cargados los feriados de 'fecha' (y, si es futura, indexado hasta ella). """
+        if fecha > self._cargado_hasta:
+            self._extender(fecha)
+        elif fecha < self._cargado_desde:
+            desde = min(fecha, self._cargado_desde - timedelta(days=DIAS_CARGA_HACIA_ATRAS))
+            self._cargar_no_laborables(desde, self._cargado_desde - timedelta(days=1))
+            self._cargado_desde = desde
+
+    def _asegurar_habil_desde(self, fecha):
+        """ Indexa hasta tener al menos un día hábil >= fecha. """
+        self._asegurar(fecha)
+        while not self._dias or self._dias[-1] < fecha:
+            self._extender(self._cargado_hasta + timedelta(days=DIAS_INICIALES))
+
+    def extender_hasta(self, fecha: date):
+        """ Indexa los días hábiles (al menos) hasta 'fecha'. """
+        self._extender(fecha)
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+    def es_habil(self, fecha: date) -> bool:
+        self._asegurar(fecha)
+        return fecha.weekday() < 5 and fecha not in self._no_laborables
+
+    def habil_desde(self, fecha: date) -> date:
+        """ La misma fecha si es hábil; si no, el siguiente día hábil. """
+        if fecha < self.origen:
+            while not self.es_habil(fecha):
+                fecha += timedelta(days=1)
+            return fecha
+        self._asegurar_habil_desde(fecha)
+        return self._dias[bisect_left(self._dias, fecha)]
+
+    def habil_hasta(self, fecha: date) -> date:
+        """ La misma fecha si es hábil; si no, el día hábil anterior. """
+        if fecha >= self.origen:
+            self._asegurar(fecha)
+            posicion = bisect_right(self._dias, fecha) - 1
+            if posicion >= 0:
+                return self._dias[posicion]
+            fecha = self.origen - timedelta(days=1)
+        while not self.es_habil(fecha):
+            fecha -= timedelta(days=1)
+        return fecha
+
+    def siguiente_habil(self, fecha: date) -> date:
+        """ Primer día hábil estrictamente posterior a 'fecha'. """
+        return self.habil_desde(fecha + timedelta(days=1))
+
+    def sumar_dias_habiles(self, fecha: date, dias: int) -> date:
+        """ El día hábil número 'dias' después de 'fecha' (con 0, habil_desde(fecha)). """
+        if dias <= 0:
+            return self.habil_desde(fecha)
+        siguiente = self.siguiente_habil(fecha)
+        if siguiente < self.origen:
+            return self.sumar_dias_habiles(siguiente, dias - 1)
+        return self.fecha(self.indice(siguiente) + dias - 1)
+
+    def dias_habiles(self, desde: date, hasta: date):
+        """ Días hábiles entre 'desde' y 'hasta' (inclusive), desde el origen en adelante. """
+        desde = max(desde, self.origen)
+        self._asegurar(hasta)
+        return self._dias[bisect_left(self._dias, desde):bisect_right(self._dias, hasta)]
+
+    # ------------------------------------------------------------------
+    # Índice de días hábiles (0 = primer día hábil >= origen)
+    # ------------------------------------------------------------------
+    def indice(self, fecha: date) -> int:
+        """ Índice del primer día hábil >= fecha (fecha >= origen). """
+        self._asegurar_habil_desde(fecha)
+        return bisect_left(self._dias, fecha)
+
+    def fecha(self, indice: int) -> date:
+        while indice >= len(self._dias):
+            self._extender(self._cargado_hasta + timedelta(days=DIAS_INICIALES))
+        return self._dias[indice]
+
+    def posicion(self, fecha: date):
+        """ Índice de 'fecha' si es un día hábil ya indexado; None si no. """
+        if fecha < self.origen or fecha > self._cargado_hasta:
+            return None
+        posicion = bisect_left(self._dias, fecha)
+        if posicion < len(self._dias) and self._dias[posicion] == fecha:
+            return posicion
+        return None
+
+    @property
+    def dias_indexados(self) -> int:
+        return len(self._dias)
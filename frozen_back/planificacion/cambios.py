@@ -0,0 +1,144 @@
+from datetime import timedelta
+
+from compras.models import OrdenCompra, OrdenCompraMateriaPrima
+from produccion.models import OrdenProduccion
+from stock.models import LoteProduccion, LoteMateriaPrima
+from ventas.models import OrdenVenta, OrdenVentaProducto
+from trazabilidad.views import get_config
+from .models import EjecucionMRP
+from . import eventos
+
+
+class AlcanceMRP:
+    """
+    Qué productos / MPs procesa una corrida del MRP.
+    En modo completo 'productos' es None y los filtros no hacen nada.
+    """
+
+    def __init__(self, productos=None, materias_primas=None):
+        self.productos = productos
+        self.materias_primas = materias_primas
+
+    @property
+    def es_completo(self):
+        return self.productos is None
+
+    @property
+    def vacio(self):
+        return not self.es_completo and not self.productos and not self.materias_primas
+
+    def filtrar(self, queryset, campo_producto='id_producto'):
+        """ Restringe un queryset a los productos del alcance (sin cambios en modo completo). """
+        if self.es_completo:
+            return queryset
+        return queryset.filter(**{f"{campo_producto}__in": self.productos})
+
+
+def detectar_cambios(desde):
+    """
+    Productos y MPs tocados desde 'desde', leídos de las tablas de simple_history
+    (OVs y sus líneas, OPs, OCs y lotes) y de 'fecha_stock' de los lotes (el
+    recálculo de stock reservado / libre, que es como se reflejan las altas, bajas
+    y cambios de estado de ReservaStock / ReservaMateriaPrima, también los hechos
+    con update() o bulk_create()). Devuelve (set productos, set materias primas).
+
+    No se detectan cambios de recetas, líneas / capacidades ni configuración:
+    después de cambiarlas hay que correr el MRP en modo COMPLETO.
+    """
+    productos = set()
+    materias_primas = set()
+
+    ovs = OrdenVenta.history.filter(history_date__gte=desde).values_list('id_orden_venta', flat=True)
+    productos.update(
+        OrdenVentaProducto.objects.filter(id_orden_venta__in=ovs).values_list('id_producto_id', flat=True)
+    )
+    productos.update(
+        OrdenVentaProducto.history.filter(history_date__gte=desde).values_list('id_producto', flat=True)
+    )
+    productos.update(
+        OrdenProduccion.history.filter(history_date__gte=desde).values_list('id_producto', flat=True)
+    )
+    productos.update(
+        LoteProduccion.history.filter(history_date__gte=desde).values_list('id_producto', flat=True)
+    )
+    productos.update(
+        LoteProduccion.objects.filter(fecha_stock__gte=desde).values_list('id_producto_id', flat=True)
+    )
+
+    materias_primas.update(
+        LoteMateriaPrima.history.filter(history_date__gte=desde).values_list('id_materia_prima', flat=True)
+    )
+    materias_primas.update(
+        LoteMateriaPrima.objects.filter(fecha_stock__gte=desde).values_list('id_materia_prima_id', flat=True)
+    )
+    ocs = OrdenCompra.history.filter(history_date__gte=desde).values_list('id_orden_compra', flat=True)
+    materias_primas.update(
+        OrdenCompraMateriaPrima.objects.filter(id_orden_compra__in=ocs).values_list('id_materia_prima_id', flat=True)
+    )
+
+    productos.discard(None)
+    materias_primas.discard(None)
+    return productos, materias_primas
+
+
+def cerrar_por_receta(productos, materias_primas, snapshot):
+    """
+    Expande el conjunto "sucio" a las componentes conexas del grafo producto <-> MP
+    (BOM): si cambió una MP se replanifican todos los productos que la usan, y si
+    cambió un producto, todas sus MPs. Así los pools virtuales de MP del run
+    incremental cuentan a TODAS las OPs que compiten por esas MPs.
+    """
+    productos = set(productos)
+    materias_primas = set(materias_primas)
+    pendientes_p = list(productos)
+    pendientes_mp = list(materias_primas)
+
+    while pendientes_p or pendientes_mp:
+        while pendientes_p:
+            for mp_id in snapshot.materias_primas_de(pendientes_p.pop()):
+                if mp_id not in materias_primas:
+                    materias_primas.add(mp_id)
+                    pendientes_mp.append(mp_id)
+        while pendientes_mp:
+            for producto_id in snapshot.productos_que_usan(pendientes_mp.pop()):
+                if producto_id not in productos:
+                    productos.add(producto_id)
+                    pendientes_p.append(producto_id)
+
+    return productos, materias_primas
+
+
+def ultima_ejecucion(fecha_planificacion):
+    return EjecucionMRP.objects.filter(
+        fecha_planificacion=fecha_planificacion, fecha_fin__isnull=False
+    ).order_by('-fecha_inicio').first()
+
+
+def calcular_alcance(modo, fecha_planificacion, snapshot):
+    """
+    Alcance de la corrida. El modo incremental vuelve a 'completo' si no hubo
+    una corrida previa para la misma fecha de planificación (los pasos que
+    dependen del día, como el cierre de OVs de mañana, necesitan una pasada entera).
+    """
+    if modo != EjecucionMRP.Modo.INCREMENTAL:
+        return AlcanceMRP()
+
+    anterior = ultima_ejecucion(fecha_planificacion)
+    if anterior is None:
+        eventos.info("Net-change: no hay corrida previa para esta fecha. Se hace regeneración completa.")
+        return AlcanceMRP()
+
+    # Se mira desde el INICIO de la corrida anterior: lo que otros commitearon mientras
+    # corría tiene history_date < fecha_fin y esa corrida no lo vio. Sus propias
+    # escrituras también entran (se replanifican de más, nunca de menos). El margen
+    # (MRP_NET_CHANGE_MARGEN_SEG) amplía la ventana hacia atrás (relojes de otros procesos).
+    margen = timedelta(seconds=get_config('MRP_NET_CHANGE_MARGEN_SEG', 0))
+    desde = anterior.fecha_inicio - margen
+    productos, materias_primas = detectar_cambios(desde)
+    productos, materias_primas = cerrar_por_receta(productos, materias_primas, snapshot)
+    eventos.info(
+        "Net-change desde %s: %s productos y %s MPs a replanificar.",
+        desde, len(productos), len(materias_primas),
+        productos=len(productos), materias_primas=len(materias_primas)
+    )
+    return AlcanceMRP(productos, materias_primas)
@@ -0,0 +1,325 @@
+import math
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from django.utils import timezone
+
+from produccion.models import CalendarioProduccion
+from .calendario_laboral import CalendarioLaboral
+
+
+# Líneas paradas por (línea, fecha) para los libros que se creen en el hilo (simulaciones)
+_contexto = threading.local()
+
+
+@contextmanager
+def lineas_bloqueadas(bloqueos):
+    """
+    Mientras dura el bloque, los LibroCapacidad que se creen en este hilo ven esas
+    líneas sin horas libres en esas fechas. bloqueos: {linea_id: [fechas]}.
+    Lo usa la simulación de planificación para probar una línea fuera de servicio.
+    """
+    _contexto.bloqueos = bloqueos
+    try:
+        yield
+    finally:
+        _contexto.bloqueos = None
+
+
+class _ArbolHorasLibres:
+    """
+    Árbol de segmentos sobre los días hábiles de UNA línea (índice del calendario
+    laboral): máximo de horas libres por rango. Encuentra el primer día con al
+    menos N horas libres desde un índice en O(log n).
+    """
+
+    def __init__(self, horas_libres):
+        self.tamano = len(horas_libres)
+        self._hojas = 1
+        while self._hojas < self.tamano:
+            self._hojas *= 2
+        # Las hojas de relleno (más allá del tamaño) nunca califican
+        self._maximo = [-math.inf] * (2 * self._hojas)
+        self._maximo[self._hojas:self._hojas + self.tamano] = horas_libres
+        for nodo in range(self._hojas - 1, 0, -1):
+            self._maximo[nodo] = max(self._maximo[2 * nodo], self._maximo[2 * nodo + 1])
+
+    def actualizar(self, indice, horas_libres):
+        nodo = indice + self._hojas
+        self._maximo[nodo] = horas_libres
+        nodo //= 2
+        while nodo:
+            self._maximo[nodo] = max(self._maximo[2 * nodo], self._maximo[2 * nodo + 1])
+            nodo //= 2
+
+    def primero_desde(self, indice, horas):
+        """ Primer índice >= 'indice' con al menos 'horas' libres, o None. """
+        if indice >= self.tamano:
+            return None
+        return self._buscar(1, 0, self._hojas, indice, horas)
+
+    def _buscar(self, nodo, izquierda, derecha, indice, horas):
+        if derecha <= indice or self._maximo[nodo] < horas:
+            return None
+        if derecha - izquierda == 1:
+            return izquierda
+        medio = (izquierda + derecha) // 2
+        encontrado = self._buscar(2 * nodo, izquierda, medio, indice, horas)
+        if encontrado is None:
+            encontrado = self._buscar(2 * nodo + 1, medio, derecha, indice, horas)
+        return encontrado
+
+
+class LibroCapacidad:
+    """
+    Libro de capacidad en memoria: (línea, fecha) -> horas reservadas.
+
+    Se carga UNA sola vez con una consulta al calendario y después el
+    "walk the calendar" consulta y reserva horas contra la memoria, en vez de
+    hacer un Sum('horas_reservadas') por cada día visitado.
+    Las reservas nuevas se acumulan y se insertan con un único bulk_create
+    al llamar a guardar().
+
+    Los días se recorren con el calendario laboral (sin fines de semana, feriados
+    ni paradas de planta) y los días sin horas libres se saltean de una vez: cada
+    línea tiene un árbol de horas libres por día hábil (ver primer_dia_libre).
+    """
+
+    def __init__(self, horas_por_dia, estados_op, fecha_desde: date = None, calendario: CalendarioLaboral = None):
+        self.horas_por_dia = float(horas_por_dia)
+        self.estados_op = list(estados_op)
+        self.fecha_desde = fecha_desde
+
+        self._carga = defaultdict(float)          # {(linea_id, fecha): horas}
+        self._carga_por_op = defaultdict(list)    # {op_id: [(linea_id, fecha, horas), ...]}
+        self._pendientes = []                     # CalendarioProduccion sin guardar
+        self._arboles = {}                        # {linea_id: _ArbolHorasLibres} (se arman al primer uso)
+
+        self._cargar()
+
+        # El índice de días hábiles cubre al menos hasta la última carga conocida
+        origen = fecha_desde or timezone.localdate()
+        self.calendario = calendario or CalendarioLaboral(
+            origen, max([origen] + [fecha for _, fecha in self._carga]) + timedelta(days=1)
+        )
+
+    def _cargar(self):
+        reservas = CalendarioProduccion.objects.filter(
+            id_orden_produccion__id_estado_orden_produccion__in=self.estados_op
+        )
+        if self.fecha_desde is not None:
+            reservas = reservas.filter(fecha__gte=self.fecha_desde)
+
+        for op_id, linea_id, fecha, horas in reservas.values_list(
+            'id_orden_produccion_id', 'id_linea_produccion_id', 'fecha', 'horas_reservadas'
+        ):
+            horas = float(horas)
+            self._carga[(linea_id, fecha)] += horas
+            self._carga_por_op[op_id].append((linea_id, fecha, horas))
+
+        # Línea parada: el día entero queda ocupado (sin fila de calendario)
+        for linea_id, fechas in (getattr(_contexto, "bloqueos", None) or {}).items():
+            for fecha in fechas:
+                self._carga[(linea_id, fecha)] += self.horas_por_dia
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+    def carga(self, linea_id, fecha) -> float:
+        return self._carga.get((linea_id, fecha), 0.0)
+
+    def _arbol(self, linea_id):
+        """ Árbol de horas libres de la línea, al día con los días hábiles indexados. """
+        arbol = self._arboles.get(linea_id)
+        if arbol is None or arbol.tamano != self.calendario.dias_indexados:
+            arbol = _ArbolHorasLibres([
+                self.horas_por_dia - self.carga(linea_id, self.calendario.fecha(indice))
+                for indice in range(self.calendario.dias_indexados)
+            ])
+            self._arboles[linea_id] = arbol
+        return arbol
+
+    def primer_dia_libre(self, lineas_ids, fecha_desde, horas=1) -> date:
+        """
+        Primer día hábil >= fecha_desde con al menos 'horas' libres en TODAS las líneas
+        (horas <= horas_por_dia). Cada línea salta de una vez al siguiente día que le
+        sirve; se repite hasta que todas coinciden en el mismo día.
+        """
+        fecha = self.calendario.habil_desde(fecha_desde)
+        # Antes del origen del índice no hay árbol: día por día
+        while fecha < self.calendario.origen:
+            if self.horas_libres(lineas_ids, fecha) >= horas:
+                return fecha
+            fecha = self.calendario.siguiente_habil(fecha)
+
+        indice = self.calendario.indice(fecha)
+        while True:
+            candidato = indice
+            for linea_id in lineas_ids:
+                arbol = self._arbol(linea_id)
+                encontrado = arbol.primero_desde(candidato, horas)
+                # Más allá de lo indexado la línea no tiene carga
+                candidato = encontrado if encontrado is not None else max(candidato, arbol.tamano)
+            if candidato == indice:
+                return self.calendario.fecha(indice)
+            indice = candidato
+
+    def horas_libres(self, lineas_ids, fecha) -> float:
+        """ Horas libres del cuello de botella (la línea más cargada) en esa fecha. """
+        horas_libres_cuello_botella = self.horas_por_dia
+        for linea_id in lineas_ids:
+            horas_libres_linea = max(0, self.horas_por_dia - self.carga(linea_id, fecha))
+            horas_libres_cuello_botella = min(horas_libres_cuello_botella, horas_libres_linea)
+        return horas_libres_cuello_botella
+
+    # ------------------------------------------------------------------
+    # Modificaciones (solo memoria hasta guardar())
+    # ------------------------------------------------------------------
+    def _sumar_carga(self, linea_id, fecha, horas):
+        # Toda fecha con carga queda dentro del índice: más allá, la línea está libre
+        self.calendario.extender_hasta(fecha)
+        self._carga[(linea_id, fecha)] += horas
+        arbol = self._arboles.get(linea_id)
+        if arbol is not None:
+            indice = self.calendario.posicion(fecha)
+            if indice is not None and indice < arbol.tamano:
+                arbol.actualizar(indice, self.horas_por_dia - self._carga[(linea_id, fecha)])
+
+    def ocupar(self, linea_id, fecha, horas):
+        """ Descuenta horas de la línea sin generar fila de calendario (simulaciones). """
+        self._sumar_carga(linea_id, fecha, float(horas))
+
+    def reservar(self, op, linea_id, fecha, horas, cantidad):
+        """ Ocupa las horas y deja pendiente la fila de CalendarioProduccion. """
+        self.ocupar(linea_id, fecha, horas)
+        reserva = CalendarioProduccion(
+            id_orden_produccion=op,
+            id_linea_produccion_id=linea_id,
+            fecha=fecha,
+            horas_reservadas=horas,
+            cantidad_a_producir=cantidad
+        )
+        self._pendientes.append(reserva)
+        return reserva
+
+    def descartar_pendientes(self, op, fecha_desde: date = None):
+        """ Quita (y devuelve la capacidad de) las reservas aún no guardadas de una OP. """
+        conservadas = []
+        for reserva in self._pendientes:
+            if reserva.id_orden_produccion is op and (fecha_desde is None or reserva.fecha >= fecha_desde):
+                self._sumar_carga(reserva.id_linea_produccion_id, reserva.fecha, -float(reserva.horas_reservadas))
+            else:
+                conservadas.append(reserva)
+        self._pendientes = conservadas
+
+    def liberar_op(self, op, fecha_desde: date = None):
+        """
+        Borra el calendario de la OP en la BD (desde 'fecha_desde' si se indica)
+        y devuelve esas horas al libro.
+        """
+        reservas = CalendarioProduccion.objects.filter(id_orden_produccion=op)
+        if fecha_desde is not None:
+            reservas = reservas.filter(fecha__gte=fecha_desde)
+        reservas.delete()
+
+        conservadas = []
+        for linea_id, fecha, horas in self._carga_por_op.pop(op.pk, []):
+            if fecha_desde is None or fecha >= fecha_desde:
+                self._sumar_carga(linea_id, fecha, -horas)
+            else:
+                conservadas.append((linea_id, fecha, horas))
+        if conservadas:
+            self._carga_por_op[op.pk] = conservadas
+
+        self.descartar_pendientes(op, fecha_desde)
+
+    # ------------------------------------------------------------------
+    # Walk the calendar (MRP, replanificador y verificación de OVs)
+    # ------------------------------------------------------------------
+    def _caminar(self, lineas_ids, fecha_desde, reservar_en):
+        """
+        Recorre los días hábiles con horas libres en todas las líneas desde 'fecha_desde'.
+        reservar_en(fecha, horas libres enteras) -> (reservó, sigue pendiente).
+        Devuelve (primer día, último día) en que reservó; (None, None) si no reservó nada.
+        """
+        primero = ultimo = None
+        fecha = fecha_desde
+        while True:
+            fecha = self.primer_dia_libre(lineas_ids, fecha)
+            reservo, pendiente = reservar_en(fecha, math.floor(self.horas_libres(lineas_ids, fecha)))
+            if reservo:
+                primero = primero or fecha
+                ultimo = fecha
+            if not pendiente:
+                return primero, ultimo
+            fecha = self.calendario.siguiente_habil(fecha)
+
+    def reservar_dia(self, op, reglas, fecha, horas, cantidad_pendiente) -> int:
+        """
+        Reserva 'horas' en CADA línea del producto ese día (el producto corre en todas
+        sus líneas a la vez) hasta cubrir la cantidad. Devuelve la cantidad que sigue pendiente.
+        """
+        for regla in reglas:
+            cantidad_real_linea = min(cantidad_pendiente, round(float(horas) * float(regla.cant_por_hora)))
+
+            if horas > 0 and cantidad_real_linea > 0:
+                self.reservar(op, regla.id_linea_produccion_id, fecha, horas, cantidad_real_linea)
+                cantidad_pendiente -= cantidad_real_linea
+
+                if cantidad_pendiente <= 0:
+                    break
+        return cantidad_pendiente
+
+    def reservar_op(self, op, reglas, cantidad, fecha_desde):
+        """
+        Reserva la OP día hábil por día hábil desde 'fecha_desde': cada día toma las horas
+        libres del cuello de botella, hasta las que faltan para la cantidad pendiente
+        (ceil(pendiente / Σ cant_por_hora)). Devuelve (primer día, último día trabajado).
+        """
+        lineas_ids = [regla.id_linea_produccion_id for regla in reglas]
+        cant_total_por_hora = float(sum(regla.cant_por_hora or 0 for regla in reglas))
+        pendiente = [cantidad]
+
+        def reservar_en(fecha, horas_libres):
+            horas = min(math.ceil(pendiente[0] / cant_total_por_hora), horas_libres)
+            antes = pendiente[0]
+            pendiente[0] = self.reservar_dia(op, reglas, fecha, horas, pendiente[0])
+            return pendiente[0] < antes, pendiente[0] > 0
+
+        if cantidad <= 0 or cant_total_por_hora <= 0:
+            return None, None
+        return self._caminar(lineas_ids, fecha_desde, reservar_en)
+
+    def ocupar_horas(self, lineas_ids, horas, fecha_desde):
+        """ Ocupa 'horas' en todas las líneas sin generar calendario (simulaciones). Devuelve el último día. """
+        pendientes = [horas]
+
+        def ocupar_en(fecha, horas_libres):
+            horas_hoy = min(pendientes[0], horas_libres)
+            for linea_id in lineas_ids:
+                self.ocupar(linea_id, fecha, horas_hoy)
+            pendientes[0] -= horas_hoy
+            return True, pendientes[0] > 0
+
+        if horas <= 0:
+            return None
+        return self._caminar(lineas_ids, fecha_desde, ocupar_en)[1]
+
+    def guardar(self) -> int:
+        """ Inserta todas las reservas pendientes con un único bulk_create. """
+        if not self._pendientes:
+            return 0
+
+        for reserva in self._pendientes:
+            # La OP pudo haberse guardado después de crear la reserva (PASO 5): se toma su pk actual
+            reserva.id_orden_produccion_id = reserva.id_orden_produccion.pk
+            horas = float(reserva.horas_reservadas)
+            self._carga_por_op[reserva.id_orden_produccion_id].append(
+                (reserva.id_linea_produccion_id, reserva.fecha, horas)
+            )
+
+        creadas = CalendarioProduccion.objects.bulk_create(self._pendientes)
+        self._pendientes = []
+        return len(creadas)
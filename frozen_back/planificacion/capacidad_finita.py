@@ -0,0 +1,200 @@
+from collections import defaultdict
+
+from ortools.sat.python import cp_model
+
+
+# ===================================================================
+# MRP A CAPACIDAD FINITA (PASO 5 con CP-SAT)
+# En vez de caminar el calendario OP por OP (la primera que entra se queda con
+# la capacidad), asigna TODAS las OPs nuevas a días hábiles en un único modelo:
+#   - cada OP necesita 'horas' en todas sus líneas a la vez (igual que el walk),
+#     a partir del día en que llega su materia prima;
+#   - cada línea tiene por día las horas libres que deja el calendario;
+#   - 1ª pasada: minimizar el atraso ponderado por prioridad contra el día de
+#     fin que permite cumplir la fecha de entrega de la OV;
+#   - 2ª pasada: con ese atraso fijo, producir lo más justo a tiempo y compacto
+#     posible (menos días de adelanto y OPs menos estiradas).
+# El solver arranca desde la mejor de varias reglas de despacho (por fecha de
+# entrega, por duración / peso, por liberación): siempre tiene una solución
+# válida que mejorar. Cada OP solo puede caer hasta unos días después de su fin
+# en esa solución (o de su objetivo), para que el modelo no crezca con el horizonte.
+# No usa Django: recibe y devuelve datos simples (planificador.py arma la entrada).
+# Los días son índices de días hábiles (0 = primer día hábil del horizonte).
+# ===================================================================
+
+ESTADOS_CON_SOLUCION = ("OPTIMAL", "FEASIBLE")
+
+DIAS_HOLGURA_MODELO = 5  # Días que una OP puede correrse más allá de su fin inicial / objetivo
+
+# Reglas de despacho para la solución inicial (se usa la de menor atraso ponderado)
+REGLAS_INICIALES = {
+    "EDD": lambda p: (p["objetivo"], -p["peso"], p["liberacion"]),  # Primero la que se entrega antes
+    "WSPT": lambda p: (p["horas"] / p["peso"], p["objetivo"]),  # Primero las cortas / de más prioridad
+    "liberacion": lambda p: (p["liberacion"], p["objetivo"]),  # En orden de llegada de la MP
+}
+
+
+def atraso_ponderado(pedidos, asignacion):
+    return sum(
+        pedido["peso"] * max(0, max(asignacion[pedido["clave"]]) - pedido["objetivo"])
+        for pedido in pedidos
+    )
+
+
+def solucion_inicial(pedidos, horas_libres, dias):
+    """
+    Prueba las REGLAS_INICIALES y devuelve (regla, asignación) de la de menor atraso
+    ponderado, o (None, None) si con ninguna entran todos los pedidos en el horizonte.
+    """
+    mejor = (None, None)
+    for regla, orden in REGLAS_INICIALES.items():
+        asignacion = despachar(sorted(pedidos, key=orden), horas_libres, dias)
+        if asignacion is not None and (
+            mejor[1] is None or atraso_ponderado(pedidos, asignacion) < atraso_ponderado(pedidos, mejor[1])
+        ):
+            mejor = (regla, asignacion)
+    return mejor
+
+
+def despachar(pedidos, horas_libres, dias):
+    """
+    En el orden dado, cada pedido toma desde su liberación las horas libres de sus
+    líneas, día por día. Devuelve {clave: {día: horas}}, o None si alguno no entra.
+    """
+    libres = dict(horas_libres)
+    asignacion = {}
+    for pedido in pedidos:
+        pendientes = pedido["horas"]
+        horas_por_dia = {}
+        for dia in range(pedido["liberacion"], dias):
+            horas = min([pendientes] + [libres.get((linea, dia), 0) for linea in pedido["lineas"]])
+            if horas <= 0:
+                continue
+            horas_por_dia[dia] = horas
+            for linea in pedido["lineas"]:
+                libres[(linea, dia)] -= horas
+            pendientes -= horas
+            if pendientes == 0:
+                break
+        if pendientes > 0:
+            return None
+        asignacion[pedido["clave"]] = horas_por_dia
+    return asignacion
+
+
+def asignar_capacidad(pedidos, horas_libres, dias, config):
+    """
+    pedidos: [{"clave", "lineas": [ids], "horas", "liberacion": día, "objetivo": día, "peso"}]
+    horas_libres: {(línea, día): horas enteras libres}; dias: largo del horizonte.
+    config: {"max_segundos", "workers"}.
+
+    Devuelve el estado, el atraso ponderado (y el de la solución inicial y su regla,
+    para comparar), el tiempo y, si hubo solución, {"asignacion": {clave: {día: horas}}}.
+    """
+    regla, inicial = solucion_inicial(pedidos, horas_libres, dias)
+    if inicial is None:
+        # Con el horizonte dado no entran todas las OPs: el MRP usa el walk
+        return _resultado("INFEASIBLE")
+
+    model = cp_model.CpModel()
+    horas_por_linea_dia = defaultdict(list)
+    atrasos = []
+    holguras = []
+    variables = []  # (clave, día, x)
+    atraso_inicial = atraso_ponderado(pedidos, inicial)
+
+    for pedido in pedidos:
+        clave = pedido["clave"]
+        hint = inicial[clave]
+        ultimo_dia = min(dias - 1, max(max(hint), pedido["objetivo"]) + DIAS_HOLGURA_MODELO)
+        dias_posibles = [
+            (dia, min(horas_libres.get((linea, dia), 0) for linea in pedido["lineas"]))
+            for dia in range(pedido["liberacion"], ultimo_dia + 1)
+        ]
+        dias_posibles = [(dia, tope) for dia, tope in dias_posibles if tope > 0]
+
+        primero, ultimo = dias_posibles[0][0], dias_posibles[-1][0]
+        inicio = model.NewIntVar(primero, ultimo, f"inicio_{clave}")
+        fin = model.NewIntVar(primero, ultimo, f"fin_{clave}")
+        horas_pedido = []
+        for dia, tope in dias_posibles:
+            x = model.NewIntVar(0, min(tope, pedido["horas"]), f"x_{clave}_{dia}")
+            trabaja = model.NewBoolVar(f"y_{clave}_{dia}")
+            model.Add(x >= 1).OnlyEnforceIf(trabaja)
+            model.Add(x == 0).OnlyEnforceIf(trabaja.Not())
+            model.Add(inicio <= dia).OnlyEnforceIf(trabaja)
+            model.Add(fin >= dia).OnlyEnforceIf(trabaja)
+            model.AddHint(x, hint.get(dia, 0))
+            model.AddHint(trabaja, dia in hint)
+            for linea in pedido["lineas"]:
+                horas_por_linea_dia[(linea, dia)].append(x)
+            horas_pedido.append(x)
+            variables.append((clave, dia, x))
+        model.Add(sum(horas_pedido) == pedido["horas"])
+
+        # Atraso y adelanto del día de fin contra el objetivo (en días hábiles)
+        atraso = model.NewIntVar(0, dias, f"atraso_{clave}")
+        adelanto = model.NewIntVar(0, dias, f"adelanto_{clave}")
+        model.Add(atraso >= fin - pedido["objetivo"])
+        model.Add(adelanto >= pedido["objetivo"] - fin)
+        atrasos.append(pedido["peso"] * atraso)
+        holguras.append(adelanto + (fin - inicio))
+
+        inicio_hint, fin_hint = min(hint), max(hint)
+        model.AddHint(inicio, inicio_hint)
+        model.AddHint(fin, fin_hint)
+        model.AddHint(atraso, max(0, fin_hint - pedido["objetivo"]))
+        model.AddHint(adelanto, max(0, pedido["objetivo"] - fin_hint))
+
+    for (linea, dia), horas in horas_por_linea_dia.items():
+        model.Add(sum(horas) <= horas_libres[(linea, dia)])
+
+    atraso_total = sum(atrasos)
+    model.Minimize(atraso_total)
+
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = config["max_segundos"]
+    solver.parameters.num_search_workers = config["workers"]
+    status = solver.Solve(model)
+    if status not in (cp_model.FEASIBLE, cp_model.OPTIMAL):
+        # Sin tiempo ni para validar la solución inicial: la devolvemos tal cual (es válida)
+        resultado = _resultado("INICIAL", regla, atraso_inicial, atraso_inicial, solver.WallTime())
+        resultado["asignacion"] = inicial
+        return resultado
+
+    resultado = _resultado(solver.StatusName(status), regla, round(solver.ObjectiveValue()), atraso_inicial, solver.WallTime())
+    resultado["asignacion"] = _asignacion(solver, variables)
+
+    # Segunda pasada (lexicográfica): sin empeorar el atraso, lo más justo a tiempo posible.
+    # Arranca desde la solución de la primera; si no llegara a nada, queda la primera.
+    model.Add(atraso_total <= resultado["atraso_ponderado"])
+    model.ClearHints()
+    for indice in range(len(model.Proto().variables)):
+        variable = model.GetIntVarFromProtoIndex(indice)
+        model.AddHint(variable, solver.Value(variable))
+    model.Minimize(sum(holguras))
+    status = solver.Solve(model)
+    resultado["tiempo"] += solver.WallTime()
+    if status in (cp_model.FEASIBLE, cp_model.OPTIMAL):
+        resultado["asignacion"] = _asignacion(solver, variables)
+    return resultado
+
+
+def _asignacion(solver, variables):
+    asignacion = {}
+    for clave, dia, x in variables:
+        horas = solver.Value(x)
+        if horas:
+            asignacion.setdefault(clave, {})[dia] = horas
+    return asignacion
+
+
+def _resultado(estado, regla=None, atraso_ponderado=None, atraso_inicial=None, tiempo=0.0):
+    return {
+        "estado": estado,
+        "regla_inicial": regla,
+        "atraso_ponderado": atraso_ponderado,
+        "atraso_inicial": atraso_inicial,
+        "tiempo": tiempo,
+        "asignacion": {},
+    }
@@ -0,0 +1,239 @@
+import functools
+import threading
+from contextlib import contextmanager
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import CorridaPlanificacion, EventoPlanificacion
+from .perfilado import PerfiladorCorrida
+
+
+# ===================================================================
+# REGISTRO ESTRUCTURADO DE EVENTOS DE PLANIFICACIÓN
+# Reemplaza los print() del MRP, del solver y del replanificador:
+#   - Los eventos se acumulan en memoria y se guardan con un único
+#     bulk_create al terminar la corrida (no hay I/O en los loops).
+#   - El mensaje usa formato '%' perezoso: si el evento está por debajo del
+#     nivel configurado no se formatea ni se guarda.
+#   - PLANIFICACION_NIVEL_EVENTOS (Configuracion, default 20 = INFO) fija el
+#     nivel mínimo; PLANIFICACION_EVENTOS_CONSOLA = 1 además los imprime.
+#   - Cada PASO queda además perfilado (tiempo, consultas, filas, memoria):
+#     ver perfilado.py. PLANIFICACION_PERFILADO = 0 lo desactiva.
+# ===================================================================
+
+Nivel = EventoPlanificacion.Nivel
+Tipo = EventoPlanificacion.Tipo
+
+_TAMANO_LOTE_BULK = 1000
+
+_contexto = threading.local()
+
+# Funciones que reciben (registro, evento) por cada evento guardado (ej: el
+# seguimiento de trabajos de planificación). Se llaman desde el hilo de la corrida.
+_suscriptores = []
+
+
+class RegistroEventos:
+    """ Buffer de eventos de UNA corrida. """
+
+    def __init__(self, origen, nivel_minimo, eco_consola, trabajo=None, perfilador=None):
+        self.nivel_minimo = nivel_minimo
+        self.eco_consola = eco_consola
+        self.perfilador = perfilador
+        self.paso_actual = ""
+        self._eventos = []
+        self.intento = 0
+        self._inicio_intento = 0
+        self._fin_intento = None
+        self.corrida = CorridaPlanificacion.objects.create(
+            origen=origen,
+            trabajo=trabajo,
+            nivel_minimo=nivel_minimo,
+            fecha_inicio=timezone.now()
+        )
+
+    def registrar(self, nivel, tipo, mensaje, args, op=None, ov=None, datos=None):
+        if nivel < self.nivel_minimo and tipo != Tipo.PASO:
+            return
+
+        if args:
+            mensaje = mensaje % args
+        evento = EventoPlanificacion(
+            corrida=self.corrida,
+            secuencia=len(self._eventos) + 1,
+            fecha=timezone.now(),
+            nivel=nivel,
+            tipo=tipo,
+            paso=self.paso_actual,
+            mensaje=mensaje,
+            id_orden_produccion=op,
+            id_orden_venta=ov,
+            datos=datos or {}
+        )
+        self._eventos.append(evento)
+
+        if self.eco_consola:
+            print(f"\n[PASO {self.paso_actual}] {mensaje}" if tipo == Tipo.PASO else mensaje)
+        for suscriptor in _suscriptores:
+            suscriptor(self, evento)
+
+    def nuevo_intento(self):
+        """
+        Empieza un intento de la corrida (ver trabajos.py). Si no es el primero,
+        el anterior se deshizo con un rollback: sus eventos (ej: OP_CREADA de OPs
+        que ya no existen) se descartan y su perfil pasa al paso 'deshecho'. Lo
+        registrado después de que falló (el aviso del conflicto) se conserva.
+        """
+        self.intento += 1
+        if self.perfilador is not None:
+            self.perfilador.nuevo_intento(descartar_anterior=self.intento > 1)
+        if self.intento > 1:
+            fin = len(self._eventos) if self._fin_intento is None else self._fin_intento
+            descartados = fin - self._inicio_intento
+            del self._eventos[self._inicio_intento:fin]
+            for secuencia, evento in enumerate(self._eventos[self._inicio_intento:], self._inicio_intento + 1):
+                evento.secuencia = secuencia
+            self.paso_actual = ""
+            self.registrar(
+                Nivel.ADVERTENCIA, Tipo.MENSAJE,
+                "Reintento %s: se descartan %s eventos del intento anterior (deshecho).",
+                (self.intento, descartados)
+            )
+        self._inicio_intento = len(self._eventos)
+        self._fin_intento = None
+
+    def intento_fallido(self):
+        """ Marca el fin del intento en curso (se descarta si hay otro intento). """
+        self._fin_intento = len(self._eventos)
+
+    def iniciar_paso(self, codigo):
+        self.paso_actual = codigo
+        if self.perfilador is not None:
+            self.perfilador.marcar(codigo)
+
+    def guardar(self, error=None):
+        if self.perfilador is not None:
+            self.perfilador.guardar(self.corrida)
+        EventoPlanificacion.objects.bulk_create(self._eventos, batch_size=_TAMANO_LOTE_BULK)
+        self.corrida.estado = CorridaPlanificacion.Estado.ERROR if error else CorridaPlanificacion.Estado.COMPLETADA
+        self.corrida.error = f"{error}" if error else ""
+        self.corrida.cantidad_eventos = len(self._eventos)
+        self.corrida.fecha_fin = timezone.now()
+        self.corrida.save(update_fields=['estado', 'error', 'cantidad_eventos', 'fecha_fin'])
+
+
+def registrar_corrida(origen):
+    """
+    Decorador: abre un RegistroEventos para la corrida y lo guarda al salir
+    (también si termina con error). Debe ir POR FUERA de @transaction.atomic
+    para que los eventos de una corrida fallida no se pierdan con el rollback.
+    Si ya hay una corrida abierta en el hilo (ej: el trabajo del MRP la abre
+    antes de los reintentos), la función se suma a esa.
+    """
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if registro_actual() is not None:
+                return funcion(*args, **kwargs)
+            with corrida(origen):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+@contextmanager
+def corrida(origen):
+    """ Equivalente a @registrar_corrida como context manager (devuelve el RegistroEventos). """
+    from trazabilidad.views import get_config
+
+    perfilador = None
+    if get_config('PLANIFICACION_PERFILADO', 1):
+        perfilador = PerfiladorCorrida(medir_memoria=bool(get_config('PLANIFICACION_PERFILADO_MEMORIA', 0)))
+
+    registro = RegistroEventos(
+        origen,
+        nivel_minimo=get_config('PLANIFICACION_NIVEL_EVENTOS', Nivel.INFO),
+        eco_consola=bool(get_config('PLANIFICACION_EVENTOS_CONSOLA', 0)),
+        trabajo=getattr(_contexto, "trabajo", None),
+        perfilador=perfilador
+    )
+    _contexto.registro = registro
+    try:
+        if perfilador is None:
+            yield registro
+        else:
+            perfilador.iniciar()
+            with connection.execute_wrapper(perfilador):
+                yield registro
+    except Exception as e:
+        _contexto.registro = None
+        registro.guardar(error=e)
+        raise
+    _contexto.registro = None
+    registro.guardar()
+
+
+def registro_actual():
+    return getattr(_contexto, "registro", None)
+
+
+def asociar_trabajo(trabajo):
+    """ Las corridas que se abran en este hilo quedan vinculadas al trabajo (o a ninguno, con None). """
+    _contexto.trabajo = trabajo
+
+
+def suscribir(funcion):
+    _suscriptores.append(funcion)
+
+
+def desuscribir(funcion):
+    if funcion in _suscriptores:
+        _suscriptores.remove(funcion)
+
+
+# ------------------------------------------------------------------
+# API de registro (no hace nada si no hay corrida abierta en el hilo)
+# ------------------------------------------------------------------
+def evento(tipo, mensaje, *args, nivel=Nivel.INFO, op=None, ov=None, **datos):
+    registro = getattr(_contexto, "registro", None)
+    if registro is not None:
+        registro.registrar(nivel, tipo, mensaje, args, op=op, ov=ov, datos=datos)
+
+
+def paso(codigo, mensaje, *args):
+    """ Marca el inicio de un PASO; los eventos siguientes quedan etiquetados con él. """
+    registro = getattr(_contexto, "registro", None)
+    if registro is not None:
+        registro.iniciar_paso(codigo)
+        registro.registrar(Nivel.INFO, Tipo.PASO, mensaje, args)
+
+
+def nuevo_intento():
+    """ Ver RegistroEventos.nuevo_intento. """
+    registro = getattr(_contexto, "registro", None)
+    if registro is not None:
+        registro.nuevo_intento()
+
+
+def intento_fallido():
+    """ Ver RegistroEventos.intento_fallido. """
+    registro = getattr(_contexto, "registro", None)
+    if registro is not None:
+        registro.intento_fallido()
+
+
+def debug(mensaje, *args, op=None, ov=None, **datos):
+    evento(Tipo.MENSAJE, mensaje, *args, nivel=Nivel.DEBUG, op=op, ov=ov, **datos)
+
+
+def info(mensaje, *args, op=None, ov=None, **datos):
+    evento(Tipo.MENSAJE, mensaje, *args, nivel=Nivel.INFO, op=op, ov=ov, **datos)
+
+
+def advertencia(mensaje, *args, op=None, ov=None, **datos):
+    evento(Tipo.MENSAJE, mensaje, *args, nivel=Nivel.ADVERTENCIA, op=op, ov=ov, **datos)
+
+
+def error(mensaje, *args, op=None, ov=None, **datos):
+    evento(Tipo.MENSAJE, mensaje, *args, nivel=Nivel.ERROR, op=op, ov=ov, **datos)
@@ -0,0 +1,115 @@
+import json
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from planificacion.benchmark import ejecutar_benchmark, comparar_resultados
+
+
+def _commit_actual():
+    try:
+        salida = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return salida.stdout.strip() or None
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark del MRP, el solver táctico y el replanificador sobre fábricas sintéticas "
+        "de distintos tamaños. Corre en la BD de test (la crea y la borra al terminar): "
+        "nunca toca los datos de la BD configurada."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ops",
+            nargs="+",
+            type=int,
+            default=[10, 100],
+            help="Tamaños de fábrica, en OPs aproximadas (default: 10 100).",
+        )
+        parser.add_argument(
+            "--semilla",
+            type=int,
+            default=1,
+            help="Semilla del generador (misma semilla = misma fábrica).",
+        )
+        parser.add_argument(
+            "--salida",
+            help="Archivo JSON donde guardar los resultados (con el commit actual).",
+        )
+        parser.add_argument(
+            "--comparar",
+            help="Archivo JSON de una corrida anterior contra el que comparar.",
+        )
+
+    def handle(self, *args, **options):
+        base = None
+        if options["comparar"]:
+            try:
+                with open(options["comparar"], encoding="utf-8") as archivo:
+                    base = json.load(archivo)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"No se pudo leer '{options['comparar']}': {e}")
+
+        nombre_original = connection.settings_dict["NAME"]
+        self.stdout.write("🧪 Creando la BD de test...")
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            resultados = []
+            for ops in options["ops"]:
+                self.stdout.write(f"🏭 Fábrica de ~{ops} OPs (semilla {options['semilla']})...")
+                resultados.append(ejecutar_benchmark(ops, semilla=options["semilla"]))
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+
+        actuales = {
+            "commit": _commit_actual(),
+            "fecha": timezone.now().isoformat(),
+            "motor_bd": connection.vendor,
+            "resultados": resultados,
+        }
+        self._mostrar(actuales, base)
+
+        if options["salida"]:
+            with open(options["salida"], "w", encoding="utf-8") as archivo:
+                json.dump(actuales, archivo, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f"✅ Resultados guardados en {options['salida']}"))
+
+    def _mostrar(self, actuales, base):
+        self.stdout.write(f"\n📊 Benchmark de planificación (commit {actuales['commit'] or '?'}, {actuales['motor_bd']})")
+        if base is not None:
+            self.stdout.write(f"   Comparado contra el commit {base.get('commit') or '?'} ({base.get('fecha', '?')})")
+
+        for resultado in actuales["resultados"]:
+            fabrica = resultado["fabrica"]
+            self.stdout.write(
+                f"   ~{resultado['ops_pedidas']} OPs: {resultado['ops_generadas']} OPs generadas, "
+                f"{resultado['tareas_calendario']} tareas de calendario, {fabrica['productos']} productos, "
+                f"{fabrica['lineas']} líneas, {fabrica['ordenes_venta']} OVs"
+            )
+
+        encabezado = f"{'OPs':>6} {'fase':<15} {'ms':>10} {'consultas':>10} {'solver':>10} {'objetivo':>10}"
+        if base is not None:
+            encabezado += f" {'Δ ms':>10} {'Δ consultas':>12}"
+        self.stdout.write(encabezado)
+        self.stdout.write("-" * len(encabezado))
+
+        for fila in comparar_resultados(actuales, base):
+            objetivo = "-" if fila["objetivo"] is None else f"{fila['objetivo']:.0f}"
+            linea = (
+                f"{fila['ops']:>6} {fila['fase']:<15} {fila['ms']:>10.1f} {fila['consultas']:>10} "
+                f"{fila['estado_solver'] or '-':>10} {objetivo:>10}"
+            )
+            if base is not None:
+                delta_ms = "-" if fila["delta_ms"] is None else f"{fila['delta_ms']:+.1f}"
+                delta_consultas = "-" if fila["delta_consultas"] is None else f"{fila['delta_consultas']:+d}"
+                linea += f" {delta_ms:>10} {delta_consultas:>12}"
+            self.stdout.write(linea)
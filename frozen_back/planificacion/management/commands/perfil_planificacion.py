@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from planificacion.models import CorridaPlanificacion
+from planificacion.perfilado import resumen_por_paso, corrida_anterior, comparar
+
+
+class Command(BaseCommand):
+    help = (
+        "Muestra el perfil por PASO (tiempo, consultas, filas, memoria) de una corrida "
+        "de planificación y lo compara con la corrida anterior del mismo origen."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "id_corrida",
+            nargs="?",
+            type=int,
+            help="Corrida a mostrar (default: la última del origen indicado).",
+        )
+        parser.add_argument(
+            "--origen",
+            default=CorridaPlanificacion.Origen.MRP,
+            choices=CorridaPlanificacion.Origen.values,
+            help="Origen de la corrida cuando no se indica id (default: MRP).",
+        )
+        parser.add_argument(
+            "--sin-comparar",
+            action="store_true",
+            help="No compara contra la corrida anterior.",
+        )
+
+    def handle(self, *args, **options):
+        if options["id_corrida"]:
+            corrida = CorridaPlanificacion.objects.filter(pk=options["id_corrida"]).first()
+        else:
+            corrida = CorridaPlanificacion.objects.filter(origen=options["origen"]).order_by('-fecha_inicio').first()
+        if corrida is None:
+            raise CommandError("No se encontró la corrida de planificación.")
+
+        pasos = resumen_por_paso(corrida)
+        anterior = None if options["sin_comparar"] else corrida_anterior(corrida)
+        if anterior is not None:
+            pasos = comparar(pasos, resumen_por_paso(anterior))
+
+        self.stdout.write(
+            f"📊 Corrida #{corrida.id_corrida} ({corrida.origen}, {corrida.estado}) - {corrida.fecha_inicio:%Y-%m-%d %H:%M:%S}"
+        )
+        if anterior is not None:
+            self.stdout.write(f"   Comparada contra la corrida #{anterior.id_corrida} ({anterior.fecha_inicio:%Y-%m-%d %H:%M:%S})")
+        if len(pasos) == 1:
+            self.stdout.write(self.style.WARNING("⚠️ La corrida no tiene perfil (PLANIFICACION_PERFILADO = 0)."))
+            return
+
+        encabezado = f"{'PASO':<20} {'ms':>10} {'consultas':>10} {'ms BD':>10} {'leídas':>9} {'escritas':>9} {'mem KB':>9}"
+        if anterior is not None:
+            encabezado += f" {'Δ ms':>10} {'Δ consultas':>12}"
+        self.stdout.write(encabezado)
+        self.stdout.write("-" * len(encabezado))
+
+        for fila in pasos:
+            memoria = "-" if fila["memoria_pico_kb"] is None else fila["memoria_pico_kb"]
+            linea = (
+                f"{fila['paso']:<20} {fila['duracion_ms']:>10.1f} {fila['consultas']:>10} "
+                f"{fila['tiempo_consultas_ms']:>10.1f} {fila['filas_leidas']:>9} {fila['filas_escritas']:>9} {memoria:>9}"
+            )
+            if anterior is not None:
+                delta_ms = "-" if fila["delta_duracion_ms"] is None else f"{fila['delta_duracion_ms']:+.1f}"
+                delta_consultas = "-" if fila["delta_consultas"] is None else f"{fila['delta_consultas']:+d}"
+                linea += f" {delta_ms:>10} {delta_consultas:>12}"
+            self.stdout.write(linea)
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from planificacion.trabajos import (
+    marcar_trabajos_caidos, tomar_siguiente_trabajo, ejecutar_trabajo, identificador_worker
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker local de planificación: toma los trabajos encolados por los "
+        "endpoints (MRP, solver, replanificación) y los ejecuta de a uno."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--una-vez",
+            action="store_true",
+            help="Procesa los trabajos pendientes y termina (útil para cron).",
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=5,
+            help="Segundos entre consultas a la cola cuando no hay trabajos (default: 5).",
+        )
+
+    def handle(self, *args, **options):
+        worker = identificador_worker()
+        self.stdout.write(f"👷 Worker de planificación iniciado ({worker})")
+
+        while True:
+            close_old_connections()
+            caidos = marcar_trabajos_caidos()
+            if caidos:
+                self.stdout.write(self.style.WARNING(f"⚠️ {caidos} trabajo(s) abandonados marcados como ERROR."))
+
+            trabajo = tomar_siguiente_trabajo(worker)
+            if trabajo is None:
+                if options["una_vez"]:
+                    break
+                time.sleep(options["intervalo"])
+                continue
+
+            self.stdout.write(f"▶️ Ejecutando trabajo #{trabajo.pk} ({trabajo.tipo}) - parámetros: {trabajo.parametros}")
+            trabajo = ejecutar_trabajo(trabajo)
+            if trabajo.estado == trabajo.Estado.COMPLETADO:
+                self.stdout.write(self.style.SUCCESS(f"✅ Trabajo #{trabajo.pk} completado: {trabajo.mensaje}"))
+            else:
+                self.stdout.write(self.style.ERROR(f"❌ Trabajo #{trabajo.pk} con error: {trabajo.mensaje}"))
+
+        self.stdout.write("👋 No quedan trabajos pendientes.")
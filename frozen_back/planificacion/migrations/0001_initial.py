@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-16 22:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EjecucionMRP',
+            fields=[
+                ('id_ejecucion_mrp', models.AutoField(primary_key=True, serialize=False)),
+                ('fecha_planificacion', models.DateField()),
+                ('modo', models.CharField(choices=[('COMPLETO', 'Regeneración completa'), ('INCREMENTAL', 'Incremental (net-change)')], default='COMPLETO', max_length=12)),
+                ('fecha_inicio', models.DateTimeField()),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True)),
+                ('productos_procesados', models.IntegerField(blank=True, null=True)),
+                ('materias_primas_procesadas', models.IntegerField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'ejecucion_mrp',
+                'ordering': ['-fecha_inicio'],
+            },
+        ),
+    ]
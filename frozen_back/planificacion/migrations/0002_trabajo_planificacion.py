@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-16 22:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planificacion', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoPlanificacion',
+            fields=[
+                ('id_trabajo', models.AutoField(primary_key=True, serialize=False)),
+                ('tipo', models.CharField(choices=[('MRP', 'MRP + Scheduler'), ('PLANIFICADOR', 'Solver táctico (OTs)'), ('REPLANIFICACION_CAPACIDAD', 'Replanificación por capacidad')], max_length=30)),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('EN_EJECUCION', 'En ejecución'), ('COMPLETADO', 'Completado'), ('ERROR', 'Error')], default='PENDIENTE', max_length=15)),
+                ('parametros', models.JSONField(blank=True, default=dict)),
+                ('paso_actual', models.CharField(blank=True, default='', max_length=100)),
+                ('progreso', models.PositiveSmallIntegerField(default=0)),
+                ('log', models.TextField(blank=True, default='')),
+                ('mensaje', models.TextField(blank=True, default='')),
+                ('worker', models.CharField(blank=True, default='', max_length=100)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_inicio', models.DateTimeField(blank=True, null=True)),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True)),
+                ('fecha_actualizacion', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'trabajo_planificacion',
+                'ordering': ['-fecha_creacion'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('estado__in', ['PENDIENTE', 'EN_EJECUCION'])), fields=('tipo',), name='trabajo_planif_unico_activo')],
+            },
+        ),
+    ]
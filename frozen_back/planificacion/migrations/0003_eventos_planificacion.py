@@ -0,0 +1,54 @@
+# Generated by Django 5.2.6 on 2026-10-16 22:54
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planificacion', '0002_trabajo_planificacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorridaPlanificacion',
+            fields=[
+                ('id_corrida', models.AutoField(primary_key=True, serialize=False)),
+                ('origen', models.CharField(choices=[('MRP', 'Planificador MRP diario'), ('PLANIFICADOR', 'Solver táctico (OTs)'), ('REPLANIFICACION_CAPACIDAD', 'Replanificación por capacidad')], max_length=30)),
+                ('estado', models.CharField(choices=[('EN_CURSO', 'En curso'), ('COMPLETADA', 'Completada'), ('ERROR', 'Error')], default='EN_CURSO', max_length=12)),
+                ('nivel_minimo', models.PositiveSmallIntegerField()),
+                ('fecha_inicio', models.DateTimeField()),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True)),
+                ('cantidad_eventos', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('trabajo', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='corridas', to='planificacion.trabajoplanificacion')),
+            ],
+            options={
+                'db_table': 'corrida_planificacion',
+                'ordering': ['-fecha_inicio'],
+            },
+        ),
+        migrations.CreateModel(
+            name='EventoPlanificacion',
+            fields=[
+                ('id_evento', models.AutoField(primary_key=True, serialize=False)),
+                ('secuencia', models.IntegerField()),
+                ('fecha', models.DateTimeField()),
+                ('nivel', models.PositiveSmallIntegerField(choices=[(10, 'Debug'), (20, 'Info'), (30, 'Advertencia'), (40, 'Error')], default=20)),
+                ('tipo', models.CharField(choices=[('PASO', 'Inicio de PASO'), ('MENSAJE', 'Mensaje'), ('OP_CREADA', 'OP creada'), ('OP_REPLANIFICADA', 'OP replanificada'), ('OP_CANCELADA', 'OP cancelada'), ('OP_ESTADO', 'Cambio de estado de OP'), ('OV_ESTADO', 'Cambio de estado de OV'), ('RESERVA', 'Reserva de stock'), ('FALTANTE_MP', 'Faltante de materia prima'), ('OC_AGREGADA', 'Compra agregada a OC'), ('ENTREGA_RETRASADA', 'Entrega retrasada'), ('ENTREGA_ADELANTADA', 'Entrega adelantada'), ('OT_CREADA', 'OTs creadas')], default='MENSAJE', max_length=20)),
+                ('paso', models.CharField(blank=True, default='', max_length=20)),
+                ('mensaje', models.TextField()),
+                ('id_orden_produccion', models.IntegerField(blank=True, null=True)),
+                ('id_orden_venta', models.IntegerField(blank=True, null=True)),
+                ('datos', models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('corrida', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='eventos', to='planificacion.corridaplanificacion')),
+            ],
+            options={
+                'db_table': 'evento_planificacion',
+                'ordering': ['corrida', 'secuencia'],
+                'indexes': [models.Index(fields=['corrida', 'tipo'], name='evento_planif_tipo_idx'), models.Index(fields=['corrida', 'id_orden_produccion'], name='evento_planif_op_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-16 22:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planificacion', '0003_eventos_planificacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MedicionPaso',
+            fields=[
+                ('id_medicion', models.AutoField(primary_key=True, serialize=False)),
+                ('secuencia', models.IntegerField()),
+                ('paso', models.CharField(max_length=20)),
+                ('fecha_inicio', models.DateTimeField()),
+                ('duracion_ms', models.FloatField(default=0)),
+                ('consultas', models.IntegerField(default=0)),
+                ('tiempo_consultas_ms', models.FloatField(default=0)),
+                ('filas_leidas', models.IntegerField(default=0)),
+                ('filas_escritas', models.IntegerField(default=0)),
+                ('memoria_pico_kb', models.IntegerField(blank=True, null=True)),
+                ('corrida', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mediciones', to='planificacion.corridaplanificacion')),
+            ],
+            options={
+                'db_table': 'medicion_paso_planificacion',
+                'ordering': ['corrida', 'secuencia'],
+            },
+        ),
+    ]
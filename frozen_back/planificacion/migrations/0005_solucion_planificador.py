@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planificacion', '0004_medicion_paso_planificacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SolucionPlanificador',
+            fields=[
+                ('id_solucion', models.AutoField(primary_key=True, serialize=False)),
+                ('fecha_desde', models.DateField()),
+                ('horizonte_dias', models.PositiveSmallIntegerField()),
+                ('estado_solver', models.CharField(max_length=20)),
+                ('objetivo', models.FloatField(blank=True, null=True)),
+                ('pistas', models.JSONField(blank=True, default=dict)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'solucion_planificador',
+                'ordering': ['-fecha_creacion'],
+            },
+        ),
+    ]
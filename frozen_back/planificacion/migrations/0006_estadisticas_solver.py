@@ -0,0 +1,58 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planificacion', '0005_solucion_planificador'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='solucionplanificador',
+            name='conflictos',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='solucionplanificador',
+            name='mejor_cota',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='solucionplanificador',
+            name='num_restricciones',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='solucionplanificador',
+            name='num_tandas',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='solucionplanificador',
+            name='num_tareas',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='solucionplanificador',
+            name='num_variables',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='solucionplanificador',
+            name='ramas',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='solucionplanificador',
+            name='tareas_con_pista',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='solucionplanificador',
+            name='tiempo_solver_seg',
+            field=models.FloatField(default=0),
+        ),
+    ]
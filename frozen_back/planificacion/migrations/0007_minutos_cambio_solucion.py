@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planificacion', '0006_estadisticas_solver'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='solucionplanificador',
+            name='minutos_cambio',
+            field=models.IntegerField(default=0),
+        ),
+    ]
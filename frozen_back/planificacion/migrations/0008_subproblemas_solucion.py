@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planificacion', '0007_minutos_cambio_solucion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='solucionplanificador',
+            name='num_subproblemas',
+            field=models.IntegerField(default=1),
+        ),
+    ]
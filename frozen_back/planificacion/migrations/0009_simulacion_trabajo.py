@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:59
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planificacion', '0008_subproblemas_solucion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajoplanificacion',
+            name='resultado',
+            field=models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder),
+        ),
+        migrations.AlterField(
+            model_name='trabajoplanificacion',
+            name='tipo',
+            field=models.CharField(choices=[('MRP', 'MRP + Scheduler'), ('PLANIFICADOR', 'Solver táctico (OTs)'), ('REPLANIFICACION_CAPACIDAD', 'Replanificación por capacidad'), ('SIMULACION', 'Simulación (no guarda cambios)')], max_length=30),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planificacion', '0009_simulacion_trabajo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiaNoLaborable',
+            fields=[
+                ('id_dia_no_laborable', models.AutoField(primary_key=True, serialize=False)),
+                ('fecha', models.DateField(unique=True)),
+                ('tipo', models.CharField(choices=[('FERIADO', 'Feriado'), ('PARADA_PLANTA', 'Parada de planta')], default='FERIADO', max_length=15)),
+                ('descripcion', models.CharField(blank=True, default='', max_length=200)),
+            ],
+            options={
+                'db_table': 'dia_no_laborable',
+                'ordering': ['fecha'],
+            },
+        ),
+    ]
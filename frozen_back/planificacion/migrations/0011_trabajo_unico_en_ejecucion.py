@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:53
+
+from django.db import migrations, models
+
+
+def cerrar_ejecuciones_superpuestas(apps, schema_editor):
+    """
+    Antes solo se evitaban dos trabajos activos del mismo tipo: puede haber varios
+    'En ejecución'. Se deja el más reciente y el resto pasa a ERROR (como un
+    trabajo abandonado) para poder crear la restricción.
+    """
+    TrabajoPlanificacion = apps.get_model('planificacion', 'TrabajoPlanificacion')
+    en_ejecucion = TrabajoPlanificacion.objects.filter(estado='EN_EJECUCION').order_by('-fecha_inicio', '-pk')
+    TrabajoPlanificacion.objects.filter(
+        pk__in=list(en_ejecucion.values_list('pk', flat=True)[1:])
+    ).update(estado='ERROR', mensaje="Cerrado al migrar: había otro trabajo en ejecución.")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planificacion', '0010_dia_no_laborable'),
+    ]
+
+    operations = [
+        migrations.RunPython(cerrar_ejecuciones_superpuestas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='trabajoplanificacion',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado', 'EN_EJECUCION')), fields=('estado',), name='trabajo_planif_unico_en_ejecucion'),
+        ),
+    ]
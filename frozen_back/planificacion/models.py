@@ -1,3 +1,257 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
-# Create your models here.
+
+class EjecucionMRP(models.Model):
+    """
+    Registro de cada corrida del MRP diario. La corrida incremental (net-change)
+    usa 'fecha_inicio' de la última ejecución del mismo día para saber qué cambió.
+    """
+    class Modo(models.TextChoices):
+        COMPLETO = 'COMPLETO', 'Regeneración completa'
+        INCREMENTAL = 'INCREMENTAL', 'Incremental (net-change)'
+
+    id_ejecucion_mrp = models.AutoField(primary_key=True)
+    fecha_planificacion = models.DateField()
+    modo = models.CharField(max_length=12, choices=Modo.choices, default=Modo.COMPLETO)
+    fecha_inicio = models.DateTimeField()
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+    # None = se procesaron todos (modo completo)
+    productos_procesados = models.IntegerField(null=True, blank=True)
+    materias_primas_procesadas = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        db_table = "ejecucion_mrp"
+        ordering = ['-fecha_inicio']
+
+    def __str__(self):
+        return f"MRP {self.fecha_planificacion} ({self.modo}) #{self.id_ejecucion_mrp}"
+
+
+class TrabajoPlanificacion(models.Model):
+    """
+    Corrida de planificación encolada (MRP, solver táctico o replanificación por
+    capacidad). La ejecuta el proceso worker ('procesar_trabajos_planificacion')
+    fuera del request HTTP; el front consulta estado, PASO actual y log por id.
+    """
+    class Tipo(models.TextChoices):
+        MRP = 'MRP', 'MRP + Scheduler'
+        PLANIFICADOR = 'PLANIFICADOR', 'Solver táctico (OTs)'
+        REPLANIFICACION_CAPACIDAD = 'REPLANIFICACION_CAPACIDAD', 'Replanificación por capacidad'
+        SIMULACION = 'SIMULACION', 'Simulación (no guarda cambios)'
+
+    class Estado(models.TextChoices):
+        PENDIENTE = 'PENDIENTE', 'Pendiente'
+        EN_EJECUCION = 'EN_EJECUCION', 'En ejecución'
+        COMPLETADO = 'COMPLETADO', 'Completado'
+        ERROR = 'ERROR', 'Error'
+
+    ESTADOS_ACTIVOS = [Estado.PENDIENTE, Estado.EN_EJECUCION]
+
+    id_trabajo = models.AutoField(primary_key=True)
+    tipo = models.CharField(max_length=30, choices=Tipo.choices)
+    estado = models.CharField(max_length=15, choices=Estado.choices, default=Estado.PENDIENTE)
+    parametros = models.JSONField(default=dict, blank=True)
+    paso_actual = models.CharField(max_length=100, blank=True, default="")
+    progreso = models.PositiveSmallIntegerField(default=0)  # 0-100
+    log = models.TextField(blank=True, default="")
+    mensaje = models.TextField(blank=True, default="")  # Resultado o error
+    # Salida estructurada del trabajo (ej: la diferencia de plan de una simulación)
+    resultado = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    worker = models.CharField(max_length=100, blank=True, default="")
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+    # Latido del worker: si deja de actualizarse, el trabajo se da por caído
+    fecha_actualizacion = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "trabajo_planificacion"
+        ordering = ['-fecha_creacion']
+        constraints = [
+            # Nunca dos corridas activas del mismo tipo (ej: dos MRP superpuestos)
+            models.UniqueConstraint(
+                fields=['tipo'],
+                condition=models.Q(estado__in=['PENDIENTE', 'EN_EJECUCION']),
+                name='trabajo_planif_unico_activo',
+            ),
+            # Y de a un trabajo en ejecución, de cualquier tipo: todos escriben o bloquean
+            # las tablas del plan (la simulación corre el MRP y lo deshace), así que con
+            # varios workers una simulación no corre a la vez que el MRP real
+            models.UniqueConstraint(
+                fields=['estado'],
+                condition=models.Q(estado='EN_EJECUCION'),
+                name='trabajo_planif_unico_en_ejecucion',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Trabajo #{self.id_trabajo} {self.tipo} ({self.estado})"
+
+
+class CorridaPlanificacion(models.Model):
+    """
+    Una corrida del MRP, del solver táctico o del replanificador, con sus
+    eventos estructurados (ver planificacion/eventos.py).
+    """
+    class Origen(models.TextChoices):
+        MRP = 'MRP', 'Planificador MRP diario'
+        PLANIFICADOR = 'PLANIFICADOR', 'Solver táctico (OTs)'
+        REPLANIFICACION_CAPACIDAD = 'REPLANIFICACION_CAPACIDAD', 'Replanificación por capacidad'
+
+    class Estado(models.TextChoices):
+        EN_CURSO = 'EN_CURSO', 'En curso'
+        COMPLETADA = 'COMPLETADA', 'Completada'
+        ERROR = 'ERROR', 'Error'
+
+    id_corrida = models.AutoField(primary_key=True)
+    origen = models.CharField(max_length=30, choices=Origen.choices)
+    estado = models.CharField(max_length=12, choices=Estado.choices, default=Estado.EN_CURSO)
+    trabajo = models.ForeignKey(
+        TrabajoPlanificacion, on_delete=models.SET_NULL, null=True, blank=True, related_name='corridas'
+    )
+    nivel_minimo = models.PositiveSmallIntegerField()  # Eventos por debajo de este nivel no se guardan
+    fecha_inicio = models.DateTimeField()
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+    cantidad_eventos = models.IntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+
+    class Meta:
+        db_table = "corrida_planificacion"
+        ordering = ['-fecha_inicio']
+
+    def __str__(self):
+        return f"Corrida #{self.id_corrida} {self.origen} ({self.estado})"
+
+
+class EventoPlanificacion(models.Model):
+    class Nivel(models.IntegerChoices):
+        DEBUG = 10, 'Debug'
+        INFO = 20, 'Info'
+        ADVERTENCIA = 30, 'Advertencia'
+        ERROR = 40, 'Error'
+
+    class Tipo(models.TextChoices):
+        PASO = 'PASO', 'Inicio de PASO'
+        MENSAJE = 'MENSAJE', 'Mensaje'
+        OP_CREADA = 'OP_CREADA', 'OP creada'
+        OP_REPLANIFICADA = 'OP_REPLANIFICADA', 'OP replanificada'
+        OP_CANCELADA = 'OP_CANCELADA', 'OP cancelada'
+        OP_ESTADO = 'OP_ESTADO', 'Cambio de estado de OP'
+        OV_ESTADO = 'OV_ESTADO', 'Cambio de estado de OV'
+        RESERVA = 'RESERVA', 'Reserva de stock'
+        FALTANTE_MP = 'FALTANTE_MP', 'Faltante de materia prima'
+        OC_AGREGADA = 'OC_AGREGADA', 'Compra agregada a OC'
+        ENTREGA_RETRASADA = 'ENTREGA_RETRASADA', 'Entrega retrasada'
+        ENTREGA_ADELANTADA = 'ENTREGA_ADELANTADA', 'Entrega adelantada'
+        OT_CREADA = 'OT_CREADA', 'OTs creadas'
+
+    id_evento = models.AutoField(primary_key=True)
+    corrida = models.ForeignKey(CorridaPlanificacion, on_delete=models.CASCADE, related_name='eventos')
+    secuencia = models.IntegerField()
+    fecha = models.DateTimeField()
+    nivel = models.PositiveSmallIntegerField(choices=Nivel.choices, default=Nivel.INFO)
+    tipo = models.CharField(max_length=20, choices=Tipo.choices, default=Tipo.MENSAJE)
+    paso = models.CharField(max_length=20, blank=True, default="")
+    mensaje = models.TextField()
+    # Ids "sueltos" (sin FK): la corrida puede haber creado y revertido la OP
+    id_orden_produccion = models.IntegerField(null=True, blank=True)
+    id_orden_venta = models.IntegerField(null=True, blank=True)
+    datos = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+
+    class Meta:
+        db_table = "evento_planificacion"
+        ordering = ['corrida', 'secuencia']
+        indexes = [
+            models.Index(fields=['corrida', 'tipo'], name='evento_planif_tipo_idx'),
+            models.Index(fields=['corrida', 'id_orden_produccion'], name='evento_planif_op_idx'),
+        ]
+
+    def __str__(self):
+        return f"[{self.corrida_id}#{self.secuencia}] {self.tipo}: {self.mensaje}"
+
+
+class MedicionPaso(models.Model):
+    """
+    Perfil de un PASO de una corrida de planificación: tiempo total, consultas
+    a la BD (cantidad y tiempo), filas leídas/escritas y pico de memoria.
+    Un mismo PASO puede aparecer más de una vez; los tramos de un intento
+    deshecho (reintentos del MRP) quedan bajo el paso 'deshecho'.
+    """
+    id_medicion = models.AutoField(primary_key=True)
+    corrida = models.ForeignKey(CorridaPlanificacion, on_delete=models.CASCADE, related_name='mediciones')
+    secuencia = models.IntegerField()
+    paso = models.CharField(max_length=20)
+    fecha_inicio = models.DateTimeField()
+    duracion_ms = models.FloatField(default=0)
+    consultas = models.IntegerField(default=0)
+    tiempo_consultas_ms = models.FloatField(default=0)
+    # rowcount informado por el driver (en SELECT algunos motores, como sqlite, no lo informan)
+    filas_leidas = models.IntegerField(default=0)
+    filas_escritas = models.IntegerField(default=0)
+    # None = corrida sin medición de memoria (PLANIFICACION_PERFILADO_MEMORIA = 0)
+    memoria_pico_kb = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        db_table = "medicion_paso_planificacion"
+        ordering = ['corrida', 'secuencia']
+
+    def __str__(self):
+        return f"[{self.corrida_id}] PASO {self.paso}: {self.duracion_ms:.0f} ms, {self.consultas} consultas"
+
+
+class SolucionPlanificador(models.Model):
+    """
+    Resultado de cada corrida del solver táctico: estado, objetivo y estadísticas
+    del modelo y de la búsqueda. En horizonte rodante (PLANIFICADOR_HORIZONTE_DIAS > 1)
+    solo se confirman las OTs del primer día; lo planificado para los días
+    siguientes queda como pista (warm start) para el modelo del día siguiente.
+    """
+    id_solucion = models.AutoField(primary_key=True)
+    fecha_desde = models.DateField()  # Primer día del horizonte (el que se confirma)
+    horizonte_dias = models.PositiveSmallIntegerField()
+    estado_solver = models.CharField(max_length=20)
+    objetivo = models.FloatField(null=True, blank=True)
+    mejor_cota = models.FloatField(null=True, blank=True)
+    tiempo_solver_seg = models.FloatField(default=0)
+    conflictos = models.BigIntegerField(default=0)
+    ramas = models.BigIntegerField(default=0)
+    num_tareas = models.IntegerField(default=0)
+    num_tandas = models.IntegerField(default=0)
+    num_variables = models.IntegerField(default=0)
+    num_restricciones = models.IntegerField(default=0)
+    tareas_con_pista = models.IntegerField(default=0)
+    minutos_cambio = models.IntegerField(default=0)  # Setup total (cambios de producto) de lo planificado
+    num_subproblemas = models.IntegerField(default=1)  # Modelos independientes (uno por línea)
+    # {id tarea de calendario: {"fecha": "YYYY-MM-DD", "inicios": [minuto del turno de cada tanda]}}
+    pistas = models.JSONField(default=dict, blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "solucion_planificador"
+        ordering = ['-fecha_creacion']
+
+    def __str__(self):
+        return f"Solución {self.fecha_desde} (+{self.horizonte_dias} días, {self.estado_solver})"
+
+
+class DiaNoLaborable(models.Model):
+    """
+    Feriados y paradas de planta. El calendario laboral de la planificación
+    (ver calendario_laboral.py) los saltea igual que a sábados y domingos.
+    """
+    class Tipo(models.TextChoices):
+        FERIADO = 'FERIADO', 'Feriado'
+        PARADA_PLANTA = 'PARADA_PLANTA', 'Parada de planta'
+
+    id_dia_no_laborable = models.AutoField(primary_key=True)
+    fecha = models.DateField(unique=True)
+    tipo = models.CharField(max_length=15, choices=Tipo.choices, default=Tipo.FERIADO)
+    descripcion = models.CharField(max_length=200, blank=True, default="")
+
+    class Meta:
+        db_table = "dia_no_laborable"
+        ordering = ['fecha']
+
+    def __str__(self):
+        return f"{self.fecha} ({self.get_tipo_display()})"
@@ -0,0 +1,155 @@
+import time
+import tracemalloc
+from collections import OrderedDict
+
+from django.utils import timezone
+
+from .models import CorridaPlanificacion, MedicionPaso
+
+
+# ===================================================================
+# PERFILADO POR PASO DE LAS CORRIDAS DE PLANIFICACIÓN
+# Cada corrida (ver eventos.py) se parte en tramos: uno desde el inicio hasta
+# el primer PASO y uno por cada eventos.paso(). Por tramo se mide:
+#   - tiempo total (reloj)
+#   - consultas a la BD y su tiempo (connection.execute_wrapper)
+#   - filas leídas / escritas (rowcount del cursor)
+#   - pico de memoria (tracemalloc, solo con PLANIFICACION_PERFILADO_MEMORIA = 1
+#     porque encarece cada asignación de memoria de Python)
+# ===================================================================
+
+PASO_INICIAL = "inicio"
+# Tramos de un intento deshecho por rollback (reintentos del MRP): no se suman a su PASO
+PASO_DESHECHO = "deshecho"
+
+_CAMPOS_SUMABLES = ("duracion_ms", "consultas", "tiempo_consultas_ms", "filas_leidas", "filas_escritas")
+
+
+class PerfiladorCorrida:
+    """ Se instala como execute_wrapper de la conexión del hilo que corre la corrida. """
+
+    def __init__(self, medir_memoria=False):
+        self.medir_memoria = medir_memoria
+        self.mediciones = []
+        self._actual = None
+        self._inicio_tramo = None
+        self._detener_tracemalloc = False
+        self._inicio_intento = 0
+
+    def iniciar(self):
+        if self.medir_memoria and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._detener_tracemalloc = True
+        self.marcar(PASO_INICIAL)
+
+    def marcar(self, paso):
+        """ Cierra el tramo en curso y abre uno nuevo para 'paso'. """
+        self._cerrar_tramo()
+        if self.medir_memoria:
+            tracemalloc.reset_peak()
+        self._actual = MedicionPaso(
+            secuencia=len(self.mediciones) + 1,
+            paso=paso,
+            fecha_inicio=timezone.now()
+        )
+        self._inicio_tramo = time.perf_counter()
+
+    def nuevo_intento(self, descartar_anterior):
+        """ Abre el tramo inicial de un intento; los tramos del anterior pasan a PASO_DESHECHO. """
+        if descartar_anterior:
+            self._cerrar_tramo()
+            for medicion in self.mediciones[self._inicio_intento:]:
+                medicion.paso = PASO_DESHECHO
+        self.marcar(PASO_INICIAL)
+        self._inicio_intento = len(self.mediciones)
+
+    def terminar(self):
+        self._cerrar_tramo()
+        if self._detener_tracemalloc:
+            tracemalloc.stop()
+            self._detener_tracemalloc = False
+
+    def guardar(self, corrida):
+        self.terminar()
+        for medicion in self.mediciones:
+            medicion.corrida = corrida
+        MedicionPaso.objects.bulk_create(self.mediciones)
+
+    def _cerrar_tramo(self):
+        if self._actual is None:
+            return
+        self._actual.duracion_ms = (time.perf_counter() - self._inicio_tramo) * 1000
+        if self.medir_memoria:
+            self._actual.memoria_pico_kb = tracemalloc.get_traced_memory()[1] // 1024
+        self.mediciones.append(self._actual)
+        self._actual = None
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            medicion = self._actual
+            if medicion is not None:
+                medicion.consultas += 1
+                medicion.tiempo_consultas_ms += (time.perf_counter() - inicio) * 1000
+                filas = context["cursor"].rowcount
+                if filas and filas > 0:
+                    if sql.lstrip()[:6].upper() == "SELECT":
+                        medicion.filas_leidas += filas
+                    else:
+                        medicion.filas_escritas += filas
+
+
+# ------------------------------------------------------------------
+# Lectura de perfiles guardados
+# ------------------------------------------------------------------
+def resumen_por_paso(corrida):
+    """
+    Mediciones de la corrida sumadas por PASO (en el orden en que aparecieron),
+    más una fila 'TOTAL'. La memoria se informa como el máximo de los tramos.
+    """
+    pasos = OrderedDict()
+    total = {campo: 0 for campo in _CAMPOS_SUMABLES}
+    total.update(paso="TOTAL", tramos=0, memoria_pico_kb=None)
+
+    for medicion in corrida.mediciones.all():
+        fila = pasos.setdefault(medicion.paso, dict(
+            {campo: 0 for campo in _CAMPOS_SUMABLES}, paso=medicion.paso, tramos=0, memoria_pico_kb=None
+        ))
+        for destino in (fila, total):
+            destino["tramos"] += 1
+            for campo in _CAMPOS_SUMABLES:
+                destino[campo] += getattr(medicion, campo)
+            if medicion.memoria_pico_kb is not None:
+                destino["memoria_pico_kb"] = max(destino["memoria_pico_kb"] or 0, medicion.memoria_pico_kb)
+
+    filas = list(pasos.values()) + [total]
+    for fila in filas:
+        fila["duracion_ms"] = round(fila["duracion_ms"], 1)
+        fila["tiempo_consultas_ms"] = round(fila["tiempo_consultas_ms"], 1)
+    return filas
+
+
+def corrida_anterior(corrida):
+    """ Última corrida COMPLETADA del mismo origen, anterior a esta y con perfil. """
+    return CorridaPlanificacion.objects.filter(
+        origen=corrida.origen,
+        estado=CorridaPlanificacion.Estado.COMPLETADA,
+        fecha_inicio__lt=corrida.fecha_inicio,
+        mediciones__isnull=False
+    ).distinct().order_by('-fecha_inicio').first()
+
+
+def comparar(resumen_actual, resumen_anterior):
+    """ Agrega a cada PASO las diferencias de tiempo y consultas contra la corrida anterior. """
+    anteriores = {fila["paso"]: fila for fila in resumen_anterior}
+    for fila in resumen_actual:
+        anterior = anteriores.get(fila["paso"])
+        if anterior is None:
+            fila["delta_duracion_ms"] = None
+            fila["delta_consultas"] = None
+            continue
+        fila["delta_duracion_ms"] = round(fila["duracion_ms"] - anterior["duracion_ms"], 1)
+        fila["delta_consultas"] = fila["consultas"] - anterior["consultas"]
+    return resumen_actual
@@ -1,103 +1,178 @@
 import math
+from bisect import bisect_left
 from datetime import timedelta, date, datetime
 from django.utils import timezone
 from django.db import transaction
-from django.db.models import Sum, Q, F, Value
-from django.db.models.functions import Coalesce
+from django.db.models import F
 from collections import defaultdict
+from simple_history.utils import bulk_create_with_history
 
 # --- Importar Modelos de todas las apps ---
-from ventas.models import OrdenVenta, OrdenVentaProducto, EstadoVenta
+from ventas.models import OrdenVenta, OrdenVentaProducto, EstadoVenta, Prioridad
 from productos.models import Producto
-from produccion.models import (
-    OrdenProduccion, EstadoOrdenProduccion, LineaProduccion, 
-    CalendarioProduccion, OrdenProduccionPegging
-)
+from produccion.models import OrdenProduccion, EstadoOrdenProduccion, OrdenProduccionPegging
 from compras.models import OrdenCompra, OrdenCompraMateriaPrima, EstadoOrdenCompra
 from stock.models import (
-    LoteProduccion, LoteMateriaPrima, EstadoLoteProduccion,
-    EstadoLoteMateriaPrima, ReservaStock, ReservaMateriaPrima,
+    LoteProduccion, EstadoLoteProduccion, ReservaStock, ReservaMateriaPrima,
     EstadoReserva, EstadoReservaMateria
 )
-from stock.services import get_stock_disponible_para_producto, get_stock_disponible_para_materia_prima
-from recetas.models import ProductoLinea, Receta, RecetaMateriaPrima
-from materias_primas.models import MateriaPrima, Proveedor
+from recetas.models import ProductoLinea, Receta
+from stock.asignacion import AsignadorFEFO
+from stock.concurrencia import bloquear_items
 from trazabilidad.views import get_config
+from .capacidad import LibroCapacidad
+from .capacidad_finita import asignar_capacidad
+from .snapshot import PlanningSnapshot
+from .cambios import calcular_alcance
+from .models import EjecucionMRP, CorridaPlanificacion
+from . import eventos
 
 # --- Constantes de Planificación (Centralizadas) ---
 #HORAS_LABORABLES_POR_DIA = 16
 #DIAS_BUFFER_ENTREGA_PT = 1
 #DIAS_BUFFER_RECEPCION_MP = 1
 
+# --- PASO 5 a capacidad finita (CP-SAT) ---
+CAPACIDAD_FINITA_MAX_SECONDS = 10  # Por pasada (atraso y justo a tiempo)
+CAPACIDAD_FINITA_WORKERS = 8
+CAPACIDAD_FINITA_MAX_VARIABLES = 100000  # Modelos más grandes usan el walk greedy
+CAPACIDAD_FINITA_DIAS_MARGEN = 5  # Días hábiles extra del horizonte, además de la carga estimada
+
 # ===================================================================
 # FUNCIONES HELPER
-# (_reservar_stock_pt y _reservar_stock_mp no cambian)
+# (Las reservas se asignan en memoria con AsignadorFEFO y se insertan
+#  con un único bulk_create al cerrar cada PASO)
 # ===================================================================
-@transaction.atomic
-def _reservar_stock_pt(linea_ov: OrdenVentaProducto, cantidad_a_reservar: int, estado_activa: EstadoReserva):
-    # ... (Tu código helper _reservar_stock_pt) ...
-    filtro_reservas_activas = Q(reservas__id_estado_reserva__descripcion='Activa')
-    lotes_disponibles = LoteProduccion.objects.filter(
-        id_producto=linea_ov.id_producto,
-        id_estado_lote_produccion__descripcion="Disponible"
-    ).annotate(
-        total_reservado=Coalesce(Sum('reservas__cantidad_reservada', filter=filtro_reservas_activas), 0)
-    ).annotate(
-        disponible=F('cantidad') - F('total_reservado')
-    ).filter(
-        disponible__gt=0
-    ).order_by('fecha_vencimiento')
-    cantidad_pendiente = cantidad_a_reservar
-    for lote in lotes_disponibles:
-        if cantidad_pendiente <= 0: break
-        disponible_lote = lote.disponible 
-        cantidad_a_tomar = min(disponible_lote, cantidad_pendiente)
-        if cantidad_a_tomar > 0:
-            ReservaStock.objects.create(
-                id_orden_venta_producto=linea_ov,
-                id_lote_produccion=lote,
-                cantidad_reservada=cantidad_a_tomar,
-                id_estado_reserva=estado_activa
-            )
-            cantidad_pendiente -= cantidad_a_tomar
-    print(f"      > (OV {linea_ov.id_orden_venta_id}) Reservados {cantidad_a_reservar - cantidad_pendiente} de {cantidad_a_reservar} de {linea_ov.id_producto.nombre}")
+def _reservar_stock_pt(asignador: AsignadorFEFO, linea_ov: OrdenVentaProducto, cantidad_a_reservar: int):
+    reservado = asignador.asignar(linea_ov, linea_ov.id_producto_id, cantidad_a_reservar)
+    eventos.evento(
+        eventos.Tipo.RESERVA, "(OV %s) Reservados %s de %s de %s", linea_ov.id_orden_venta_id, reservado,
+        cantidad_a_reservar, linea_ov.id_producto.nombre, nivel=eventos.Nivel.DEBUG, ov=linea_ov.id_orden_venta_id
+    )
+    return reservado
 
-@transaction.atomic
-def _reservar_stock_mp(op: OrdenProduccion, mp_id: int, cantidad_a_reservar: int, estado_activa: EstadoReservaMateria):
-    # ... (Tu código helper _reservar_stock_mp) ...
-    filtro_reservas_activas = Q(reservas__id_estado_reserva_materia__descripcion='Activa')
-    lotes_disponibles_mp = LoteMateriaPrima.objects.filter(
-        id_materia_prima_id=mp_id,
-        id_estado_lote_materia_prima__descripcion="disponible"
-    ).annotate(
-        total_reservado=Coalesce(Sum('reservas__cantidad_reservada', filter=filtro_reservas_activas), 0)
-    ).annotate(
-        disponible=F('cantidad') - F('total_reservado')
-    ).filter(
-        disponible__gt=0
-    ).order_by('fecha_vencimiento')
-    cantidad_pendiente = cantidad_a_reservar
-    for lote_mp in lotes_disponibles_mp:
-        if cantidad_pendiente <= 0: break
-        disponible_lote = lote_mp.disponible 
-        cantidad_a_tomar = min(disponible_lote, cantidad_pendiente)
-        if cantidad_a_tomar > 0:
-            ReservaMateriaPrima.objects.create(
-                id_orden_produccion=op,
-                id_lote_materia_prima=lote_mp,
-                cantidad_reservada=cantidad_a_tomar,
-                id_estado_reserva_materia=estado_activa
-            )
-            cantidad_pendiente -= cantidad_a_tomar
-    print(f"      > (OP {op.id_orden_produccion}) Reservados {cantidad_a_reservar - cantidad_pendiente} de {cantidad_a_reservar} de MP {mp_id}")
+def _reservar_stock_mp(asignador: AsignadorFEFO, op: OrdenProduccion, mp_id: int, cantidad_a_reservar: int):
+    reservado = asignador.asignar(op, mp_id, cantidad_a_reservar)
+    eventos.evento(
+        eventos.Tipo.RESERVA, "(OP %s) Reservados %s de %s de MP %s", op.id_orden_produccion, reservado,
+        cantidad_a_reservar, mp_id, nivel=eventos.Nivel.DEBUG, op=op.id_orden_produccion
+    )
+    return reservado
+
+
+def _reservar_asignacion(libro_capacidad: LibroCapacidad, op: OrdenProduccion, capacidades_linea, cantidad_a_producir: int, horas_por_fecha):
+    """ Reserva los días / horas que eligió el modelo de capacidad finita. Devuelve (primer día, último día). """
+    cantidad_pendiente_op = cantidad_a_producir
+    dias_trabajados = []
+    for fecha, horas in sorted(horas_por_fecha.items()):
+        if cantidad_pendiente_op <= 0:
+            break
+        cantidad_antes = cantidad_pendiente_op
+        cantidad_pendiente_op = libro_capacidad.reservar_dia(op, capacidades_linea, fecha, horas, cantidad_pendiente_op)
+        if cantidad_pendiente_op < cantidad_antes:
+            dias_trabajados.append(fecha)
+    if not dias_trabajados:
+        return None, None
+    return dias_trabajados[0], dias_trabajados[-1]
+
+
+def _asignar_capacidad_finita(pedidos_op, libro_capacidad: LibroCapacidad, hoy: date, horas_por_dia: int, dias_buffer_entrega: int):
+    """
+    PASO 5 a capacidad finita: asigna las horas de TODAS las OPs nuevas a días hábiles
+    en un modelo CP-SAT (ver capacidad_finita.py) que minimiza el atraso contra la fecha
+    de entrega de la OV, ponderado por prioridad. Devuelve {índice del pedido: {fecha: horas}},
+    o None si el modelo es muy grande o no encontró solución (el PASO 5 usa el walk greedy).
+    """
+    calendario = libro_capacidad.calendario
+    # Horizonte en días hábiles: hasta la última liberación / entrega, más la carga estimada
+    demanda_por_linea = defaultdict(int)
+    for pedido in pedidos_op:
+        for cap_linea in pedido["capacidades_linea"]:
+            demanda_por_linea[cap_linea.id_linea_produccion_id] += pedido["horas_necesarias_totales"]
+    dias_carga = max(math.ceil(horas / horas_por_dia) for horas in demanda_por_linea.values())
+
+    objetivos = []
+    for pedido in pedidos_op:
+        # Último día de fin que todavía permite entregar a tiempo (fin + buffer + 1 día <= entrega)
+        objetivos.append(calendario.habil_hasta(
+            pedido["linea_ov"].id_orden_venta.fecha_entrega.date() - timedelta(days=dias_buffer_entrega + 1)
+        ))
+
+    # (el doble de la carga estimada: la carga que ya tiene el calendario no está contada)
+    fecha_limite = max(objetivos + [p["fecha_inicio_por_materiales"] for p in pedidos_op])
+    dias_extra = 2 * dias_carga + CAPACIDAD_FINITA_DIAS_MARGEN
+    fechas = calendario.dias_habiles(hoy, calendario.sumar_dias_habiles(fecha_limite, dias_extra))
+
+    def _indice(fecha):
+        # Primer día hábil del horizonte >= fecha (0 si es anterior a hoy)
+        return min(bisect_left(fechas, fecha), len(fechas) - 1)
+
+    ids_prioridad = list(Prioridad.objects.order_by('id_prioridad').values_list('id_prioridad', flat=True))
+    pesos = {id_prioridad: len(ids_prioridad) - posicion + 1 for posicion, id_prioridad in enumerate(ids_prioridad)}
+    pedidos = [
+        {
+            "clave": indice,
+            "lineas": [cap_linea.id_linea_produccion_id for cap_linea in pedido["capacidades_linea"]],
+            "horas": pedido["horas_necesarias_totales"],
+            "liberacion": _indice(max(pedido["fecha_inicio_por_materiales"], hoy)),
+            "objetivo": _indice(fecha_objetivo),
+            # Sin prioridad pesa 1; la de id más bajo (la primera en el PASO 1-3) pesa más
+            "peso": pesos.get(pedido["linea_ov"].id_orden_venta.id_prioridad_id, 1),
+        }
+        for indice, (pedido, fecha_objetivo) in enumerate(zip(pedidos_op, objetivos))
+    ]
+
+    num_variables = sum(len(fechas) - pedido["liberacion"] for pedido in pedidos)
+    if num_variables > get_config('MRP_CAPACIDAD_MAX_VARIABLES', CAPACIDAD_FINITA_MAX_VARIABLES):
+        eventos.advertencia(
+            "⚠️ Capacidad finita: el modelo tendría %s variables (%s OPs x %s días). Se usa el walk greedy.",
+            num_variables, len(pedidos), len(fechas)
+        )
+        return None
+
+    lineas_ids = {linea_id for pedido in pedidos for linea_id in pedido["lineas"]}
+    horas_libres = {
+        (linea_id, indice): max(0, math.floor(horas_por_dia - libro_capacidad.carga(linea_id, fecha)))
+        for linea_id in lineas_ids
+        for indice, fecha in enumerate(fechas)
+    }
+
+    resultado = asignar_capacidad(pedidos, horas_libres, len(fechas), {
+        "max_segundos": get_config('MRP_CAPACIDAD_MAX_SEG', CAPACIDAD_FINITA_MAX_SECONDS),
+        "workers": CAPACIDAD_FINITA_WORKERS,
+    })
+    if not resultado["asignacion"]:
+        eventos.advertencia(
+            "⚠️ Capacidad finita: sin solución en %s días hábiles (%s). Se usa el walk greedy.",
+            len(fechas), resultado["estado"]
+        )
+        return None
+
+    eventos.info(
+        "✅ Capacidad finita: %s OPs en %s días hábiles. Estado %s, atraso ponderado %s días (EDD: %s), %.2fs.",
+        len(pedidos), len(fechas), resultado["estado"], resultado["atraso_ponderado"],
+        resultado["atraso_inicial"], resultado["tiempo"]
+    )
+    return {
+        clave: {fechas[dia]: horas for dia, horas in horas_por_dia_pedido.items()}
+        for clave, horas_por_dia_pedido in resultado["asignacion"].items()
+    }
 
 
 # ===================================================================
 # FUNCIÓN PRINCIPAL DEL PLANIFICADOR
 # ===================================================================
 
+@eventos.registrar_corrida(CorridaPlanificacion.Origen.MRP)
 @transaction.atomic
-def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
+def ejecutar_planificacion_diaria_mrp(fecha_simulada: date, modo: str = EjecucionMRP.Modo.COMPLETO):
+    """
+    MRP diario. modo=COMPLETO regenera todo el plan; modo=INCREMENTAL (net-change)
+    solo replanifica los productos / MPs que cambiaron desde la corrida anterior
+    del mismo día (ver planificacion/cambios.py).
+    Devuelve los ids de las OPs creadas.
+    """
+    inicio_ejecucion = timezone.now()
     
     # 1. CARGA DINÁMICA DE CONFIGURACIÓN (Fresh data)
     # Esto consulta la BD cada vez que corres el planificador, permitiendo cambios en caliente.
@@ -109,9 +184,9 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
     tomorrow = hoy + timedelta(days=1)
     fecha_limite_ov = hoy + timedelta(days=7)
     
-    print(f"--- INICIANDO PLANIFICADOR MRP DIARIO ({hoy}) ---")
-    print(f"--- Alcance: Órdenes de Venta hasta {fecha_limite_ov} ---")
-    print(f"--- Día de Reserva JIT: {tomorrow} ---")
+    eventos.info("--- INICIANDO PLANIFICADOR MRP DIARIO (%s) - Modo: %s ---", hoy, modo)
+    eventos.info("--- Alcance: Órdenes de Venta hasta %s ---", fecha_limite_ov)
+    eventos.info("--- Día de Reserva JIT: %s ---", tomorrow)
 
     # --- Obtener Estados ---
     estado_ov_creada = EstadoVenta.objects.get(descripcion="Creada")
@@ -127,18 +202,40 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
     estado_reserva_activa, _ = EstadoReserva.objects.get_or_create(descripcion="Activa")
     estado_reserva_mp_activa, _ = EstadoReservaMateria.objects.get_or_create(descripcion="Activa")
     
-    # --- Pools de Stock (Se inicializan 1 vez) ---
-    print("   > Obteniendo pools de stock (MP y OCs)...")
-    stock_virtual_mp = {
-        mp.id_materia_prima: get_stock_disponible_para_materia_prima(mp.id_materia_prima)
-        for mp in MateriaPrima.objects.all()
-    }
-    compras_en_proceso = OrdenCompraMateriaPrima.objects.filter(
-        id_orden_compra__id_estado_orden_compra=estado_oc_en_proceso
+    estados_ov_activos = [estado_ov_creada, estado_ov_en_preparacion]
+    # Qué estados de OP consideramos "En Camino" (Stock futuro asegurado)
+    estados_op_activos = [estado_op_en_espera, estado_op_pendiente_inicio, estado_op_en_proceso]
+
+    # --- Snapshot de Planificación (BOM, capacidades, reservas y stock en pocas consultas) ---
+    eventos.debug("Cargando snapshot de planificación (recetas, líneas, reservas y stock)...")
+    snapshot = PlanningSnapshot(
+        estado_oc_en_proceso=estado_oc_en_proceso,
+        estados_op_activos=estados_op_activos,
+        estados_op_con_reservas_mp=[estado_op_en_espera, estado_op_pendiente_inicio],
+        estados_ov_activos=estados_ov_activos
+    )
+
+    # --- Alcance de la corrida (todo, o solo lo que cambió en modo incremental) ---
+    alcance = calcular_alcance(modo, hoy, snapshot)
+    ejecucion = EjecucionMRP(
+        fecha_planificacion=hoy,
+        modo=EjecucionMRP.Modo.COMPLETO if alcance.es_completo else EjecucionMRP.Modo.INCREMENTAL,
+        fecha_inicio=inicio_ejecucion
     )
-    stock_virtual_oc = defaultdict(int)
-    for item in compras_en_proceso:
-        stock_virtual_oc[item.id_materia_prima_id] += item.cantidad
+    if not alcance.es_completo:
+        ejecucion.productos_procesados = len(alcance.productos)
+        ejecucion.materias_primas_procesadas = len(alcance.materias_primas)
+
+    if alcance.vacio:
+        ejecucion.fecha_fin = timezone.now()
+        ejecucion.save()
+        eventos.info("--- PLANIFICADOR MRP FINALIZADO (sin cambios desde la última corrida) ---")
+        return []
+
+    # --- Pools de Stock (Se inicializan 1 vez) ---
+    eventos.debug("Obteniendo pools de stock (MP y OCs)...")
+    stock_virtual_mp = defaultdict(int, snapshot.stock_mp)
+    stock_virtual_oc = defaultdict(int, snapshot.en_transito_oc)
     
     # Diccionario para agrupar compras (Se inicializa 1 vez)
     compras_agregadas_por_proveedor = defaultdict(lambda: {
@@ -147,21 +244,31 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
         "items": defaultdict(int) 
     })
 
+    # --- Libro de Capacidad (1 sola consulta al calendario para todo el run) ---
+    # PASO 0.6 y PASO 5 reservan horas en memoria; se guardan al final del PASO 5.
+    libro_capacidad = LibroCapacidad(
+        HORAS_LABORABLES_POR_DIA,
+        estados_op=[estado_op_en_espera, estado_op_pendiente_inicio],
+        fecha_desde=hoy
+    )
+    # Calendario laboral (fines de semana, feriados y paradas de planta) compartido con el libro
+    calendario = libro_capacidad.calendario
+
     # ===================================================================
     # 🆕 PASO 0.6: BALANCE GLOBAL DE MP Y REPLANIFICACIÓN DE OPs EXISTENTES
     # (Revisa OPs 'En espera', genera OCs Y replanifica la OP si la MP se retrasa)
     # ===================================================================
-    print(f"\n[PASO 0.6] Balanceando MP para OPs existentes (pre-asignación y OCs)...")
+    eventos.paso("0.6", "Balanceando MP para OPs existentes (pre-asignación y OCs)...")
 
-    ops_activas_balance = OrdenProduccion.objects.filter(
+    ops_activas_balance = alcance.filtrar(OrdenProduccion.objects.filter(
         id_estado_orden_produccion__in=[estado_op_en_espera, estado_op_pendiente_inicio]
-    ).select_related('id_producto').order_by('fecha_planificada')
+    )).select_related('id_producto').order_by('fecha_planificada')
 
-    print(f"   > Analizando {ops_activas_balance.count()} OPs existentes ('En espera', 'Pendiente')...")
+    eventos.info("Analizando %s OPs existentes ('En espera', 'Pendiente')...", len(ops_activas_balance))
 
     for op in ops_activas_balance:
         if not op.fecha_planificada:
-            print(f"     ⚠️ OP {op.id_orden_produccion} no tiene fecha planificada, usando 'hoy'.")
+            eventos.advertencia("⚠️ OP %s no tiene fecha planificada, usando 'hoy'.", op.id_orden_produccion, op=op.id_orden_produccion)
             fecha_requerida_mp = hoy - timedelta(days=DIAS_BUFFER_RECEPCION_MP)
         else:
             fecha_requerida_mp = op.fecha_planificada.date() - timedelta(days=DIAS_BUFFER_RECEPCION_MP)
@@ -169,8 +276,7 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
         max_lead_time_op = 0 # Para esta OP específica
         
         try:
-            receta = Receta.objects.get(id_producto=op.id_producto)
-            ingredientes = RecetaMateriaPrima.objects.filter(id_receta=receta).select_related('id_materia_prima__id_proveedor')
+            ingredientes = snapshot.ingredientes(op.id_producto_id)
             
             for ing in ingredientes:
                 mp_id = ing.id_materia_prima_id
@@ -179,11 +285,7 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
                 
                 cantidad_total_requerida = ing.cantidad * op.cantidad
                 
-                reservas_fisicas = ReservaMateriaPrima.objects.filter(
-                    id_orden_produccion=op,
-                    id_lote_materia_prima__id_materia_prima_id=mp_id,
-                    id_estado_reserva_materia=estado_reserva_mp_activa
-                ).aggregate(total=Sum('cantidad_reservada'))['total'] or 0
+                reservas_fisicas = snapshot.reservado_mp(op.pk, mp_id)
                 
                 demanda_pendiente = cantidad_total_requerida - reservas_fisicas
                 
@@ -196,7 +298,7 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
                 if tomar_de_stock > 0:
                     stock_virtual_mp[mp_id] -= tomar_de_stock
                     demanda_pendiente -= tomar_de_stock
-                    print(f"     > (OP {op.id_orden_produccion}) pre-asigna {tomar_de_stock} de MP {mp_id} (del stock físico).")
+                    eventos.debug("(OP %s) pre-asigna %s de MP %s (del stock físico).", op.id_orden_produccion, tomar_de_stock, mp_id, op=op.id_orden_produccion)
 
                 if demanda_pendiente <= 0:
                     continue 
@@ -207,7 +309,7 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
                 if tomar_de_oc > 0:
                     stock_virtual_oc[mp_id] -= tomar_de_oc
                     demanda_pendiente -= tomar_de_oc
-                    print(f"     > (OP {op.id_orden_produccion}) pre-asigna {tomar_de_oc} de MP {mp_id} (de OCs en camino).")
+                    eventos.debug("(OP %s) pre-asigna %s de MP %s (de OCs en camino).", op.id_orden_produccion, tomar_de_oc, mp_id, op=op.id_orden_produccion)
 
                 if demanda_pendiente <= 0:
                     continue 
@@ -215,7 +317,10 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
                 cantidad_a_comprar = demanda_pendiente
                 
                 if cantidad_a_comprar > 0:
-                    print(f"     ⚠️ (OP {op.id_orden_produccion}) NECESITA COMPRAR {cantidad_a_comprar} de MP {mp_id}.")
+                    eventos.evento(
+                        eventos.Tipo.FALTANTE_MP, "⚠️ (OP %s) NECESITA COMPRAR %s de MP %s.", op.id_orden_produccion,
+                        cantidad_a_comprar, mp_id, op=op.id_orden_produccion, id_materia_prima=mp_id, cantidad=cantidad_a_comprar
+                    )
                     
                     # 1. Registrar el lead time de esta compra
                     lead_proveedor = proveedor.lead_time_days
@@ -234,18 +339,14 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
             
             if max_lead_time_op > 0:
                 # Esta OP ha disparado una nueva compra. Debemos RECALCULAR su fecha de inicio.
-                print(f"     > OP {op.id_orden_produccion} requiere comprar MP (Lead time: {max_lead_time_op} dias). Verificando replanificación...")
+                eventos.debug("OP %s requiere comprar MP (Lead time: %s dias). Verificando replanificación...", op.id_orden_produccion, max_lead_time_op, op=op.id_orden_produccion)
 
                 # 1. Calcular cuándo llega la MP (Lógica de PASO 6, ajustada a dias hábiles)
                 fecha_solicitud_oc = hoy
-                fecha_entrega_oc = hoy + timedelta(days=max_lead_time_op)
-                while fecha_entrega_oc.weekday() >= 5: # Mover a Lunes si cae finde
-                    fecha_entrega_oc += timedelta(days=1)
+                fecha_entrega_oc = calendario.habil_desde(hoy + timedelta(days=max_lead_time_op))
                 
                 # 2. Calcular cuándo puede empezar la OP
-                fecha_inicio_por_materiales = fecha_entrega_oc + timedelta(days=DIAS_BUFFER_RECEPCION_MP)
-                while fecha_inicio_por_materiales.weekday() >= 5: # Mover a Lunes
-                    fecha_inicio_por_materiales += timedelta(days=1)
+                fecha_inicio_por_materiales = calendario.habil_desde(fecha_entrega_oc + timedelta(days=DIAS_BUFFER_RECEPCION_MP))
 
                 # 3. Comparar con la fecha actual
                 if op.fecha_planificada:
@@ -253,128 +354,52 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
                 else:
                     # Fallback: Si la OP es 'zombie' o manual sin fecha, asumimos que empieza HOY
                     # para forzar el cálculo de replanificación si hace falta material.
-                    print(f"      ⚠️ OP {op.id_orden_produccion} no tenía fecha planificada. Asumiendo 'HOY'.")
+                    eventos.advertencia("⚠️ OP %s no tenía fecha planificada. Asumiendo 'HOY'.", op.id_orden_produccion, op=op.id_orden_produccion)
                     fecha_inicio_actual = hoy  #------> REVISAR, NO ME GUSTA QUE LA FECHA POR DEFECTO SEA LA ACTUAL, CUANDO CREO UNA OP YA TENGO LA FECHA
 
                 if fecha_inicio_por_materiales > fecha_inicio_actual:
-                    print(f"    🚨 ¡RETRASO DETECTADO! OP {op.id_orden_produccion}")
-                    print(f"       Fecha actual: {fecha_inicio_actual}. Nueva fecha por MP: {fecha_inicio_por_materiales}.")
-                    print(f"       REPLANIFICANDO esta OP...")
+                    eventos.advertencia(
+                        "🚨 ¡RETRASO DETECTADO! OP %s. Fecha actual: %s. Nueva fecha por MP: %s. REPLANIFICANDO esta OP...",
+                        op.id_orden_produccion, fecha_inicio_actual, fecha_inicio_por_materiales, op=op.id_orden_produccion
+                    )
                     
                     # --- INICIO LÓGICA DE REPLANIFICACIÓN (Copiada de PASO 5) ---
                     
-                    # 1. Borrar calendario viejo
-                    CalendarioProduccion.objects.filter(id_orden_produccion=op).delete()
+                    # 1. Borrar calendario viejo (BD + libro de capacidad)
+                    libro_capacidad.liberar_op(op)
                     
                     # 2. Recalcular horas necesarias
-                    capacidades_linea = ProductoLinea.objects.filter(id_producto=op.id_producto)
-                    if not capacidades_linea.exists():
-                        print(f"    !ERROR: {op.id_producto.nombre} no tiene líneas. No se puede replanificar.")
+                    capacidades_linea = snapshot.capacidades(op.id_producto_id)
+                    if not capacidades_linea:
+                        eventos.error("!ERROR: %s no tiene líneas. No se puede replanificar.", op.id_producto.nombre, op=op.id_orden_produccion)
                         continue
 
-                    cant_total_por_hora = capacidades_linea.aggregate(total=Sum('cant_por_hora'))['total'] or 0
+                    cant_total_por_hora = snapshot.capacidad_total_por_hora(op.id_producto_id)
                     if cant_total_por_hora <= 0:
-                        print(f"    !ERROR: {op.id_producto.nombre} capacidad 0/hr. No se puede replanificar.")
+                        eventos.error("!ERROR: %s capacidad 0/hr. No se puede replanificar.", op.id_producto.nombre, op=op.id_orden_produccion)
                         continue
                     
-                    horas_necesarias_float = float(op.cantidad) / float(cant_total_por_hora)
-                    horas_necesarias_totales = math.ceil(horas_necesarias_float)
-                    
-                    # 3. Walk the calendar
-                    fecha_a_buscar = fecha_inicio_por_materiales # ❗️ Usamos la nueva fecha
-                    horas_pendientes = horas_necesarias_totales
-                    cantidad_pendiente_op = op.cantidad
-                    reservas_a_crear_bulk = []
-                    fecha_inicio_real_asignada = None
-
-                    print(f"       Buscando nuevo hueco desde {fecha_a_buscar}...")
-                    
-                    # --- INICIO: Bucle "Walk the Calendar" ---
-                    while horas_pendientes > 0 and cantidad_pendiente_op > 0:
-                        # (Asegúrate que HORAS_LABORABLES_POR_DIA sea accesible globalmente)
-                        horas_libres_cuello_botella = HORAS_LABORABLES_POR_DIA
-                        lineas_ids_producto = [c.id_linea_produccion_id for c in capacidades_linea]
-                        
-                        carga_existente = CalendarioProduccion.objects.filter(
-                            id_linea_produccion_id__in=lineas_ids_producto,
-                            fecha=fecha_a_buscar,
-                            id_orden_produccion__id_estado_orden_produccion__in=[estado_op_en_espera, estado_op_pendiente_inicio]
-                        ).values('id_linea_produccion_id').annotate(
-                            total_reservado=Sum('horas_reservadas')
-                        ).values('id_linea_produccion_id', 'total_reservado')
-                        
-                        carga_por_linea = {c['id_linea_produccion_id']: float(c['total_reservado']) for c in carga_existente}
-
-                        for linea_id in lineas_ids_producto:
-                            carga_dia = carga_por_linea.get(linea_id, 0.0)
-                            horas_libres_linea = max(0, HORAS_LABORABLES_POR_DIA - carga_dia)
-                            horas_libres_cuello_botella = min(horas_libres_cuello_botella, horas_libres_linea)
-
-                        horas_libres_enteras = math.floor(horas_libres_cuello_botella)
-
-                        if horas_libres_enteras <= 0:
-                            fecha_a_buscar += timedelta(days=1)
-                            while fecha_a_buscar.weekday() >= 5: fecha_a_buscar += timedelta(days=1)
-                            continue
-                            
-                        horas_a_reservar_hoy = min(horas_pendientes, horas_libres_enteras) 
-                        se_reservo_tiempo_en_fecha = False
-
-                        for cap_linea in capacidades_linea:
-                            cantidad_calculada_linea = round(float(horas_a_reservar_hoy) * float(cap_linea.cant_por_hora))
-                            cantidad_real_linea = min(cantidad_pendiente_op, cantidad_calculada_linea)
-
-                            if horas_a_reservar_hoy > 0 and cantidad_real_linea > 0:
-                                se_reservo_tiempo_en_fecha = True 
-                                
-                                reservas_a_crear_bulk.append(
-                                    CalendarioProduccion(
-                                        id_orden_produccion=op, 
-                                        id_linea_produccion=cap_linea.id_linea_produccion,
-                                        fecha=fecha_a_buscar,
-                                        horas_reservadas=horas_a_reservar_hoy,
-                                        cantidad_a_producir=cantidad_real_linea
-                                    )
-                                )
-                                cantidad_pendiente_op -= cantidad_real_linea
-                                if cantidad_pendiente_op <= 0:
-                                    break 
-                        
-                        if se_reservo_tiempo_en_fecha:
-                            horas_pendientes -= horas_a_reservar_hoy 
-                            if fecha_inicio_real_asignada is None:
-                                fecha_inicio_real_asignada = fecha_a_buscar
-                            print(f"       > Re-reservadas {horas_a_reservar_hoy}hs en {fecha_a_buscar}.")
-                        
-                        if cantidad_pendiente_op <= 0:
-                            horas_pendientes = 0 
-                            break
-
-                        fecha_a_buscar += timedelta(days=1)
-                        while fecha_a_buscar.weekday() >= 5:
-                            fecha_a_buscar += timedelta(days=1)
-                        
-                        if cantidad_pendiente_op > 0:
-                            horas_pendientes = horas_necesarias_totales
-                    # --- FIN: Bucle "Walk the Calendar" ---
+                    # 3. Walk the calendar (días hábiles con horas libres, desde la llegada de la MP)
+                    eventos.debug("Buscando nuevo hueco desde %s...", fecha_inicio_por_materiales, op=op.id_orden_produccion)
+                    fecha_inicio_real_asignada, ultimo_dia_trabajado = libro_capacidad.reservar_op(
+                        op, capacidades_linea, op.cantidad, fecha_inicio_por_materiales
+                    )
 
                     if fecha_inicio_real_asignada is None:
                         fecha_inicio_real_asignada = fecha_inicio_por_materiales
-                    
-                    fecha_fin_real_asignada = fecha_a_buscar - timedelta(days=1)
-                    while fecha_fin_real_asignada.weekday() >= 5:
-                         fecha_fin_real_asignada -= timedelta(days=1)
-                    if fecha_fin_real_asignada < fecha_inicio_real_asignada:
-                        fecha_fin_real_asignada = fecha_inicio_real_asignada
-                    
+                    fecha_fin_real_asignada = ultimo_dia_trabajado or fecha_inicio_real_asignada
+
                     # 4. Guardar OP y Calendario
                     op.fecha_planificada = timezone.make_aware(datetime.combine(fecha_inicio_real_asignada, datetime.min.time()))
                     op.fecha_fin_planificada = fecha_fin_real_asignada
                     op.id_estado_orden_produccion = estado_op_en_espera # Pasa a 'En espera' porque necesita MP
                     op.save()
                     
-                    CalendarioProduccion.objects.bulk_create(reservas_a_crear_bulk)
-                    print(f"       ✅ OP {op.id_orden_produccion} REPLANIFICADA. Nuevo rango: {op.fecha_planificada.date()} a {op.fecha_fin_planificada}.")
+                    eventos.evento(
+                        eventos.Tipo.OP_REPLANIFICADA, "✅ OP %s REPLANIFICADA. Nuevo rango: %s a %s.",
+                        op.id_orden_produccion, op.fecha_planificada.date(), op.fecha_fin_planificada,
+                        op=op.id_orden_produccion, fecha_inicio=op.fecha_planificada.date(), fecha_fin=op.fecha_fin_planificada
+                    )
 
                     # 5. REVISAR Y DESPLAZAR OVs VINCULADAS
                     peggings = OrdenProduccionPegging.objects.filter(id_orden_produccion=op).select_related('id_orden_venta_producto__id_orden_venta')
@@ -386,18 +411,17 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
                             continue
 
                         dias_totales_margen = DIAS_BUFFER_ENTREGA_PT + 1
-                        nueva_fecha_entrega_sugerida_date = op.fecha_fin_planificada + timedelta(days=dias_totales_margen)
-                        
-                        while nueva_fecha_entrega_sugerida_date.weekday() >= 5:
-                             nueva_fecha_entrega_sugerida_date += timedelta(days=1) 
+                        nueva_fecha_entrega_sugerida_date = calendario.habil_desde(op.fecha_fin_planificada + timedelta(days=dias_totales_margen))
 
                         if nueva_fecha_entrega_sugerida_date > ov.fecha_entrega.date():
-                            print(f"    !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
-                            print(f"    !!! ALERTA DE ENTREGA (REPLANIFICACIÓN): OP {op.id_orden_produccion}")
-                            print(f"    !!! Vinculada a: OV {ov.id_orden_venta} (Entrega actual: {ov.fecha_entrega.date()})")
-                            print(f"    !!! Producción AHORA termina el: {op.fecha_fin_planificada}")
-                            print(f"    !!! DESPLAZANDO OV {ov.id_orden_venta} a {nueva_fecha_entrega_sugerida_date}")
-                            print(f"    !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
+                            eventos.evento(
+                                eventos.Tipo.ENTREGA_RETRASADA,
+                                "!!! ALERTA DE ENTREGA (REPLANIFICACIÓN): OP %s vinculada a OV %s (Entrega actual: %s). "
+                                "Producción AHORA termina el: %s. DESPLAZANDO OV %s a %s",
+                                op.id_orden_produccion, ov.id_orden_venta, ov.fecha_entrega.date(), op.fecha_fin_planificada,
+                                ov.id_orden_venta, nueva_fecha_entrega_sugerida_date, nivel=eventos.Nivel.ADVERTENCIA,
+                                op=op.id_orden_produccion, ov=ov.id_orden_venta, fecha_anterior=ov.fecha_entrega.date(), fecha_nueva=nueva_fecha_entrega_sugerida_date
+                            )
                             
                             ov.fecha_entrega = nueva_fecha_entrega_sugerida_date
                             ov.id_estado_venta = estado_ov_en_preparacion 
@@ -407,7 +431,7 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
                 # --- FIN LÓGICA DE REPLANIFICACIÓN ---
 
         except Receta.DoesNotExist:
-            print(f"     ⚠️ OP {op.id_orden_produccion} no tiene receta. No se puede balancear MP.")
+            eventos.advertencia("⚠️ OP %s no tiene receta. No se puede balancear MP.", op.id_orden_produccion, op=op.id_orden_produccion)
 
 
 
@@ -416,26 +440,49 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
     # 🆕 PASO 0: CIERRE DE OVs PARA MAÑANA
     # (Reservar Stock PT y cambiar estado a 'Pendiente de Pago')
     # ===================================================================
-    print(f"\n[PASO 0] Verificando entregas para mañana ({tomorrow}) para paso a 'Pendiente de Pago'...")
+    eventos.paso("0", "Verificando entregas para mañana (%s) para paso a 'Pendiente de Pago'...", tomorrow)
 
     # 1. Buscar OVs en 'En Preparación' que se entreguen mañana
     ovs_cierre = OrdenVenta.objects.filter(
         id_estado_venta=estado_ov_en_preparacion,
         fecha_entrega__date=tomorrow
     )
+    if not alcance.es_completo:
+        ovs_cierre = ovs_cierre.filter(
+            ordenventaproducto__id_producto__in=alcance.productos
+        ).distinct()
+
+    # Traemos las líneas de todas las OVs de cierre en una sola consulta
+    lineas_por_ov = defaultdict(list)
+    for linea in OrdenVentaProducto.objects.filter(id_orden_venta__in=ovs_cierre).select_related('id_producto'):
+        lineas_por_ov[linea.id_orden_venta_id].append(linea)
+
+    # Locks de PT de toda la corrida (PASO 0, 0.5 y 1-3) en una sola llamada, en orden
+    # ascendente como las ventas (ver stock/concurrencia.py): los asignadores de cada
+    # PASO vuelven a pedirlos, pero ya los tiene esta transacción.
+    productos_pt_corrida = {linea.id_producto_id for lineas in lineas_por_ov.values() for linea in lineas}
+    productos_pt_corrida.update(alcance.filtrar(OrdenVentaProducto.objects.filter(
+        id_orden_venta__id_estado_venta__in=estados_ov_activos,
+        id_orden_venta__fecha_entrega__range=[hoy, fecha_limite_ov]
+    )).values_list('id_producto_id', flat=True))
+    productos_pt_corrida.update(alcance.filtrar(ReservaStock.objects.filter(
+        id_orden_venta_producto__id_orden_venta__id_estado_venta__descripcion__icontains="Cancelada"
+    ), 'id_orden_venta_producto__id_producto').values_list('id_lote_produccion__id_producto_id', flat=True))
+    bloquear_items("pt", productos_pt_corrida)
+
+    # Lotes PT de esos productos: 1 consulta (bloqueados), reservas en un bulk_create al final del PASO 0
+    asignador_pt = AsignadorFEFO.para_productos(estado_reserva_activa)
+    asignador_pt.precargar({linea.id_producto_id for lineas in lineas_por_ov.values() for linea in lineas})
 
     for ov in ovs_cierre:
-        print(f"   > Procesando cierre de OV {ov.id_orden_venta}...")
+        eventos.debug("Procesando cierre de OV %s...", ov.id_orden_venta, ov=ov.id_orden_venta)
         todas_lineas_listas = True
         
-        lineas = OrdenVentaProducto.objects.filter(id_orden_venta=ov)
+        lineas = lineas_por_ov[ov.id_orden_venta]
         
         for linea in lineas:
             # A. Calcular cuánto falta reservar para esta línea
-            reservas_actuales = ReservaStock.objects.filter(
-                id_orden_venta_producto=linea,
-                id_estado_reserva=estado_reserva_activa
-            ).aggregate(total=Sum('cantidad_reservada'))['total'] or 0
+            reservas_actuales = snapshot.reservado_pt(linea.pk)
             
             cantidad_pendiente_reserva = linea.cantidad - reservas_actuales
             
@@ -443,13 +490,17 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
                 continue # Ya está todo reservado
             
             # B. Verificar stock físico disponible (Lotes PT)
-            stock_fisico_disponible = get_stock_disponible_para_producto(linea.id_producto.id_producto)
+            stock_fisico_disponible = snapshot.stock_pt.get(linea.id_producto_id, 0)
             
             if stock_fisico_disponible >= cantidad_pendiente_reserva:
                 # C. Reservar lo que falta
-                _reservar_stock_pt(linea, cantidad_pendiente_reserva, estado_reserva_activa)
+                reservado = _reservar_stock_pt(asignador_pt, linea, cantidad_pendiente_reserva)
+                snapshot.registrar_reserva_pt(linea.pk, linea.id_producto_id, reservado)
             else:
-                print(f"     ⚠️ ALERTA: Stock insuficiente para OV {ov.id_orden_venta}, Prod: {linea.id_producto.nombre}. (Faltan {cantidad_pendiente_reserva})")
+                eventos.advertencia(
+                    "⚠️ ALERTA: Stock insuficiente para OV %s, Prod: %s. (Faltan %s)",
+                    ov.id_orden_venta, linea.id_producto.nombre, cantidad_pendiente_reserva, ov=ov.id_orden_venta
+                )
                 todas_lineas_listas = False
                 break # Cortamos el proceso de esta OV, no se puede pasar de estado
         
@@ -457,16 +508,19 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
         if todas_lineas_listas:
             ov.id_estado_venta = estado_ov_pendiente_pago
             ov.save(update_fields=['id_estado_venta'])
-            print(f"     ✅ OV {ov.id_orden_venta} actualizada a 'Pendiente de Pago'. Stock reservado.")
+            eventos.evento(eventos.Tipo.OV_ESTADO, "✅ OV %s actualizada a 'Pendiente de Pago'. Stock reservado.", ov.id_orden_venta, ov=ov.id_orden_venta)
         else:
-            print(f"     ❌ OV {ov.id_orden_venta} no pudo cambiar de estado (falta stock).")
+            eventos.info("❌ OV %s no pudo cambiar de estado (falta stock).", ov.id_orden_venta, ov=ov.id_orden_venta)
+
+    # Se guardan ANTES del PASO 0.5 (que borra reservas y cambia el stock de los lotes)
+    asignador_pt.guardar()
 
 
     # ===================================================================
     # 🆕 PASO 0.5: LIMPIEZA DE RESERVAS DE OVs CANCELADAS
     # (Liberar stock PT retenido por ventas que se cancelaron)
     # ===================================================================
-    print(f"\n[PASO 0.5] Liberando stock de Órdenes de Venta canceladas...")
+    eventos.paso("0.5", "Liberando stock de Órdenes de Venta canceladas...")
 
     # 1. Buscar el estado "Cancelada" (ajusta el string si tu estado se llama diferente, ej: "Anulada")
     try:
@@ -474,49 +528,47 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
         
         # 2. Borrar todas las reservas de stock asociadas a OVs en ese estado
         #    Filtramos: Reserva -> LineaOV -> OV -> Estado
-        reservas_a_liberar = ReservaStock.objects.filter(
+        reservas_a_liberar = alcance.filtrar(ReservaStock.objects.filter(
             id_orden_venta_producto__id_orden_venta__id_estado_venta=estado_ov_cancelada
-        )
+        ), 'id_orden_venta_producto__id_producto')
         
         cantidad_reservas = reservas_a_liberar.count()
         
         if cantidad_reservas > 0:
+            snapshot.liberar_reservas_pt(reservas_a_liberar)
             reservas_a_liberar.delete()
-            print(f"   ✅ Se liberaron {cantidad_reservas} reservas de stock. Ahora están disponibles para otras OVs.")
+            eventos.info("✅ Se liberaron %s reservas de stock. Ahora están disponibles para otras OVs.", cantidad_reservas)
         else:
-            print("   > No hay reservas retenidas por OVs canceladas.")
+            eventos.debug("No hay reservas retenidas por OVs canceladas.")
             
     except EstadoVenta.DoesNotExist:
-        print("   ⚠️ No se encontró el estado 'Cancelada' en la BD. Saltando limpieza.")
+        eventos.advertencia("⚠️ No se encontró el estado 'Cancelada' en la BD. Saltando limpieza.")
         
     # ===================================================================
     # PASO 1-3: JIT Y LÍNEAS PENDIENTES
     # ===================================================================
-    print("\n[PASO 1-3/6] Identificando demandas netas y JIT (Revisión exhaustiva)...")
-
-    estados_ov_activos = [estado_ov_creada, estado_ov_en_preparacion]
+    eventos.paso("1-3", "Identificando demandas netas y JIT (Revisión exhaustiva)...")
 
     # 1. Traemos TODAS las líneas activas en el rango de fechas.
     # QUITAMOS el filtro 'ops_vinculadas__isnull=True' porque es el causante del error.
-    lineas_ov_candidatas = OrdenVentaProducto.objects.filter(
+    lineas_ov_candidatas = list(alcance.filtrar(OrdenVentaProducto.objects.filter(
         id_orden_venta__id_estado_venta__in=estados_ov_activos,
         id_orden_venta__fecha_entrega__range=[hoy, fecha_limite_ov]
-    ).select_related(
+    )).select_related(
         'id_orden_venta', 'id_producto'
-    ).order_by('id_orden_venta__fecha_entrega', 'id_orden_venta__id_prioridad__id_prioridad')
+    ).order_by('id_orden_venta__fecha_entrega', 'id_orden_venta__id_prioridad__id_prioridad'))
 
-    # Inicializamos stock virtual de productos terminados
-    stock_virtual_pt = {
-        p_id: get_stock_disponible_para_producto(p_id)
-        for p_id in lineas_ov_candidatas.values_list('id_producto_id', flat=True).distinct()
-    }
+    # Inicializamos stock virtual de productos terminados (desde el snapshot, ya descontado el PASO 0)
+    stock_virtual_pt = defaultdict(int, snapshot.stock_pt)
+
+    # Asignador nuevo: el del PASO 0 ya no ve lo liberado en el PASO 0.5.
+    # Lotes de todos los productos candidatos en 1 consulta, antes de asignar en orden de OV
+    asignador_pt = AsignadorFEFO.para_productos(estado_reserva_activa)
+    asignador_pt.precargar({linea_ov.id_producto_id for linea_ov in lineas_ov_candidatas})
 
     lineas_para_producir = [] 
     ovs_completamente_reservadas = set()
 
-    # Definimos qué estados de OP consideramos "En Camino" (Stock futuro asegurado)
-    estados_op_activos = [estado_op_en_espera, estado_op_pendiente_inicio, estado_op_en_proceso]
-
     for linea_ov in lineas_ov_candidatas:
         ov = linea_ov.id_orden_venta
         producto_id = linea_ov.id_producto_id
@@ -524,18 +576,12 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
         # --- A. Calcular Cobertura Actual ---
         
         # 1. ¿Cuánto ya tengo reservado físicamente (Hard allocation)?
-        cantidad_reservada_fisica = ReservaStock.objects.filter(
-            id_orden_venta_producto=linea_ov,
-            id_estado_reserva__descripcion='Activa'
-        ).aggregate(total=Sum('cantidad_reservada'))['total'] or 0
+        cantidad_reservada_fisica = snapshot.reservado_pt(linea_ov.pk)
 
         # 2. ¿Cuánto viene en camino (OPs activas vinculadas a esta línea)?
         # Ignoramos OPs Finalizadas o Canceladas, porque si están finalizadas y no hay reserva física,
         # significa que el stock se usó para otra cosa (tu problema actual).
-        cantidad_en_produccion = OrdenProduccionPegging.objects.filter(
-            id_orden_venta_producto=linea_ov,
-            id_orden_produccion__id_estado_orden_produccion__in=estados_op_activos
-        ).aggregate(total=Sum('cantidad_asignada'))['total'] or 0
+        cantidad_en_produccion = snapshot.en_produccion(linea_ov.pk)
 
         cantidad_cubierta = cantidad_reservada_fisica + cantidad_en_produccion
         cantidad_realmente_faltante = linea_ov.cantidad - cantidad_cubierta
@@ -544,7 +590,11 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
             # Esta línea está cubierta (ya sea por stock reservado o por una OP que se está haciendo)
             continue
 
-        print(f"   > Revisando OV {ov.id_orden_venta} - Prod {linea_ov.id_producto.nombre}: Faltan {cantidad_realmente_faltante} (Total: {linea_ov.cantidad}, Res: {cantidad_reservada_fisica}, En Prod: {cantidad_en_produccion})")
+        eventos.debug(
+            "Revisando OV %s - Prod %s: Faltan %s (Total: %s, Res: %s, En Prod: %s)",
+            ov.id_orden_venta, linea_ov.id_producto.nombre, cantidad_realmente_faltante,
+            linea_ov.cantidad, cantidad_reservada_fisica, cantidad_en_produccion, ov=ov.id_orden_venta
+        )
 
         # --- B. Intentar cubrir con Stock Libre (Virtual) ---
         stock_disp = stock_virtual_pt.get(producto_id, 0)
@@ -557,30 +607,34 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
             
             # Reservamos
             if ov.fecha_entrega.date() <= tomorrow: # Si es urgente o para mañana
-                print(f"     -> Asignando stock físico urgente: {tomar_de_stock} u.")
-                _reservar_stock_pt(linea_ov, tomar_de_stock, estado_reserva_activa)
+                eventos.debug("-> Asignando stock físico urgente: %s u.", tomar_de_stock, ov=ov.id_orden_venta)
+                reservado = _reservar_stock_pt(asignador_pt, linea_ov, tomar_de_stock)
+                snapshot.registrar_reserva_pt(linea_ov.pk, producto_id, reservado)
             else:
-                print(f"     -> Asignando stock virtual: {tomar_de_stock} u.")
-                _reservar_stock_pt(linea_ov, tomar_de_stock, estado_reserva_activa)
+                eventos.debug("-> Asignando stock virtual: %s u.", tomar_de_stock, ov=ov.id_orden_venta)
+                reservado = _reservar_stock_pt(asignador_pt, linea_ov, tomar_de_stock)
+                snapshot.registrar_reserva_pt(linea_ov.pk, producto_id, reservado)
 
         # --- C. Verificar si falta producir ---
         if cantidad_para_producir > 0:
-            print(f"     ⚠️ FALTANTE DETECTADO: Generar OP por {cantidad_para_producir} u.")
+            eventos.debug("⚠️ FALTANTE DETECTADO: Generar OP por %s u.", cantidad_para_producir, ov=ov.id_orden_venta)
             lineas_para_producir.append((linea_ov, cantidad_para_producir))
             
             # Marcamos la OV en preparación si no lo está
-            if ov.id_estado_venta != estado_ov_en_preparacion:
+            if ov.id_estado_venta_id != estado_ov_en_preparacion.pk:
                 ov.id_estado_venta = estado_ov_en_preparacion
                 ov.save(update_fields=['id_estado_venta'])
         
         # Chequeo para OVs completas (Lógica original mantenida)
         elif cantidad_para_producir <= 0 and cantidad_realmente_faltante > 0:
              # Si entró aquí es porque lo cubrió todo con stock virtual en el paso B
-             if ov.id_estado_venta == estado_ov_creada:
-                print(f"     -> OV {ov.id_orden_venta} cubierta con stock. Pasando a 'Pendiente de Pago'.")
+             if ov.id_estado_venta_id == estado_ov_creada.pk:
+                eventos.evento(eventos.Tipo.OV_ESTADO, "-> OV %s cubierta con stock. Pasando a 'Pendiente de Pago'.", ov.id_orden_venta, ov=ov.id_orden_venta)
                 ov.id_estado_venta = estado_ov_pendiente_pago
                 ov.save(update_fields=['id_estado_venta'])
 
+    asignador_pt.guardar()
+
     # ===================================================================
     # ❗️ PASO 4: CANCELACIÓN DE OPs HUÉRFANAS
     # ===================================================================
@@ -622,17 +676,27 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
     # ===================================================================
     # ❗️ PASO 4: CANCELACIÓN DE OPs HUÉRFANAS Y LIBERACIÓN DE MP
     # ===================================================================
-    print(f"\n[PASO 4/6] Verificando OPs 'En espera' huérfanas (OVs canceladas)...")
+    eventos.paso("4", "Verificando OPs 'En espera' huérfanas (OVs canceladas)...")
+
+    # Locks de MP de PASO 4 (libera reservas), 4.5 y 5 (reservan): una sola llamada ordenada
+    materias_primas_corrida = set()
+    for op_id, producto_id in alcance.filtrar(OrdenProduccion.objects.filter(
+        id_estado_orden_produccion__in=[estado_op_en_espera, estado_op_pendiente_inicio]
+    )).values_list('id_orden_produccion', 'id_producto_id'):
+        materias_primas_corrida.update(snapshot.materias_primas_de(producto_id))
+        materias_primas_corrida.update(snapshot.reservas_mp_de_op(op_id))
+    for linea_ov, _ in lineas_para_producir:
+        materias_primas_corrida.update(snapshot.materias_primas_de(linea_ov.id_producto_id))
+    bloquear_items("mp", materias_primas_corrida)
 
     ov_activas_ids = set(OrdenVenta.objects.filter(
         id_estado_venta__in=estados_ov_activos
     ).values_list('id_orden_venta', flat=True))
 
-    ops_en_espera = OrdenProduccion.objects.filter(
+    ops_en_espera = alcance.filtrar(OrdenProduccion.objects.filter(
         id_estado_orden_produccion__in=[estado_op_en_espera, estado_op_pendiente_inicio]
-    ).prefetch_related(
-        'ovs_vinculadas__id_orden_venta_producto__id_orden_venta',
-        'reservamateriaprima_set' # ❗️ Asegurate que el related_name sea correcto, sino usa reserva_materia_prima_set
+    )).prefetch_related(
+        'ovs_vinculadas__id_orden_venta_producto__id_orden_venta'
     ) 
 
     ops_a_cancelar_objs = [] # Guardamos los objetos, no solo IDs
@@ -642,7 +706,7 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
         # 1. Si es MANUAL, la ignoramos (no se cancela)
         # (Asumiendo que ya agregaste el campo es_generada_automaticamente)
         if getattr(op, 'es_generada_automaticamente', False) is False:
-             print(f"   > OP {op.id_orden_produccion} es MANUAL. Se conserva.")
+             eventos.debug("OP %s es MANUAL. Se conserva.", op.id_orden_produccion, op=op.id_orden_produccion)
              continue
 
         # 2. Verificar vinculaciones
@@ -654,33 +718,31 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
         
         if not ovs_vinculadas_activas:
             ops_a_cancelar_objs.append(op)
-            print(f"   > OP {op.id_orden_produccion} es HUÉRFANA. Marcando para cancelar.")
+            eventos.evento(eventos.Tipo.OP_CANCELADA, "OP %s es HUÉRFANA. Marcando para cancelar.", op.id_orden_produccion, op=op.id_orden_produccion)
 
     # PROCESO DE CANCELACIÓN Y DEVOLUCIÓN DE STOCK A MEMORIA
     if ops_a_cancelar_objs:
-        print(f"   > Cancelando {len(ops_a_cancelar_objs)} OPs y liberando sus materiales...")
+        eventos.info("Cancelando %s OPs y liberando sus materiales...", len(ops_a_cancelar_objs))
         
         for op_cancelar in ops_a_cancelar_objs:
             
-            # A. Recuperar reservas de MP antes de borrarlas
-            # ❗️ Ajusta 'reserva_materia_prima_set' si tu related_name es diferente en el modelo ReservaMateriaPrima
+            # A. Recuperar reservas de MP antes de borrarlas (agrupadas por MP en el snapshot)
             reservas_mp = ReservaMateriaPrima.objects.filter(id_orden_produccion=op_cancelar)
             
-            for reserva in reservas_mp:
-                mp_id = reserva.id_lote_materia_prima.id_materia_prima_id
-                cantidad_liberada = reserva.cantidad_reservada
+            for mp_id, cantidad_liberada in snapshot.reservas_mp_de_op(op_cancelar.pk).items():
                 
                 # B. DEVOLVER AL POOL VIRTUAL (Para que el Paso 5 la use)
                 if mp_id in stock_virtual_mp:
                     stock_virtual_mp[mp_id] += cantidad_liberada
-                    print(f"     ♻️ Liberados {cantidad_liberada} de MP {mp_id} (Vuelven al pool virtual).")
+                    eventos.debug("♻️ Liberados %s de MP %s (Vuelven al pool virtual).", cantidad_liberada, mp_id, op=op_cancelar.id_orden_produccion)
                 else:
                     # Si no estaba en el pool (raro), lo inicializamos
                     stock_virtual_mp[mp_id] = cantidad_liberada
 
             # C. Borrar datos físicos
             reservas_mp.delete() # Borra las reservas de MP
-            CalendarioProduccion.objects.filter(id_orden_produccion=op_cancelar).delete() # Borra calendario
+            snapshot.liberar_reservas_mp(op_cancelar.pk)
+            libro_capacidad.liberar_op(op_cancelar) # Borra calendario (y libera sus horas)
             
             # D. Marcar OP como cancelada
             op_cancelar.id_estado_orden_produccion = estado_op_cancelada
@@ -691,20 +753,24 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
     # 🆕 PASO 4.5: REASIGNACIÓN DE STOCK A OPs "EN ESPERA"
     # (Prioridad: Las OPs viejas comen antes que las nuevas)
     # ===================================================================
-    print(f"\n[PASO 4.5] Intentando asignar stock liberado a OPs antiguas en espera...")
+    eventos.paso("4.5", "Intentando asignar stock liberado a OPs antiguas en espera...")
+
+    # Reservas de MP de PASO 4.5 y PASO 5: en memoria y un único bulk_create al final del PASO 5
+    # (lotes de todas las MPs de la corrida en 1 consulta)
+    asignador_mp = AsignadorFEFO.para_materias_primas(estado_reserva_mp_activa)
+    asignador_mp.precargar(materias_primas_corrida)
 
     # 1. Buscamos OPs que siguen esperando material
     # Ordenamos por fecha para respetar FIFO (primero entra, primero se sirve)
-    ops_remanentes = OrdenProduccion.objects.filter(
+    ops_remanentes = alcance.filtrar(OrdenProduccion.objects.filter(
         id_estado_orden_produccion=estado_op_en_espera
-    ).order_by('fecha_planificada')
+    )).select_related('id_producto').order_by('fecha_planificada')
 
     for op in ops_remanentes:
-        print(f"   > Re-evaluando OP {op.id_orden_produccion} (Producto: {op.id_producto.nombre})...")
+        eventos.debug("Re-evaluando OP %s (Producto: %s)...", op.id_orden_produccion, op.id_producto.nombre, op=op.id_orden_produccion)
         
         try:
-            receta = Receta.objects.get(id_producto=op.id_producto)
-            ingredientes = RecetaMateriaPrima.objects.filter(id_receta=receta)
+            ingredientes = snapshot.ingredientes(op.id_producto_id)
             
             op_completo = True # Asumimos que sí, hasta que falte algo
             
@@ -715,10 +781,7 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
                 cantidad_total_necesaria = ing.cantidad * op.cantidad
                 
                 # B. Calcular cuánto YA tiene reservado (de ejecuciones anteriores)
-                reservado_actual = ReservaMateriaPrima.objects.filter(
-                    id_orden_produccion=op,
-                    id_lote_materia_prima__id_materia_prima_id=mp_id
-                ).aggregate(total=Sum('cantidad_reservada'))['total'] or 0
+                reservado_actual = snapshot.reservado_mp(op.pk, mp_id, solo_activas=False)
                 
                 cantidad_faltante = cantidad_total_necesaria - reservado_actual
                 
@@ -736,12 +799,13 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
                     
                     # 2. Crear la reserva física REAL en BD
                     #    (Usamos stock REAL para buscar el lote, porque si está en virtual es que está en físico)
-                    stock_real_mp = get_stock_disponible_para_materia_prima(mp_id) 
+                    stock_real_mp = snapshot.stock_mp.get(mp_id, 0)
                     cant_a_reservar_bd = min(stock_real_mp, tomar_ahora) # Safety check
                     
                     if cant_a_reservar_bd > 0:
-                        _reservar_stock_mp(op, mp_id, cant_a_reservar_bd, estado_reserva_mp_activa)
-                        print(f"     ✅ Asignados {cant_a_reservar_bd} de MP {mp_id} a OP {op.id_orden_produccion} (Recuperado).")
+                        reservado = _reservar_stock_mp(asignador_mp, op, mp_id, cant_a_reservar_bd)
+                        snapshot.registrar_reserva_mp(op.pk, mp_id, reservado)
+                        eventos.debug("✅ Asignados %s de MP %s a OP %s (Recuperado).", cant_a_reservar_bd, mp_id, op.id_orden_produccion, op=op.id_orden_produccion)
                     
                     # Recalcular faltante
                     cantidad_faltante -= tomar_ahora
@@ -753,46 +817,49 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
             if op_completo:
                 op.id_estado_orden_produccion = estado_op_pendiente_inicio
                 op.save()
-                print(f"     🎉 ¡OP {op.id_orden_produccion} completó sus materiales! Pasa a 'Pendiente de inicio'.")
+                eventos.evento(eventos.Tipo.OP_ESTADO, "🎉 ¡OP %s completó sus materiales! Pasa a 'Pendiente de inicio'.", op.id_orden_produccion, op=op.id_orden_produccion)
                 
         except Receta.DoesNotExist:
-            print(f"     ⚠️ La OP {op.id_orden_produccion} no tiene receta activa.")
+            eventos.advertencia("⚠️ La OP %s no tiene receta activa.", op.id_orden_produccion, op=op.id_orden_produccion)
 
 
     # ===================================================================
     # ❗️ PASO 5: SCHEDULING (MTO) Y CÁLCULO DE MP Y OCs
     # (Lógica de MP/OC movida ANTES del Calendar Walk)
     # ===================================================================
-    print(f"\n[PASO 5/6] Planificando OPs (MTO) para {len(lineas_para_producir)} nuevas líneas de OV...")
+    eventos.paso("5", "Planificando OPs (MTO) para %s nuevas líneas de OV...", len(lineas_para_producir))
+
+    estado_lote_espera = EstadoLoteProduccion.objects.filter(descripcion__iexact="En espera").first()
 
+    # --- 5.1 HORAS, MATERIALES Y FECHA MÍNIMA DE INICIO DE CADA OP (todavía sin guardar) ---
+    pedidos_op = []
     for linea_ov, cantidad_a_producir in lineas_para_producir:
         
         producto = linea_ov.id_producto
         ov = linea_ov.id_orden_venta
         fecha_entrega_ov = ov.fecha_entrega.date()
         
-        print(f"   --- Planificando para OV {ov.id_orden_venta} (Línea {linea_ov.id_orden_venta_producto}) ---")
+        eventos.debug("--- Planificando para OV %s (Línea %s) ---", ov.id_orden_venta, linea_ov.id_orden_venta_producto, ov=ov.id_orden_venta)
 
+        op = None
         try:
             # --- A. CÁLCULO DE TIEMPO DE PRODUCCIÓN ---
-            capacidades_linea = ProductoLinea.objects.filter(id_producto=producto)
-            if not capacidades_linea.exists():
-                print(f"      !ERROR: {producto.nombre} no tiene líneas asignadas en 'ProductoLinea'. Omitiendo OP.")
+            capacidades_linea = snapshot.capacidades(producto.id_producto)
+            if not capacidades_linea:
+                eventos.error("!ERROR: %s no tiene líneas asignadas en 'ProductoLinea'. Omitiendo OP.", producto.nombre, ov=ov.id_orden_venta)
                 continue
 
-            cant_total_por_hora = capacidades_linea.aggregate(
-                total=Sum('cant_por_hora')
-            )['total'] or 0
+            cant_total_por_hora = snapshot.capacidad_total_por_hora(producto.id_producto)
 
             if cant_total_por_hora <= 0:
-                print(f"      !ERROR: {producto.nombre} tiene capacidad total 0/hr. Omitiendo OP.")
+                eventos.error("!ERROR: %s tiene capacidad total 0/hr. Omitiendo OP.", producto.nombre, ov=ov.id_orden_venta)
                 continue
             
             horas_necesarias_float = float(cantidad_a_producir) / float(cant_total_por_hora)
             horas_necesarias_totales = math.ceil(horas_necesarias_float)
             dias_produccion_estimados = math.ceil(horas_necesarias_totales / HORAS_LABORABLES_POR_DIA)
             
-            print(f"      > Necesita {horas_necesarias_float:.2f} horas-máquina (redondeado a {horas_necesarias_totales}hs enteras).")
+            eventos.debug("Necesita %.2f horas-máquina (redondeado a %shs enteras).", horas_necesarias_float, horas_necesarias_totales, ov=ov.id_orden_venta)
 
             # --- B. CÁLCULO DE FECHA IDEAL DE INICIO (POR OV) ---
             fecha_planificada_ideal = fecha_entrega_ov - timedelta(days=dias_produccion_estimados) - timedelta(DIAS_BUFFER_ENTREGA_PT)
@@ -800,9 +867,7 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
                 fecha_planificada_ideal = hoy
 
             # --- ❗️ C. CHEQUEO DE MP Y CÁLCULO DE LEAD TIME (NUEVO) ---
-            print(f"      > [PASO 5C] Calculando MP y Lead Time...")
-            receta = Receta.objects.get(id_producto=producto)
-            ingredientes_totales = RecetaMateriaPrima.objects.filter(id_receta=receta)
+            ingredientes_totales = snapshot.ingredientes(producto.id_producto)
             max_lead_time_mp = 0
             op_tiene_todo_el_material_EN_STOCK = True
             
@@ -847,7 +912,10 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
                     max_lead_time_mp = max(max_lead_time_mp, lead_proveedor)
                     
                     # Agregamos la compra al pool global
-                    print(f"      ! Faltan {cantidad_a_comprar} de {mp.nombre}. Agregando a OC.")
+                    eventos.evento(
+                        eventos.Tipo.FALTANTE_MP, "! Faltan %s de %s. Agregando a OC.", cantidad_a_comprar, mp.nombre,
+                        ov=ov.id_orden_venta, id_materia_prima=mp_id, cantidad=cantidad_a_comprar
+                    )
                     proveedor = mp.id_proveedor
                     compra_agregada = compras_agregadas_por_proveedor[proveedor.id_proveedor]
                     compra_agregada["proveedor"] = proveedor
@@ -858,179 +926,157 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
             # --- ❗️ D. CALCULAR FECHA DE INICIO MÍNIMA REAL ---
             
             # 1. Calcular cuándo llega la MP (Lead Time puro)
-            fecha_recepcion_mp_pura = hoy + timedelta(days=max_lead_time_mp)
-            
-            # Si la recepción cae Sábado o Domingo, pasamos al Lunes siguiente
-            while fecha_recepcion_mp_pura.weekday() >= 5:
-                fecha_recepcion_mp_pura += timedelta(days=1)
+            # Si la recepción cae en un día no hábil, pasamos al siguiente día hábil
+            fecha_recepcion_mp_pura = calendario.habil_desde(hoy + timedelta(days=max_lead_time_mp))
             
             # 2. Sumar BUFFER para determinar cuándo puede INICIAR la producción
             # (Esto asegura que la producción empiece DESPUÉS de que llegue la MP)
-            fecha_inicio_por_materiales = fecha_recepcion_mp_pura + timedelta(days=DIAS_BUFFER_RECEPCION_MP)
-
-            # Si el inicio calculado cae finde, mover al Lunes
-            while fecha_inicio_por_materiales.weekday() >= 5:
-                fecha_inicio_por_materiales += timedelta(days=1)
+            # (si el inicio calculado cae en un día no hábil, pasa al siguiente)
+            fecha_inicio_por_materiales = calendario.habil_desde(fecha_recepcion_mp_pura + timedelta(days=DIAS_BUFFER_RECEPCION_MP))
 
             # La fecha MÍNIMA es la mayor entre la ideal (por venta) y la posible (por materiales)
             fecha_inicio_minima_real = max(fecha_planificada_ideal, fecha_inicio_por_materiales)
             
-            print(f"      > Fecha ideal (OV): {fecha_planificada_ideal}. Materiales listos: {fecha_inicio_por_materiales}.")
-            print(f"      > Inicio MÍNIMO REAL (max): {fecha_inicio_minima_real}.")
-
-
-            # --- E. LÓGICA "WALK THE CALENDAR" ---
-            
-            cantidad_pendiente_op = cantidad_a_producir 
-            horas_pendientes = horas_necesarias_totales 
-            
-            fecha_a_buscar = fecha_inicio_minima_real
-            
-            # Validación inicial de finde (por si acaso)
-            while fecha_a_buscar.weekday() >= 5:
-                fecha_a_buscar += timedelta(days=1)
-
-            fecha_inicio_real_asignada = None
-            ultimo_dia_trabajado = None
-            fecha_fin_real_asignada = None
-            reservas_a_crear_bulk = []
-            
-            print(f"       > Buscando hueco desde {fecha_a_buscar}...")
+            eventos.debug("Fecha ideal (OV): %s. Materiales listos: %s.", fecha_planificada_ideal, fecha_inicio_por_materiales, ov=ov.id_orden_venta)
+            eventos.debug("Inicio MÍNIMO REAL (max): %s.", fecha_inicio_minima_real, ov=ov.id_orden_venta)
+
+            pedidos_op.append({
+                "linea_ov": linea_ov,
+                "cantidad_a_producir": cantidad_a_producir,
+                "op": op,
+                "capacidades_linea": capacidades_linea,
+                "horas_necesarias_totales": horas_necesarias_totales,
+                "ingredientes_totales": ingredientes_totales,
+                "max_lead_time_mp": max_lead_time_mp,
+                "op_tiene_todo_el_material_EN_STOCK": op_tiene_todo_el_material_EN_STOCK,
+                "fecha_inicio_minima_real": fecha_inicio_minima_real,
+                "fecha_inicio_por_materiales": fecha_inicio_por_materiales,
+            })
 
-            while horas_pendientes > 0 and cantidad_pendiente_op > 0:
-                horas_libres_cuello_botella = HORAS_LABORABLES_POR_DIA
-                lineas_ids_producto = [c.id_linea_produccion_id for c in capacidades_linea]
-                
-                carga_existente = CalendarioProduccion.objects.filter(
-                    id_linea_produccion_id__in=lineas_ids_producto,
-                    fecha=fecha_a_buscar,
-                    id_orden_produccion__id_estado_orden_produccion__in=[estado_op_en_espera, estado_op_pendiente_inicio]
-                ).values('id_linea_produccion_id').annotate(
-                    total_reservado=Sum('horas_reservadas')
-                ).values('id_linea_produccion_id', 'total_reservado')
-                
-                carga_por_linea = {c['id_linea_produccion_id']: float(c['total_reservado']) for c in carga_existente}
-
-                for linea_id in lineas_ids_producto:
-                    carga_dia = carga_por_linea.get(linea_id, 0.0)
-                    horas_libres_linea = max(0, HORAS_LABORABLES_POR_DIA - carga_dia)
-                    horas_libres_cuello_botella = min(horas_libres_cuello_botella, horas_libres_linea)
-
-                horas_libres_enteras = math.floor(horas_libres_cuello_botella)
-
-                # Si no hay horas hoy, avanzar
-                if horas_libres_enteras <= 0:
-                    fecha_a_buscar += timedelta(days=1)
-                    while fecha_a_buscar.weekday() >= 5: fecha_a_buscar += timedelta(days=1)
-                    continue
-                    
-                horas_a_reservar_hoy = min(horas_pendientes, horas_libres_enteras) 
-                se_reservo_tiempo_en_fecha = False
-
-                for cap_linea in capacidades_linea:
-                    cantidad_calculada_linea = round(float(horas_a_reservar_hoy) * float(cap_linea.cant_por_hora))
-                    cantidad_real_linea = min(cantidad_pendiente_op, cantidad_calculada_linea)
-
-                    if horas_a_reservar_hoy > 0 and cantidad_real_linea > 0:
-                        se_reservo_tiempo_en_fecha = True 
-                        
-                        reservas_a_crear_bulk.append(
-                            CalendarioProduccion(
-                                id_orden_produccion=op, 
-                                id_linea_produccion=cap_linea.id_linea_produccion,
-                                fecha=fecha_a_buscar,
-                                horas_reservadas=horas_a_reservar_hoy,
-                                cantidad_a_producir=cantidad_real_linea
-                            )
-                        )
-                        
-                        cantidad_pendiente_op -= cantidad_real_linea
-                        
-                        if cantidad_pendiente_op <= 0:
-                            break 
-                
-                # --- Gestión de avance de fechas ---
-                if se_reservo_tiempo_en_fecha:
-                    horas_pendientes -= horas_a_reservar_hoy 
-                
-                    ultimo_dia_trabajado = fecha_a_buscar
-
-                    if fecha_inicio_real_asignada is None:
-                        fecha_inicio_real_asignada = fecha_a_buscar
-                    
-                    print(f"       > Reservadas {horas_a_reservar_hoy}hs enteras en {fecha_a_buscar}. Faltan {horas_pendientes}hs. Quedan {cantidad_pendiente_op} u.")
-                
-                # Si terminamos la cantidad, forzamos salida
-                if cantidad_pendiente_op <= 0:
-                    horas_pendientes = 0 
-                    break
+        except Receta.DoesNotExist:
+            eventos.error("!ERROR: %s no tiene Receta. Omitiendo OP.", producto.nombre, ov=ov.id_orden_venta)
+        except Exception as e:
+            eventos.error("!ERROR al planificar OP para %s: %s", producto.nombre, e, ov=ov.id_orden_venta)
+
+    # --- 5.2 CAPACIDAD: walk greedy, una OP por vez (default), o todas juntas en un
+    # modelo CP-SAT que minimiza el atraso ponderado (MRP_CAPACIDAD_FINITA = 1) ---
+    asignacion_capacidad = None
+    if pedidos_op and get_config('MRP_CAPACIDAD_FINITA', 0):
+        asignacion_capacidad = _asignar_capacidad_finita(
+            pedidos_op, libro_capacidad, hoy, HORAS_LABORABLES_POR_DIA, DIAS_BUFFER_ENTREGA_PT
+        )
 
-                # Si todavía falta (cantidad u horas) o si no pudimos reservar hoy, AVANZAR
-                # (La lógica simplificada: siempre avanzamos al siguiente día hábil para la siguiente iteración)
-                fecha_a_buscar += timedelta(days=1)
-                while fecha_a_buscar.weekday() >= 5:
-                    fecha_a_buscar += timedelta(days=1)
-                
-                # Si cambiamos de día y aún falta cantidad, renovamos las horas disponibles para el nuevo día
-                if cantidad_pendiente_op > 0:
-                    horas_pendientes = horas_necesarias_totales
+    # --- 5.3 RESERVA DE CALENDARIO Y FECHAS DE CADA OP (en memoria) ---
+    # Las OPs, sus lotes y el pegging se insertan después con un bulk_create por tabla
+    ops_a_crear = []
+    for indice, pedido in enumerate(pedidos_op):
+        linea_ov = pedido["linea_ov"]
+        cantidad_a_producir = pedido["cantidad_a_producir"]
+        op = pedido["op"]
+        capacidades_linea = pedido["capacidades_linea"]
+        max_lead_time_mp = pedido["max_lead_time_mp"]
+        fecha_inicio_minima_real = pedido["fecha_inicio_minima_real"]
+        producto = linea_ov.id_producto
+        ov = linea_ov.id_orden_venta
 
+        try:
+            # --- E. RESERVA DE CALENDARIO (días elegidos por el modelo, o "walk the calendar") ---
+            if asignacion_capacidad is not None:
+                fecha_inicio_real_asignada, ultimo_dia_trabajado = _reservar_asignacion(
+                    libro_capacidad, op, capacidades_linea, cantidad_a_producir, asignacion_capacidad.get(indice, {})
+                )
+            else:
+                eventos.debug("Buscando hueco desde %s...", fecha_inicio_minima_real, ov=ov.id_orden_venta)
+                fecha_inicio_real_asignada, ultimo_dia_trabajado = libro_capacidad.reservar_op(
+                    op, capacidades_linea, cantidad_a_producir, fecha_inicio_minima_real
+                )
 
-            # --- Fuera del bucle while ---
+            # --- Fechas reales de la OP ---
             if fecha_inicio_real_asignada is None:
                 fecha_inicio_real_asignada = fecha_inicio_minima_real
             
-            # La fecha fin es el último día que se usó con éxito
-            # Como el bucle avanza 'fecha_a_buscar' al final, debemos retroceder uno.
-           # fecha_fin_real_asignada = fecha_a_buscar - timedelta(days=1)
+            # La fecha fin es el último día (hábil) que se usó con éxito
             fecha_fin_real_asignada = ultimo_dia_trabajado if ultimo_dia_trabajado else fecha_inicio_real_asignada
-            while fecha_fin_real_asignada.weekday() >= 5: # Ajuste por si acaso retrocedió a finde
-                 fecha_fin_real_asignada -= timedelta(days=1)
 
-            if fecha_fin_real_asignada < fecha_inicio_real_asignada:
-                fecha_fin_real_asignada = fecha_inicio_real_asignada
-
-            # --- F. GUARDAR OP, PEGGING Y RESERVAS DE CALENDARIO ---
-            
-            # Ahora guardamos la OP con sus fechas reales
             op.fecha_planificada = timezone.make_aware(datetime.combine(fecha_inicio_real_asignada, datetime.min.time()))
             op.fecha_fin_planificada = fecha_fin_real_asignada
-            op.save() # ❗️ Guardamos la OP (obtiene PK)
-            
-            print(f"      > CREADA OP {op.id_orden_produccion} (MTO) y vinculada a OV {ov.id_orden_venta}.")
-            
-            # Vinculamos el Pegging (ahora la OP tiene PK)
-            OrdenProduccionPegging.objects.create(
-                id_orden_produccion=op,
-                id_orden_venta_producto=linea_ov,
-                cantidad_asignada=cantidad_a_producir
+
+            # --- Estado según la MP (toda en stock o esperando compras) ---
+            if pedido["op_tiene_todo_el_material_EN_STOCK"]:
+                op.id_estado_orden_produccion = estado_op_pendiente_inicio
+            else:
+                op.id_estado_orden_produccion = estado_op_en_espera
+
+            fecha_inicio_op = op.fecha_planificada.date() - timedelta(days=max_lead_time_mp + DIAS_BUFFER_RECEPCION_MP)
+            op.fecha_inicio = timezone.make_aware(datetime.combine(fecha_inicio_op, datetime.min.time()))
+
+            # --- H. LÓGICA DE LOTE ---
+            if estado_lote_espera:
+                dias_duracion = getattr(producto, 'dias_duracion', 0) or 0
+                # Sin señales (bulk_create): stock_libre se carga acá (el lote nuevo no tiene reservas)
+                op.id_lote_produccion = LoteProduccion(
+                    id_producto=op.id_producto,
+                    id_estado_lote_produccion=estado_lote_espera,
+                    cantidad=op.cantidad,
+                    stock_libre=op.cantidad,
+                    fecha_produccion=timezone.now().date(), 
+                    fecha_vencimiento=timezone.now().date() + timedelta(days=dias_duracion)
+                )
+
+            ops_a_crear.append(pedido)
+
+        except Exception as e:
+            eventos.error("!ERROR al planificar OP para %s: %s", producto.nombre, e, ov=ov.id_orden_venta)
+            libro_capacidad.descartar_pendientes(op)
+
+    # --- F. GUARDAR LOTES, OPs Y PEGGING (un bulk_create por tabla, con su historial) ---
+    lotes = [pedido["op"].id_lote_produccion for pedido in ops_a_crear if pedido["op"].id_lote_produccion]
+    bulk_create_with_history(lotes, LoteProduccion)
+    # (bulk_create toma el id del lote recién insertado para la FK de la OP)
+    bulk_create_with_history([pedido["op"] for pedido in ops_a_crear], OrdenProduccion)
+    OrdenProduccionPegging.objects.bulk_create([
+        OrdenProduccionPegging(
+            id_orden_produccion=pedido["op"],
+            id_orden_venta_producto=pedido["linea_ov"],
+            cantidad_asignada=pedido["cantidad_a_producir"]
+        )
+        for pedido in ops_a_crear
+    ])
+
+    # --- G / I. ENTREGAS DESPLAZADAS Y RESERVAS DE MP (ahora que cada OP tiene PK) ---
+    ops_creadas = []
+    for pedido in ops_a_crear:
+        linea_ov = pedido["linea_ov"]
+        op = pedido["op"]
+        producto = linea_ov.id_producto
+        ov = linea_ov.id_orden_venta
+
+        try:
+            eventos.evento(
+                eventos.Tipo.OP_CREADA, "CREADA OP %s (MTO) y vinculada a OV %s.", op.id_orden_produccion, ov.id_orden_venta,
+                op=op.id_orden_produccion, ov=ov.id_orden_venta, id_producto=producto.id_producto, cantidad=op.cantidad,
+                fecha_inicio=op.fecha_planificada.date(), fecha_fin=op.fecha_fin_planificada
             )
-            
-            # Asignamos la OP (con PK) a las reservas y las creamos
-            for reserva in reservas_a_crear_bulk:
-                reserva.id_orden_produccion = op
-            CalendarioProduccion.objects.bulk_create(reservas_a_crear_bulk)
-            
-            print(f"      -> PLANIFICACIÓN REAL: {op.fecha_planificada.date()} a {op.fecha_fin_planificada}.")
+            eventos.debug("-> PLANIFICACIÓN REAL: %s a %s.", op.fecha_planificada.date(), op.fecha_fin_planificada, op=op.id_orden_produccion, ov=ov.id_orden_venta)
+            if op.id_lote_produccion is None:
+                eventos.error("!ERROR CRÍTICO: No se pudo crear Lote. Estado 'En espera' no existe.", op=op.id_orden_produccion)
 
-           # 1. Calculamos la nueva fecha sugerida (Fin Producción + Buffer + 1 día seguridad)
+            # 1. Calculamos la nueva fecha sugerida (Fin Producción + Buffer + 1 día seguridad)
             dias_totales_margen = DIAS_BUFFER_ENTREGA_PT + 1
-            nueva_fecha_entrega_sugerida_date = op.fecha_fin_planificada + timedelta(days=dias_totales_margen)
-
-            while nueva_fecha_entrega_sugerida_date.weekday() >= 5:
-                nueva_fecha_entrega_sugerida_date += timedelta(days=1) 
+            nueva_fecha_entrega_sugerida_date = calendario.habil_desde(op.fecha_fin_planificada + timedelta(days=dias_totales_margen))
 
             # 2. Verificamos si hay retraso (Si la nueva fecha es MAYOR a la original)
             if nueva_fecha_entrega_sugerida_date > ov.fecha_entrega.date():
                 
-                print(f"      !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
-                print(f"      !!! ALERTA DE ENTREGA: OP {op.id_orden_produccion}")
-                print(f"      !!! Vinculada a: OV {ov.id_orden_venta} (Entrega actual: {ov.fecha_entrega.date()})")
-                print(f"      !!! Producción termina el: {op.fecha_fin_planificada}")
-                print(f"      !!! Nueva fecha de entrega sugerida: {nueva_fecha_entrega_sugerida_date}")
-                print(f"      !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
-
-                print(f"      !!! DESPLAZANDO OV {ov.id_orden_venta} a {nueva_fecha_entrega_sugerida_date}")
+                eventos.evento(
+                    eventos.Tipo.ENTREGA_RETRASADA,
+                    "!!! ALERTA DE ENTREGA: OP %s vinculada a OV %s (Entrega actual: %s). "
+                    "Producción termina el: %s. DESPLAZANDO OV %s a %s",
+                    op.id_orden_produccion, ov.id_orden_venta, ov.fecha_entrega.date(), op.fecha_fin_planificada,
+                    ov.id_orden_venta, nueva_fecha_entrega_sugerida_date, nivel=eventos.Nivel.ADVERTENCIA,
+                    op=op.id_orden_produccion, ov=ov.id_orden_venta, fecha_anterior=ov.fecha_entrega.date(), fecha_nueva=nueva_fecha_entrega_sugerida_date
+                )
+
                 
                 # ✅ SOLUCIÓN: Asignación DIRECTA.
                 # 'nueva_fecha_entrega_sugerida_date' ya es un objeto 'date' válido.
@@ -1043,67 +1089,63 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
                 # Guardamos solo los campos modificados
                 ov.save(update_fields=['fecha_entrega', 'id_estado_venta'])
 
-            # --- H. LÓGICA DE LOTE ---
-            try:
-                estado_lote_espera = EstadoLoteProduccion.objects.get(descripcion__iexact="En espera")
-                dias_duracion = getattr(producto, 'dias_duracion', 0) or 0
-                
-                lote = LoteProduccion.objects.create(
-                    id_producto=op.id_producto,
-                    id_estado_lote_produccion=estado_lote_espera,
-                    cantidad=op.cantidad,
-                    fecha_produccion=timezone.now().date(), 
-                    fecha_vencimiento=timezone.now().date() + timedelta(days=dias_duracion)
-                )
-                op.id_lote_produccion = lote
-            except EstadoLoteProduccion.DoesNotExist:
-                print(f"      !ERROR CRÍTICO: No se pudo crear Lote. Estado 'En espera' no existe.")
-
-            # --- I. (PASO 5) ACTUALIZAR ESTADO Y RESERVAS DE MP ---
-            print(f"      > [PASO 5I] Creando Reservas de MP y asignando Estado...")
-            
-            # Volvemos a iterar, esta vez para crear las Reservas de MP (ahora que OP tiene PK)
-            for ingr in ingredientes_totales:
+            # --- I. (PASO 5) RESERVAS DE MP ---
+            for ingr in pedido["ingredientes_totales"]:
                 mp_id = ingr.id_materia_prima_id
                 cantidad_requerida_op = ingr.cantidad * op.cantidad
                 cantidad_faltante_op = cantidad_requerida_op
 
                 # Usamos el pool global (que ya descontamos virtualmente)
-                stock_mp_disponible_real = get_stock_disponible_para_materia_prima(mp_id)
+                stock_mp_disponible_real = snapshot.stock_mp.get(mp_id, 0)
                 
                 # Cuánto debemos tomar del stock real (no del virtual)
                 tomar_de_stock = min(stock_mp_disponible_real, cantidad_faltante_op)
                 
                 if tomar_de_stock > 0:
-                    _reservar_stock_mp(op, mp_id, tomar_de_stock, estado_reserva_mp_activa)
+                    reservado = _reservar_stock_mp(asignador_mp, op, mp_id, tomar_de_stock)
+                    snapshot.registrar_reserva_mp(op.pk, mp_id, reservado)
 
-            if op_tiene_todo_el_material_EN_STOCK:
-                op.id_estado_orden_produccion = estado_op_pendiente_inicio
-                print(f"      > OP {op.id_orden_produccion} tiene toda la MP en Stock. Estado -> Pendiente de inicio")
+            if op.id_estado_orden_produccion == estado_op_pendiente_inicio:
+                eventos.debug("OP %s tiene toda la MP en Stock. Estado -> Pendiente de inicio", op.id_orden_produccion, op=op.id_orden_produccion)
             else:
-                op.id_estado_orden_produccion = estado_op_en_espera
-                print(f"      > OP {op.id_orden_produccion} esperando MP (en tránsito o por comprar). Estado -> En espera")
+                eventos.debug("OP %s esperando MP (en tránsito o por comprar). Estado -> En espera", op.id_orden_produccion, op=op.id_orden_produccion)
 
-            fecha_inicio_op = op.fecha_planificada.date() - timedelta(days=max_lead_time_mp + DIAS_BUFFER_RECEPCION_MP)
-            op.fecha_inicio = timezone.make_aware(datetime.combine(fecha_inicio_op, datetime.min.time()))
-            
-            # Guardamos todo al final
-            op.save()
+            ops_creadas.append(op.id_orden_produccion)
 
-        except Receta.DoesNotExist:
-            print(f"      !ERROR: {producto.nombre} no tiene Receta. Omitiendo OP.")
-            if op and op.pk: op.delete()
         except Exception as e:
-            print(f"      !ERROR al planificar OP para {producto.nombre}: {e}")
-            if op and op.pk: op.delete()
+            eventos.error("!ERROR al planificar OP para %s: %s", producto.nombre, e, ov=ov.id_orden_venta)
+            libro_capacidad.descartar_pendientes(op)
+            asignador_mp.descartar(op)
+            snapshot.liberar_reservas_mp(op.pk)
+            op.delete()
+
+    # Guardamos TODAS las reservas de calendario del run (PASO 0.6 + PASO 5) de una vez
+    reservas_creadas = libro_capacidad.guardar()
+    eventos.info("Calendario: %s reservas creadas en un único bulk_create.", reservas_creadas)
+    reservas_mp_creadas = asignador_mp.guardar()
+    eventos.info("Materia prima: %s reservas creadas en un único bulk_create.", reservas_mp_creadas)
             
     # ===================================================================
     # ❗️ PASO 6: CREACIÓN DE OCs (AGREGADAS)
     # ===================================================================
-    print(f"\n[PASO 6/6] Creando {len(compras_agregadas_por_proveedor)} OCs agrupadas por proveedor...")
+    eventos.paso("6", "Creando %s OCs agrupadas por proveedor...", len(compras_agregadas_por_proveedor))
 
     # (La lógica de este paso no cambia, solo lee el diccionario
     # 'compras_agregadas_por_proveedor' que llenamos en el PASO 5C)
+
+    # Fecha planificada más temprana por MP entre las OPs 'En espera' (1 consulta + BOM del snapshot)
+    fecha_op_mas_temprana_por_mp = {}
+    if compras_agregadas_por_proveedor:
+        for producto_id, fecha_planificada in OrdenProduccion.objects.filter(
+            id_estado_orden_produccion=estado_op_en_espera,
+            fecha_planificada__isnull=False
+        ).values_list('id_producto_id', 'fecha_planificada'):
+            if not snapshot.tiene_receta(producto_id):
+                continue
+            for ing in snapshot.ingredientes(producto_id):
+                fecha_actual = fecha_op_mas_temprana_por_mp.get(ing.id_materia_prima_id)
+                if fecha_actual is None or fecha_planificada < fecha_actual:
+                    fecha_op_mas_temprana_por_mp[ing.id_materia_prima_id] = fecha_planificada
     
     for proveedor_id, info in compras_agregadas_por_proveedor.items():
         proveedor = info["proveedor"]
@@ -1111,14 +1153,9 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
         fecha_requerida_mas_temprana = date(9999, 12, 31)
         for mp_id in info["items"].keys():
             # Buscamos la fecha más temprana para esta MP en las OPs 'En espera'
-            ops_necesitadas = OrdenProduccion.objects.filter(
-                id_estado_orden_produccion=estado_op_en_espera,
-                id_producto__receta__recetamateriaprima__id_materia_prima_id=mp_id
-            ).order_by('fecha_planificada')
-            
-            op_mas_temprana = ops_necesitadas.first()
-            if op_mas_temprana:
-                fecha_req_op = op_mas_temprana.fecha_planificada.date() - timedelta(days=DIAS_BUFFER_RECEPCION_MP)
+            fecha_op_mas_temprana = fecha_op_mas_temprana_por_mp.get(mp_id)
+            if fecha_op_mas_temprana:
+                fecha_req_op = fecha_op_mas_temprana.date() - timedelta(days=DIAS_BUFFER_RECEPCION_MP)
                 if fecha_req_op < fecha_requerida_mas_temprana:
                     fecha_requerida_mas_temprana = fecha_req_op
         
@@ -1128,27 +1165,21 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
         fecha_necesaria_mp = fecha_requerida_mas_temprana
         lead_time = proveedor.lead_time_days
 
-        fecha_entrega_oc = fecha_necesaria_mp
-
-        # Si cae Sábado (5) o Domingo (6), mover al Lunes siguiente
-        while fecha_entrega_oc.weekday() >= 5:
-            fecha_entrega_oc += timedelta(days=1)
+        # Si cae en un día no hábil, mover al siguiente día hábil
+        fecha_entrega_oc = calendario.habil_desde(fecha_necesaria_mp)
 
-        fecha_solicitud_oc = fecha_entrega_oc - timedelta(days=lead_time)
-
-        # Si cae Sábado o Domingo, adelantar al VIERNES ANTERIOR (pedir antes)
-        while fecha_solicitud_oc.weekday() >= 5:
-            fecha_solicitud_oc -= timedelta(days=1)
+        # Si cae en un día no hábil, adelantar al día hábil ANTERIOR (pedir antes)
+        fecha_solicitud_oc = calendario.habil_hasta(fecha_entrega_oc - timedelta(days=lead_time))
 
 
         if fecha_solicitud_oc < hoy:
             fecha_solicitud_oc = hoy
-            fecha_entrega_oc = hoy + timedelta(days=lead_time)
-
-            while fecha_entrega_oc.weekday() >= 5:
-                fecha_entrega_oc += timedelta(days=1)
+            fecha_entrega_oc = calendario.habil_desde(hoy + timedelta(days=lead_time))
 
-            print(f"   !ALERTA OC: Pedido a {proveedor.nombre} está retrasado. Nueva entrega: {fecha_entrega_oc}")
+            eventos.advertencia(
+                "!ALERTA OC: Pedido a %s está retrasado. Nueva entrega: %s", proveedor.nombre, fecha_entrega_oc,
+                id_proveedor=proveedor.id_proveedor, fecha_entrega=fecha_entrega_oc
+            )
             
         oc, created = OrdenCompra.objects.get_or_create(
             id_proveedor=proveedor,
@@ -1157,13 +1188,13 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
             defaults={'fecha_solicitud': fecha_solicitud_oc}
         )
         if created:
-            print(f"   > Generando NUEVA OC {oc.id_orden_compra} para {proveedor.nombre} (Entrega: {fecha_entrega_oc})")
+            eventos.info("Generando NUEVA OC %s para %s (Entrega: %s)", oc.id_orden_compra, proveedor.nombre, fecha_entrega_oc)
         else:
-            print(f"   > Usando OC EXISTENTE {oc.id_orden_compra} para {proveedor.nombre} (Entrega: {fecha_entrega_oc})")
+            eventos.info("Usando OC EXISTENTE %s para %s (Entrega: %s)", oc.id_orden_compra, proveedor.nombre, fecha_entrega_oc)
         
 
         for mp_id, cantidad_necesaria_hoy in info["items"].items():
-            mp = MateriaPrima.objects.get(id_materia_prima=mp_id)
+            mp = snapshot.materias_primas[mp_id]
             cantidad_final = mp.calcular_cantidad_a_pedir(cantidad_necesaria_hoy)
             
             item_oc, item_created = OrdenCompraMateriaPrima.objects.get_or_create(
@@ -1173,11 +1204,23 @@ def ejecutar_planificacion_diaria_mrp(fecha_simulada: date):
             )
             
             if item_created:
-                print(f"      - NUEVO Item: {cantidad_final} de MP {mp_id} (necesitaba {cantidad_necesaria_hoy}, lote: {mp.cantidad_minima_pedido})")
+                eventos.evento(
+                    eventos.Tipo.OC_AGREGADA, "NUEVO Item: %s de MP %s (necesitaba %s, lote: %s)",
+                    cantidad_final, mp_id, cantidad_necesaria_hoy, mp.cantidad_minima_pedido,
+                    id_orden_compra=oc.id_orden_compra, id_materia_prima=mp_id, cantidad=cantidad_final
+                )
             else:
                 cantidad_anterior = item_oc.cantidad
                 item_oc.cantidad += cantidad_final 
                 item_oc.save()
-                print(f"      - Item existente (MP {mp_id}) en OC {oc.id_orden_compra} AUMENTADO de {cantidad_anterior} a {item_oc.cantidad} (lote: {mp.cantidad_minima_pedido})")
+                eventos.evento(
+                    eventos.Tipo.OC_AGREGADA, "Item existente (MP %s) en OC %s AUMENTADO de %s a %s (lote: %s)",
+                    mp_id, oc.id_orden_compra, cantidad_anterior, item_oc.cantidad, mp.cantidad_minima_pedido,
+                    id_orden_compra=oc.id_orden_compra, id_materia_prima=mp_id, cantidad=cantidad_final
+                )
+
+    ejecucion.fecha_fin = timezone.now()
+    ejecucion.save()
 
-    print("\n--- PLANIFICADOR MRP FINALIZADO ---")
\ No newline at end of file
+    eventos.info("--- PLANIFICADOR MRP FINALIZADO ---")
+    return ops_creadas
@@ -3,33 +3,180 @@ from collections import defaultdict
 from django.utils import timezone
 from django.db import transaction
 # ❗️ Importar Count para chequear tareas restantes
-from django.db.models import Q, Sum, Count 
+from django.db.models import Count
 from datetime import timedelta, date, datetime, time
 
 from produccion.models import (
     OrdenProduccion,
-    LineaProduccion,
     OrdenDeTrabajo,
     EstadoOrdenProduccion,
     EstadoOrdenTrabajo,
     CalendarioProduccion
 )
 
-from recetas.models import ProductoLinea
-from ortools.sat.python import cp_model
+from recetas.models import TiempoCambioLinea
+from reportes.services import marcar_produccion_diaria
+from .cache_capacidad import obtener_capacidades
+from .models import CorridaPlanificacion, SolucionPlanificador
+from . import eventos
+from .calendario_laboral import CalendarioLaboral
+from .solver_despacho import ESTADOS_CON_SOLUCION, dividir_en_subproblemas, resolver_subproblemas
 
 
-HORIZONTE_MINUTOS = 16 * 60
 SOLVER_MAX_SECONDS = 30
-SOLVER_WORKERS = 8
+SOLVER_CAMBIOS_MAX_SECONDS = 10  # Segunda pasada: minimizar los minutos de cambio de producto
+SOLVER_WORKERS = 8  # Workers de CP-SAT por corrida (se reparten entre los procesos)
+SOLVER_PROCESOS = 4  # Subproblemas (líneas) que se resuelven en paralelo
+SOLVER_TAREAS_PARALELO = 50  # Tareas mínimas para usar el pool de procesos
+DIAS_PISTA_OTS = 7  # Antigüedad máxima de las OTs que se usan como pista
 
 
-def ejecutar_planificador(fecha_simulada: date):
+def _dias_con_turno(dia_inicial: date, horizonte_dias: int):
+    """
+    Índices (0 = dia_inicial) de los días del horizonte que tienen turno.
+    El primero siempre cuenta: el calendario ya tiene tareas para ese día.
+    """
+    calendario = CalendarioLaboral(dia_inicial, dia_inicial + timedelta(days=horizonte_dias))
+    return [0] + [
+        d for d in range(1, horizonte_dias)
+        if calendario.es_habil(dia_inicial + timedelta(days=d))
+    ]
+
+
+def _pistas_previas(dia_de_planificacion: date):
+    """
+    Pistas (warm start) de la última solución de horizonte rodante que
+    cubría este día: {id tarea: {"fecha": ..., "inicios": [...]}}.
+    """
+    solucion = SolucionPlanificador.objects.filter(
+        fecha_desde__lt=dia_de_planificacion,
+        horizonte_dias__gt=1
+    ).exclude(pistas={}).order_by('-fecha_creacion').first()
+    if solucion is None:
+        return {}
+    if solucion.fecha_desde + timedelta(days=solucion.horizonte_dias) <= dia_de_planificacion:
+        return {}
+    return solucion.pistas
+
+
+def _pistas_de_ots(dia_de_planificacion: date, ops_ids):
+    """
+    Pistas tomadas de las OTs ya programadas para las mismas OPs: por (OP, línea),
+    los minutos del turno en que arrancaron sus tandas el último día que tuvo OTs
+    (si se re-planifica un día que ya tiene OTs, son exactamente esas).
+    """
+    inicios_por_dia = defaultdict(lambda: defaultdict(list))  # {(op, linea): {dia: [minutos]}}
+    for op_id, linea_id, hora_inicio in OrdenDeTrabajo.objects.filter(
+        id_orden_produccion_id__in=ops_ids,
+        hora_inicio_programada__date__gte=dia_de_planificacion - timedelta(days=DIAS_PISTA_OTS),
+        hora_inicio_programada__date__lte=dia_de_planificacion
+    ).order_by('hora_inicio_programada').values_list(
+        'id_orden_produccion_id', 'id_linea_produccion_id', 'hora_inicio_programada'
+    ):
+        hora_local = timezone.localtime(hora_inicio)
+        inicio_turno = datetime.combine(hora_local.date(), time(6, 0))
+        minutos = int((hora_local.replace(tzinfo=None) - inicio_turno).total_seconds() // 60)
+        inicios_por_dia[(op_id, linea_id)][hora_local.date()].append(minutos)
+
+    return {
+        clave: por_dia[max(por_dia)]
+        for clave, por_dia in inicios_por_dia.items()
+    }
+
+
+def _matriz_cambios(lineas_ids):
+    """ Minutos de setup por (línea, producto origen, producto destino). Lo que no está cargado vale 0. """
+    return {
+        (linea_id, origen_id, destino_id): minutos
+        for linea_id, origen_id, destino_id, minutos in TiempoCambioLinea.objects.filter(
+            id_linea_produccion_id__in=lineas_ids, minutos__gt=0
+        ).values_list('id_linea_produccion_id', 'id_producto_origen_id', 'id_producto_destino_id', 'minutos')
+    }
+
+
+def _posponer_tareas(tareas, fecha_destino):
+    """
+    Mueve tareas del calendario a 'fecha_destino'. El calendario admite una sola
+    tarea por (línea, fecha, OP): si el destino ya tiene una, se le suman la
+    cantidad y las horas y la tarea movida se borra.
+    Devuelve {id de la tarea movida: id de la tarea donde quedó}.
+    """
+    existentes = {
+        (t.id_orden_produccion_id, t.id_linea_produccion_id): t
+        for t in CalendarioProduccion.objects.filter(
+            fecha=fecha_destino,
+            id_orden_produccion_id__in={t.id_orden_produccion_id for t in tareas}
+        )
+    }
+    ids_finales = {}
+    ids_a_borrar = []
+    a_guardar = {}
+    for tarea in tareas:
+        clave = (tarea.id_orden_produccion_id, tarea.id_linea_produccion_id)
+        destino = existentes.get(clave)
+        if destino is None:
+            tarea.fecha = fecha_destino
+            existentes[clave] = tarea
+            a_guardar[tarea.id] = tarea
+            ids_finales[tarea.id] = tarea.id
+        else:
+            destino.cantidad_a_producir += tarea.cantidad_a_producir
+            destino.horas_reservadas += tarea.horas_reservadas
+            a_guardar[destino.id] = destino
+            ids_a_borrar.append(tarea.id)
+            ids_finales[tarea.id] = destino.id
+
+    if ids_a_borrar:
+        CalendarioProduccion.objects.filter(id__in=ids_a_borrar).delete()
+    CalendarioProduccion.objects.bulk_update(
+        a_guardar.values(), ['fecha', 'cantidad_a_producir', 'horas_reservadas']
+    )
+    return ids_finales
+
+
+@eventos.registrar_corrida(CorridaPlanificacion.Origen.PLANIFICADOR)
+def ejecutar_planificador(fecha_simulada: date, horizonte_dias: int = None):
     """
     NUEVA LÓGICA (Solver Táctico / Dispatcher):
     Lee las TAREAS del CalendarioProduccion para "mañana" y
     las optimiza para generar las OrdenesDeTrabajo (OTs).
+
+    HORIZONTE RODANTE (horizonte_dias > 1, default: config PLANIFICADOR_HORIZONTE_DIAS = 1):
+    arma UN modelo con las tareas de los próximos N días, cada una ubicada en el
+    turno de algún día con turno del horizonte. Solo se confirman las OTs del
+    primer día. Las tareas de mañana que no entraron mañana se mueven al día
+    elegido por el solver (no al día siguiente a ciegas); las de días posteriores
+    quedan donde estaban. La solución de esos días se guarda como pista
+    (warm start) para el modelo del día siguiente.
+
+    TANDAS AGRUPADAS (config PLANIFICADOR_TANDAS_AGRUPADAS, default 1): cada tarea
+    del calendario es UN intervalo con todas sus tandas seguidas (en una línea no
+    gana nada intercalarlas con otras tareas) y al guardar se corta en una OT por
+    tanda. Con 0 vuelve al modelo de un intervalo por tanda, con las tandas de
+    cada tarea ordenadas entre sí para romper la simetría.
+
+    CAMBIOS DE PRODUCTO: con la matriz TiempoCambioLinea (setup producto → producto
+    por línea) cargada, el orden en cada línea respeta esos minutos entre tandas.
+    Se resuelve en dos pasadas: primero la producción y, con esa producción fija,
+    el mínimo setup total. En esas líneas las tareas de un solo día pasan a ser
+    opcionales: la que no entra por los setups se pospone como las fallidas.
+
+    SUBPROBLEMAS: cada tarea ya tiene su línea y todas las restricciones son por
+    línea, así que cada línea es un modelo independiente (ver solver_despacho.py).
+    Con PLANIFICADOR_PROCESOS > 1 (default 4) y al menos PLANIFICADOR_TAREAS_PARALELO
+    tareas (default 50) se resuelven en paralelo en un pool de procesos; las OTs
+    de todas se guardan juntas. Si una línea no tiene
+    solución, solo sus tareas se posponen.
+
+    Devuelve los ids de las OTs creadas.
     """
+    from trazabilidad.views import get_config
+
+    if horizonte_dias is None:
+        horizonte_dias = get_config('PLANIFICADOR_HORIZONTE_DIAS', 1)
+    horizonte_dias = max(1, int(horizonte_dias))
+    rodante = horizonte_dias > 1
+    tandas_agrupadas = bool(get_config('PLANIFICADOR_TANDAS_AGRUPADAS', 1))
 
     # ❗️ CORRECCIÓN: El solver SÍ debe correr para "mañana". 
     # El MRP corre para 'fecha_simulada' (hoy) y planifica el futuro.
@@ -40,11 +187,13 @@ def ejecutar_planificador(fecha_simulada: date):
     # borra la línea de arriba y descomenta la siguiente)
     # dia_de_planificacion = fecha_simulada 
     
-    print(f"Iniciando Solver Táctico para {dia_de_planificacion}...")
+    eventos.info("Iniciando Solver Táctico para %s (horizonte: %s días)...", dia_de_planificacion, horizonte_dias)
+    fin_horizonte = dia_de_planificacion + timedelta(days=horizonte_dias)
 
     # ===================================================================
     # ✅ 1) SELECCIONAR TAREAS (CALENDARIO) PARA EL DÍA
     # ===================================================================
+    eventos.paso("Scheduler 1", "Seleccionando tareas del calendario de %s a %s...", dia_de_planificacion, fin_horizonte - timedelta(days=1))
     
     # El Solver ahora busca OPs "Pendiente de inicio" (primer día)
     # O "En proceso" (días siguientes).
@@ -52,67 +201,64 @@ def ejecutar_planificador(fecha_simulada: date):
     # ❗️ CORRECCIÓN: Sacamos "Finalizada" de aquí.
     estados_op_validos = ["Pendiente de inicio", "En proceso", "Finalizada"]
     
-    tasks_today = list(
+    tasks_horizonte = list(
         CalendarioProduccion.objects.filter(
-            fecha=dia_de_planificacion,
+            fecha__gte=dia_de_planificacion,
+            fecha__lt=fin_horizonte,
             id_orden_produccion__id_estado_orden_produccion__descripcion__in=estados_op_validos
         ).select_related(
             'id_orden_produccion__id_producto',
             'id_linea_produccion'
-        ).order_by('id_orden_produccion__id_orden_produccion')
+        ).order_by('fecha', 'id_orden_produccion__id_orden_produccion')
     )
 
-    if not tasks_today:
-        print(f"✅ No hay líneas de calendario ({', '.join(estados_op_validos)}) para planificar en {dia_de_planificacion}.")
-        return
+    if not tasks_horizonte:
+        eventos.info("✅ No hay líneas de calendario (%s) para planificar en %s.", ", ".join(estados_op_validos), dia_de_planificacion)
+        return []
 
     # ===================================================================
     # ✅ 2) OBTENER REGLAS Y LÍNEAS (Sin cambios)
     # ===================================================================
+    eventos.paso("Scheduler 2", "Obteniendo líneas activas y reglas Producto ↔ Línea...")
     
     # ... (Esta sección no cambia) ...
-    lineas_activas = list(
-        LineaProduccion.objects.filter(
-            Q(id_estado_linea_produccion__descripcion="Disponible") |
-            Q(id_estado_linea_produccion__descripcion="Ocupada")
-        )
-    )
-    lineas_activas_ids = set(l.id_linea_produccion for l in lineas_activas)
-    if not lineas_activas:
-        print("❌ No hay líneas disponibles.")
-        return
-    productos_ids = list(set(task.id_orden_produccion.id_producto_id for task in tasks_today))
-    lineas_ids = list(set(task.id_linea_produccion_id for task in tasks_today))
-    reglas = ProductoLinea.objects.filter(
-        id_producto_id__in=productos_ids,
-        id_linea_produccion_id__in=lineas_ids
-    ).values("id_producto_id", "id_linea_produccion_id", "cant_por_hora", "cantidad_minima")
-    capacidad_lookup = {
-        (r["id_producto_id"], r["id_linea_produccion_id"]): {
-            "cant_por_hora": r["cant_por_hora"],
-            "cantidad_minima": r["cantidad_minima"] or 0
-        }
-        for r in reglas
-    }
+    # Líneas activas y reglas salen de la caché de capacidad (se recarga solo si cambiaron)
+    capacidades = obtener_capacidades()
+    lineas_activas_ids = capacidades.lineas_activas
+    if not lineas_activas_ids:
+        eventos.error("❌ No hay líneas disponibles.")
+        return []
+    lineas_ids = list(set(task.id_linea_produccion_id for task in tasks_horizonte))
+    capacidad_lookup = {}
+    for task in tasks_horizonte:
+        clave = (task.id_orden_produccion.id_producto_id, task.id_linea_produccion_id)
+        regla = capacidades.regla(*clave)
+        if regla is not None:
+            capacidad_lookup[clave] = {
+                "cant_por_hora": regla.cant_por_hora,
+                "cantidad_minima": regla.cantidad_minima or 0
+            }
     if not capacidad_lookup:
-        print("❌ No hay reglas Producto ↔ Línea válidas. No se puede planificar.")
-        return
+        eventos.error("❌ No hay reglas Producto ↔ Línea válidas. No se puede planificar.")
+        return []
+    matriz_cambios = _matriz_cambios(lineas_ids)
 
     # ===================================================================
-    # ✅ 3) CREAR MODELO (Basado en TAREAS, no en OPs)
+    # ✅ 3) ARMAR LOS DATOS DEL MODELO (Basado en TAREAS, no en OPs)
     # ===================================================================
-    
-    model = cp_model.CpModel()
-    intervals_por_linea = defaultdict(list)
-    todas_tandas = []
-    all_end_vars = []
-    
-    # Variable auxiliar para calcular el techo de la producción total (para definir la variable del solver)
-    suma_total_objetivo_global = 0
+    eventos.paso("Scheduler 3", "Construyendo el modelo CP-SAT para %s tareas...", len(tasks_horizonte))
 
-    print("✅ Generando tandas según CalendarioProduccion...")
+    dias_con_turno = _dias_con_turno(dia_de_planificacion, horizonte_dias)
+    # Warm start: 1) lo que la corrida anterior (horizonte rodante) planificó para esta tarea,
+    # 2) los horarios de las últimas OTs de la misma OP y línea, 3) el día que tiene en el calendario.
+    pistas = _pistas_previas(dia_de_planificacion) if rodante else {}
+    pistas_ots = _pistas_de_ots(dia_de_planificacion, {t.id_orden_produccion_id for t in tasks_horizonte})
+    tareas_con_pista = defaultdict(int)  # {origen de la pista: cantidad de tareas}
+    tareas_solver = []  # Datos simples de cada tarea para solver_despacho
 
-    for cal_task in tasks_today:
+    eventos.info("✅ Generando tandas según CalendarioProduccion...")
+
+    for cal_task in tasks_horizonte:
         op = cal_task.id_orden_produccion
         linea = cal_task.id_linea_produccion
         producto_id = op.id_producto_id
@@ -122,11 +268,11 @@ def ejecutar_planificador(fecha_simulada: date):
         
         # Validaciones básicas
         if linea.id_linea_produccion not in lineas_activas_ids:
-            print(f"❌ Línea {linea.id_linea_produccion} no está disponible. Omitiendo tarea de OP {op.id_orden_produccion}.")
+            eventos.advertencia("❌ Línea %s no está disponible. Omitiendo tarea de OP %s.", linea.id_linea_produccion, op.id_orden_produccion, op=op.id_orden_produccion)
             continue
             
         if (producto_id, linea.id_linea_produccion) not in capacidad_lookup:
-            print(f"❌ No hay regla para OP {op.id_orden_produccion} en Línea {linea.id_linea_produccion}. Omitiendo.")
+            eventos.advertencia("❌ No hay regla para OP %s en Línea %s. Omitiendo.", op.id_orden_produccion, linea.id_linea_produccion, op=op.id_orden_produccion)
             continue
             
         regla = capacidad_lookup[(producto_id, linea.id_linea_produccion)]
@@ -134,19 +280,38 @@ def ejecutar_planificador(fecha_simulada: date):
         minimo = regla["cantidad_minima"] or 0
         
         if tamano_tanda <= 0:
-            print(f"⚠️ TAMAÑO TANDA 0: OP {op.id_orden_produccion} en línea {linea.id_linea_produccion}")
+            eventos.advertencia("⚠️ TAMAÑO TANDA 0: OP %s en línea %s", op.id_orden_produccion, linea.id_linea_produccion, op=op.id_orden_produccion)
             continue
             
         max_tandas = math.ceil(total_task_qty / tamano_tanda)
         if max_tandas == 0:
             continue
-            
-        task_tandas = [] 
         
         # 🆕 Variable para sumar lo que REALMENTE vamos a pedir al solver
         # (Esto será >= total_task_qty si forzamos mínimos)
         cantidad_objetivo_solver = 0
+
+        # Pistas: día y minutos del turno en que arrancaría cada tanda
+        inicios_pista = dia_pista = None
+        if rodante:
+            pista = pistas.get(str(cal_task.id))
+            dia_pista = (date.fromisoformat(pista["fecha"]) - dia_de_planificacion).days if pista else None
+            if dia_pista in dias_con_turno:
+                inicios_pista, origen_pista = pista["inicios"], "solución anterior"
+            else:
+                dia_pista = (cal_task.fecha - dia_de_planificacion).days
+                inicios_pista = pistas_ots.get((op.id_orden_produccion, linea.id_linea_produccion), [])
+                origen_pista = "OTs" if inicios_pista else "calendario"
+            if dia_pista in dias_con_turno:
+                tareas_con_pista[origen_pista] += 1
+            else:
+                inicios_pista = None
+        elif (op.id_orden_produccion, linea.id_linea_produccion) in pistas_ots:
+            inicios_pista = pistas_ots[(op.id_orden_produccion, linea.id_linea_produccion)]
+            tareas_con_pista["OTs"] += 1
         
+        # Tamaño y duración de cada tanda de la tarea
+        tandas_tarea = []
         for t in range(max_tandas):
             
             # Cálculo del tamaño de esta tanda específica
@@ -157,7 +322,10 @@ def ejecutar_planificador(fecha_simulada: date):
                 if sobra < minimo:
                     # ✅ CORRECCIÓN: En lugar de 'continue', forzamos el mínimo.
                     # Esto evita que la ecuación sea infactible.
-                    print(f"⚠️ Ajuste: Tanda final (OP {op.id_orden_produccion}) de {sobra}u es menor al mínimo ({minimo}u). Se producirá el mínimo ({minimo}u).")
+                    eventos.debug(
+                        "⚠️ Ajuste: Tanda final (OP %s) de %su es menor al mínimo (%su). Se producirá el mínimo (%su).",
+                        op.id_orden_produccion, sobra, minimo, minimo, op=op.id_orden_produccion
+                    )
                     tamano_real = minimo # Producimos un poco de más (Stock sobra)
                 else:
                     tamano_real = sobra
@@ -172,86 +340,137 @@ def ejecutar_planificador(fecha_simulada: date):
             duracion_real = math.ceil(60 * (tamano_real / tamano_tanda))
             if duracion_real <= 0:
                 continue
-                
-            # Variables del Solver
-            lit = model.NewBoolVar(f"cal{cal_task.id}_t{t}")
-            start = model.NewIntVar(0, HORIZONTE_MINUTOS, f"start_{cal_task.id}_{t}")
-            end = model.NewIntVar(0, HORIZONTE_MINUTOS, f"end_{cal_task.id}_{t}")
-            interval = model.NewOptionalIntervalVar(start, duracion_real, end, lit, f"interval_{cal_task.id}_{t}")
-            
-            tanda_info = {
-                "literal": lit, "op": op, "linea": linea, "tamano": tamano_real,
-                "start": start, "end": end, "duracion": duracion_real, "cal_task_id": cal_task.id
-            }
-            
-            todas_tandas.append(tanda_info)
-            task_tandas.append(tanda_info)
-            intervals_por_linea[linea.id_linea_produccion].append(interval)
-            all_end_vars.append(end)
-        
-        # 🆕 RESTRICCIÓN DE CANTIDAD TOTAL
-        # La suma de las tandas activas debe ser igual al objetivo ajustado (incluyendo mínimos forzados)
-        model.Add(sum(tanda["literal"] * tanda["tamano"] for tanda in task_tandas) == cantidad_objetivo_solver)
-        
-        # RESTRICCIÓN DE TIEMPO (Calendario)
-        # Intentamos respetar las horas reservadas en el MRP
-        model.Add(sum(tanda["literal"] * tanda["duracion"] for tanda in task_tandas) <= max_minutos_tarea)
+            tandas_tarea.append((tamano_real, duracion_real))
 
-        # Sumamos al total global para definir el dominio de la variable objetivo
-        suma_total_objetivo_global += cantidad_objetivo_solver
+        if not tandas_tarea:
+            continue
+        tareas_solver.append({
+            "id": cal_task.id,
+            "linea": linea.id_linea_produccion,
+            "producto": producto_id,
+            "tandas": tandas_tarea,
+            "cantidad": cantidad_objetivo_solver,
+            "max_minutos": max_minutos_tarea,
+            "inicios_pista": inicios_pista,
+            "dia_pista": dia_pista,
+        })
+
+    if tareas_con_pista:
+        eventos.info(
+            "♻️ Warm start: pistas para %s tareas (%s).", sum(tareas_con_pista.values()),
+            ", ".join(f"{origen}: {cantidad}" for origen, cantidad in tareas_con_pista.items())
+        )
+
+    # Subproblemas independientes (uno por línea): cada uno es un modelo aparte y,
+    # con PLANIFICADOR_PROCESOS > 1, se resuelven en paralelo en un pool de procesos.
+    # Levantar el pool cuesta un par de segundos: los modelos chicos se resuelven acá.
+    tareas_por_linea = dividir_en_subproblemas(tareas_solver)
+    procesos = 1
+    if len(tareas_solver) >= get_config('PLANIFICADOR_TAREAS_PARALELO', SOLVER_TAREAS_PARALELO):
+        procesos = max(1, min(get_config('PLANIFICADOR_PROCESOS', SOLVER_PROCESOS), len(tareas_por_linea)))
+    config_solver = {
+        "horizonte_dias": horizonte_dias,
+        "dias_con_turno": dias_con_turno,
+        "tandas_agrupadas": tandas_agrupadas,
+        "max_segundos": get_config('PLANIFICADOR_SOLVER_MAX_SEG', SOLVER_MAX_SECONDS),
+        "cambios_max_segundos": get_config('PLANIFICADOR_CAMBIOS_MAX_SEG', SOLVER_CAMBIOS_MAX_SECONDS),
+        "gap_relativo": get_config('PLANIFICADOR_GAP_RELATIVO_PCT', 1) / 100,
+        # Los workers de CP-SAT se reparten entre los procesos
+        "workers": max(1, SOLVER_WORKERS // procesos),
+    }
+    subproblemas = [
+        {
+            "lineas": [linea_id],
+            "tareas": tareas,
+            "cambios": {clave: minutos for clave, minutos in matriz_cambios.items() if clave[0] == linea_id},
+            "config": config_solver,
+        }
+        # Los más grandes primero: el pool reparte mejor la carga
+        for linea_id, tareas in sorted(tareas_por_linea.items(), key=lambda item: -len(item[1]))
+    ]
 
-    # RESTRICCIÓN DE NO SUPERPOSICIÓN
-    for linea_id, intervals in intervals_por_linea.items():
-        model.AddNoOverlap(intervals)
-        
-    # VARIABLES OBJETIVO
-    makespan = model.NewIntVar(0, HORIZONTE_MINUTOS, "makespan")
-    if all_end_vars:
-        model.AddMaxEquality(makespan, all_end_vars)
-    
-    # Maximizar la producción total realizada
-    # (Aunque forzamos la igualdad arriba, esto ayuda al solver a orientarse)
-    produccion_total = model.NewIntVar(0, suma_total_objetivo_global, "produccion_total")
-    model.Add(produccion_total == sum(tanda["literal"] * tanda["tamano"] for tanda in todas_tandas))
-    
-    model.Maximize(produccion_total)
-    
     # ===================================================================
     # ✅ 4) EJECUTAR SOLVER Y GUARDAR
     # ===================================================================
-    solver = cp_model.CpSolver()
-    solver.parameters.max_time_in_seconds = SOLVER_MAX_SECONDS
-    solver.parameters.num_search_workers = SOLVER_WORKERS
-
-    status = solver.Solve(model)
+    cantidad_tandas = sum(len(tarea["tandas"]) for tarea in tareas_solver)
+    eventos.paso(
+        "Scheduler 4", "Resolviendo el modelo (%s tandas, %s subproblemas en %s procesos)...",
+        cantidad_tandas, len(subproblemas), procesos
+    )
+    inicio_solver = timezone.now()
+    resultados = resolver_subproblemas(subproblemas, procesos)
+    tiempo_solver = (timezone.now() - inicio_solver).total_seconds()
+
+    resultados_ok = [r for r in resultados if r["estado"] in ESTADOS_CON_SOLUCION]
+    for resultado in resultados:
+        eventos.debug(
+            "Línea %s: %s en %.2fs (%s variables, %s tareas programadas).",
+            resultado["lineas"], resultado["estado"], resultado["tiempo"],
+            resultado["num_variables"], len(resultado["tareas"])
+        )
+        if resultado["estado"] not in ESTADOS_CON_SOLUCION:
+            eventos.error("❌ Línea %s: sin solución (%s). Sus tareas de mañana se posponen.", resultado["lineas"], resultado["estado"])
+
+    if not resultados:
+        estado_global = "MODEL_INVALID"
+    elif len(resultados_ok) < len(resultados):
+        estado_global = next(r["estado"] for r in resultados if r["estado"] not in ESTADOS_CON_SOLUCION)
+    elif all(r["estado"] == "OPTIMAL" for r in resultados):
+        estado_global = "OPTIMAL"
+    else:
+        estado_global = "FEASIBLE"
+
+    solucion_guardada = SolucionPlanificador.objects.create(
+        fecha_desde=dia_de_planificacion,
+        horizonte_dias=horizonte_dias,
+        estado_solver=estado_global,
+        objetivo=sum(r["objetivo"] for r in resultados_ok) if resultados_ok else None,
+        mejor_cota=sum(r["mejor_cota"] for r in resultados_ok) if resultados_ok else None,
+        tiempo_solver_seg=tiempo_solver,
+        conflictos=sum(r["conflictos"] for r in resultados),
+        ramas=sum(r["ramas"] for r in resultados),
+        num_tareas=len(tasks_horizonte),
+        num_tandas=cantidad_tandas,
+        num_variables=sum(r["num_variables"] for r in resultados),
+        num_restricciones=sum(r["num_restricciones"] for r in resultados),
+        tareas_con_pista=sum(tareas_con_pista.values()),
+        minutos_cambio=sum(r["minutos_cambio"] for r in resultados_ok),
+        num_subproblemas=len(subproblemas)
+    )
+    eventos.info(
+        "⏱️ Solver: %s en %.2fs (%s subproblemas, %s variables, %s restricciones, %s conflictos).",
+        solucion_guardada.estado_solver, solucion_guardada.tiempo_solver_seg, solucion_guardada.num_subproblemas,
+        solucion_guardada.num_variables, solucion_guardada.num_restricciones, solucion_guardada.conflictos
+    )
+    if solucion_guardada.minutos_cambio:
+        eventos.info("🧽 Cambios de producto: %s minutos de setup en total.", solucion_guardada.minutos_cambio)
 
     # --- ❗️ INICIO DE CORRECCIÓN 2 ---
     # Lógica de "Snooze" (posponer) si el solver falla
     # ---
-    if status not in (cp_model.FEASIBLE, cp_model.OPTIMAL):
-        print(f"❌ No se pudo generar una planificación para {dia_de_planificacion}. (El plan era infactible)")
+    if not resultados_ok:
+        eventos.error("❌ No se pudo generar una planificación para %s. (El plan era infactible)", dia_de_planificacion)
         
         # "Snooze button": Mover las tareas de hoy a mañana
         tomorrow = dia_de_planificacion + timedelta(days=1)
-        task_ids_to_move = [t.id for t in tasks_today]
+        tasks_to_move = [t for t in tasks_horizonte if t.fecha == dia_de_planificacion]
         
         # 1. Mover las tareas a mañana
-        #    (Esto es una simplificación. Idealmente, "combinaría"
-        #     las horas/cantidad con una tarea existente de mañana)
-        tasks_movidas = CalendarioProduccion.objects.filter(
-            id__in=task_ids_to_move
-        ).update(fecha=tomorrow)
+        #    (si mañana ya hay una tarea de la misma OP y línea, se combinan)
+        with transaction.atomic():
+            tasks_movidas = len(_posponer_tareas(tasks_to_move, tomorrow))
         
         # 2. NO cambiamos el estado de la OP. La dejamos 'En proceso' / 'Pendiente de inicio'.
         
-        print(f"⚠️ {tasks_movidas} tareas del calendario pospuestas de {dia_de_planificacion} a {tomorrow}.")
-        print(f"   La OP asociada seguirá 'En proceso' o 'Pendiente de inicio' y se re-intentará mañana.")
-        return # Terminar la ejecución de hoy
+        eventos.advertencia("⚠️ %s tareas del calendario pospuestas de %s a %s.", tasks_movidas, dia_de_planificacion, tomorrow)
+        eventos.info("La OP asociada seguirá 'En proceso' o 'Pendiente de inicio' y se re-intentará mañana.")
+        return [] # Terminar la ejecución de hoy
     # ---
     # ❗️ FIN DE CORRECCIÓN 2
     # ---
 
     # ✅ Guardar resultados
+    eventos.paso("Scheduler 4.1", "Guardando OTs y actualizando calendario y OPs...")
     estado_ot = EstadoOrdenTrabajo.objects.get(descripcion="Pendiente")
     estado_op_planificada = EstadoOrdenProduccion.objects.get(descripcion="Planificada")
     # estado_op_en_espera = EstadoOrdenProduccion.objects.get(descripcion="En espera") # Ya no lo usamos aquí
@@ -262,42 +481,78 @@ def ejecutar_planificador(fecha_simulada: date):
     ops_planificadas_exitosamente = set() # ID de OPs con OTs creadas
     cal_tasks_exitosas_ids = set() # ID de Tareas del Calendario completadas
 
-    for tanda in todas_tandas:
-        if solver.Value(tanda["literal"]):
-            ini = solver.Value(tanda["start"])
-            fin = solver.Value(tanda["end"])
-            ots_creadas.append(
-                OrdenDeTrabajo(
-                    id_orden_produccion=tanda["op"],
-                    id_linea_produccion=tanda["linea"],
-                    cantidad_programada=tanda["tamano"],
-                    hora_inicio_programada=hora_base_dt + timezone.timedelta(minutes=ini),
-                    hora_fin_programada=hora_base_dt + timezone.timedelta(minutes=fin),
-                    id_estado_orden_trabajo=estado_ot
+    # Tareas programadas por el solver (de todos los subproblemas con solución)
+    tareas_por_id = {task.id: task for task in tasks_horizonte}
+    tareas_programadas = {}
+    for resultado in resultados_ok:
+        tareas_programadas.update(resultado["tareas"])
+
+    for id_tarea, programada in tareas_programadas.items():
+        # Con horizonte rodante solo se confirman las tandas del primer día
+        if programada["dia"] != 0:
+            continue
+        cal_task = tareas_por_id[id_tarea]
+        for ini, tandas in programada["bloques"]:
+            # Una OT por tanda (con tandas agrupadas, una detrás de otra dentro del intervalo)
+            for tamano, duracion in tandas:
+                ots_creadas.append(
+                    OrdenDeTrabajo(
+                        id_orden_produccion=cal_task.id_orden_produccion,
+                        id_linea_produccion=cal_task.id_linea_produccion,
+                        cantidad_programada=tamano,
+                        hora_inicio_programada=hora_base_dt + timezone.timedelta(minutes=ini),
+                        hora_fin_programada=hora_base_dt + timezone.timedelta(minutes=ini + duracion),
+                        id_estado_orden_trabajo=estado_ot
+                    )
                 )
-            )
-            ops_planificadas_exitosamente.add(tanda["op"].id_orden_produccion)
-            cal_tasks_exitosas_ids.add(tanda["cal_task_id"])
+                ini += duracion
+        ops_planificadas_exitosamente.add(cal_task.id_orden_produccion_id)
+        cal_tasks_exitosas_ids.add(id_tarea)
 
     
     # --- Lógica de actualización de estado (SIN CAMBIOS, YA ERA CORRECTA) ---
     
-    # (IDs de tareas que deberían haber corrido pero que el solver no pudo/decidió no planificar)
-    cal_tasks_originales_ids = set(task.id for task in tasks_today)
-    cal_tasks_fallidas_ids = cal_tasks_originales_ids - cal_tasks_exitosas_ids
+    # Horizonte rodante: tareas que el solver ubicó en un día posterior del horizonte.
+    # Las de mañana se mueven a ese día; de todas se guarda la pista para el modelo de mañana.
+    tareas_reprogramadas = defaultdict(list)  # {nueva fecha: [tareas de mañana]}
+    pistas_nuevas = {}
+    for id_tarea, programada in tareas_programadas.items():
+        if programada["dia"] == 0:
+            continue
+        cal_task = tareas_por_id[id_tarea]
+        nueva_fecha = dia_de_planificacion + timedelta(days=programada["dia"])
+        if cal_task.fecha == dia_de_planificacion:
+            tareas_reprogramadas[nueva_fecha].append(cal_task)
+        pistas_nuevas[id_tarea] = {
+            "fecha": nueva_fecha.isoformat(),
+            "inicios": programada["inicios"]
+        }
+
+    # (IDs de tareas de mañana que el solver no pudo/decidió no planificar en el horizonte;
+    #  las de días posteriores que no entraron quedan en su fecha y se reintentan mañana)
+    cal_tasks_originales_ids = set(task.id for task in tasks_horizonte if task.fecha == dia_de_planificacion)
+    cal_tasks_fallidas_ids = cal_tasks_originales_ids - cal_tasks_exitosas_ids - {
+        cal_task.id for tareas in tareas_reprogramadas.values() for cal_task in tareas
+    }
 
 
     with transaction.atomic():
         # 1. Crear las OTs
         OrdenDeTrabajo.objects.bulk_create(ots_creadas)
-        print(f"✅ {len(ots_creadas)} OTs creadas exitosamente para {dia_de_planificacion}.")
+        # Sin señales: ver reportes/signals.py
+        for ot in ots_creadas:
+            marcar_produccion_diaria(ot.id_linea_produccion_id, ot.hora_inicio_programada)
+        eventos.evento(
+            eventos.Tipo.OT_CREADA, "✅ %s OTs creadas exitosamente para %s.", len(ots_creadas), dia_de_planificacion,
+            ops=sorted(ops_planificadas_exitosamente)
+        )
 
         # 2. Limpiar TAREAS de Calendario exitosas
         if cal_tasks_exitosas_ids:
             reservas_blandas_borradas = CalendarioProduccion.objects.filter(
                 id__in=cal_tasks_exitosas_ids
             ).delete()
-            print(f"🧹 Limpiadas {reservas_blandas_borradas[0]} reservas de calendario EXITOSAS.")
+            eventos.info("🧹 Limpiadas %s reservas de calendario EXITOSAS.", reservas_blandas_borradas[0])
         
         # 3. Actualizar estado de OPs exitosas
         if ops_planificadas_exitosamente:
@@ -309,7 +564,7 @@ def ejecutar_planificador(fecha_simulada: date):
             ).update(id_estado_orden_produccion=estado_op_en_proceso)
             
             if ops_actualizadas_a_proceso > 0:
-                print(f"✅ {ops_actualizadas_a_proceso} OPs movidas de 'Pendiente de inicio' a 'En proceso'.")
+                eventos.evento(eventos.Tipo.OP_ESTADO, "✅ %s OPs movidas de 'Pendiente de inicio' a 'En proceso'.", ops_actualizadas_a_proceso)
 
             # Buscamos OPs que (después de borrar) ya no tengan tareas futuras
             ops_para_chequear_finalizacion = ops_planificadas_exitosamente
@@ -324,23 +579,40 @@ def ejecutar_planificador(fecha_simulada: date):
 
             if ops_sin_tareas_futuras.exists():
                 ids_ops_finalizadas = list(ops_sin_tareas_futuras.values_list('id_orden_produccion', flat=True))
-                print(f"🎉 OPs {ids_ops_finalizadas} han completado su última tarea de calendario.")
+                eventos.evento(eventos.Tipo.OP_ESTADO, "🎉 OPs %s han completado su última tarea de calendario.", ids_ops_finalizadas, ops=ids_ops_finalizadas)
                 
                 # Las movemos a "Planificada"
                 ops_sin_tareas_futuras.update(id_estado_orden_produccion=estado_op_planificada)
 
-        # 4. Gestionar Tareas que FALLARON hoy (Snooze)
+        # 4. Horizonte rodante: mover las tareas de mañana al día elegido por el solver y guardar las pistas
+        if rodante:
+            for nueva_fecha, tareas in tareas_reprogramadas.items():
+                for id_movida, id_final in _posponer_tareas(tareas, nueva_fecha).items():
+                    if id_movida != id_final:
+                        # Se combinó con otra tarea: la pista queda para la que sigue en el calendario
+                        pistas_nuevas.setdefault(id_final, pistas_nuevas.pop(id_movida))
+            eventos.info(
+                "📅 Horizonte de %s días: %s tareas planificadas para días posteriores (%s de mañana movidas a su día).",
+                horizonte_dias, len(pistas_nuevas), sum(len(tareas) for tareas in tareas_reprogramadas.values())
+            )
+            solucion_guardada.pistas = {str(id_tarea): pista for id_tarea, pista in pistas_nuevas.items()}
+            solucion_guardada.save(update_fields=['pistas'])
+
+        # 5. Gestionar Tareas que FALLARON hoy (Snooze)
         if cal_tasks_fallidas_ids:
-            print(f"⚠️ {len(cal_tasks_fallidas_ids)} TAREAS de Calendario no pudieron ser planificadas hoy por el solver (maximizando).")
+            eventos.advertencia("⚠️ %s TAREAS de Calendario no pudieron ser planificadas hoy por el solver (maximizando).", len(cal_tasks_fallidas_ids))
             
-            tomorrow = dia_de_planificacion + timedelta(days=1)
+            # Con horizonte rodante, las que no entraron en ningún día del horizonte van al día siguiente a él
+            tomorrow = fin_horizonte
             
             # ❗️ "Snooze button" para las tareas que el solver decidió no hacer
-            tasks_movidas = CalendarioProduccion.objects.filter(
-                id__in=cal_tasks_fallidas_ids
-            ).update(fecha=tomorrow)
+            tasks_movidas = len(_posponer_tareas(
+                [t for t in tasks_horizonte if t.id in cal_tasks_fallidas_ids], tomorrow
+            ))
             
-            print(f"⚠️ {tasks_movidas} tareas NO planificadas fueron pospuestas a {tomorrow}.")
+            eventos.advertencia("⚠️ %s tareas NO planificadas fueron pospuestas a %s.", tasks_movidas, tomorrow)
+
+    return [ot.id_orden_trabajo for ot in ots_creadas]
 
 
 # ---
@@ -7,14 +7,18 @@ from django.db.models.functions import Coalesce
 from django.utils import timezone
 import math
 from ventas.models import OrdenVenta, EstadoVenta
-from recetas.models import ProductoLinea
 from produccion.models import EstadoOrdenProduccion, OrdenProduccion, CalendarioProduccion, OrdenProduccionPegging, EstadoOrdenTrabajo
+from .cache_capacidad import obtener_capacidades
+from .capacidad import LibroCapacidad
+from .models import CorridaPlanificacion
+from . import eventos
 # Constantes
 HORAS_LABORABLES_POR_DIA = 16
 DIAS_BUFFER_ENTREGA_PT = 1  # Días de buffer entre fin de producción y entrega al cliente
 
 
 
+@eventos.registrar_corrida(CorridaPlanificacion.Origen.REPLANIFICACION_CAPACIDAD)
 @transaction.atomic
 def replanificar_ops_por_capacidad(
     fecha_simulada: date, 
@@ -31,10 +35,11 @@ def replanificar_ops_por_capacidad(
     # Fecha mínima: pasado mañana (o el valor de dias_minimo_a_replanificar)
     fecha_minima_replanificacion = hoy + timedelta(days=dias_minimo_a_replanificar) 
     
-    print(f"--- INICIANDO REPLANIFICACIÓN POR CAPACIDAD ({hoy}) ---")
-    print(f"--- Foco: OPs con reservas a partir de: {fecha_minima_replanificacion} ---")
+    eventos.info("--- INICIANDO REPLANIFICACIÓN POR CAPACIDAD (%s) ---", hoy)
+    eventos.info("--- Foco: OPs con reservas a partir de: %s ---", fecha_minima_replanificacion)
 
     # 1. Obtener Estados Necesarios
+    eventos.paso("Replanificación 1", "Obteniendo estados base...")
     try:
         estado_op_en_espera = EstadoOrdenProduccion.objects.get(descripcion="En espera")
         estado_op_pendiente_inicio = EstadoOrdenProduccion.objects.get(descripcion="Pendiente de inicio")
@@ -47,7 +52,7 @@ def replanificar_ops_por_capacidad(
         estado_ot_en_proceso = EstadoOrdenTrabajo.objects.get(descripcion__iexact="En progreso")
         # Ajusta "Completada" o "Finalizada" según tu BD
     except Exception as e:
-        print(f"¡ERROR! No se pudieron obtener estados base: {e}")
+        eventos.error("¡ERROR! No se pudieron obtener estados base: %s", e)
         raise 
         
     estados_activos_para_replanificar = [
@@ -64,6 +69,7 @@ def replanificar_ops_por_capacidad(
     ]
     
     # 2. Filtrar OPs Elegibles y Calcular Cantidad Pendiente
+    eventos.paso("Replanificación 2", "Filtrando OPs elegibles y calculando cantidad pendiente...")
     ops_elegibles_query = OrdenProduccion.objects.filter(
         # Filtro A: Estado Activo (Incluye 'Planificada')
         id_estado_orden_produccion__in=estados_activos_para_replanificar,
@@ -94,7 +100,18 @@ def replanificar_ops_por_capacidad(
         
     ops_a_replanificar = list(ops_elegibles_query)
     
-    print(f"   > Encontradas {len(ops_a_replanificar)} OPs elegibles para replanificar.")
+    eventos.info("Encontradas %s OPs elegibles para replanificar.", len(ops_a_replanificar))
+
+    eventos.paso("Replanificación 3-8", "Replanificando %s OPs sobre el calendario...", len(ops_a_replanificar))
+
+    # Libro de capacidad: una sola consulta al calendario para todas las OPs
+    libro_capacidad = LibroCapacidad(
+        HORAS_LABORABLES_POR_DIA,
+        estados_op=estados_activos_para_replanificar,
+        fecha_desde=fecha_minima_replanificacion
+    )
+    # Reglas Producto ↔ Línea: una foto para toda la corrida (no un aggregate por OP)
+    capacidades = obtener_capacidades()
     
     for op in ops_a_replanificar:
         
@@ -102,29 +119,26 @@ def replanificar_ops_por_capacidad(
         producto = op.id_producto
         
         # 3.1 Recalcular Horas Necesarias con la Capacidad ACTUAL (para la cantidad restante)
-        capacidades_linea = ProductoLinea.objects.filter(id_producto=producto)
-        cant_total_por_hora = capacidades_linea.aggregate(total=Sum('cant_por_hora'))['total'] or 0
+        capacidades_linea = capacidades.reglas(producto.id_producto)
+        cant_total_por_hora = capacidades.capacidad_total_por_hora(producto.id_producto)
         
         if cant_total_por_hora <= 0:
-            print(f"     !ERROR: Capacidad 0/hr para {producto.nombre}. No se puede replanificar.")
+            eventos.error("!ERROR: Capacidad 0/hr para %s. No se puede replanificar.", producto.nombre, op=op.id_orden_produccion)
             continue
             
         horas_necesarias_float = float(cantidad_a_producir_restante) / float(cant_total_por_hora)
         horas_necesarias_totales = math.ceil(horas_necesarias_float)
 
-        print(f"\n   --- Replanificando OP {op.id_orden_produccion} ({producto.nombre}).")
-        print(f"     > Cantidad restante: {cantidad_a_producir_restante} u. Nuevas horas requeridas: {horas_necesarias_totales} hs.")
+        eventos.debug("--- Replanificando OP %s (%s).", op.id_orden_produccion, producto.nombre, op=op.id_orden_produccion)
+        eventos.debug("Cantidad restante: %s u. Nuevas horas requeridas: %s hs.", cantidad_a_producir_restante, horas_necesarias_totales, op=op.id_orden_produccion)
 
         # 4. Modificación: Borrar solo las reservas a partir de la fecha mínima de replanificación
         # Obtener la fecha a partir de la cual se considerará 'futuro'
         fecha_borrado_minima = fecha_minima_replanificacion 
         
-        CalendarioProduccion.objects.filter(
-            id_orden_produccion=op,
-            # 🚨 FILTRO CLAVE: Solo borra las reservas en o después de la fecha mínima
-            fecha__gte=fecha_borrado_minima 
-        ).delete()
-        print(f"     > Eliminadas reservas a partir de: {fecha_borrado_minima}.")
+        # 🚨 FILTRO CLAVE: Solo borra las reservas en o después de la fecha mínima
+        libro_capacidad.liberar_op(op, fecha_desde=fecha_borrado_minima)
+        eventos.debug("Eliminadas reservas a partir de: %s.", fecha_borrado_minima, op=op.id_orden_produccion)
         
         # 5. Determinar Fecha de Inicio Mínima (punto de partida)
         # El punto de partida es el máximo entre la fecha de replanificación forzosa (fecha_minima_replanificacion)
@@ -134,19 +148,7 @@ def replanificar_ops_por_capacidad(
             fecha_minima_replanificacion
         )
         
-       # 6. Walk the Calendar (Buscar nuevo hueco)
-        cantidad_pendiente_op = cantidad_a_producir_restante
-        horas_pendientes = horas_necesarias_totales 
-        fecha_a_buscar = fecha_inicio_minima_real
-        
-        while fecha_a_buscar.weekday() >= 5: fecha_a_buscar += timedelta(days=1) 
-
-        fecha_inicio_real_asignada = None
-        ultimo_dia_trabajado = None
-        
-        # 💡 CORRECCIÓN CRÍTICA: La lista debe inicializarse aquí
-        reservas_a_crear_bulk = [] 
-        
+        # 6. Walk the Calendar (Buscar nuevo hueco)
         # 🚨 AJUSTE DE CANTIDAD PENDIENTE (Implementado previamente)
         cantidad_reservada_no_borrada = CalendarioProduccion.objects.filter(
             id_orden_produccion=op,
@@ -155,104 +157,34 @@ def replanificar_ops_por_capacidad(
             total_reservado=Coalesce(Sum('cantidad_a_producir'), 0)
         )['total_reservado']
 
-        cantidad_pendiente_op -= cantidad_reservada_no_borrada
+        cantidad_pendiente_op = cantidad_a_producir_restante - cantidad_reservada_no_borrada
         
         if cantidad_pendiente_op <= 0:
-            print(f"     > Cantidad cubierta por reservas existentes no borradas. Saltando OP.")
+            eventos.debug("Cantidad cubierta por reservas existentes no borradas. Saltando OP.", op=op.id_orden_produccion)
             continue # <--- Esto hace que el código salte el resto del bucle y vaya a la siguiente OP
-            
-        horas_necesarias_float_nueva = float(cantidad_pendiente_op) / float(cant_total_por_hora)
-        horas_pendientes = math.ceil(horas_necesarias_float_nueva) 
-        horas_pendientes = max(0, horas_pendientes)
-        
-        # --- INICIO LÓGICA DE CALENDAR WALK ---
-        while horas_pendientes > 0 and cantidad_pendiente_op > 0:
-            horas_libres_cuello_botella = HORAS_LABORABLES_POR_DIA
-            lineas_ids_producto = [c.id_linea_produccion_id for c in capacidades_linea]
-            
-            # Carga existente de OPs activas
-            carga_existente = CalendarioProduccion.objects.filter(
-                id_linea_produccion_id__in=lineas_ids_producto,
-                fecha=fecha_a_buscar,
-                id_orden_produccion__id_estado_orden_produccion__in=estados_activos_para_replanificar
-            ).values('id_linea_produccion_id').annotate(
-                total_reservado=Sum('horas_reservadas')
-            ).values('id_linea_produccion_id', 'total_reservado')
-            
-            carga_por_linea = {c['id_linea_produccion_id']: float(c['total_reservado']) for c in carga_existente}
-
-            for linea_id in lineas_ids_producto:
-                carga_dia = carga_por_linea.get(linea_id, 0.0)
-                horas_libres_linea = max(0, HORAS_LABORABLES_POR_DIA - carga_dia)
-                horas_libres_cuello_botella = min(horas_libres_cuello_botella, horas_libres_linea)
-
-            horas_libres_enteras = math.floor(horas_libres_cuello_botella)
 
-            if horas_libres_enteras <= 0:
-                fecha_a_buscar += timedelta(days=1)
-                while fecha_a_buscar.weekday() >= 5: fecha_a_buscar += timedelta(days=1)
-                continue
-                    
-            horas_a_reservar_hoy = min(horas_pendientes, horas_libres_enteras) 
-            se_reservo_tiempo_en_fecha = False
-
-            for cap_linea in capacidades_linea:
-                cantidad_calculada_linea = round(float(horas_a_reservar_hoy) * float(cap_linea.cant_por_hora))
-                cantidad_real_linea = min(cantidad_pendiente_op, cantidad_calculada_linea)
-
-                if horas_a_reservar_hoy > 0 and cantidad_real_linea > 0:
-                    se_reservo_tiempo_en_fecha = True 
-                    
-                    reservas_a_crear_bulk.append(
-                        CalendarioProduccion(
-                            id_orden_produccion=op, 
-                            id_linea_produccion=cap_linea.id_linea_produccion,
-                            fecha=fecha_a_buscar,
-                            horas_reservadas=horas_a_reservar_hoy,
-                            cantidad_a_producir=cantidad_real_linea
-                        )
-                    )
-                    cantidad_pendiente_op -= cantidad_real_linea
-                    
-                    if cantidad_pendiente_op <= 0: break 
-            
-            if se_reservo_tiempo_en_fecha:
-                horas_pendientes -= horas_a_reservar_hoy 
-                ultimo_dia_trabajado = fecha_a_buscar
-                if fecha_inicio_real_asignada is None:
-                    fecha_inicio_real_asignada = fecha_a_buscar
-            
-            if cantidad_pendiente_op <= 0:
-                horas_pendientes = 0 
-                break
-
-            fecha_a_buscar += timedelta(days=1)
-            while fecha_a_buscar.weekday() >= 5: fecha_a_buscar += timedelta(days=1)
-            
-            if cantidad_pendiente_op > 0:
-                # Recalcular horas pendientes en base a la cantidad restante
-                horas_necesarias_float_nueva = float(cantidad_pendiente_op) / float(cant_total_por_hora)
-                horas_pendientes = math.ceil(horas_necesarias_float_nueva) 
-        # --- FIN LÓGICA DE CALENDAR WALK ---
+        # Días hábiles con horas libres; cada día, hasta las horas que faltan para la cantidad pendiente
+        fecha_inicio_real_asignada, ultimo_dia_trabajado = libro_capacidad.reservar_op(
+            op, capacidades_linea, cantidad_pendiente_op, fecha_inicio_minima_real
+        )
 
         # 7. Guardar OP y Calendario Nuevos
         if fecha_inicio_real_asignada is None:
             fecha_inicio_real_asignada = fecha_inicio_minima_real
 
         fecha_fin_real_asignada = ultimo_dia_trabajado if ultimo_dia_trabajado else fecha_inicio_real_asignada
-        while fecha_fin_real_asignada.weekday() >= 5:
-             fecha_fin_real_asignada -= timedelta(days=1)
-        if fecha_fin_real_asignada < fecha_inicio_real_asignada:
-            fecha_fin_real_asignada = fecha_inicio_real_asignada
 
         op.fecha_planificada = timezone.make_aware(datetime.combine(fecha_inicio_real_asignada, datetime.min.time()))
         op.fecha_fin_planificada = fecha_fin_real_asignada
         # No cambiamos el estado aquí, se mantiene 'Planificada', 'En espera' o 'Pendiente de inicio'
         op.save(update_fields=['fecha_planificada', 'fecha_fin_planificada'])
         
-        CalendarioProduccion.objects.bulk_create(reservas_a_crear_bulk)
-        
-        print(f"     ✅ OP {op.id_orden_produccion} REPLANIFICADA. Nuevo rango: {op.fecha_planificada.date()} a {op.fecha_fin_planificada}.")
+        eventos.evento(
+            eventos.Tipo.OP_REPLANIFICADA, "✅ OP %s REPLANIFICADA. Nuevo rango: %s a %s.",
+            op.id_orden_produccion, op.fecha_planificada.date(), op.fecha_fin_planificada,
+            op=op.id_orden_produccion, fecha_inicio=op.fecha_planificada.date(), fecha_fin=op.fecha_fin_planificada,
+            cantidad_restante=cantidad_a_producir_restante, horas=horas_necesarias_totales
+        )
 
         # 8. Revisar y Desplazar OVs Vinculadas
         peggings = OrdenProduccionPegging.objects.filter(id_orden_produccion=op).select_related('id_orden_venta_producto__id_orden_venta')
@@ -262,11 +194,10 @@ def replanificar_ops_por_capacidad(
             dias_totales_margen = DIAS_BUFFER_ENTREGA_PT + 1
             
             # 1. Calcular la nueva fecha sugerida de entrega (objeto datetime.date)
-            nueva_fecha_entrega_sugerida_date = op.fecha_fin_planificada + timedelta(days=dias_totales_margen)
-            
-            # Asegurar que el día sugerido sea laborable
-            while nueva_fecha_entrega_sugerida_date.weekday() >= 5:
-                nueva_fecha_entrega_sugerida_date += timedelta(days=1) 
+            # (asegurando que el día sugerido sea laborable)
+            nueva_fecha_entrega_sugerida_date = libro_capacidad.calendario.habil_desde(
+                op.fecha_fin_planificada + timedelta(days=dias_totales_margen)
+            )
 
             # 2. Obtener la fecha de entrega original de la OV como DATE
             # Esto resuelve el TypeError (date vs datetime), ya que ov.fecha_entrega es un DateTimeField
@@ -285,15 +216,28 @@ def replanificar_ops_por_capacidad(
 
             if hay_retraso:
                 # Se activa la alerta y se actualiza el estado
-                print(f"     🚨 ¡ALERTA! OV {ov.id_orden_venta} desplazada a {nueva_fecha_entrega_sugerida_date}. (RETRASO)")
+                eventos.evento(
+                    eventos.Tipo.ENTREGA_RETRASADA, "🚨 ¡ALERTA! OV %s desplazada a %s. (RETRASO)",
+                    ov.id_orden_venta, nueva_fecha_entrega_sugerida_date, nivel=eventos.Nivel.ADVERTENCIA,
+                    op=op.id_orden_produccion, ov=ov.id_orden_venta,
+                    fecha_anterior=fecha_entrega_ov_original_date, fecha_nueva=nueva_fecha_entrega_sugerida_date
+                )
                 ov.id_estado_venta = estado_ov_en_preparacion 
                 campos_a_actualizar.append('id_estado_venta')
             elif hay_avance:
                 # Solo se registra el avance, el estado se deja como está
-                print(f"     🎉 ¡AVANCE! OV {ov.id_orden_venta} adelantada a {nueva_fecha_entrega_sugerida_date}.")
+                eventos.evento(
+                    eventos.Tipo.ENTREGA_ADELANTADA, "🎉 ¡AVANCE! OV %s adelantada a %s.",
+                    ov.id_orden_venta, nueva_fecha_entrega_sugerida_date,
+                    op=op.id_orden_produccion, ov=ov.id_orden_venta,
+                    fecha_anterior=fecha_entrega_ov_original_date, fecha_nueva=nueva_fecha_entrega_sugerida_date
+                )
 
             # 6. Guardar los cambios en la OV
             ov.save(update_fields=campos_a_actualizar)
 
-    print("\n--- REPLANIFICACIÓN POR CAPACIDAD FINALIZADA ---")
+    reservas_creadas = libro_capacidad.guardar()
+    eventos.info("Calendario: %s reservas creadas en un único bulk_create.", reservas_creadas)
+
+    eventos.info("--- REPLANIFICACIÓN POR CAPACIDAD FINALIZADA ---")
     return True
\ No newline at end of file
@@ -0,0 +1,43 @@
+from rest_framework import serializers
+from .models import TrabajoPlanificacion, CorridaPlanificacion, EventoPlanificacion, MedicionPaso, DiaNoLaborable
+
+
+class TrabajoPlanificacionSerializer(serializers.ModelSerializer):
+    """ Estado del trabajo (sin el log ni el resultado, para listados). """
+    class Meta:
+        model = TrabajoPlanificacion
+        exclude = ["log", "resultado"]
+
+
+class TrabajoPlanificacionDetalleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TrabajoPlanificacion
+        fields = "__all__"
+
+
+class CorridaPlanificacionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CorridaPlanificacion
+        fields = "__all__"
+
+
+class EventoPlanificacionSerializer(serializers.ModelSerializer):
+    nivel_display = serializers.CharField(source="get_nivel_display", read_only=True)
+
+    class Meta:
+        model = EventoPlanificacion
+        exclude = ["corrida"]
+
+
+class MedicionPasoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MedicionPaso
+        exclude = ["corrida"]
+
+
+class DiaNoLaborableSerializer(serializers.ModelSerializer):
+    tipo_display = serializers.CharField(source="get_tipo_display", read_only=True)
+
+    class Meta:
+        model = DiaNoLaborable
+        fields = "__all__"
@@ -0,0 +1,49 @@
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from produccion.models import LineaProduccion
+from recetas.models import ProductoLinea
+from .cache_capacidad import ESTADOS_LINEA_ACTIVOS, invalidar_capacidades
+
+
+# ------------------------------------------------------------------
+# Capacidad: reglas Producto ↔ Línea y estado de las líneas
+# ------------------------------------------------------------------
+# Quien cambie ProductoLinea o LineaProduccion sin señales (ver stock/signals.py)
+# llama a invalidar_capacidades().
+
+@receiver(post_save, sender=ProductoLinea)
+@receiver(post_delete, sender=ProductoLinea)
+@receiver(post_delete, sender=LineaProduccion)
+def invalidar_cache_capacidad(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidar_capacidades()
+
+
+@receiver(pre_save, sender=LineaProduccion)
+def recordar_estado_anterior_de_linea(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    instance._estado_anterior = LineaProduccion.objects.filter(pk=instance.pk).values_list(
+        'id_estado_linea_produccion_id', 'id_estado_linea_produccion__descripcion'
+    ).first()
+
+
+@receiver(post_save, sender=LineaProduccion)
+def linea_modificada(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_estado_anterior', None)
+    instance._estado_anterior = None
+    # La foto solo guarda qué líneas están activas: las vistas de OTs pasan la línea
+    # de 'Disponible' a 'Ocupada' y vuelta en cada inicio / fin, y eso no la cambia
+    # (así no se escribe la versión en cada OT)
+    if not created and anterior is not None:
+        estado_id, descripcion = anterior
+        if estado_id == instance.id_estado_linea_produccion_id:
+            return
+        nueva = instance.id_estado_linea_produccion.descripcion
+        if (descripcion in ESTADOS_LINEA_ACTIVOS) == (nueva in ESTADOS_LINEA_ACTIVOS):
+            return
+    invalidar_capacidades()
@@ -0,0 +1,365 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from compras.models import OrdenCompraMateriaPrima
+from produccion.models import LineaProduccion, OrdenDeTrabajo, OrdenProduccion
+from productos.models import Producto
+from ventas.models import Cliente, EstadoVenta, OrdenVenta, OrdenVentaProducto, Prioridad
+
+from .capacidad import lineas_bloqueadas
+from .models import EjecucionMRP
+from .planificador import ejecutar_planificacion_diaria_mrp
+from .planner_service import ejecutar_planificador
+from .replanificador import replanificar_ops_por_capacidad
+
+
+# ===================================================================
+# SIMULACIÓN DE PLANIFICACIÓN ("¿qué pasa si...?")
+# Corre el plan completo (replanificación por capacidad si hay líneas paradas,
+# MRP y, opcionalmente, el solver táctico) con un escenario aplicado: pedidos
+# urgentes nuevos y/o líneas fuera de servicio en un rango de fechas.
+# Todo pasa dentro de UNA transacción que se deshace al final: se devuelve la
+# diferencia contra el plan vigente (OPs nuevas y modificadas, entregas movidas,
+# compras) y en la BD no queda nada (ni el escenario ni las corridas).
+# Se ejecuta desde el worker de planificación (TrabajoPlanificacion.Tipo.SIMULACION):
+# la cola corre de a un trabajo por vez entre todos los workers, así nunca corre al
+# mismo tiempo que el MRP real.
+# OJO: como la transacción llega hasta el final, los advisory locks por producto / MP
+# y los lotes bloqueados (select_for_update) que toma el MRP (ver stock/concurrencia.py)
+# quedan tomados durante TODA la simulación, incluido el solver táctico. Mientras tanto
+# las reservas de ventas sobre esos productos / MPs esperan (hasta su lock_timeout y
+# reintentan). Con 'incluir_despacho': false la ventana es solo la del MRP.
+# Como otros usuarios pueden confirmar OVs / OPs / OTs mientras corre, lo "nuevo" no
+# se detecta por id: se comparan solo las filas que creó la simulación (ids devueltos
+# por _crear_pedidos, el MRP y el solver).
+# ===================================================================
+
+# Estados cuyo plan ya no cambia: no se comparan
+ESTADOS_OP_CERRADOS = ("Finalizada", "Cancelado")
+ESTADOS_OV_CERRADOS = ("Pagada", "Cancelada")
+
+
+class Escenario:
+    """ Escenario validado (a partir del JSON del request / de los parámetros del trabajo). """
+
+    def __init__(self, pedidos, lineas_fuera_de_servicio, incluir_despacho, modo):
+        self.pedidos = pedidos                                    # [{"id_cliente", "id_prioridad", "fecha_entrega", "productos": {id: cantidad}}]
+        self.lineas_fuera_de_servicio = lineas_fuera_de_servicio  # [(linea_id, desde, hasta)]
+        self.incluir_despacho = incluir_despacho
+        self.modo = modo
+
+    def bloqueos(self):
+        """ {linea_id: [fechas]} para capacidad.lineas_bloqueadas. """
+        bloqueos = defaultdict(list)
+        for linea_id, desde, hasta in self.lineas_fuera_de_servicio:
+            bloqueos[linea_id].extend(desde + timedelta(days=dia) for dia in range((hasta - desde).days + 1))
+        return dict(bloqueos)
+
+
+def _leer_fecha(valor, campo):
+    try:
+        return datetime.strptime(valor, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        raise ValueError(f"'{campo}' debe ser una fecha YYYY-MM-DD.")
+
+
+def _leer_entero(valor, campo):
+    try:
+        entero = int(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{campo}' debe ser un entero.")
+    if entero <= 0:
+        raise ValueError(f"'{campo}' debe ser mayor a 0.")
+    return entero
+
+
+def leer_escenario(datos):
+    """
+    Valida el escenario y lo devuelve como Escenario. Lanza ValueError con el
+    motivo si algo no es válido (la vista lo devuelve como 400).
+
+    {
+        "pedidos": [{"id_cliente": 1, "id_prioridad": 1 (opcional), "fecha_entrega": "YYYY-MM-DD",
+                     "productos": [{"id_producto": 3, "cantidad": 100}]}],
+        "lineas_fuera_de_servicio": [{"id_linea_produccion": 2, "desde": "YYYY-MM-DD", "hasta": "YYYY-MM-DD"}],
+        "incluir_despacho": true,
+        "modo": "COMPLETO" | "INCREMENTAL"
+    }
+    """
+    datos = datos or {}
+    pedidos_datos = datos.get("pedidos") or []
+    lineas_datos = datos.get("lineas_fuera_de_servicio") or []
+    if not isinstance(pedidos_datos, list) or not isinstance(lineas_datos, list):
+        raise ValueError("'pedidos' y 'lineas_fuera_de_servicio' deben ser listas.")
+
+    modo = datos.get("modo", EjecucionMRP.Modo.COMPLETO)
+    if modo not in EjecucionMRP.Modo.values:
+        raise ValueError(f"Modo inválido. Use uno de: {', '.join(EjecucionMRP.Modo.values)}.")
+
+    pedidos = []
+    for pedido in pedidos_datos:
+        productos = {}
+        for item in pedido.get("productos") or []:
+            id_producto = _leer_entero(item.get("id_producto"), "id_producto")
+            productos[id_producto] = productos.get(id_producto, 0) + _leer_entero(item.get("cantidad"), "cantidad")
+        if not productos:
+            raise ValueError("Cada pedido debe tener al menos un producto.")
+        pedidos.append({
+            "id_cliente": _leer_entero(pedido.get("id_cliente"), "id_cliente"),
+            "id_prioridad": _leer_entero(pedido["id_prioridad"], "id_prioridad") if pedido.get("id_prioridad") else None,
+            "fecha_entrega": _leer_fecha(pedido.get("fecha_entrega"), "fecha_entrega"),
+            "productos": productos,
+        })
+
+    lineas_fuera_de_servicio = []
+    for linea in lineas_datos:
+        desde = _leer_fecha(linea.get("desde"), "desde")
+        hasta = _leer_fecha(linea.get("hasta"), "hasta") if linea.get("hasta") else desde
+        if hasta < desde:
+            raise ValueError("'hasta' no puede ser anterior a 'desde'.")
+        lineas_fuera_de_servicio.append((_leer_entero(linea.get("id_linea_produccion"), "id_linea_produccion"), desde, hasta))
+
+    # Que existan (1 consulta por modelo)
+    _verificar_ids(Cliente, {pedido["id_cliente"] for pedido in pedidos}, "clientes")
+    _verificar_ids(Prioridad, {pedido["id_prioridad"] for pedido in pedidos if pedido["id_prioridad"]}, "prioridades")
+    _verificar_ids(Producto, {id_producto for pedido in pedidos for id_producto in pedido["productos"]}, "productos")
+    _verificar_ids(LineaProduccion, {linea_id for linea_id, _, _ in lineas_fuera_de_servicio}, "líneas")
+
+    return Escenario(pedidos, lineas_fuera_de_servicio, bool(datos.get("incluir_despacho", True)), modo)
+
+
+def _verificar_ids(modelo, ids, nombre):
+    if not ids:
+        return
+    existentes = set(modelo.objects.filter(pk__in=ids).values_list('pk', flat=True))
+    faltantes = sorted(ids - existentes)
+    if faltantes:
+        raise ValueError(f"No existen {nombre} con id {faltantes}.")
+
+
+# ------------------------------------------------------------------
+# Foto del plan (antes / después)
+# ------------------------------------------------------------------
+def _fecha(valor):
+    return valor.date() if isinstance(valor, datetime) else valor
+
+
+def _foto_ops(id_minimo=None):
+    ops = OrdenProduccion.objects.all()
+    if id_minimo is None:
+        ops = ops.exclude(id_estado_orden_produccion__descripcion__in=ESTADOS_OP_CERRADOS)
+    else:
+        ops = ops.filter(id_orden_produccion__gte=id_minimo)
+    return {
+        op_id: {
+            "producto": producto,
+            "cantidad": cantidad,
+            "estado": estado,
+            "fecha_inicio": _fecha(fecha_planificada),
+            "fecha_fin": fecha_fin,
+        }
+        for op_id, producto, cantidad, estado, fecha_planificada, fecha_fin in ops.values_list(
+            'id_orden_produccion', 'id_producto__nombre', 'cantidad', 'id_estado_orden_produccion__descripcion',
+            'fecha_planificada', 'fecha_fin_planificada'
+        )
+    }
+
+
+def _foto_ovs(id_minimo=None):
+    ovs = OrdenVenta.objects.all()
+    if id_minimo is None:
+        ovs = ovs.exclude(id_estado_venta__descripcion__in=ESTADOS_OV_CERRADOS)
+    else:
+        ovs = ovs.filter(id_orden_venta__gte=id_minimo)
+    return {
+        ov_id: {"fecha_entrega": _fecha(fecha_entrega), "estado": estado}
+        for ov_id, fecha_entrega, estado in ovs.values_list(
+            'id_orden_venta', 'fecha_entrega', 'id_estado_venta__descripcion'
+        )
+    }
+
+
+def _foto_compras():
+    """ {(oc, mp): fila} de las OCs 'En proceso' (las únicas que crea o amplía el MRP). """
+    return {
+        (oc_id, mp_id): {
+            "proveedor": proveedor,
+            "fecha_entrega": fecha_entrega,
+            "materia_prima": materia_prima,
+            "cantidad": cantidad,
+        }
+        for oc_id, proveedor, fecha_entrega, mp_id, materia_prima, cantidad in OrdenCompraMateriaPrima.objects.filter(
+            id_orden_compra__id_estado_orden_compra__descripcion="En proceso"
+        ).values_list(
+            'id_orden_compra_id', 'id_orden_compra__id_proveedor__nombre', 'id_orden_compra__fecha_entrega_estimada',
+            'id_materia_prima_id', 'id_materia_prima__nombre', 'cantidad'
+        )
+    }
+
+
+# ------------------------------------------------------------------
+# Diferencias
+# ------------------------------------------------------------------
+def _diferencia_ops(antes, despues, ops_creadas):
+    nuevas = []
+    modificadas = []
+    for op_id, op in sorted(despues.items()):
+        if op_id in ops_creadas:
+            nuevas.append({"id_orden_produccion": op_id, **op})
+        elif op_id in antes:
+            cambios = {
+                campo: {"antes": antes[op_id][campo], "despues": valor}
+                for campo, valor in op.items() if antes[op_id][campo] != valor
+            }
+            if cambios:
+                modificadas.append({"id_orden_produccion": op_id, "producto": op["producto"], "cambios": cambios})
+    return {"nuevas": nuevas, "modificadas": modificadas}
+
+
+def _diferencia_entregas(antes, despues, pedidos_por_ov):
+    movidas = []
+    simuladas = []
+    for ov_id, ov in sorted(despues.items()):
+        if ov_id in pedidos_por_ov:
+            pedido = pedidos_por_ov[ov_id]
+            atraso = (ov["fecha_entrega"] - pedido["fecha_entrega"]).days if ov["fecha_entrega"] else None
+            simuladas.append({
+                "id_cliente": pedido["id_cliente"],
+                "fecha_entrega_pedida": pedido["fecha_entrega"],
+                "fecha_entrega_planificada": ov["fecha_entrega"],
+                "dias_atraso": max(0, atraso) if atraso is not None else None,
+                "estado": ov["estado"],
+            })
+        elif ov_id in antes and antes[ov_id]["fecha_entrega"] != ov["fecha_entrega"]:
+            fecha_anterior = antes[ov_id]["fecha_entrega"]
+            movidas.append({
+                "id_orden_venta": ov_id,
+                "fecha_anterior": fecha_anterior,
+                "fecha_nueva": ov["fecha_entrega"],
+                "dias": (ov["fecha_entrega"] - fecha_anterior).days if fecha_anterior and ov["fecha_entrega"] else None,
+                "estado": ov["estado"],
+            })
+    return {"movidas": movidas, "pedidos_simulados": simuladas}
+
+
+def _diferencia_compras(antes, despues):
+    ocs_antes = {oc_id for oc_id, _ in antes}
+    nuevas = {}
+    modificadas = []
+    for (oc_id, mp_id), item in sorted(despues.items()):
+        if oc_id not in ocs_antes:
+            oc = nuevas.setdefault(oc_id, {
+                "id_orden_compra": oc_id,
+                "proveedor": item["proveedor"],
+                "fecha_entrega": item["fecha_entrega"],
+                "materias_primas": [],
+            })
+            oc["materias_primas"].append({"materia_prima": item["materia_prima"], "cantidad": item["cantidad"]})
+        elif antes.get((oc_id, mp_id), {}).get("cantidad") != item["cantidad"]:
+            modificadas.append({
+                "id_orden_compra": oc_id,
+                "proveedor": item["proveedor"],
+                "materia_prima": item["materia_prima"],
+                "cantidad_anterior": antes.get((oc_id, mp_id), {}).get("cantidad", 0),
+                "cantidad_nueva": item["cantidad"],
+            })
+    return {"nuevas": list(nuevas.values()), "modificadas": modificadas}
+
+
+def _ots_nuevas(ids_ots):
+    return [
+        {"linea": fila["id_linea_produccion__descripcion"], "ots": fila["ots"], "cantidad": fila["cantidad"]}
+        for fila in OrdenDeTrabajo.objects.filter(id_orden_trabajo__in=ids_ots).values(
+            'id_linea_produccion__descripcion'
+        ).annotate(
+            ots=Count('id_orden_trabajo'), cantidad=Sum('cantidad_programada')
+        ).order_by('id_linea_produccion__descripcion')
+    ]
+
+
+# ------------------------------------------------------------------
+# Simulación
+# ------------------------------------------------------------------
+def _crear_pedidos(pedidos):
+    """
+    Crea las OVs del escenario (dentro de la transacción que se deshace).
+    Devuelve {id_orden_venta: pedido}.
+    """
+    estado_creada = EstadoVenta.objects.get(descripcion="Creada")
+    # Sin prioridad indicada: la más alta (id más bajo, la primera en el PASO 1-3)
+    prioridad_maxima = Prioridad.objects.order_by('id_prioridad').values_list('id_prioridad', flat=True).first()
+    pedidos_por_ov = {}
+    for pedido in pedidos:
+        entrega = timezone.make_aware(datetime.combine(pedido["fecha_entrega"], datetime.min.time()))
+        orden_venta = OrdenVenta.objects.create(
+            id_cliente_id=pedido["id_cliente"],
+            id_estado_venta=estado_creada,
+            id_prioridad_id=pedido["id_prioridad"] or prioridad_maxima,
+            fecha_entrega=entrega
+        )
+        OrdenVentaProducto.objects.bulk_create([
+            OrdenVentaProducto(id_orden_venta=orden_venta, id_producto_id=id_producto, cantidad=cantidad)
+            for id_producto, cantidad in pedido["productos"].items()
+        ])
+        pedidos_por_ov[orden_venta.id_orden_venta] = pedido
+    return pedidos_por_ov
+
+
+def simular_planificacion(fecha_simulada: date, escenario: Escenario):
+    """
+    Corre el plan con el escenario aplicado y devuelve la diferencia contra el plan
+    vigente. La BD queda como estaba (la transacción se deshace siempre).
+    """
+    tomorrow = fecha_simulada + timedelta(days=1)
+
+    with transaction.atomic():
+        ops_antes = _foto_ops()
+        ovs_antes = _foto_ovs()
+        compras_antes = _foto_compras()
+
+        pedidos_por_ov = _crear_pedidos(escenario.pedidos)
+
+        with lineas_bloqueadas(escenario.bloqueos()):
+            if escenario.lineas_fuera_de_servicio:
+                # Las OPs ya planificadas salen de los días parados (desde mañana si la parada lo toca)
+                primer_dia_parado = min(desde for _, desde, _ in escenario.lineas_fuera_de_servicio)
+                replanificar_ops_por_capacidad(
+                    fecha_simulada=fecha_simulada,
+                    dias_minimo_a_replanificar=1 if primer_dia_parado <= tomorrow else 2
+                )
+            ops_creadas = set(ejecutar_planificacion_diaria_mrp(fecha_simulada, escenario.modo))
+
+        ots_creadas = ejecutar_planificador(fecha_simulada) if escenario.incluir_despacho else []
+
+        # Las OPs y OVs de antes se vuelven a leer aunque hayan cambiado de estado (ej: OP cancelada)
+        ops_despues = {
+            op_id: op for op_id, op in _foto_ops(id_minimo=min([*ops_antes, *ops_creadas], default=0)).items()
+            if op_id in ops_antes or op_id in ops_creadas
+        }
+        ovs_despues = {
+            ov_id: ov for ov_id, ov in _foto_ovs(id_minimo=min([*ovs_antes, *pedidos_por_ov], default=0)).items()
+            if ov_id in ovs_antes or ov_id in pedidos_por_ov
+        }
+
+        resultado = {
+            "fecha": fecha_simulada,
+            "ordenes_produccion": _diferencia_ops(ops_antes, ops_despues, ops_creadas),
+            "entregas": _diferencia_entregas(ovs_antes, ovs_despues, pedidos_por_ov),
+            "ordenes_compra": _diferencia_compras(compras_antes, _foto_compras()),
+            "ordenes_trabajo": _ots_nuevas(ots_creadas) if escenario.incluir_despacho else None,
+        }
+        resultado["resumen"] = {
+            "ops_nuevas": len(resultado["ordenes_produccion"]["nuevas"]),
+            "ops_modificadas": len(resultado["ordenes_produccion"]["modificadas"]),
+            "entregas_movidas": len(resultado["entregas"]["movidas"]),
+            "entregas_atrasadas": sum(1 for ov in resultado["entregas"]["movidas"] if (ov["dias"] or 0) > 0),
+            "ocs_nuevas": len(resultado["ordenes_compra"]["nuevas"]),
+            "ocs_modificadas": len(resultado["ordenes_compra"]["modificadas"]),
+        }
+
+        transaction.set_rollback(True)
+    return resultado
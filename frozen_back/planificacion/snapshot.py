@@ -0,0 +1,193 @@
+from collections import defaultdict
+
+from django.db.models import Sum, Q
+
+from compras.models import OrdenCompraMateriaPrima
+from materias_primas.models import MateriaPrima
+from produccion.models import OrdenProduccionPegging
+from recetas.models import Receta, RecetaMateriaPrima
+from stock.models import ReservaStock, ReservaMateriaPrima
+from stock.services import get_stock_disponible_para_productos, get_stock_disponible_para_materias_primas
+from .cache_capacidad import obtener_capacidades
+
+
+class PlanningSnapshot:
+    """
+    Foto de los datos maestros y pools de stock que usa el MRP diario.
+
+    Se carga al inicio del run con una cantidad FIJA de consultas (BOM,
+    capacidades por línea, lead times, reservas activas y disponible por lote)
+    y todos los PASOS leen de acá en vez de consultar por OP / línea de OV.
+    Cuando el MRP crea o borra reservas, se registran en la foto para que
+    los PASOS siguientes vean los mismos números que verían en la BD.
+    """
+
+    def __init__(self, estado_oc_en_proceso, estados_op_activos, estados_op_con_reservas_mp, estados_ov_activos):
+        self._cargar_recetas()
+        self._cargar_capacidades()
+        self._cargar_stock()
+        self._cargar_oc_en_transito(estado_oc_en_proceso)
+        self._cargar_reservas_pt(estados_ov_activos)
+        self._cargar_en_produccion(estados_op_activos, estados_ov_activos)
+        self._cargar_reservas_mp(estados_op_con_reservas_mp)
+
+    # ------------------------------------------------------------------
+    # Carga (1 consulta por bloque)
+    # ------------------------------------------------------------------
+    def _cargar_recetas(self):
+        self.materias_primas = {
+            mp.id_materia_prima: mp
+            for mp in MateriaPrima.objects.select_related('id_proveedor')
+        }
+
+        # Si un producto tuviera más de una receta usamos la primera (id más bajo)
+        self._receta_por_producto = {}
+        for receta_id, producto_id in Receta.objects.order_by('id_receta').values_list('id_receta', 'id_producto_id'):
+            self._receta_por_producto.setdefault(producto_id, receta_id)
+
+        self._ingredientes_por_receta = defaultdict(list)
+        for ing in RecetaMateriaPrima.objects.order_by('id_receta_materia_prima'):
+            # Reutilizamos la MP ya cargada (evita el N+1 de ing.id_materia_prima.id_proveedor)
+            ing.id_materia_prima = self.materias_primas[ing.id_materia_prima_id]
+            self._ingredientes_por_receta[ing.id_receta_id].append(ing)
+
+        # Índice inverso de la BOM (MP -> productos que la usan), para el MRP incremental
+        self._productos_por_mp = defaultdict(set)
+        for producto_id, receta_id in self._receta_por_producto.items():
+            for ing in self._ingredientes_por_receta[receta_id]:
+                self._productos_por_mp[ing.id_materia_prima_id].add(producto_id)
+
+    def _cargar_capacidades(self):
+        # Reglas Producto ↔ Línea desde la caché versionada (1 consulta si no cambiaron)
+        self._capacidades = obtener_capacidades()
+
+    def _cargar_stock(self):
+        # Disponible = Σ (cantidad - reservas activas) de los lotes disponibles
+        self.stock_pt = defaultdict(int, get_stock_disponible_para_productos())
+        self.stock_mp = defaultdict(int, get_stock_disponible_para_materias_primas())
+
+    def _cargar_oc_en_transito(self, estado_oc_en_proceso):
+        self.en_transito_oc = defaultdict(int)
+        for fila in OrdenCompraMateriaPrima.objects.filter(
+            id_orden_compra__id_estado_orden_compra=estado_oc_en_proceso
+        ).values('id_materia_prima_id').annotate(total=Sum('cantidad')):
+            self.en_transito_oc[fila['id_materia_prima_id']] += fila['total'] or 0
+
+    def _cargar_reservas_pt(self, estados_ov_activos):
+        self._reservado_pt = defaultdict(int)
+        for fila in ReservaStock.objects.filter(
+            id_estado_reserva__descripcion='Activa',
+            id_orden_venta_producto__id_orden_venta__id_estado_venta__in=estados_ov_activos
+        ).values('id_orden_venta_producto_id').annotate(total=Sum('cantidad_reservada')):
+            self._reservado_pt[fila['id_orden_venta_producto_id']] = fila['total'] or 0
+
+    def _cargar_en_produccion(self, estados_op_activos, estados_ov_activos):
+        self._en_produccion = defaultdict(int)
+        for fila in OrdenProduccionPegging.objects.filter(
+            id_orden_produccion__id_estado_orden_produccion__in=estados_op_activos,
+            id_orden_venta_producto__id_orden_venta__id_estado_venta__in=estados_ov_activos
+        ).values('id_orden_venta_producto_id').annotate(total=Sum('cantidad_asignada')):
+            self._en_produccion[fila['id_orden_venta_producto_id']] = fila['total'] or 0
+
+    def _cargar_reservas_mp(self, estados_op):
+        # {(op_id, mp_id): cantidad} -> todas / solo activas / activas sobre lotes disponibles
+        self._reservado_mp_total = defaultdict(int)
+        self._reservado_mp_activo = defaultdict(int)
+        self._reservado_mp_en_stock = defaultdict(int)
+
+        filtro_activa = Q(id_estado_reserva_materia__descripcion='Activa')
+        filtro_en_stock = filtro_activa & Q(id_lote_materia_prima__id_estado_lote_materia_prima__descripcion="disponible")
+
+        for fila in ReservaMateriaPrima.objects.filter(
+            id_orden_produccion__id_estado_orden_produccion__in=estados_op
+        ).values(
+            'id_orden_produccion_id', 'id_lote_materia_prima__id_materia_prima_id'
+        ).annotate(
+            total=Sum('cantidad_reservada'),
+            activo=Sum('cantidad_reservada', filter=filtro_activa),
+            en_stock=Sum('cantidad_reservada', filter=filtro_en_stock),
+        ):
+            clave = (fila['id_orden_produccion_id'], fila['id_lote_materia_prima__id_materia_prima_id'])
+            self._reservado_mp_total[clave] = fila['total'] or 0
+            self._reservado_mp_activo[clave] = fila['activo'] or 0
+            self._reservado_mp_en_stock[clave] = fila['en_stock'] or 0
+
+    # ------------------------------------------------------------------
+    # Lecturas
+    # ------------------------------------------------------------------
+    def ingredientes(self, producto_id):
+        """ BOM del producto. Lanza Receta.DoesNotExist igual que Receta.objects.get(). """
+        receta_id = self._receta_por_producto.get(producto_id)
+        if receta_id is None:
+            raise Receta.DoesNotExist(f"El producto {producto_id} no tiene receta.")
+        return self._ingredientes_por_receta[receta_id]
+
+    def tiene_receta(self, producto_id):
+        return producto_id in self._receta_por_producto
+
+    def materias_primas_de(self, producto_id):
+        """ Ids de MP de la receta del producto (vacío si no tiene receta). """
+        receta_id = self._receta_por_producto.get(producto_id)
+        if receta_id is None:
+            return []
+        return [ing.id_materia_prima_id for ing in self._ingredientes_por_receta[receta_id]]
+
+    def productos_que_usan(self, mp_id):
+        """ Ids de producto cuya receta usa la MP. """
+        return self._productos_por_mp.get(mp_id, set())
+
+    def capacidades(self, producto_id):
+        return self._capacidades.reglas(producto_id)
+
+    def capacidad_total_por_hora(self, producto_id):
+        return self._capacidades.capacidad_total_por_hora(producto_id)
+
+    def reservado_pt(self, linea_ov_id):
+        return self._reservado_pt.get(linea_ov_id, 0)
+
+    def en_produccion(self, linea_ov_id):
+        return self._en_produccion.get(linea_ov_id, 0)
+
+    def reservado_mp(self, op_id, mp_id, solo_activas=True):
+        if solo_activas:
+            return self._reservado_mp_activo.get((op_id, mp_id), 0)
+        return self._reservado_mp_total.get((op_id, mp_id), 0)
+
+    def reservas_mp_de_op(self, op_id):
+        """ {mp_id: cantidad reservada (todas)} de una OP. """
+        return {
+            mp_id: cantidad
+            for (op, mp_id), cantidad in self._reservado_mp_total.items()
+            if op == op_id and cantidad
+        }
+
+    # ------------------------------------------------------------------
+    # Registro de movimientos del run
+    # ------------------------------------------------------------------
+    def registrar_reserva_pt(self, linea_ov_id, producto_id, cantidad):
+        self._reservado_pt[linea_ov_id] += cantidad
+        self.stock_pt[producto_id] -= cantidad
+
+    def liberar_reservas_pt(self, reservas):
+        """ Antes de borrar reservas de PT: lo activo sobre lotes disponibles vuelve al stock. """
+        for fila in reservas.filter(
+            id_estado_reserva__descripcion='Activa',
+            id_lote_produccion__id_estado_lote_produccion__descripcion="Disponible"
+        ).values('id_orden_venta_producto_id', 'id_lote_produccion__id_producto_id').annotate(total=Sum('cantidad_reservada')):
+            cantidad = fila['total'] or 0
+            self.stock_pt[fila['id_lote_produccion__id_producto_id']] += cantidad
+            self._reservado_pt[fila['id_orden_venta_producto_id']] -= cantidad
+
+    def registrar_reserva_mp(self, op_id, mp_id, cantidad):
+        clave = (op_id, mp_id)
+        self._reservado_mp_total[clave] += cantidad
+        self._reservado_mp_activo[clave] += cantidad
+        self._reservado_mp_en_stock[clave] += cantidad
+        self.stock_mp[mp_id] -= cantidad
+
+    def liberar_reservas_mp(self, op_id):
+        """ La OP perdió sus reservas de MP: lo que estaba tomado de lotes disponibles vuelve al stock. """
+        for clave in [c for c in self._reservado_mp_total if c[0] == op_id]:
+            self.stock_mp[clave[1]] += self._reservado_mp_en_stock.pop(clave, 0)
+            self._reservado_mp_activo.pop(clave, None)
+            self._reservado_mp_total.pop(clave, None)
@@ -0,0 +1,323 @@
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from ortools.sat.python import cp_model
+
+
+# ===================================================================
+# MODELO CP-SAT DEL SOLVER TÁCTICO (DISPATCHER)
+# planner_service prepara los datos (tareas, tandas, pistas) y los divide en
+# SUBPROBLEMAS independientes; este módulo arma y resuelve el modelo de cada uno.
+# No usa Django ni la BD: recibe y devuelve solo datos simples, así cada
+# subproblema puede resolverse en otro proceso (ver resolver_subproblemas).
+# ===================================================================
+
+HORIZONTE_MINUTOS = 16 * 60  # Largo del turno de cada día (desde las 06:00)
+MINUTOS_POR_DIA = 24 * 60
+
+ESTADOS_CON_SOLUCION = ("OPTIMAL", "FEASIBLE")
+
+
+def dividir_en_subproblemas(tareas):
+    """
+    Agrupa las tareas en subproblemas independientes: {línea: [tareas]}.
+    Cada tarea del calendario ya viene con su línea (el MRP eligió la línea
+    según las reglas Producto ↔ Línea), y todas las restricciones del modelo son
+    por línea (no superposición, setups, carga por día): las componentes
+    conexas del modelo son las líneas.
+    """
+    tareas_por_linea = defaultdict(list)
+    for tarea in tareas:
+        tareas_por_linea[tarea["linea"]].append(tarea)
+    return tareas_por_linea
+
+
+def resolver_subproblemas(subproblemas, procesos):
+    """
+    Resuelve los subproblemas (independientes entre sí) y devuelve los resultados
+    en el mismo orden. Con procesos > 1 los reparte en un pool de procesos 'spawn'
+    (quien llama puede tener hilos y conexiones abiertos: no se hace fork).
+    """
+    if procesos <= 1 or len(subproblemas) <= 1:
+        return [resolver_subproblema(subproblema) for subproblema in subproblemas]
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(procesos, len(subproblemas)), mp_context=contexto) as pool:
+        return list(pool.map(resolver_subproblema, subproblemas))
+
+
+def resolver_subproblema(subproblema):
+    """
+    Arma y resuelve el modelo de un subproblema:
+      {"lineas": [...], "tareas": [...], "cambios": {(línea, origen, destino): minutos}, "config": {...}}
+    Cada tarea: {"id", "linea", "producto", "tandas": [(tamaño, duración)], "cantidad",
+    "max_minutos", "inicios_pista" (o None), "dia_pista" (solo horizonte rodante)}.
+
+    Devuelve el estado y las estadísticas del solver y, si hubo solución, por tarea
+    programada: {"dia", "bloques": [(inicio, tandas)], "inicios": [minuto del turno]}.
+    """
+    config = subproblema["config"]
+    horizonte_dias = config["horizonte_dias"]
+    rodante = horizonte_dias > 1
+    dias_con_turno = config["dias_con_turno"]
+    matriz_cambios = subproblema["cambios"]
+
+    model = cp_model.CpModel()
+    intervals_por_linea = defaultdict(list)
+    todas_tandas = []
+    all_end_vars = []
+    objetivo_por_tarea = []  # (día, literal 'la tarea va ese día', cantidad): solo en horizonte rodante
+    carga_por_linea_dia = defaultdict(list)  # {(línea, día): [minutos * literal]}: solo en horizonte rodante
+
+    # Eje de tiempo en minutos desde las 06:00 del primer día. Con horizonte
+    # rodante cada tanda cae dentro del turno de UN día: [dia*1440, dia*1440 + turno].
+    fin_eje = MINUTOS_POR_DIA * (horizonte_dias - 1) + HORIZONTE_MINUTOS
+    dominio_dias = cp_model.Domain.FromValues(dias_con_turno)
+
+    productos_por_linea = defaultdict(set)
+    for tarea in subproblema["tareas"]:
+        productos_por_linea[tarea["linea"]].add(tarea["producto"])
+    lineas_con_cambios = {
+        linea_id for linea_id, productos in productos_por_linea.items()
+        if any(matriz_cambios.get((linea_id, origen, destino)) for origen in productos for destino in productos)
+    }
+
+    # Variable auxiliar para calcular el techo de la producción total (para definir la variable del solver)
+    suma_total_objetivo = 0
+
+    for tarea in subproblema["tareas"]:
+        id_tarea = tarea["id"]
+        linea_id = tarea["linea"]
+        inicios_pista = tarea["inicios_pista"]
+        task_tandas = []
+
+        # Horizonte rodante: el solver elige el día (entre los que tienen turno)
+        # y puede dejar la tarea fuera del horizonte si no entra.
+        dia_var = programada = None
+        if rodante:
+            dia_var = model.NewIntVarFromDomain(dominio_dias, f"dia_{id_tarea}")
+            programada = model.NewBoolVar(f"programada_{id_tarea}")
+            if inicios_pista is not None:
+                model.AddHint(dia_var, tarea["dia_pista"])
+                model.AddHint(programada, 1)
+        elif linea_id in lineas_con_cambios:
+            # Con setups la carga del MRP puede no entrar en el turno: la tarea pasa
+            # a ser opcional (todo o nada) y la que quede afuera se pospone sola.
+            programada = model.NewBoolVar(f"programada_{id_tarea}")
+
+        # Tandas agrupadas: UN intervalo por tarea con todas sus tandas seguidas (se cortan
+        # en OTs al guardar). Si no, un intervalo por tanda, ordenadas entre sí.
+        if config["tandas_agrupadas"]:
+            bloques = [tarea["tandas"]]
+        else:
+            bloques = [[tanda] for tanda in tarea["tandas"]]
+
+        for t, tandas_bloque in enumerate(bloques):
+            tamano_real = sum(tamano for tamano, _ in tandas_bloque)
+            duracion_real = sum(duracion for _, duracion in tandas_bloque)
+
+            # Variables del Solver
+            lit = model.NewBoolVar(f"cal{id_tarea}_t{t}")
+            start = model.NewIntVar(0, fin_eje, f"start_{id_tarea}_{t}")
+            end = model.NewIntVar(0, fin_eje, f"end_{id_tarea}_{t}")
+            interval = model.NewOptionalIntervalVar(start, duracion_real, end, lit, f"interval_{id_tarea}_{t}")
+
+            inicio_turno = None
+            if rodante:
+                inicio_turno = model.NewIntVar(0, max(0, HORIZONTE_MINUTOS - duracion_real), f"inicio_turno_{id_tarea}_{t}")
+                model.Add(start == MINUTOS_POR_DIA * dia_var + inicio_turno)
+
+            if task_tandas:
+                # Ruptura de simetría: las tandas de la tarea son intercambiables,
+                # así que se activan y se ubican en orden (t-1 antes que t).
+                anterior = task_tandas[-1]
+                model.AddImplication(lit, anterior["literal"])
+                model.Add(start >= anterior["end"]).OnlyEnforceIf(lit)
+
+            if inicios_pista is not None:
+                model.AddHint(lit, 1)
+                inicio_pista = min(inicios_pista[t], HORIZONTE_MINUTOS - duracion_real) if t < len(inicios_pista) else -1
+                if inicio_pista >= 0:
+                    # En un solo día el eje arranca a las 06:00 del día: minuto del turno == start
+                    model.AddHint(inicio_turno if rodante else start, inicio_pista)
+
+            tanda_info = {
+                "literal": lit, "tarea": id_tarea, "linea": linea_id, "producto": tarea["producto"],
+                "tamano": tamano_real, "start": start, "end": end, "duracion": duracion_real,
+                "dia": dia_var, "inicio_turno": inicio_turno, "tandas": tandas_bloque
+            }
+
+            todas_tandas.append(tanda_info)
+            task_tandas.append(tanda_info)
+            intervals_por_linea[linea_id].append(interval)
+            all_end_vars.append(end)
+
+        # 🆕 RESTRICCIÓN DE CANTIDAD TOTAL
+        # La suma de las tandas activas debe ser igual al objetivo ajustado (incluyendo mínimos forzados).
+        # Con horizonte rodante (o setups en la línea): todo o nada, según si la tarea entra.
+        if programada is None:
+            model.Add(sum(tanda["literal"] * tanda["tamano"] for tanda in task_tandas) == tarea["cantidad"])
+        else:
+            model.Add(sum(tanda["literal"] * tanda["tamano"] for tanda in task_tandas) == tarea["cantidad"] * programada)
+
+        if rodante:
+            # Un literal por día posible: la tarea (todo o nada) ocupa sus minutos en ese día.
+            # Redundante con el NoOverlap, pero da al solver una cota mucho más ajustada.
+            minutos_tarea = sum(tanda["duracion"] for tanda in task_tandas)
+            en_dia = {d: model.NewBoolVar(f"en_dia_{id_tarea}_{d}") for d in dias_con_turno}
+            model.Add(sum(en_dia.values()) == programada)
+            model.Add(dia_var == sum(d * literal for d, literal in en_dia.items())).OnlyEnforceIf(programada)
+            for tanda in task_tandas:
+                tanda["en_dia_0"] = en_dia[0]
+            for d, literal in en_dia.items():
+                carga_por_linea_dia[(linea_id, d)].append(minutos_tarea * literal)
+                objetivo_por_tarea.append((d, literal, tarea["cantidad"]))
+                if inicios_pista is not None:
+                    model.AddHint(literal, int(d == tarea["dia_pista"]))
+
+        # RESTRICCIÓN DE TIEMPO (Calendario)
+        # Intentamos respetar las horas reservadas en el MRP
+        model.Add(sum(tanda["literal"] * tanda["duracion"] for tanda in task_tandas) <= tarea["max_minutos"])
+
+        # Sumamos al total para definir el dominio de la variable objetivo
+        suma_total_objetivo += tarea["cantidad"]
+
+    # RESTRICCIÓN DE NO SUPERPOSICIÓN
+    for linea_id, intervals in intervals_por_linea.items():
+        model.AddNoOverlap(intervals)
+
+    # CAMBIOS DE PRODUCTO (setup dependiente de la secuencia)
+    # En las líneas con tiempos de cambio entre sus productos, un circuito ordena
+    # los intervalos (nodo 0 = línea vacía al inicio/fin) y cada arco i -> j exige
+    # el setup de producto(i) a producto(j) entre el fin de i y el inicio de j.
+    # Con horizonte rodante el circuito es solo del primer día (el único que se
+    # confirma): para los días siguientes alcanza con la estimación de capacidad.
+    tandas_por_linea = defaultdict(list)
+    for tanda in todas_tandas:
+        tandas_por_linea[tanda["linea"]].append(tanda)
+    minutos_cambio = []  # [minutos * literal del arco]
+    for linea_id, tandas_linea in tandas_por_linea.items():
+        if linea_id not in lineas_con_cambios:
+            continue
+
+        arcos = [(0, 0, model.NewBoolVar(f"linea_vacia_{linea_id}"))]
+        for i, tanda in enumerate(tandas_linea, start=1):
+            arcos.append((0, i, model.NewBoolVar(f"primera_{linea_id}_{i}")))
+            arcos.append((i, 0, model.NewBoolVar(f"ultima_{linea_id}_{i}")))
+            en_circuito = tanda["literal"]
+            if rodante:
+                en_circuito = model.NewBoolVar(f"en_circuito_{linea_id}_{i}")
+                model.AddBoolAnd([tanda["literal"], tanda["en_dia_0"]]).OnlyEnforceIf(en_circuito)
+                model.AddBoolOr([tanda["literal"].Not(), tanda["en_dia_0"].Not()]).OnlyEnforceIf(en_circuito.Not())
+            arcos.append((i, i, en_circuito.Not()))  # Tanda no programada (ese día): queda fuera del circuito
+            for j, siguiente in enumerate(tandas_linea, start=1):
+                if i == j:
+                    continue
+                arco = model.NewBoolVar(f"sigue_{linea_id}_{i}_{j}")
+                arcos.append((i, j, arco))
+                setup = matriz_cambios.get((linea_id, tanda["producto"], siguiente["producto"]), 0)
+                model.Add(siguiente["start"] >= tanda["end"] + setup).OnlyEnforceIf(arco)
+                if setup:
+                    minutos_cambio.append(setup * arco)
+        model.AddCircuit(arcos)
+    total_cambio = sum(minutos_cambio)
+
+    # Horizonte rodante: minutos por línea y día dentro del turno
+    for cargas in carga_por_linea_dia.values():
+        model.Add(sum(cargas) <= HORIZONTE_MINUTOS)
+
+    # VARIABLES OBJETIVO
+    makespan = model.NewIntVar(0, fin_eje, "makespan")
+    if all_end_vars:
+        model.AddMaxEquality(makespan, all_end_vars)
+
+    # Maximizar la producción total realizada
+    # (Aunque forzamos la igualdad arriba, esto ayuda al solver a orientarse)
+    produccion_total = model.NewIntVar(0, suma_total_objetivo, "produccion_total")
+    model.Add(produccion_total == sum(tanda["literal"] * tanda["tamano"] for tanda in todas_tandas))
+
+    if rodante:
+        # Producción descontada por día: una tarea vale cantidad * (N - día) si se programa
+        # (siempre conviene programarla, y cuanto antes mejor). Las no programadas no suman.
+        objetivo_produccion = sum(
+            cantidad * (horizonte_dias - d) * literal
+            for d, literal, cantidad in objetivo_por_tarea
+        )
+    else:
+        objetivo_produccion = produccion_total
+    model.Maximize(objetivo_produccion)
+
+    # ===================================================================
+    # RESOLVER
+    # ===================================================================
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = config["max_segundos"]
+    solver.parameters.num_search_workers = config["workers"]
+    # Corte temprano: la solución está a menos de X% de la cota del óptimo (0 = buscar el óptimo)
+    solver.parameters.relative_gap_limit = config["gap_relativo"]
+
+    status = solver.Solve(model)
+    hay_solucion = status in (cp_model.FEASIBLE, cp_model.OPTIMAL)
+    # Objetivo y cota de la producción (la segunda pasada, si la hay, solo mueve los setups)
+    objetivo = solver.ObjectiveValue() if hay_solucion else None
+    mejor_cota = solver.BestObjectiveBound() if hay_solucion else None
+    tiempo = solver.WallTime()
+    conflictos = solver.NumConflicts()
+    ramas = solver.NumBranches()
+    if hay_solucion:
+        tareas = _tareas_programadas(solver, todas_tandas)
+        minutos_cambio_logrados = solver.Value(total_cambio) if minutos_cambio else 0
+
+    if minutos_cambio and hay_solucion:
+        # Segunda pasada (lexicográfica): con la producción lograda fija, minimizar los
+        # minutos de cambio de producto. Arranca desde la solución de la primera pasada.
+        model.Add(objetivo_produccion >= round(objetivo))
+        model.ClearHints()
+        for indice in range(len(model.Proto().variables)):
+            variable = model.GetIntVarFromProtoIndex(indice)
+            model.AddHint(variable, solver.Value(variable))
+        model.Minimize(total_cambio)
+        # Probar el mínimo de setups cuesta mucho más que encontrarlo: tiene su propio límite
+        solver.parameters.max_time_in_seconds = config["cambios_max_segundos"]
+        status_cambios = solver.Solve(model)
+        tiempo += solver.WallTime()
+        conflictos += solver.NumConflicts()
+        ramas += solver.NumBranches()
+        # Si no llegara a nada en su límite, queda la solución de la primera pasada
+        if status_cambios in (cp_model.FEASIBLE, cp_model.OPTIMAL):
+            status = status_cambios
+            tareas = _tareas_programadas(solver, todas_tandas)
+            minutos_cambio_logrados = solver.Value(total_cambio)
+
+    estadisticas_modelo = model.Proto()
+    resultado = {
+        "lineas": subproblema["lineas"],
+        "estado": solver.StatusName(status),
+        "objetivo": objetivo,
+        "mejor_cota": mejor_cota,
+        "tiempo": tiempo,
+        "conflictos": conflictos,
+        "ramas": ramas,
+        "num_variables": len(estadisticas_modelo.variables),
+        "num_restricciones": len(estadisticas_modelo.constraints),
+        "minutos_cambio": minutos_cambio_logrados if hay_solucion else 0,
+        "tareas": tareas if hay_solucion else {},
+    }
+    return resultado
+
+
+def _tareas_programadas(solver, todas_tandas):
+    """ {tarea: {dia, bloques, inicios}} de las tandas programadas en la solución actual del solver. """
+    tareas = {}
+    for tanda in todas_tandas:
+        if not solver.Value(tanda["literal"]):
+            continue
+        programada = tareas.setdefault(tanda["tarea"], {
+            "dia": solver.Value(tanda["dia"]) if tanda["dia"] is not None else 0,
+            "bloques": [],
+            "inicios": [],
+        })
+        programada["bloques"].append((solver.Value(tanda["start"]), tanda["tandas"]))
+        if tanda["inicio_turno"] is not None:
+            programada["inicios"].append(solver.Value(tanda["inicio_turno"]))
+    return tareas
@@ -1,3 +1,410 @@
-from django.test import TestCase
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from produccion.models import (
+    CalendarioProduccion, EstadoOrdenProduccion, LineaProduccion, OrdenProduccion, estado_linea_produccion,
+)
+from productos.models import Producto, TipoProducto, Unidad
+from recetas.models import ProductoLinea
+from ventas.models import Cliente, EstadoVenta, OrdenVenta, Prioridad
+from . import simulacion
+from .benchmark import comparar_resultados, ejecutar_benchmark, generar_fabrica
+from .cache_capacidad import _version_actual, obtener_capacidades
+from .calendario_laboral import DIAS_INICIALES, CalendarioLaboral
+from .capacidad import LibroCapacidad, _ArbolHorasLibres, lineas_bloqueadas
+from .capacidad_finita import asignar_capacidad, atraso_ponderado, despachar
+from .models import DiaNoLaborable, TrabajoPlanificacion
+from .simulacion import leer_escenario, simular_planificacion
+from .solver_despacho import HORIZONTE_MINUTOS, resolver_subproblema
+from .trabajos import encolar_trabajo, tomar_siguiente_trabajo
+
+LUNES = date(2025, 6, 2)
+SABADO = LUNES + timedelta(days=5)
+
+
+class ArbolHorasLibresTests(SimpleTestCase):
+
+    def test_primer_indice_con_horas_suficientes(self):
+        arbol = _ArbolHorasLibres([0, 2, 8, 1, 8])
+        self.assertEqual(arbol.primero_desde(0, 1), 1)
+        self.assertEqual(arbol.primero_desde(0, 3), 2)
+        self.assertEqual(arbol.primero_desde(3, 3), 4)
+        self.assertIsNone(arbol.primero_desde(0, 9))
+
+    def test_fuera_del_rango(self):
+        arbol = _ArbolHorasLibres([8, 8, 8])
+        self.assertIsNone(arbol.primero_desde(3, 1))
+        # Las hojas de relleno (hasta 4) nunca califican
+        self.assertIsNone(arbol.primero_desde(2, 9))
+
+    def test_actualizar(self):
+        arbol = _ArbolHorasLibres([8, 8, 8, 8])
+        arbol.actualizar(0, 0)
+        arbol.actualizar(1, 3)
+        self.assertEqual(arbol.primero_desde(0, 4), 2)
+        arbol.actualizar(1, 8)
+        self.assertEqual(arbol.primero_desde(0, 4), 1)
+
+
+class CalendarioLaboralTests(TestCase):
+
+    def test_saltea_fines_de_semana(self):
+        calendario = CalendarioLaboral(LUNES)
+        self.assertTrue(calendario.es_habil(LUNES))
+        self.assertFalse(calendario.es_habil(SABADO))
+        self.assertEqual(calendario.habil_desde(SABADO), LUNES + timedelta(days=7))
+        self.assertEqual(calendario.habil_hasta(SABADO), LUNES + timedelta(days=4))
+        self.assertEqual(calendario.siguiente_habil(LUNES + timedelta(days=4)), LUNES + timedelta(days=7))
+
+    def test_saltea_feriados(self):
+        martes = LUNES + timedelta(days=1)
+        DiaNoLaborable.objects.create(fecha=martes, descripcion="Feriado")
+        calendario = CalendarioLaboral(LUNES)
+        self.assertFalse(calendario.es_habil(martes))
+        self.assertEqual(calendario.siguiente_habil(LUNES), martes + timedelta(days=1))
+        self.assertEqual(len(calendario.dias_habiles(LUNES, LUNES + timedelta(days=6))), 4)
+        self.assertIsNone(calendario.posicion(martes))
+
+    def test_sumar_dias_habiles(self):
+        calendario = CalendarioLaboral(LUNES)
+        self.assertEqual(calendario.sumar_dias_habiles(LUNES, 0), LUNES)
+        self.assertEqual(calendario.sumar_dias_habiles(SABADO, 0), LUNES + timedelta(days=7))
+        self.assertEqual(calendario.sumar_dias_habiles(LUNES, 5), LUNES + timedelta(days=7))
+
+    def test_indice_y_fecha(self):
+        calendario = CalendarioLaboral(SABADO)
+        self.assertEqual(calendario.indice(SABADO), 0)
+        self.assertEqual(calendario.fecha(0), LUNES + timedelta(days=7))
+        self.assertEqual(calendario.fecha(5), LUNES + timedelta(days=14))
+
+    def test_se_extiende_mas_alla_de_lo_indexado(self):
+        calendario = CalendarioLaboral(LUNES)
+        lejana = LUNES + timedelta(days=DIAS_INICIALES * 3 + 7)
+        self.assertEqual(calendario.habil_desde(lejana), lejana)
+        self.assertEqual(calendario.fecha(calendario.indice(lejana)), lejana)
+
+    def test_antes_del_origen(self):
+        calendario = CalendarioLaboral(LUNES + timedelta(days=7))
+        DiaNoLaborable.objects.create(fecha=LUNES, descripcion="Parada")
+        self.assertEqual(calendario.habil_desde(LUNES - timedelta(days=1)), LUNES + timedelta(days=1))
+        self.assertEqual(calendario.habil_hasta(SABADO), LUNES + timedelta(days=4))
+
+
+class LibroCapacidadTests(TestCase):
+
+    def setUp(self):
+        self.libro = LibroCapacidad(8, estados_op=[], fecha_desde=LUNES)
+
+    def test_primer_dia_libre(self):
+        self.assertEqual(self.libro.primer_dia_libre([1], SABADO), LUNES + timedelta(days=7))
+        self.libro.ocupar(1, LUNES, 6)
+        self.assertEqual(self.libro.primer_dia_libre([1], LUNES, horas=2), LUNES)
+        self.assertEqual(self.libro.primer_dia_libre([1], LUNES, horas=3), LUNES + timedelta(days=1))
+
+    def test_todas_las_lineas_en_el_mismo_dia(self):
+        self.libro.ocupar(1, LUNES, 8)
+        self.libro.ocupar(2, LUNES + timedelta(days=1), 8)
+        self.assertEqual(self.libro.primer_dia_libre([1, 2], LUNES), LUNES + timedelta(days=2))
+        self.assertEqual(self.libro.horas_libres([1, 2], LUNES), 0)
+
+    def test_liberar_horas(self):
+        self.libro.ocupar(1, LUNES, 8)
+        self.assertEqual(self.libro.primer_dia_libre([1], LUNES), LUNES + timedelta(days=1))
+        self.libro.ocupar(1, LUNES, -8)
+        self.assertEqual(self.libro.primer_dia_libre([1], LUNES), LUNES)
+
+    def test_lineas_bloqueadas(self):
+        with lineas_bloqueadas({1: [LUNES]}):
+            libro = LibroCapacidad(8, estados_op=[], fecha_desde=LUNES)
+        self.assertEqual(libro.primer_dia_libre([1], LUNES), LUNES + timedelta(days=1))
+        self.assertEqual(libro.primer_dia_libre([2], LUNES), LUNES)
+
+    def test_reservar_op(self):
+        op = OrdenProduccion()
+        reglas = [SimpleNamespace(id_linea_produccion_id=1, cant_por_hora=10)]
+        self.libro.ocupar(1, LUNES, 5)
+        primero, ultimo = self.libro.reservar_op(op, reglas, 100, LUNES)
+
+        self.assertEqual((primero, ultimo), (LUNES, LUNES + timedelta(days=1)))
+        reservas = [(r.fecha, r.horas_reservadas, r.cantidad_a_producir) for r in self.libro._pendientes]
+        self.assertEqual(reservas, [(LUNES, 3, 30), (LUNES + timedelta(days=1), 7, 70)])
+
+        self.libro.descartar_pendientes(op)
+        self.assertEqual(self.libro.horas_libres([1], LUNES + timedelta(days=1)), 8)
+
+    def test_guardar_op_creada_despues_de_reservar(self):
+        op = OrdenProduccion(
+            id_estado_orden_produccion=EstadoOrdenProduccion.objects.create(descripcion="Pendiente"), cantidad=10
+        )
+        linea = LineaProduccion.objects.create(
+            descripcion="L1", id_estado_linea_produccion=estado_linea_produccion.objects.create(descripcion="Disponible")
+        )
+        self.libro.reservar(op, linea.pk, LUNES, 2, 10)
+        op.save()
+
+        self.assertEqual(self.libro.guardar(), 1)
+        self.assertEqual(
+            list(CalendarioProduccion.objects.values_list('id_orden_produccion_id', 'fecha', 'horas_reservadas')),
+            [(op.pk, LUNES, 2)]
+        )
+        # Liberar la OP devuelve las horas guardadas
+        self.libro.liberar_op(op)
+        self.assertEqual(self.libro.horas_libres([linea.pk], LUNES), 8)
+        self.assertFalse(CalendarioProduccion.objects.exists())
+
+    def test_ocupar_horas(self):
+        ultimo = self.libro.ocupar_horas([1, 2], 20, SABADO)
+        self.assertEqual(ultimo, LUNES + timedelta(days=9))
+        self.assertEqual(self.libro.carga(2, LUNES + timedelta(days=9)), 4)
+
+
+def _pedido(clave, horas, liberacion=0, objetivo=0, peso=1, lineas=(1,)):
+    return {
+        "clave": clave, "lineas": list(lineas), "horas": horas,
+        "liberacion": liberacion, "objetivo": objetivo, "peso": peso,
+    }
+
+
+class CapacidadFinitaTests(SimpleTestCase):
+
+    def test_despachar_en_orden(self):
+        libres = {(1, dia): 8 for dia in range(3)}
+        asignacion = despachar([_pedido("a", 10), _pedido("b", 4)], libres, 3)
+        self.assertEqual(asignacion, {"a": {0: 8, 1: 2}, "b": {1: 4}})
+        # No modifica las horas libres recibidas
+        self.assertEqual(libres[(1, 0)], 8)
+
+    def test_despachar_respeta_liberacion_y_lineas(self):
+        libres = {(1, 0): 8, (1, 1): 8, (2, 0): 0, (2, 1): 3}
+        asignacion = despachar([_pedido("a", 3, lineas=(1, 2))], libres, 2)
+        self.assertEqual(asignacion, {"a": {1: 3}})
+        self.assertIsNone(despachar([_pedido("a", 4, lineas=(1, 2))], libres, 2))
+        self.assertIsNone(despachar([_pedido("a", 9, liberacion=1)], libres, 2))
+
+    def test_asignar_capacidad_prioriza_el_peso(self):
+        libres = {(1, dia): 8 for dia in range(4)}
+        pedidos = [_pedido("normal", 8, objetivo=0, peso=1), _pedido("urgente", 8, objetivo=0, peso=5)]
+        resultado = asignar_capacidad(pedidos, libres, 4, {"max_segundos": 5, "workers": 1})
+
+        self.assertIn(resultado["estado"], ("OPTIMAL", "FEASIBLE"))
+        self.assertEqual(resultado["asignacion"]["urgente"], {0: 8})
+        self.assertEqual(resultado["atraso_ponderado"], atraso_ponderado(pedidos, resultado["asignacion"]))
+        self.assertLessEqual(resultado["atraso_ponderado"], resultado["atraso_inicial"])
+
+    def test_asignar_capacidad_no_supera_las_horas_libres(self):
+        libres = {(1, dia): 4 for dia in range(6)}
+        libres.update({(2, dia): 6 for dia in range(6)})
+        pedidos = [
+            _pedido("a", 6, objetivo=1, lineas=(1, 2)),
+            _pedido("b", 8, objetivo=2, lineas=(2,)),
+            _pedido("c", 5, liberacion=2, objetivo=3, lineas=(1,)),
+        ]
+        resultado = asignar_capacidad(pedidos, libres, 6, {"max_segundos": 5, "workers": 1})
+
+        uso = {}
+        for pedido in pedidos:
+            horas = resultado["asignacion"][pedido["clave"]]
+            self.assertEqual(sum(horas.values()), pedido["horas"])
+            self.assertGreaterEqual(min(horas), pedido["liberacion"])
+            for dia, cantidad in horas.items():
+                for linea in pedido["lineas"]:
+                    uso[(linea, dia)] = uso.get((linea, dia), 0) + cantidad
+        for clave, horas in uso.items():
+            self.assertLessEqual(horas, libres[clave])
+
+    def test_asignar_capacidad_sin_horizonte(self):
+        resultado = asignar_capacidad([_pedido("a", 20)], {(1, 0): 8}, 1, {"max_segundos": 1, "workers": 1})
+        self.assertEqual(resultado["estado"], "INFEASIBLE")
+        self.assertEqual(resultado["asignacion"], {})
+
+
+def _subproblema(tareas, cambios=None, **config):
+    return {
+        "lineas": [1],
+        "tareas": tareas,
+        "cambios": cambios or {},
+        "config": {
+            "horizonte_dias": 1, "dias_con_turno": [0], "tandas_agrupadas": True, "max_segundos": 5,
+            "cambios_max_segundos": 5, "gap_relativo": 0, "workers": 1, **config,
+        },
+    }
+
+
+def _tarea(id_tarea, producto, tandas=2):
+    return {
+        "id": id_tarea, "linea": 1, "producto": producto, "tandas": [(10, 30)] * tandas,
+        "cantidad": 10 * tandas, "max_minutos": 600, "inicios_pista": None,
+    }
+
+
+class SolverDespachoTests(SimpleTestCase):
+
+    def _bloques(self, resultado):
+        """ [(inicio, fin)] de todos los bloques programados, ordenados. """
+        return sorted(
+            (inicio, inicio + sum(duracion for _, duracion in tandas))
+            for tarea in resultado["tareas"].values()
+            for inicio, tandas in tarea["bloques"]
+        )
+
+    def test_programa_todas_las_tareas_sin_superponer(self):
+        resultado = resolver_subproblema(_subproblema([_tarea(i, i % 2) for i in range(4)]))
+
+        self.assertEqual(resultado["estado"], "OPTIMAL")
+        self.assertEqual(resultado["objetivo"], 80)
+        self.assertEqual(set(resultado["tareas"]), {0, 1, 2, 3})
+        bloques = self._bloques(resultado)
+        for (_, fin), (inicio, _) in zip(bloques, bloques[1:]):
+            self.assertLessEqual(fin, inicio)
+        self.assertLessEqual(bloques[-1][1], HORIZONTE_MINUTOS)
+
+    def test_tiempos_de_cambio(self):
+        cambios = {(1, 0, 1): 60, (1, 1, 0): 60}
+        tareas = [_tarea(0, 0), _tarea(1, 1), _tarea(2, 0), _tarea(3, 1)]
+        resultado = resolver_subproblema(_subproblema(tareas, cambios))
+
+        self.assertEqual(set(resultado["tareas"]), {0, 1, 2, 3})
+        # Lo mínimo es agrupar por producto: un solo cambio
+        self.assertEqual(resultado["minutos_cambio"], 60)
+        productos = [
+            tareas[id_tarea]["producto"]
+            for _, id_tarea in sorted((t["bloques"][0][0], i) for i, t in resultado["tareas"].items())
+        ]
+        self.assertEqual(sum(a != b for a, b in zip(productos, productos[1:])), 1)
+
+    def test_sin_tiempo_para_los_cambios_queda_la_primera_pasada(self):
+        cambios = {(1, a, b): 20 + 5 * a + b for a in range(3) for b in range(3) if a != b}
+        tareas = [_tarea(i, i % 3) for i in range(6)]
+        resultado = resolver_subproblema(_subproblema(tareas, cambios, cambios_max_segundos=1e-9))
+
+        self.assertIn(resultado["estado"], ("OPTIMAL", "FEASIBLE"))
+        self.assertEqual(len(resultado["tareas"]), 6)
+        self.assertGreater(resultado["minutos_cambio"], 0)
+
+
+class ColaTrabajosTests(TestCase):
+
+    def test_uno_activo_por_tipo(self):
+        mrp, creado = encolar_trabajo(TrabajoPlanificacion.Tipo.MRP, {})
+        self.assertTrue(creado)
+        self.assertEqual(encolar_trabajo(TrabajoPlanificacion.Tipo.MRP, {}), (mrp, False))
+        self.assertTrue(encolar_trabajo(TrabajoPlanificacion.Tipo.SIMULACION, {})[1])
+
+    def test_de_a_un_trabajo_en_ejecucion(self):
+        mrp, _ = encolar_trabajo(TrabajoPlanificacion.Tipo.MRP, {})
+        simulacion, _ = encolar_trabajo(TrabajoPlanificacion.Tipo.SIMULACION, {})
+
+        self.assertEqual(tomar_siguiente_trabajo("w1"), mrp)
+        # Con el MRP en ejecución, otro worker no toma la simulación
+        self.assertIsNone(tomar_siguiente_trabajo("w2"))
+
+        TrabajoPlanificacion.objects.filter(pk=mrp.pk).update(estado=TrabajoPlanificacion.Estado.COMPLETADO)
+        self.assertEqual(tomar_siguiente_trabajo("w2"), simulacion)
+
+
+class BenchmarkTests(TestCase):
+
+    def test_generar_fabrica(self):
+        resumen = generar_fabrica(20, hoy=LUNES)
+        self.assertEqual(resumen["ordenes_venta"], 20)
+        self.assertEqual(LineaProduccion.objects.count(), resumen["lineas"])
+        self.assertEqual(OrdenVenta.objects.count(), 20)
+
+    def test_ejecutar_benchmark_no_deja_datos(self):
+        resultado = ejecutar_benchmark(10)
+        self.assertEqual(set(resultado["fases"]), {"mrp", "planificador", "replanificador"})
+        self.assertGreater(resultado["ops_generadas"], 0)
+        self.assertFalse(OrdenVenta.objects.exists())
+        self.assertFalse(OrdenProduccion.objects.exists())
+
+    def test_comparar_resultados(self):
+        def corrida(ms, consultas):
+            fases = {fase: {"ms": ms, "consultas": consultas} for fase in ("mrp", "planificador", "replanificador")}
+            return {"resultados": [{"ops_pedidas": 10, "fases": fases}]}
+
+        filas = comparar_resultados(corrida(120.0, 50), corrida(100.0, 80))
+        self.assertEqual([f["fase"] for f in filas], ["mrp", "planificador", "replanificador"])
+        self.assertEqual((filas[0]["delta_ms"], filas[0]["delta_consultas"]), (20.0, -30))
+        self.assertIsNone(comparar_resultados(corrida(120.0, 50), None)[0]["delta_ms"])
+
+
+class SimulacionTests(TestCase):
+
+    def setUp(self):
+        generar_fabrica(10, hoy=LUNES)
+        self.cliente = Cliente.objects.first()
+        self.escenario = leer_escenario({
+            "pedidos": [{
+                "id_cliente": self.cliente.pk,
+                "fecha_entrega": "2025-06-20",
+                "productos": [{"id_producto": Producto.objects.first().pk, "cantidad": 50}],
+            }],
+        })
+
+    def test_no_deja_datos(self):
+        ovs = OrdenVenta.objects.count()
+        resultado = simular_planificacion(LUNES, self.escenario)
+        self.assertGreater(resultado["resumen"]["ops_nuevas"], 0)
+        self.assertEqual(OrdenVenta.objects.count(), ovs)
+        self.assertFalse(OrdenProduccion.objects.exists())
+
+    def test_solo_compara_lo_que_crea_la_simulacion(self):
+        mrp = simulacion.ejecutar_planificacion_diaria_mrp
+
+        def mrp_con_otra_ov(*args):
+            # Otro usuario confirma una OV mientras corre la simulación
+            OrdenVenta.objects.create(
+                id_cliente=self.cliente, id_estado_venta=EstadoVenta.objects.get(descripcion="Creada"),
+                id_prioridad=Prioridad.objects.first(), fecha_entrega=timezone.make_aware(datetime(2025, 6, 25))
+            )
+            return mrp(*args)
+
+        with mock.patch.object(simulacion, 'ejecutar_planificacion_diaria_mrp', mrp_con_otra_ov):
+            resultado = simular_planificacion(LUNES, self.escenario)
+
+        simulados = resultado["entregas"]["pedidos_simulados"]
+        self.assertEqual(len(simulados), 1)
+        self.assertEqual(simulados[0]["fecha_entrega_pedida"], date(2025, 6, 20))
+        ops_nuevas = {op["id_orden_produccion"] for op in resultado["ordenes_produccion"]["nuevas"]}
+        self.assertEqual(len(ops_nuevas), resultado["resumen"]["ops_nuevas"])
+
+
+class CacheCapacidadTests(TestCase):
+
+    def setUp(self):
+        estados = {
+            descripcion: estado_linea_produccion.objects.create(descripcion=descripcion)
+            for descripcion in ("Disponible", "Ocupada", "Fuera de servicio")
+        }
+        self.disponible, self.ocupada, self.fuera = estados.values()
+        self.linea = LineaProduccion.objects.create(descripcion="L1", id_estado_linea_produccion=self.disponible)
+
+    def test_ocupar_la_linea_no_cambia_la_version(self):
+        version = _version_actual()
+        self.linea.id_estado_linea_produccion = self.ocupada
+        self.linea.save()
+        self.linea.id_estado_linea_produccion = self.disponible
+        self.linea.save()
+        self.assertEqual(_version_actual(), version)
+
+    def test_linea_fuera_de_servicio(self):
+        self.assertIn(self.linea.pk, obtener_capacidades().lineas_activas)
+        version = _version_actual()
+        self.linea.id_estado_linea_produccion = self.fuera
+        self.linea.save()
+        self.assertEqual(_version_actual(), version + 1)
+        self.assertNotIn(self.linea.pk, obtener_capacidades().lineas_activas)
+
+    def test_reglas_producto_linea(self):
+        producto = Producto.objects.create(
+            nombre="P1", precio=1, id_tipo_producto=TipoProducto.objects.create(descripcion="T"),
+            id_unidad=Unidad.objects.create(descripcion="U"), dias_duracion=30, umbral_minimo=0
+        )
+        version = _version_actual()
+        ProductoLinea.objects.create(id_producto=producto, id_linea_produccion=self.linea, cant_por_hora=10)
+        self.assertEqual(_version_actual(), version + 1)
+        self.assertEqual(obtener_capacidades().capacidad_total_por_hora(producto.pk), 10)
@@ -0,0 +1,285 @@
+import os
+import socket
+import sys
+import threading
+import traceback
+from datetime import datetime, timedelta
+
+from django.db import connection, transaction, IntegrityError, OperationalError
+from django.utils import timezone
+
+from stock.concurrencia import ejecutar_con_reintentos
+from .models import TrabajoPlanificacion, EjecucionMRP, CorridaPlanificacion
+from . import eventos
+from .planificador import ejecutar_planificacion_diaria_mrp
+from .planner_service import ejecutar_planificador
+from .replanificador import replanificar_ops_por_capacidad
+from .simulacion import leer_escenario, simular_planificacion
+
+
+# ===================================================================
+# TRABAJOS DE PLANIFICACIÓN EN SEGUNDO PLANO
+# Las vistas solo encolan (fila en 'trabajo_planificacion') y devuelven el id.
+# El worker (proceso "worker" del Procfile: manage.py procesar_trabajos_planificacion) toma los
+# trabajos pendientes de a uno, los corre en un hilo aparte y, desde el hilo
+# principal, va guardando PASO actual, progreso y log con su propia conexión
+# (la corrida del MRP es una sola transacción: lo que escribe no se ve hasta el commit).
+# El avance sale de los eventos de planificación (ver eventos.py): el
+# seguimiento se suscribe y toma los PASOS y mensajes de las corridas del trabajo.
+# ===================================================================
+
+# PASOS conocidos por tipo de trabajo (para calcular el % de avance)
+PASOS_POR_TIPO = {
+    TrabajoPlanificacion.Tipo.MRP: ["0.6", "0", "0.5", "1-3", "4", "4.5", "5", "6", "Scheduler"],
+    TrabajoPlanificacion.Tipo.SIMULACION: ["Replanificación", "0.6", "0", "0.5", "1-3", "4", "4.5", "5", "6", "Scheduler"],
+}
+
+
+
+class SeguimientoTrabajo:
+    """
+    Suscriptor de eventos de planificación: acumula los mensajes de las corridas
+    del trabajo para el log y toma de los eventos PASO el paso en curso.
+    """
+
+    def __init__(self, trabajo):
+        self.id_trabajo = trabajo.pk
+        self.pasos = PASOS_POR_TIPO.get(trabajo.tipo, [])
+        self.paso_actual = ""
+        self.progreso = 0
+        self.resultado = {}  # Lo completa la tarea si devuelve datos (ej: simulación)
+        self._lineas = []
+        self._lock = threading.Lock()
+
+    def __call__(self, registro, evento):
+        if registro.corrida.trabajo_id != self.id_trabajo:
+            return
+        if evento.tipo == eventos.Tipo.PASO:
+            self.avanzar(evento.paso)
+            self.agregar(f"\n[PASO {evento.paso}] {evento.mensaje}")
+        else:
+            self.agregar(evento.mensaje)
+
+    def agregar(self, texto):
+        with self._lock:
+            self._lineas.append(texto)
+
+    def avanzar(self, paso):
+        """
+        Marca el PASO en curso. El progreso es la fracción de PASOS ya terminados
+        (los sub-pasos como 'Scheduler 3' cuentan como su PASO: 'Scheduler').
+        """
+        self.paso_actual = paso
+        principal = paso.split(" ")[0]
+        if principal in self.pasos:
+            self.progreso = int(100 * self.pasos.index(principal) / len(self.pasos))
+
+    def log(self):
+        with self._lock:
+            return "\n".join(self._lineas)
+
+
+# ------------------------------------------------------------------
+# Tareas (una por tipo de trabajo)
+# ------------------------------------------------------------------
+def _fecha_de(parametros):
+    fecha = parametros.get("fecha")
+    return datetime.strptime(fecha, "%Y-%m-%d").date() if fecha else timezone.localdate()
+
+
+def _intento_mrp(fecha, modo):
+    eventos.nuevo_intento()
+    try:
+        ejecutar_planificacion_diaria_mrp(fecha, modo)
+    except Exception:
+        eventos.intento_fallido()
+        raise
+
+
+def _tarea_mrp(parametros, seguimiento):
+    fecha = _fecha_de(parametros)
+    modo = parametros.get("modo", EjecucionMRP.Modo.COMPLETO)
+
+    # 1. MRP: QUÉ producir y CUÁNDO (reintenta si choca con reservas concurrentes).
+    # La corrida se abre afuera de los reintentos: un solo registro, con los eventos
+    # del intento que quedó (los de los intentos deshechos se descartan).
+    with eventos.corrida(CorridaPlanificacion.Origen.MRP):
+        eventos.info("--- INICIANDO FASE 1: MRP (Planificación de Materiales) ---")
+        ejecutar_con_reintentos("mrp", _intento_mrp, fecha, modo)
+        eventos.info("--- FASE 1: MRP COMPLETADA ---")
+
+    # 2. Scheduler: OTs para mañana a partir de las OPs "Pendiente de inicio"
+    with eventos.corrida(CorridaPlanificacion.Origen.PLANIFICADOR):
+        eventos.paso("Scheduler", "--- INICIANDO FASE 2: SCHEDULER (Planificación de Taller) ---")
+        ejecutar_planificador(fecha)
+        eventos.info("--- FASE 2: SCHEDULER COMPLETADA ---")
+    return f"Planificador MRP ({modo}) ejecutado para {fecha}."
+
+
+def _tarea_planificador(parametros, seguimiento):
+    fecha = _fecha_de(parametros)
+    ejecutar_planificador(fecha, horizonte_dias=parametros.get("horizonte_dias"))
+    return "Planificador ejecutado exitosamente. Se crearon las Órdenes de Trabajo."
+
+
+def _tarea_replanificacion_capacidad(parametros, seguimiento):
+    fecha = _fecha_de(parametros)
+    productos_ids = parametros.get("productos")
+    replanificar_ops_por_capacidad(
+        fecha_simulada=fecha,
+        productos_a_replanificar_ids=productos_ids
+    )
+    mensaje = f"Replanificación por capacidad ejecutada para {fecha}."
+    if productos_ids:
+        mensaje += f" Productos enfocados: {productos_ids}."
+    return mensaje
+
+
+def _tarea_simulacion(parametros, seguimiento):
+    fecha = _fecha_de(parametros)
+    seguimiento.resultado = simular_planificacion(fecha, leer_escenario(parametros.get("escenario")))
+    resumen = seguimiento.resultado["resumen"]
+    return (
+        f"Simulación para {fecha} (sin cambios en la BD): {resumen['ops_nuevas']} OPs nuevas, "
+        f"{resumen['ops_modificadas']} modificadas, {resumen['entregas_movidas']} entregas movidas, "
+        f"{resumen['ocs_nuevas']} OCs nuevas."
+    )
+
+
+TAREAS = {
+    TrabajoPlanificacion.Tipo.MRP: _tarea_mrp,
+    TrabajoPlanificacion.Tipo.PLANIFICADOR: _tarea_planificador,
+    TrabajoPlanificacion.Tipo.REPLANIFICACION_CAPACIDAD: _tarea_replanificacion_capacidad,
+    TrabajoPlanificacion.Tipo.SIMULACION: _tarea_simulacion,
+}
+
+
+# ------------------------------------------------------------------
+# Cola
+# ------------------------------------------------------------------
+def marcar_trabajos_caidos():
+    """ Pasa a ERROR los trabajos 'En ejecución' cuyo worker dejó de dar señales. """
+    from trazabilidad.views import get_config
+
+    limite = timezone.now() - timedelta(seconds=get_config('TRABAJOS_PLANIFICACION_TIMEOUT_SEG', 600))
+    return TrabajoPlanificacion.objects.filter(
+        estado=TrabajoPlanificacion.Estado.EN_EJECUCION,
+        fecha_actualizacion__lt=limite
+    ).update(
+        estado=TrabajoPlanificacion.Estado.ERROR,
+        mensaje="El worker dejó de responder (trabajo abandonado).",
+        fecha_fin=timezone.now()
+    )
+
+
+def encolar_trabajo(tipo, parametros):
+    """
+    Crea el trabajo en estado PENDIENTE y devuelve (trabajo, creado).
+    Si ya hay uno activo del mismo tipo devuelve ese con creado=False
+    (la restricción única de la tabla lo garantiza aun con requests simultáneos).
+    """
+    marcar_trabajos_caidos()
+    try:
+        with transaction.atomic():
+            return TrabajoPlanificacion.objects.create(tipo=tipo, parametros=parametros), True
+    except IntegrityError:
+        activo = TrabajoPlanificacion.objects.filter(
+            tipo=tipo, estado__in=TrabajoPlanificacion.ESTADOS_ACTIVOS
+        ).first()
+        if activo is None:
+            # Terminó justo entre el INSERT y la consulta: reintentamos una vez
+            return TrabajoPlanificacion.objects.create(tipo=tipo, parametros=parametros), True
+        return activo, False
+
+
+def tomar_siguiente_trabajo(worker):
+    """
+    Toma el trabajo pendiente más antiguo (SKIP LOCKED: varios workers no se pisan).
+    Mientras otro trabajo esté en ejecución no toma ninguno: la restricción única de
+    la tabla lo garantiza aun si dos workers lo intentan a la vez.
+    """
+    if TrabajoPlanificacion.objects.filter(estado=TrabajoPlanificacion.Estado.EN_EJECUCION).exists():
+        return None
+    try:
+        with transaction.atomic():
+            trabajo = TrabajoPlanificacion.objects.select_for_update(skip_locked=True).filter(
+                estado=TrabajoPlanificacion.Estado.PENDIENTE
+            ).order_by('fecha_creacion').first()
+            if trabajo is None:
+                return None
+
+            ahora = timezone.now()
+            trabajo.estado = TrabajoPlanificacion.Estado.EN_EJECUCION
+            trabajo.worker = worker
+            trabajo.fecha_inicio = ahora
+            trabajo.fecha_actualizacion = ahora
+            trabajo.save(update_fields=['estado', 'worker', 'fecha_inicio', 'fecha_actualizacion'])
+    except IntegrityError:
+        # Otro worker empezó un trabajo al mismo tiempo: este queda pendiente
+        return None
+    return trabajo
+
+
+def _guardar_avance(trabajo, seguimiento):
+    try:
+        TrabajoPlanificacion.objects.filter(pk=trabajo.pk).update(
+            paso_actual=seguimiento.paso_actual,
+            progreso=seguimiento.progreso,
+            log=seguimiento.log(),
+            fecha_actualizacion=timezone.now()
+        )
+    except OperationalError as e:
+        # sqlite local: la corrida tiene la BD bloqueada; se reintenta en el próximo latido
+        print(f"⚠️ No se pudo guardar el avance del trabajo {trabajo.pk}: {e}", file=sys.stderr)
+
+
+def ejecutar_trabajo(trabajo):
+    """ Corre un trabajo ya tomado y deja el resultado (o el error) en su fila. """
+    from trazabilidad.views import get_config
+
+    intervalo = get_config('TRABAJOS_PLANIFICACION_INTERVALO_SEG', 2)
+    seguimiento = SeguimientoTrabajo(trabajo)
+    resultado = {}
+
+    def _correr():
+        eventos.asociar_trabajo(trabajo)
+        try:
+            resultado["mensaje"] = TAREAS[trabajo.tipo](trabajo.parametros, seguimiento)
+        except Exception as e:
+            resultado["error"] = f"{e}"
+            seguimiento.agregar(traceback.format_exc())
+        finally:
+            eventos.asociar_trabajo(None)
+            # Cada hilo abre su propia conexión: la cerramos al terminar
+            connection.close()
+
+    hilo = threading.Thread(target=_correr, name=f"trabajo-planificacion-{trabajo.pk}", daemon=True)
+    eventos.suscribir(seguimiento)
+    try:
+        hilo.start()
+        while hilo.is_alive():
+            hilo.join(intervalo)
+            _guardar_avance(trabajo, seguimiento)
+    finally:
+        eventos.desuscribir(seguimiento)
+
+    if "error" in resultado:
+        trabajo.estado = TrabajoPlanificacion.Estado.ERROR
+        trabajo.mensaje = resultado["error"]
+        trabajo.progreso = seguimiento.progreso
+    else:
+        trabajo.estado = TrabajoPlanificacion.Estado.COMPLETADO
+        trabajo.mensaje = resultado.get("mensaje") or ""
+        trabajo.progreso = 100
+
+    trabajo.paso_actual = seguimiento.paso_actual
+    trabajo.log = seguimiento.log()
+    trabajo.resultado = seguimiento.resultado
+    trabajo.fecha_fin = timezone.now()
+    trabajo.fecha_actualizacion = trabajo.fecha_fin
+    trabajo.save()
+    return trabajo
+
+
+def identificador_worker():
+    return f"{socket.gethostname()}:{os.getpid()}"
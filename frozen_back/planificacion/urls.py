@@ -1,7 +1,12 @@
-from django.urls import path
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
 from . import views
 
+router = DefaultRouter()
+router.register(r'dias-no-laborables', views.DiaNoLaborableViewSet)
+
 urlpatterns = [
+    path('', include(router.urls)),
     # Registra la vista en la URL 'api/planificacion/ejecutar/'
     path('planificacion/', views.ejecutar_planificacion_view, name='ejecutar-planificacion'),
     path('replanificar/', views.replanificar_produccion_view, name='replanificar_produccion'),
@@ -12,5 +17,12 @@ urlpatterns = [
         name='calendario_planificacion_feed'
     ),
     path('replanificar-ops-por-capacidad/', views.replanificar_capacidad_view, name='replanificar-ops-por-capacidad'),
+    path('simular/', views.simular_planificacion_view, name='simular-planificacion'),
+    path('trabajos/', views.listar_trabajos_planificacion_view, name='trabajos-planificacion'),
+    path('trabajos/<int:id_trabajo>/', views.detalle_trabajo_planificacion_view, name='trabajo-planificacion-detalle'),
+    path('corridas/', views.listar_corridas_planificacion_view, name='corridas-planificacion'),
+    path('corridas/<int:id_corrida>/', views.detalle_corrida_planificacion_view, name='corrida-planificacion-detalle'),
+    path('corridas/<int:id_corrida>/eventos/', views.eventos_corrida_planificacion_view, name='corrida-planificacion-eventos'),
+    path('corridas/<int:id_corrida>/perfil/', views.perfil_corrida_planificacion_view, name='corrida-planificacion-perfil'),
 
 ]
\ No newline at end of file
@@ -3,12 +3,20 @@ from django.shortcuts import render
 # Create your views here.
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from rest_framework import status
+from rest_framework import status, viewsets
 from compras.models import OrdenCompra
 from ventas.models import OrdenVenta
 from produccion.models import OrdenProduccion
-from planificacion.planner_service import ejecutar_planificador, replanificar_produccion
-from planificacion.planificador import ejecutar_planificacion_diaria_mrp
+from planificacion.planner_service import replanificar_produccion
+from planificacion.models import EjecucionMRP, TrabajoPlanificacion, CorridaPlanificacion, EventoPlanificacion, DiaNoLaborable
+from planificacion.serializers import (
+    TrabajoPlanificacionSerializer, TrabajoPlanificacionDetalleSerializer,
+    CorridaPlanificacionSerializer, EventoPlanificacionSerializer, MedicionPasoSerializer,
+    DiaNoLaborableSerializer
+)
+from planificacion.perfilado import resumen_por_paso, corrida_anterior, comparar
+from planificacion.trabajos import encolar_trabajo
+from planificacion.simulacion import leer_escenario
 import traceback
 from datetime import timedelta, date, datetime
 from django.utils import timezone
@@ -22,30 +30,41 @@ from rest_framework.response import Response
 from django.db.models import F, Case, When, Value, CharField, Sum
 from django.utils import timezone
 from datetime import timedelta, datetime
-from planificacion.replanificador import replanificar_ops_por_capacidad
 
 @api_view(['POST']) # Define que esta vista solo acepta POST
 def ejecutar_planificacion_view(request):
     """
     Endpoint para disparar el script de planificación de Google OR-Tools.
+    El solver corre en el worker de planificación: se devuelve el id del trabajo
+    para consultar su avance en /api/planificacion/trabajos/<id>/.
+
+    Opcionalmente, acepta un JSON con:
+    {
+        "fecha": "YYYY-MM-DD",
+        "horizonte_dias": 5   (horizonte rodante; default: config PLANIFICADOR_HORIZONTE_DIAS)
+    }
     """
-    try:
-        print("Iniciando planificador desde el endpoint /planificacion/...")
-        
-        # Llama a tu función principal del planner_service
-        ejecutar_planificador() 
-        
-        return Response(
-            {"mensaje": "Planificador ejecutado exitosamente. Se crearon las Órdenes de Trabajo."}, 
-            status=status.HTTP_200_OK
-        )
-    
-    except Exception as e:
-        print(f"Error al ejecutar el planificador desde API: {str(e)}")
-        return Response(
-            {"error": f"Ocurrió un error al ejecutar el planificador: {str(e)}"}, 
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
+    fecha_enviada = request.data.get('fecha')
+    if fecha_enviada and _fecha_invalida(fecha_enviada):
+        return _respuesta_fecha_invalida()
+
+    horizonte_dias = request.data.get('horizonte_dias')
+    if horizonte_dias is not None:
+        try:
+            horizonte_dias = int(horizonte_dias)
+        except (TypeError, ValueError):
+            horizonte_dias = 0
+        if not 1 <= horizonte_dias <= 30:
+            return Response(
+                {"status": "error", "message": "'horizonte_dias' debe ser un entero entre 1 y 30."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+    return _respuesta_encolado(
+        TrabajoPlanificacion.Tipo.PLANIFICADOR,
+        {"fecha": fecha_enviada, "horizonte_dias": horizonte_dias},
+        "Planificador encolado."
+    )
     
 
 @api_view(['POST']) # Define que esta vista solo acepta POST
@@ -77,62 +96,36 @@ def replanificar_produccion_view(request):
 @api_view(['POST'])
 def ejecutar_planificador_view(request):
     """
-    Endpoint para disparar manualmente el Planificador MRP Diario.
+    Endpoint para disparar manualmente el Planificador MRP Diario (MRP + Scheduler).
+    La corrida se encola para el worker de planificación y se responde enseguida
+    con el id del trabajo. Si ya hay un MRP en curso se devuelve ese (409).
     
-    Opcionalmente, acepta un JSON para simular una fecha:
+    Opcionalmente, acepta un JSON para simular una fecha y elegir el modo del MRP:
     {
-        "fecha": "YYYY-MM-DD"
+        "fecha": "YYYY-MM-DD",
+        "modo": "COMPLETO" | "INCREMENTAL"   (default: COMPLETO)
     }
     """
     
-    fecha_a_usar = None
     fecha_enviada = request.data.get('fecha')
+    modo = request.data.get('modo', EjecucionMRP.Modo.COMPLETO)
 
-    if fecha_enviada:
-        # Si el usuario envía una fecha, la usamos para simular
-        try:
-            fecha_a_usar = datetime.strptime(fecha_enviada, "%Y-%m-%d").date()
-            print(f"Simulando ejecución del planificador para la fecha: {fecha_a_usar}")
-        except ValueError:
-            return Response(
-                {"status": "error", "message": "Formato de fecha inválido. Use YYYY-MM-DD."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-    else:
-        # Si no se envía fecha, usa el día real (para producción)
-        fecha_a_usar = timezone.localdate()
-        print(f"Ejecutando planificador para la fecha actual: {fecha_a_usar}")
-
-    try:
-       # --- INICIO DE LÓGICA MODIFICADA ---
-        
-        # 1. Primero, corre el MRP para determinar QUÉ producir y CUÁNDO (Crea OPs "Pendiente de inicio")
-        print("\n--- INICIANDO FASE 1: MRP (Planificación de Materiales) ---")
-        ejecutar_planificacion_diaria_mrp(fecha_a_usar)
-        print("--- FASE 1: MRP COMPLETADA ---")
-
-        # 2. Segundo, corre el Scheduler para planificar el día de MAÑANA
-        #    (Toma las OPs "Pendiente de inicio" para mañana y crea las OTs)
-        print("\n--- INICIANDO FASE 2: SCHEDULER (Planificación de Taller) ---")
-        # Nota: El scheduler usa 'timezone.localdate() + 1' internamente,
-        # así que no necesita la fecha simulada (a menos que quieras cambiarlo).
-        ejecutar_planificador(fecha_a_usar)
-        print("--- FASE 2: SCHEDULER COMPLETADA ---")
-        
-        # --- FIN DE LÓGICA MODIFICADA ---
-        print("Planificador MRP ejecutado exitosamente desde la API.")
+    if modo not in EjecucionMRP.Modo.values:
         return Response(
-            {"status": "ok", "message": f"Planificador MRP ejecutado para {fecha_a_usar}." },
-            status=status.HTTP_200_OK
-        )
-    except Exception as e:
-        # Captura cualquier error que ocurra durante la planificación
-        print(f"ERROR al ejecutar planificador desde API: {e}")
-        traceback.print_exc() # Imprime el error completo en la consola del servidor
-        return Response(
-            {"status": "error", "message": f"Error al ejecutar el planificador: {str(e)}"},
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            {"status": "error", "message": f"Modo inválido. Use uno de: {', '.join(EjecucionMRP.Modo.values)}."},
+            status=status.HTTP_400_BAD_REQUEST
         )
+
+    # Si el usuario envía una fecha, la usamos para simular;
+    # si no, el worker usa el día real (para producción)
+    if fecha_enviada and _fecha_invalida(fecha_enviada):
+        return _respuesta_fecha_invalida()
+
+    return _respuesta_encolado(
+        TrabajoPlanificacion.Tipo.MRP,
+        {"fecha": fecha_enviada, "modo": modo},
+        f"Planificador MRP ({modo}) encolado."
+    )
     
 @api_view(['POST'])
 def replanificar_capacidad_view(request):
@@ -147,47 +140,248 @@ def replanificar_capacidad_view(request):
     }
     """
     
-    fecha_a_usar = None
     fecha_enviada = request.data.get('fecha')
     productos_ids = request.data.get('productos')
 
-    # --- 1. Determinar Fecha de Ejecución ---
-    if fecha_enviada:
-        try:
-            fecha_a_usar = datetime.strptime(fecha_enviada, "%Y-%m-%d").date()
-        except ValueError:
-            return Response(
-                {"status": "error", "message": "Formato de fecha inválido. Use YYYY-MM-DD."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-    else:
-        fecha_a_usar = timezone.localdate()
+    # --- 1. Validar Fecha de Ejecución ---
+    if fecha_enviada and _fecha_invalida(fecha_enviada):
+        return _respuesta_fecha_invalida()
 
-    print(f"Iniciando Replanificación de Capacidad para fecha: {fecha_a_usar}")
-    
-    # --- 2. Ejecutar Replanificación ---
+    # --- 2. Encolar Replanificación ---
+    mensaje = "Replanificación por capacidad encolada."
+    if productos_ids:
+        mensaje += f" Productos enfocados: {productos_ids}."
+    return _respuesta_encolado(
+        TrabajoPlanificacion.Tipo.REPLANIFICACION_CAPACIDAD,
+        {"fecha": fecha_enviada, "productos": productos_ids},
+        mensaje
+    )
+
+
+@api_view(['POST'])
+def simular_planificacion_view(request):
+    """
+    Simulación "¿qué pasa si...?": corre replanificación, MRP y (opcional) solver
+    con un escenario aplicado y deshace todo al final. Se encola para el worker;
+    la diferencia de plan queda en el campo 'resultado' de
+    /api/planificacion/trabajos/<id>/.
+
+    Acepta un JSON con:
+    {
+        "fecha": "YYYY-MM-DD" (Opcional, simula la fecha de hoy),
+        "pedidos": [{"id_cliente": 1, "id_prioridad": 1 (opcional), "fecha_entrega": "YYYY-MM-DD",
+                     "productos": [{"id_producto": 3, "cantidad": 100}]}],
+        "lineas_fuera_de_servicio": [{"id_linea_produccion": 2, "desde": "YYYY-MM-DD", "hasta": "YYYY-MM-DD"}],
+        "incluir_despacho": true (default),
+        "modo": "COMPLETO" | "INCREMENTAL" (default: COMPLETO)
+    }
+    """
+    fecha_enviada = request.data.get('fecha')
+    if fecha_enviada and _fecha_invalida(fecha_enviada):
+        return _respuesta_fecha_invalida()
+
+    escenario = {
+        clave: request.data.get(clave)
+        for clave in ("pedidos", "lineas_fuera_de_servicio", "incluir_despacho", "modo")
+        if request.data.get(clave) is not None
+    }
     try:
-        replanificar_ops_por_capacidad(
-            fecha_simulada=fecha_a_usar,
-            productos_a_replanificar_ids=productos_ids
+        leer_escenario(escenario)
+    except ValueError as e:
+        return Response({"status": "error", "message": f"{e}"}, status=status.HTTP_400_BAD_REQUEST)
+
+    return _respuesta_encolado(
+        TrabajoPlanificacion.Tipo.SIMULACION,
+        {"fecha": fecha_enviada, "escenario": escenario},
+        "Simulación encolada (no modifica el plan)."
+    )
+
+# ===================================================================
+# TRABAJOS DE PLANIFICACIÓN (cola del worker)
+# ===================================================================
+def _fecha_invalida(fecha_enviada):
+    try:
+        datetime.strptime(fecha_enviada, "%Y-%m-%d")
+        return False
+    except (TypeError, ValueError):
+        return True
+
+
+def _respuesta_fecha_invalida():
+    return Response(
+        {"status": "error", "message": "Formato de fecha inválido. Use YYYY-MM-DD."},
+        status=status.HTTP_400_BAD_REQUEST
+    )
+
+
+def _limite_de(request, por_defecto):
+    try:
+        return int(request.query_params.get('limite', por_defecto))
+    except ValueError:
+        return por_defecto
+
+
+def _respuesta_encolado(tipo, parametros, mensaje):
+    trabajo, creado = encolar_trabajo(tipo, parametros)
+    if not creado:
+        return Response(
+            {
+                "status": "error",
+                "message": f"Ya hay un trabajo {trabajo.get_tipo_display()} en curso (#{trabajo.id_trabajo}).",
+                "id_trabajo": trabajo.id_trabajo,
+                "estado": trabajo.estado,
+            },
+            status=status.HTTP_409_CONFLICT
         )
-        
-        mensaje = f"Replanificación por capacidad ejecutada para {fecha_a_usar}."
-        if productos_ids:
-            mensaje += f" Productos enfocados: {productos_ids}."
-            
+    return Response(
+        {"status": "ok", "message": mensaje, "id_trabajo": trabajo.id_trabajo, "estado": trabajo.estado},
+        status=status.HTTP_202_ACCEPTED
+    )
+
+
+@api_view(['GET'])
+def listar_trabajos_planificacion_view(request):
+    """
+    Últimos trabajos de planificación (sin log).
+    Filtros opcionales: ?tipo=MRP&estado=EN_EJECUCION&limite=20
+    """
+    trabajos = TrabajoPlanificacion.objects.all()
+    if request.query_params.get('tipo'):
+        trabajos = trabajos.filter(tipo=request.query_params['tipo'])
+    if request.query_params.get('estado'):
+        trabajos = trabajos.filter(estado=request.query_params['estado'])
+
+    limite = _limite_de(request, 20)
+    serializer = TrabajoPlanificacionSerializer(trabajos.defer('log', 'resultado')[:limite], many=True)
+    return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def detalle_trabajo_planificacion_view(request, id_trabajo):
+    """ Estado, PASO actual, progreso (%) y log de un trabajo de planificación. """
+    try:
+        trabajo = TrabajoPlanificacion.objects.get(pk=id_trabajo)
+    except TrabajoPlanificacion.DoesNotExist:
         return Response(
-            {"status": "ok", "message": mensaje },
-            status=status.HTTP_200_OK
+            {"status": "error", "message": f"No existe el trabajo {id_trabajo}."},
+            status=status.HTTP_404_NOT_FOUND
         )
-            
-    except Exception as e:
-        print(f"ERROR CRÍTICO al ejecutar replanificación de capacidad: {e}")
-        traceback.print_exc()
+    return Response(TrabajoPlanificacionDetalleSerializer(trabajo).data, status=status.HTTP_200_OK)
+
+
+# ===================================================================
+# CORRIDAS Y EVENTOS DE PLANIFICACIÓN (registro estructurado)
+# ===================================================================
+def _buscar_corrida(id_corrida):
+    try:
+        return CorridaPlanificacion.objects.get(pk=id_corrida), None
+    except CorridaPlanificacion.DoesNotExist:
+        return None, Response(
+            {"status": "error", "message": f"No existe la corrida {id_corrida}."},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+
+@api_view(['GET'])
+def listar_corridas_planificacion_view(request):
+    """
+    Últimas corridas de planificación (MRP, planificador, replanificación).
+    Filtros opcionales: ?origen=MRP&trabajo=12&limite=20
+    """
+    corridas = CorridaPlanificacion.objects.all()
+    if request.query_params.get('origen'):
+        corridas = corridas.filter(origen=request.query_params['origen'])
+    if request.query_params.get('trabajo'):
+        corridas = corridas.filter(trabajo_id=request.query_params['trabajo'])
+
+    limite = _limite_de(request, 20)
+    serializer = CorridaPlanificacionSerializer(corridas[:limite], many=True)
+    return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def detalle_corrida_planificacion_view(request, id_corrida):
+    """ Datos de la corrida + resumen de eventos por tipo y por nivel. """
+    corrida, error = _buscar_corrida(id_corrida)
+    if error:
+        return error
+
+    datos = CorridaPlanificacionSerializer(corrida).data
+    datos["eventos_por_tipo"] = {
+        fila["tipo"]: fila["total"]
+        for fila in corrida.eventos.values("tipo").annotate(total=models.Count("id_evento")).order_by()
+    }
+    datos["eventos_por_nivel"] = {
+        EventoPlanificacion.Nivel(fila["nivel"]).label: fila["total"]
+        for fila in corrida.eventos.values("nivel").annotate(total=models.Count("id_evento")).order_by()
+    }
+    return Response(datos, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def eventos_corrida_planificacion_view(request, id_corrida):
+    """
+    Eventos de una corrida, en orden.
+    Filtros opcionales: ?tipo=OP_CREADA&nivel=30&paso=5&op=15&ov=7&desde=120&limite=500
+    ('nivel' es el mínimo; 'desde' es la secuencia a partir de la cual traer, para paginar).
+    """
+    corrida, error = _buscar_corrida(id_corrida)
+    if error:
+        return error
+
+    eventos = corrida.eventos.all()
+    parametros = request.query_params
+    try:
+        if parametros.get('tipo'):
+            eventos = eventos.filter(tipo__in=parametros['tipo'].split(','))
+        if parametros.get('nivel'):
+            eventos = eventos.filter(nivel__gte=int(parametros['nivel']))
+        if parametros.get('paso'):
+            eventos = eventos.filter(paso=parametros['paso'])
+        if parametros.get('op'):
+            eventos = eventos.filter(id_orden_produccion=int(parametros['op']))
+        if parametros.get('ov'):
+            eventos = eventos.filter(id_orden_venta=int(parametros['ov']))
+        if parametros.get('desde'):
+            eventos = eventos.filter(secuencia__gt=int(parametros['desde']))
+    except ValueError:
         return Response(
-            {"status": "error", "message": f"Error en la replanificación de capacidad: {str(e)}"},
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            {"status": "error", "message": "Los filtros 'nivel', 'op', 'ov' y 'desde' deben ser numéricos."},
+            status=status.HTTP_400_BAD_REQUEST
         )
+
+    limite = _limite_de(request, 500)
+    serializer = EventoPlanificacionSerializer(eventos[:limite], many=True)
+    return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def perfil_corrida_planificacion_view(request, id_corrida):
+    """
+    Perfil por PASO de una corrida (tiempo, consultas, filas, pico de memoria),
+    comparado contra la corrida COMPLETADA anterior del mismo origen.
+    Con ?tramos=1 incluye además cada tramo medido tal cual se guardó.
+    """
+    corrida, error = _buscar_corrida(id_corrida)
+    if error:
+        return error
+
+    pasos = resumen_por_paso(corrida)
+    anterior = corrida_anterior(corrida)
+    if anterior is not None:
+        pasos = comparar(pasos, resumen_por_paso(anterior))
+
+    datos = {
+        "id_corrida": corrida.id_corrida,
+        "origen": corrida.origen,
+        "estado": corrida.estado,
+        "fecha_inicio": corrida.fecha_inicio,
+        "corrida_anterior": anterior.id_corrida if anterior else None,
+        "pasos": pasos,
+    }
+    if request.query_params.get('tramos') == '1':
+        datos["tramos"] = MedicionPasoSerializer(corrida.mediciones.all(), many=True).data
+    return Response(datos, status=status.HTTP_200_OK)
     
 
 class CalendarioPlanificacionView(APIView):
@@ -339,4 +533,13 @@ class CalendarioPlanificacionView(APIView):
             return Response(
                 {"error": "Ocurrió un error interno al generar el calendario.", "detalle": str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
\ No newline at end of file
+            )
+
+
+class DiaNoLaborableViewSet(viewsets.ModelViewSet):
+    """
+    ABM de feriados y paradas de planta. El MRP, el replanificador y la
+    verificación de OVs no planifican producción en estos días.
+    """
+    queryset = DiaNoLaborable.objects.all()
+    serializer_class = DiaNoLaborableSerializer
@@ -6,18 +6,24 @@ from stock.models import LoteMateriaPrima, EstadoLoteMateriaPrima, LoteProduccio
 from recetas.models import Receta, RecetaMateriaPrima
 from django.core.exceptions import ValidationError
 from recetas.models import Receta, RecetaMateriaPrima
-from stock.services import verificar_stock_mp_y_enviar_alerta
+from stock.services import verificar_stock_mp_y_enviar_alertas
+from stock.asignacion import AsignadorFEFO
+from stock.concurrencia import ejecutar_con_reintentos
 
 from stock.models import EstadoLoteProduccion
 
 
-@transaction.atomic
 def procesar_ordenes_en_espera(materia_prima_ingresada):
     """
     Busca órdenes de producción 'En espera' que necesiten la materia prima que acaba de ingresar.
     Si ahora tienen stock suficiente para TODOS sus ingredientes, las pasa a 'Pendiente de inicio'
     creando RESERVAS en lugar de descontar directamente.
+    Corre en su propia transacción y se reintenta si choca con otra reserva concurrente.
     """
+    return ejecutar_con_reintentos("ordenes_en_espera", _procesar_ordenes_en_espera, materia_prima_ingresada)
+
+
+def _procesar_ordenes_en_espera(materia_prima_ingresada):
     print(f"Iniciando revisión de órdenes en espera por ingreso de: {materia_prima_ingresada.nombre}")
 
     # 1. Obtener los estados que vamos a necesitar
@@ -42,6 +48,13 @@ def procesar_ordenes_en_espera(materia_prima_ingresada):
 
     print(f"Se encontraron {ordenes_a_revisar.count()} órdenes para revisar.")
 
+    # Lotes de MP bloqueados y cargados una vez; las reservas se insertan todas juntas al final
+    asignador = AsignadorFEFO.para_materias_primas(estado_activa_reserva, estado_lote=estado_disponible_mp)
+    # Todas las MPs de las recetas en una sola llamada (locks en orden, ver stock/concurrencia.py)
+    asignador.precargar(RecetaMateriaPrima.objects.filter(
+        id_receta__id_producto__in=ordenes_a_revisar.values('id_producto')
+    ).values_list('id_materia_prima_id', flat=True))
+
     # 3. Iterar sobre cada orden y verificar si AHORA tiene stock completo
     for orden in ordenes_a_revisar:
         print(f"Revisando stock para la Orden de Producción #{orden.id_orden_produccion}...")
@@ -67,14 +80,8 @@ def procesar_ordenes_en_espera(materia_prima_ingresada):
                 
                 if cantidad_faltante > 0:
                     # Calcular stock disponible para completar lo que falta
-                    lotes_disponibles = LoteMateriaPrima.objects.filter(
-                        id_materia_prima=materia,
-                        id_estado_lote_materia_prima=estado_disponible_mp
-                    )
-                    stock_disponible_total = 0
-
-                    for lote in lotes_disponibles:
-                        stock_disponible_total += lote.cantidad_disponible
+                    # (ya descontado lo asignado a las órdenes anteriores de esta misma revisión)
+                    stock_disponible_total = asignador.disponible(materia.pk)
 
                     if stock_disponible_total < cantidad_faltante:
                         stock_suficiente = False
@@ -107,34 +114,10 @@ def procesar_ordenes_en_espera(materia_prima_ingresada):
                     if cantidad_faltante > 0:
                         print(f"  Completando reserva para {materia.nombre}: faltan {cantidad_faltante} unidades")
                         
-                        lotes_mp = LoteMateriaPrima.objects.filter(
-                            id_materia_prima=materia,
-                            id_estado_lote_materia_prima=estado_disponible_mp
-                        ).order_by('fecha_vencimiento')
-
-                        cantidad_a_reservar = cantidad_faltante
-
-                        for lote in lotes_mp:
-                            if cantidad_a_reservar <= 0: 
-                                break
-                            
-                            disponible_lote = lote.cantidad_disponible
-                            if disponible_lote <= 0:
-                                continue
-                                
-                            cantidad_reservada = min(disponible_lote, cantidad_a_reservar)
-                            
-                            # Crear nueva reserva para completar lo faltante
-                            ReservaMateriaPrima.objects.create(
-                                id_orden_produccion=orden,
-                                id_lote_materia_prima=lote,
-                                cantidad_reservada=cantidad_reservada,
-                                id_estado_reserva_materia=estado_activa_reserva
-                            )
-                            
-                            cantidad_a_reservar -= cantidad_reservada
-                            reservas_creadas += 1
-                            print(f"    → Reservados {cantidad_reservada} de {materia.nombre} (Lote: {lote.id_lote_materia_prima})")
+                        # Reparto FEFO en memoria (se guarda con un bulk_create al final)
+                        cantidad_reservada = asignador.asignar(orden, materia.pk, cantidad_faltante)
+                        reservas_creadas += 1
+                        print(f"    → Reservados {cantidad_reservada} de {materia.nombre}")
                 
                 # Cambiar estado de la orden
                 orden.id_estado_orden_produccion = estado_pendiente
@@ -149,6 +132,8 @@ def procesar_ordenes_en_espera(materia_prima_ingresada):
             print(f"Advertencia: La orden #{orden.id_orden_produccion} no tiene receta asociada. Se omite.")
             continue
 
+    asignador.guardar()
+
 
 
 
@@ -221,8 +206,7 @@ def descontar_stock_reservado(orden):
 
 
     print(f"Verificando umbrales de stock para {len(materias_primas_afectadas)} materias primas...")
-    for mp_id in materias_primas_afectadas:
-        verificar_stock_mp_y_enviar_alerta(mp_id)
+    verificar_stock_mp_y_enviar_alertas(materias_primas_afectadas)
 
 
 
@@ -21,6 +21,8 @@ from .serializers import (
     NoConformidadCreateSerializer
 )
 from .filters import OrdenDeTrabajoFilter, OrdenProduccionFilter
+from reportes.cache_reportes import FUENTE_PRODUCCION, invalidar_reportes
+from reportes.exportacion import ExportacionMixin
 from django.utils import timezone
 from datetime import timedelta
 from django.db.models import Sum
@@ -543,6 +545,9 @@ class OrdenProduccionViewSet(viewsets.ModelViewSet):
                 # Cancelarlas en lote
                 count = ots_a_cancelar.count()
                 if count > 0:
+                    # Sin señales: ver reportes/signals.py
+                    fechas_ots = ots_a_cancelar.values_list('hora_inicio_programada', 'hora_fin_programada')
+                    invalidar_reportes(FUENTE_PRODUCCION, *(fecha for fechas in fechas_ots for fecha in fechas))
                     ots_a_cancelar.update(id_estado_orden_trabajo=estado_ot_cancelada)
                     print(f"Canceladas {count} Órdenes de Trabajo hijas de la OP {orden.id_orden_produccion}.")
             
@@ -676,7 +681,7 @@ class NoConformidadViewSet(viewsets.ModelViewSet):
 
 
 
-class HistorialOrdenProduccionViewSet(viewsets.ReadOnlyModelViewSet):
+class HistorialOrdenProduccionViewSet(ExportacionMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint para ver el historial de cambios de las Órdenes de Producción.
     """
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produccion', '0021_alter_historicalordenproduccion_es_generada_automaticamente_and_more'),
+        ('productos', '0007_comboproducto_precio_unitario_imagencombo'),
+        ('recetas', '0003_productolinea_cantidad_minima'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TiempoCambioLinea',
+            fields=[
+                ('id_tiempo_cambio', models.AutoField(primary_key=True, serialize=False)),
+                ('minutos', models.PositiveIntegerField(default=0)),
+                ('id_linea_produccion', models.ForeignKey(db_column='id_linea_produccion', on_delete=django.db.models.deletion.CASCADE, related_name='tiempos_cambio', to='produccion.lineaproduccion')),
+                ('id_producto_destino', models.ForeignKey(db_column='id_producto_destino', on_delete=django.db.models.deletion.CASCADE, related_name='cambios_hacia', to='productos.producto')),
+                ('id_producto_origen', models.ForeignKey(db_column='id_producto_origen', on_delete=django.db.models.deletion.CASCADE, related_name='cambios_desde', to='productos.producto')),
+            ],
+            options={
+                'db_table': 'tiempo_cambio_linea',
+                'unique_together': {('id_linea_produccion', 'id_producto_origen', 'id_producto_destino')},
+            },
+        ),
+    ]
@@ -33,3 +33,20 @@ class ProductoLinea(models.Model):
     class Meta:
         db_table = "producto_linea"
         unique_together = ("id_producto", "id_linea_produccion")
+
+
+class TiempoCambioLinea(models.Model):
+    """
+    Matriz de cambio de producto (setup) por línea: minutos de limpieza/preparación
+    para pasar de producir 'id_producto_origen' a 'id_producto_destino' en la línea.
+    Los pares que no están cargados se toman como 0 minutos.
+    """
+    id_tiempo_cambio = models.AutoField(primary_key=True)
+    id_linea_produccion = models.ForeignKey(LineaProduccion, on_delete=models.CASCADE, db_column="id_linea_produccion", related_name="tiempos_cambio")
+    id_producto_origen = models.ForeignKey(Producto, on_delete=models.CASCADE, db_column="id_producto_origen", related_name="cambios_desde")
+    id_producto_destino = models.ForeignKey(Producto, on_delete=models.CASCADE, db_column="id_producto_destino", related_name="cambios_hacia")
+    minutos = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = "tiempo_cambio_linea"
+        unique_together = ("id_linea_produccion", "id_producto_origen", "id_producto_destino")
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import ProductoLinea, Receta, RecetaMateriaPrima
+from .models import ProductoLinea, Receta, RecetaMateriaPrima, TiempoCambioLinea
 from materias_primas.models import MateriaPrima
 
 # ------------------------------
@@ -31,5 +31,24 @@ class ProductoLineaSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = ProductoLinea
-        fields = '__all__' 
-       
\ No newline at end of file
+        fields = '__all__'
+
+
+# ------------------------------
+# Serializer TiempoCambioLinea
+# ------------------------------
+class TiempoCambioLineaSerializer(serializers.ModelSerializer):
+    nombre_linea = serializers.CharField(source='id_linea_produccion.descripcion', read_only=True)
+    nombre_producto_origen = serializers.CharField(source='id_producto_origen.nombre', read_only=True)
+    nombre_producto_destino = serializers.CharField(source='id_producto_destino.nombre', read_only=True)
+
+    class Meta:
+        model = TiempoCambioLinea
+        fields = '__all__'
+
+    def validate(self, data):
+        origen = data.get("id_producto_origen", getattr(self.instance, "id_producto_origen", None))
+        destino = data.get("id_producto_destino", getattr(self.instance, "id_producto_destino", None))
+        if origen is not None and origen == destino:
+            raise serializers.ValidationError("El producto de origen y el de destino deben ser distintos.")
+        return data
@@ -1,11 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import LineasProduccionPorProductoView, RecetaViewSet, RecetaMateriaPrimaViewSet, ProductoLineaViewSet, ActualizarCapacidadLineaView
+from .views import LineasProduccionPorProductoView, RecetaViewSet, RecetaMateriaPrimaViewSet, ProductoLineaViewSet, TiempoCambioLineaViewSet, ActualizarCapacidadLineaView
 
 router = DefaultRouter()
 router.register(r'recetas', RecetaViewSet)
 router.register(r'recetas-materias', RecetaMateriaPrimaViewSet)
 router.register(r'productos-linea', ProductoLineaViewSet)
+router.register(r'tiempos-cambio', TiempoCambioLineaViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -7,8 +7,8 @@ from rest_framework import viewsets, filters
 from django_filters.rest_framework import DjangoFilterBackend
 
 from produccion.models import LineaProduccion
-from .models import ProductoLinea, Receta, RecetaMateriaPrima
-from .serializers import RecetaSerializer, RecetaMateriaPrimaSerializer, ProductoLineaSerializer
+from .models import ProductoLinea, Receta, RecetaMateriaPrima, TiempoCambioLinea
+from .serializers import RecetaSerializer, RecetaMateriaPrimaSerializer, ProductoLineaSerializer, TiempoCambioLineaSerializer
 
 # ------------------------------
 # Receta
@@ -66,6 +66,17 @@ class ProductoLineaViewSet(viewsets.ModelViewSet):
     search_fields = ["id_producto__nombre", "id_linea_produccion__descripcion"]
 
 
+# ------------------------------
+# TiempoCambioLinea (matriz de setup producto → producto por línea)
+# ------------------------------
+class TiempoCambioLineaViewSet(viewsets.ModelViewSet):
+    queryset = TiempoCambioLinea.objects.select_related('id_linea_produccion', 'id_producto_origen', 'id_producto_destino').order_by('id_tiempo_cambio')
+    serializer_class = TiempoCambioLineaSerializer
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filterset_fields = ["id_linea_produccion", "id_producto_origen", "id_producto_destino"]
+    search_fields = ["id_producto_origen__nombre", "id_producto_destino__nombre", "id_linea_produccion__descripcion"]
+
+
 
 class LineasProduccionPorProductoView(APIView):
     """
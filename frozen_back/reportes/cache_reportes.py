@@ -0,0 +1,138 @@
+import hashlib
+import json
+import time
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+
+# ===================================================================
+# CACHÉ DE REPORTES
+# El resultado de un reporte se guarda por clase + parámetros normalizados en el
+# caché de Django (alias 'reportes' de settings.CACHES; si no está, 'default').
+# La invalidación es por rango: cada reporte declara de qué FUENTES lee y la
+# clave incluye la versión de cada mes (fuente, AAAA-MM) que toca su rango.
+# Las señales (reportes/signals.py) incrementan la versión del mes del registro
+# que cambió: una OV de hoy no invalida el reporte del mes pasado. Lo que no
+# tiene mes (el precio o el nombre de un Producto) renueva la versión TODOS_LOS_MESES
+# de la fuente, que también entra en la clave.
+#   - Rango cerrado (termina antes de hoy): sin vencimiento.
+#   - Rango que toca hoy o el futuro: además vence a los SEGUNDOS_RANGO_ABIERTO,
+#     por lo que no pasa por señales (QuerySet.update()...).
+# Con varios procesos (gunicorn + worker de planificación) el caché tiene que
+# ser compartido (FileBasedCache): con LocMemCache cada proceso invalida el suyo.
+# ===================================================================
+
+# Fuentes de datos de los reportes y la fecha por la que filtran
+FUENTE_PRODUCCION = 'produccion'  # OTs (inicio / fin programado) y producción diaria
+FUENTE_DESPERDICIO = 'desperdicio'  # No Conformidades por fecha de creación de la OP
+FUENTE_VENTAS = 'ventas'  # Órdenes de venta y sus productos por fecha de la OV
+
+SEGUNDOS_RANGO_ABIERTO = 60
+
+PREFIJO = 'reportes'
+
+TODOS_LOS_MESES = 'todos'
+
+
+def _cache():
+    return caches['reportes'] if 'reportes' in settings.CACHES else caches['default']
+
+
+def _a_fecha(momento) -> date:
+    if isinstance(momento, datetime):
+        return timezone.localtime(momento).date() if timezone.is_aware(momento) else momento.date()
+    return momento
+
+
+def _meses(desde: date, hasta: date):
+    """ 'AAAA-MM' de cada mes entre desde y hasta (inclusive). """
+    anio, mes = desde.year, desde.month
+    meses = []
+    while (anio, mes) <= (hasta.year, hasta.month):
+        meses.append(f"{anio:04d}-{mes:02d}")
+        anio, mes = (anio + 1, 1) if mes == 12 else (anio, mes + 1)
+    return meses
+
+
+def _clave_version(fuente, mes):
+    return f"{PREFIJO}:version:{fuente}:{mes}"
+
+
+def _nueva_version():
+    # Si una versión se pierde (el caché la descarta), la nueva no repite un valor
+    # viejo: los resultados guardados con la anterior no vuelven a servirse.
+    return time.time_ns()
+
+
+def _versiones(fuentes, desde: date, hasta: date):
+    cache = _cache()
+    claves = [
+        _clave_version(fuente, mes)
+        for fuente in fuentes
+        for mes in [TODOS_LOS_MESES, *_meses(desde, hasta)]
+    ]
+    versiones = cache.get_many(claves)
+    for clave in claves:
+        if clave not in versiones:
+            cache.add(clave, _nueva_version(), None)
+            versiones[clave] = cache.get(clave)
+    return [versiones[clave] for clave in claves]
+
+
+def obtener_reporte(nombre, fuentes, desde, hasta, parametros, calcular):
+    """
+    Devuelve el resultado cacheado del reporte 'nombre' para [desde, hasta] y los
+    'parametros' (dict ya normalizado), o lo calcula con calcular() y lo guarda.
+    calcular() devuelve (datos, cacheable): solo se guarda si cacheable es True.
+    """
+    desde, hasta = _a_fecha(desde), _a_fecha(hasta)
+    firma = json.dumps(
+        [parametros, _versiones(fuentes, desde, hasta)], sort_keys=True, default=str
+    )
+    clave = f"{PREFIJO}:{nombre}:{hashlib.sha1(firma.encode()).hexdigest()}"
+
+    cache = _cache()
+    datos = cache.get(clave)
+    if datos is not None:
+        return datos
+
+    datos, cacheable = calcular()
+    if cacheable:
+        rango_abierto = hasta >= timezone.localdate()
+        cache.set(clave, datos, SEGUNDOS_RANGO_ABIERTO if rango_abierto else None)
+    return datos
+
+
+def _renovar_al_confirmar(fuente, meses):
+    def renovar():
+        # Versión nueva con set (no incr: en FileBasedCache es get + set y dos
+        # procesos que invalidan a la vez pueden dejar el mismo valor)
+        version = _nueva_version()
+        _cache().set_many({_clave_version(fuente, mes): version for mes in meses}, None)
+
+    # Al confirmar la transacción: hasta entonces los datos nuevos no los ve otro proceso
+    transaction.on_commit(renovar)
+
+
+def invalidar_reportes(fuente, *momentos):
+    """
+    Invalida los reportes de 'fuente' cuyo rango incluya el mes de alguno de los
+    'momentos' (dates o datetimes; los None se ignoran).
+    """
+    meses = {_a_fecha(momento).strftime('%Y-%m') for momento in momentos if momento is not None}
+    if meses:
+        _renovar_al_confirmar(fuente, meses)
+
+
+def invalidar_rango(fuente, desde: date, hasta: date):
+    """ Invalida los reportes de 'fuente' de todos los meses entre desde y hasta. """
+    _renovar_al_confirmar(fuente, _meses(desde, hasta))
+
+
+def invalidar_fuente(fuente):
+    """ Invalida todos los reportes de 'fuente', de cualquier rango. """
+    _renovar_al_confirmar(fuente, [TODOS_LOS_MESES])
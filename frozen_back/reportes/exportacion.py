@@ -0,0 +1,269 @@
+import csv
+import json
+import re
+import zipfile
+from datetime import date, datetime, time
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.core.exceptions import FieldDoesNotExist
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+
+# ===================================================================
+# EXPORTACIÓN CSV / XLSX EN STREAMING
+# Los reportes y los historiales (simple_history, crecen sin límite) se leen
+# como JSON paginado de a PAGE_SIZE filas. Acá se exportan enteros como
+# StreamingHttpResponse: las filas se escriben a medida que salen de la BD
+# (.iterator(chunk_size=...)), así la memoria no depende del tamaño del export.
+# XLSX sin dependencias: es un zip de XML (SpreadsheetML) que se escribe
+# con zipfile sobre un buffer que se vacía en cada tanda. Cada hoja admite
+# FILAS_POR_HOJA filas; si hay más, siguen en otra hoja (con encabezado).
+# ===================================================================
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+FILAS_POR_TANDA = 2000  # chunk_size de .iterator() al leer de la BD
+BYTES_POR_ENVIO = 64 * 1024  # Lo que se junta antes de mandar un pedazo del XLSX
+FILAS_POR_HOJA = 1048575  # Límite de Excel (1.048.576) menos el encabezado
+
+# Caracteres de control que XML no admite
+_CONTROL_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _texto(valor):
+    """ Valor de una celda como texto (CSV y celdas de texto del XLSX). """
+    if valor is None:
+        return ''
+    if isinstance(valor, datetime):
+        if timezone.is_aware(valor):
+            valor = timezone.localtime(valor)
+        return valor.isoformat(sep=' ')
+    if isinstance(valor, (date, time)):
+        return valor.isoformat()
+    if isinstance(valor, (dict, list)):
+        return json.dumps(valor, ensure_ascii=False, default=str)
+    return str(valor)
+
+
+# ------------------------------------------------------------------
+# CSV
+# ------------------------------------------------------------------
+class _Eco:
+    """ 'Archivo' para csv.writer que devuelve lo escrito en vez de guardarlo. """
+
+    def write(self, valor):
+        return valor
+
+
+def _csv(encabezados, filas):
+    escritor = csv.writer(_Eco())
+    # BOM: Excel abre el CSV como UTF-8 (acentos, ñ)
+    yield '\ufeff' + escritor.writerow(encabezados)
+    for fila in filas:
+        yield escritor.writerow([_texto(valor) for valor in fila])
+
+
+# ------------------------------------------------------------------
+# XLSX
+# ------------------------------------------------------------------
+class _Buffer:
+    """ Destino no 'seekable' para zipfile: acumula bytes hasta que se los retira. """
+
+    def __init__(self):
+        self._partes = []
+        self.tamanio = 0
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        self.tamanio += len(datos)
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def retirar(self):
+        datos = b''.join(self._partes)
+        self._partes = []
+        self.tamanio = 0
+        return datos
+
+
+def _columna(indice):
+    """ Letra de la columna (0 -> A, 26 -> AA). """
+    letras = ''
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+def _celda(referencia, valor):
+    if isinstance(valor, (int, float, Decimal)) and not isinstance(valor, bool):
+        return f'<c r="{referencia}"><v>{valor}</v></c>'
+    texto = escape(_CONTROL_XML.sub('', _texto(valor)))
+    return f'<c r="{referencia}" t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _fila_xml(numero, valores, columnas):
+    celdas = ''.join(_celda(f'{columna}{numero}', valor) for columna, valor in zip(columnas, valores))
+    return f'<row r="{numero}">{celdas}</row>'.encode('utf-8')
+
+
+_NS_HOJA = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_NS_RELACIONES = 'http://schemas.openxmlformats.org/package/2006/relationships'
+_TIPO_DOCUMENTO = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_XML = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+
+def _metadatos_xlsx(hojas):
+    """ Archivos fijos del XLSX para 'hojas' hojas (se escriben al final, cuando se sabe cuántas son). """
+    numeros = range(1, hojas + 1)
+    return {
+        '[Content_Types].xml': _XML + (
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            + ''.join(
+                f'<Override PartName="/xl/worksheets/sheet{n}.xml" '
+                'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                for n in numeros
+            ) + '</Types>'
+        ),
+        '_rels/.rels': _XML + (
+            f'<Relationships xmlns="{_NS_RELACIONES}">'
+            f'<Relationship Id="rId1" Type="{_TIPO_DOCUMENTO}/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>'
+        ),
+        'xl/workbook.xml': _XML + (
+            f'<workbook xmlns="{_NS_HOJA}" xmlns:r="{_TIPO_DOCUMENTO}"><sheets>'
+            + ''.join(f'<sheet name="Datos {n}" sheetId="{n}" r:id="rId{n}"/>' for n in numeros)
+            + '</sheets></workbook>'
+        ),
+        'xl/_rels/workbook.xml.rels': _XML + (
+            f'<Relationships xmlns="{_NS_RELACIONES}">'
+            + ''.join(
+                f'<Relationship Id="rId{n}" Type="{_TIPO_DOCUMENTO}/worksheet" Target="worksheets/sheet{n}.xml"/>'
+                for n in numeros
+            ) + '</Relationships>'
+        ),
+    }
+
+
+def _xlsx(encabezados, filas):
+    columnas = [_columna(indice) for indice in range(len(encabezados))]
+    salida = _Buffer()
+    with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_DEFLATED) as archivo:
+        filas = iter(filas)
+        hojas = 0
+        fila = next(filas, None)
+        while hojas == 0 or fila is not None:
+            hojas += 1
+            with archivo.open(f'xl/worksheets/sheet{hojas}.xml', 'w', force_zip64=True) as hoja:
+                hoja.write(f'{_XML}<worksheet xmlns="{_NS_HOJA}"><sheetData>'.encode('utf-8'))
+                hoja.write(_fila_xml(1, encabezados, columnas))
+                numero = 1
+                while fila is not None and numero <= FILAS_POR_HOJA:
+                    numero += 1
+                    hoja.write(_fila_xml(numero, fila, columnas))
+                    if salida.tamanio >= BYTES_POR_ENVIO:
+                        yield salida.retirar()
+                    fila = next(filas, None)
+                hoja.write(b'</sheetData></worksheet>')
+
+        for nombre, contenido in _metadatos_xlsx(hojas).items():
+            archivo.writestr(nombre, contenido)
+    yield salida.retirar()
+
+
+# ------------------------------------------------------------------
+# Respuestas
+# ------------------------------------------------------------------
+def respuesta_exportada(formato, encabezados, filas, nombre):
+    """
+    StreamingHttpResponse con 'filas' (iterable de listas, en el orden de
+    'encabezados') en 'formato' ('csv' o 'xlsx'). 'filas' se consume de a una:
+    pasarle un generador para no cargar todo en memoria.
+    """
+    generador = _csv(encabezados, filas) if formato == 'csv' else _xlsx(encabezados, filas)
+    respuesta = StreamingHttpResponse(generador, content_type=FORMATOS[formato])
+    archivo = f"{nombre}-{timezone.localdate():%Y%m%d}.{formato}"
+    respuesta['Content-Disposition'] = f'attachment; filename="{archivo}"'
+    return respuesta
+
+
+def error_formato():
+    return Response(
+        {"error": f"Formato inválido. Usar {' o '.join(FORMATOS)}."},
+        status=status.HTTP_400_BAD_REQUEST
+    )
+
+
+def filas_de_datos(datos):
+    """ (encabezados, filas) de la respuesta de un reporte: lista de dicts o un solo dict. """
+    registros = [datos] if isinstance(datos, dict) else list(datos)
+    encabezados = []
+    for registro in registros:
+        for clave in registro:
+            if clave not in encabezados:
+                encabezados.append(clave)
+    return encabezados, ([registro.get(clave) for clave in encabezados] for registro in registros)
+
+
+def _relaciones(serializer, modelo):
+    """
+    Caminos 'a__b' de las FKs que leen los campos con source 'a.b.campo' del
+    serializer, para traerlos con select_related en vez de una consulta por fila.
+    """
+    caminos = set()
+    for campo in serializer.fields.values():
+        partes = campo.source.split('.')[:-1]
+        actual = modelo
+        for indice, parte in enumerate(partes):
+            try:
+                relacion = actual._meta.get_field(parte)
+            except FieldDoesNotExist:
+                break
+            if not (relacion.many_to_one or relacion.one_to_one):
+                break
+            caminos.add('__'.join(partes[:indice + 1]))
+            actual = relacion.related_model
+    return sorted(caminos)
+
+
+class ExportacionMixin:
+    """
+    Agrega GET .../exportar/?formato=csv|xlsx a un ViewSet de solo lectura: todas
+    las filas que pasan los filtros (mismos parámetros que el listado), sin paginar
+    y con los campos del serializer, leídas de a FILAS_POR_TANDA.
+    """
+
+    @action(detail=False, methods=['get'])
+    def exportar(self, request):
+        formato = request.query_params.get('formato', 'csv')
+        if formato not in FORMATOS:
+            return error_formato()
+
+        serializer = self.get_serializer()
+        queryset = self.filter_queryset(self.get_queryset())
+        queryset = queryset.select_related(*_relaciones(serializer, queryset.model))
+
+        encabezados = list(serializer.fields)
+        filas = (
+            [representacion.get(campo) for campo in encabezados]
+            for representacion in (
+                serializer.to_representation(instancia)
+                for instancia in queryset.iterator(chunk_size=FILAS_POR_TANDA)
+            )
+        )
+        return respuesta_exportada(formato, encabezados, filas, self.basename or type(self).__name__)
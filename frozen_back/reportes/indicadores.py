@@ -0,0 +1,281 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+from django.db.models import Count, DurationField, F, FloatField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from produccion.models import NoConformidad
+from ventas.models import OrdenVenta, OrdenVentaProducto
+from .cache_reportes import FUENTE_DESPERDICIO, FUENTE_PRODUCCION, FUENTE_VENTAS, obtener_reporte
+from .services import calcular_oee, factores_oee, totales_produccion
+
+
+# ===================================================================
+# INDICADORES (KPIs) DEL TABLERO
+# Cada indicador sale de un GRUPO: una consulta (o dos) que comparten varios
+# indicadores del mismo rango. Ej.: una sola pasada por OrdenVenta agrupada por
+# canal alimenta volumen, tiempo de ciclo, cumplimiento de fecha y los promedios.
+# Los endpoints individuales de reportes usan estas mismas funciones, así el
+# tablero y cada reporte devuelven exactamente lo mismo.
+# calcular_indicadores() arma solo los grupos que hacen falta para los
+# indicadores pedidos y calcula en paralelo los que son independientes.
+# ===================================================================
+
+MAX_HILOS_TABLERO = 4
+
+
+def _fechas(fecha_desde, fecha_hasta):
+    return {"fecha_desde": fecha_desde.strftime('%Y-%m-%d'), "fecha_hasta": fecha_hasta.strftime('%Y-%m-%d')}
+
+
+# ------------------------------------------------------------------
+# Grupo ventas: 1 consulta sobre OrdenVenta + 1 sobre OrdenVentaProducto
+# ------------------------------------------------------------------
+def resumen_ventas(fecha_desde, fecha_hasta):
+    """ Conteos y tiempos de las OVs del rango por canal, y totales de sus productos. """
+    entregada = Q(fecha_entrega__isnull=False)
+    con_fecha_estimada = entregada & Q(fecha_estimada__isnull=False)
+    por_tipo = list(OrdenVenta.objects.filter(
+        fecha__range=(fecha_desde, fecha_hasta)
+    ).values('tipo_venta').annotate(
+        ordenes=Count('pk'),
+        entregadas=Count('pk', filter=entregada),
+        duracion_entregadas=Sum(F('fecha_entrega') - F('fecha'), filter=entregada, output_field=DurationField()),
+        con_fecha_estimada=Count('pk', filter=con_fecha_estimada),
+        # Nota: __date compara solo la fecha de entrega, ignorando la hora
+        cumplidas=Count('pk', filter=con_fecha_estimada & Q(fecha_entrega__date__lte=F('fecha_estimada'))),
+    ).order_by('tipo_venta'))
+
+    productos = OrdenVentaProducto.objects.filter(
+        id_orden_venta__fecha__range=(fecha_desde, fecha_hasta)
+    ).aggregate(
+        total_dinero=Coalesce(Sum(F('cantidad') * F('id_producto__precio')), Value(0.0), output_field=FloatField()),
+        total_unidades=Coalesce(Sum('cantidad'), Value(0)),
+    )
+    return {"por_tipo": por_tipo, **productos}
+
+
+def _total_ordenes(resumen):
+    return sum(fila['ordenes'] for fila in resumen['por_tipo'])
+
+
+def volumen_por_tipo(resumen, fecha_desde, fecha_hasta):
+    """ Volumen de ventas (conteo de órdenes) por canal (tipo_venta). """
+    total_global = _total_ordenes(resumen)
+    reporte = []
+    for fila in resumen['por_tipo']:
+        porcentaje = (fila['ordenes'] / total_global) * 100 if total_global > 0 else 0.0
+        reporte.append({
+            "tipo_venta": fila['tipo_venta'],
+            "ordenes_contadas": fila['ordenes'],
+            "porcentaje": round(porcentaje, 2)
+        })
+    return reporte
+
+
+def tiempo_ciclo_venta(resumen, fecha_desde, fecha_hasta):
+    """ Tiempo de Ciclo de Venta (fecha_entrega - fecha) promedio de las órdenes entregadas. """
+    entregadas = sum(fila['entregadas'] for fila in resumen['por_tipo'])
+    segundos = sum(fila['duracion_entregadas'].total_seconds() for fila in resumen['por_tipo'] if fila['duracion_entregadas'])
+    promedio_dias = segundos / entregadas / (60 * 60 * 24) if entregadas else 0.0
+    return {
+        "tiempo_ciclo_promedio_dias": round(promedio_dias, 2),
+        "total_ordenes_completadas": entregadas
+    }
+
+
+def cumplimiento_fecha(resumen, fecha_desde, fecha_hasta):
+    """ Tasa de Cumplimiento de Fecha Estimada (fecha_entrega <= fecha_estimada). """
+    total_completadas = sum(fila['con_fecha_estimada'] for fila in resumen['por_tipo'])
+    if total_completadas == 0:
+        return {"tasa_cumplimiento": 0.0, "total_ordenes_analizadas": 0}
+
+    ordenes_cumplidas = sum(fila['cumplidas'] for fila in resumen['por_tipo'])
+    return {
+        "tasa_cumplimiento": round(ordenes_cumplidas / total_completadas * 100.0, 2),
+        "ordenes_cumplidas": ordenes_cumplidas,
+        "total_ordenes_analizadas": total_completadas
+    }
+
+
+def total_dinero_ventas(resumen, fecha_desde, fecha_hasta):
+    """ Suma Total de Dinero en Ventas (cantidad * precio del producto). """
+    return {"total_dinero_ventas": round(resumen['total_dinero'], 2)}
+
+
+def valor_pedido_promedio(resumen, fecha_desde, fecha_hasta):
+    """ Valor de Pedido Promedio (AOV). """
+    total_ordenes = _total_ordenes(resumen)
+    total_dinero = round(resumen['total_dinero'], 2)
+    aov = (total_dinero / total_ordenes) if total_ordenes > 0 else 0.0
+    return {
+        "valor_pedido_promedio": round(aov, 2),
+        "total_ordenes": total_ordenes
+    }
+
+
+def productos_por_venta(resumen, fecha_desde, fecha_hasta):
+    """ Cantidad Promedio de Productos (unidades) por Venta. """
+    total_ordenes = _total_ordenes(resumen)
+    promedio = (resumen['total_unidades'] / total_ordenes) if total_ordenes > 0 else 0.0
+    return {
+        "unidades_promedio_por_venta": round(promedio, 2),
+        "total_unidades_vendidas": resumen['total_unidades']
+    }
+
+
+# ------------------------------------------------------------------
+# Grupo producción: 1 consulta a la tabla de hechos de producción diaria
+# ------------------------------------------------------------------
+def tasa_desperdicio(totales, fecha_desde, fecha_hasta):
+    """ Desperdicio de las OTs Completadas sobre su cantidad programada. """
+    total_desperdiciado = float(totales['desperdicio'])
+    total_programado = float(totales['cantidad_planificada_completada'])
+    tasa = (total_desperdiciado / total_programado) * 100.0 if total_programado > 0 else 0.0
+    return {
+        **_fechas(fecha_desde, fecha_hasta),
+        "total_programado_completado": total_programado,
+        "total_desperdiciado": total_desperdiciado,
+        "tasa_desperdicio_porcentaje": round(tasa, 2)
+    }
+
+
+def factor_calidad(totales, fecha_desde, fecha_hasta):
+    """ Factor de Calidad del OEE (Producción Bruta - Desperdicio). """
+    return {
+        **_fechas(fecha_desde, fecha_hasta),
+        "produccion_bruta_total": float(totales['produccion_bruta']),
+        "total_desperdiciado": float(totales['desperdicio']),
+        "factor_calidad_oee": round(factores_oee(totales)['calidad'] * 100.0, 2)
+    }
+
+
+def factor_rendimiento(totales, fecha_desde, fecha_hasta):
+    """ Factor de Rendimiento del OEE: tiempo ideal (cant_por_hora) sobre tiempo programado. """
+    resultado = {
+        **_fechas(fecha_desde, fecha_hasta),
+        "produccion_bruta_total": 0.0,
+        "tiempo_funcionamiento_minutos": 0.0,
+        "tiempo_ideal_requerido_minutos": 0.0,
+        "factor_rendimiento_oee": 0.0
+    }
+    if not totales['ots_completadas'] or totales['minutos_programados'] <= 0:
+        return resultado
+
+    resultado.update({
+        "produccion_bruta_total": float(totales['produccion_bruta']),
+        "tiempo_funcionamiento_minutos": round(totales['minutos_programados'], 2),
+        "tiempo_ideal_requerido_minutos": round(totales['minutos_ideales'], 2),
+        "factor_rendimiento_oee": round(factores_oee(totales)['rendimiento'] * 100.0, 2)
+    })
+    return resultado
+
+
+def disponibilidad_ajustada(totales, fecha_desde, fecha_hasta):
+    """ Disponibilidad Ajustada: ejecución menos pausas y penalización por terminar tarde. """
+    return {
+        **_fechas(fecha_desde, fecha_hasta),
+        "total_tiempo_ejecucion_minutos": round(totales['minutos_ejecucion'], 2),
+        "total_tiempo_perdido_pausas_minutos": round(totales['minutos_pausa'], 2),
+        "total_penalizado_por_fecha_minutos": round(totales['minutos_ejecucion_tarde'], 2),
+        "disponibilidad_ajustada_porcentaje": round(factores_oee(totales)['disponibilidad'] * 100.0, 2)
+    }
+
+
+# ------------------------------------------------------------------
+# Grupos propios (una consulta cada uno)
+# ------------------------------------------------------------------
+def formatear_oee(fila):
+    """ Fila de calcular_oee() como la devuelven los reportes (factores en porcentaje). """
+    factores = fila['factores']
+    return {
+        "periodo_inicio": fila['periodo_inicio'].strftime('%Y-%m-%d'),
+        "periodo_fin": fila['periodo_fin'].strftime('%Y-%m-%d'),
+        "disponibilidad": round(factores['disponibilidad'] * 100.0, 2),
+        "rendimiento": round(factores['rendimiento'] * 100.0, 2),
+        "calidad": round(factores['calidad'] * 100.0, 2),
+        "oee_total": round(factores['oee'] * 100.0, 2),
+    }
+
+
+def oee_mensual(filas, fecha_desde, fecha_hasta):
+    """ OEE por mes (como ReporteOEEGeneral sin 'periodo'). """
+    return [formatear_oee(fila) for fila in filas]
+
+
+def consultar_desperdicio_por_causa(fecha_desde, fecha_hasta):
+    """ Total desperdiciado por causa (TipoNoConformidad), filtrando por la creación de la OP. """
+    # Cadena de FKs: NC -> OT -> OP -> fecha_creacion
+    return list(NoConformidad.objects.filter(
+        id_orden_trabajo__id_orden_produccion__fecha_creacion__range=(fecha_desde, fecha_hasta)
+    ).values(
+        causa=F('id_tipo_no_conformidad__nombre')
+    ).annotate(
+        total_desperdiciado=Sum('cant_desperdiciada')
+    ).order_by('-total_desperdiciado'))
+
+
+# grupo: (cálculo compartido(desde, hasta), fuentes para el caché de reportes)
+GRUPOS = {
+    'ventas': (resumen_ventas, (FUENTE_VENTAS,)),
+    'produccion': (totales_produccion, (FUENTE_PRODUCCION,)),
+    'oee': (lambda fecha_desde, fecha_hasta: calcular_oee(fecha_desde, fecha_hasta, periodo='mes'), (FUENTE_PRODUCCION,)),
+    'desperdicio': (consultar_desperdicio_por_causa, (FUENTE_DESPERDICIO,)),
+}
+
+# id del indicador: (grupo, función(compartido, desde, hasta))
+INDICADORES = {
+    'volumen_por_tipo': ('ventas', volumen_por_tipo),
+    'tiempo_ciclo_venta': ('ventas', tiempo_ciclo_venta),
+    'cumplimiento_fecha': ('ventas', cumplimiento_fecha),
+    'total_dinero_ventas': ('ventas', total_dinero_ventas),
+    'valor_pedido_promedio': ('ventas', valor_pedido_promedio),
+    'productos_por_venta': ('ventas', productos_por_venta),
+    'tasa_desperdicio': ('produccion', tasa_desperdicio),
+    'factor_calidad': ('produccion', factor_calidad),
+    'factor_rendimiento': ('produccion', factor_rendimiento),
+    'disponibilidad_ajustada': ('produccion', disponibilidad_ajustada),
+    'oee': ('oee', oee_mensual),
+    'desperdicio_por_causa': ('desperdicio', lambda filas, fecha_desde, fecha_hasta: filas),
+}
+
+
+def calcular_grupo(grupo, fecha_desde, fecha_hasta):
+    """ Cálculo compartido del grupo (pasa por el caché de reportes). """
+    calculo, fuentes = GRUPOS[grupo]
+    return obtener_reporte(
+        f"tablero.{grupo}", fuentes, fecha_desde, fecha_hasta,
+        {"fecha_desde": fecha_desde.strftime('%Y-%m-%d'), "fecha_hasta": fecha_hasta.strftime('%Y-%m-%d')},
+        lambda: (calculo(fecha_desde, fecha_hasta), True)
+    )
+
+
+def _calcular_grupo_en_hilo(grupo, fecha_desde, fecha_hasta):
+    try:
+        return calcular_grupo(grupo, fecha_desde, fecha_hasta)
+    finally:
+        # Cada hilo abre su propia conexión a la BD: se cierra al terminar
+        connection.close()
+
+
+def calcular_indicadores(ids, fecha_desde, fecha_hasta):
+    """
+    Calcula los indicadores 'ids' (claves de INDICADORES) para el rango. Cada
+    grupo se calcula una sola vez; si hay más de uno, en hilos paralelos.
+    Devuelve {id: datos} solo con los pedidos.
+    """
+    grupos = sorted({INDICADORES[indicador][0] for indicador in ids})
+    if len(grupos) == 1:
+        compartidos = {grupos[0]: calcular_grupo(grupos[0], fecha_desde, fecha_hasta)}
+    else:
+        with ThreadPoolExecutor(max_workers=min(len(grupos), MAX_HILOS_TABLERO)) as executor:
+            futuros = {
+                grupo: executor.submit(_calcular_grupo_en_hilo, grupo, fecha_desde, fecha_hasta)
+                for grupo in grupos
+            }
+        compartidos = {grupo: futuro.result() for grupo, futuro in futuros.items()}
+
+    return {
+        indicador: INDICADORES[indicador][1](compartidos[INDICADORES[indicador][0]], fecha_desde, fecha_hasta)
+        for indicador in ids
+    }
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('produccion', '0021_alter_historicalordenproduccion_es_generada_automaticamente_and_more'),
+        ('productos', '0007_comboproducto_precio_unitario_imagencombo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DesperdicioDiario',
+            fields=[
+                ('id_desperdicio_diario', models.AutoField(primary_key=True, serialize=False)),
+                ('fecha', models.DateField()),
+                ('cantidad', models.IntegerField(default=0)),
+                ('id_linea_produccion', models.ForeignKey(db_column='id_linea_produccion', on_delete=django.db.models.deletion.CASCADE, related_name='desperdicio_diario', to='produccion.lineaproduccion')),
+                ('id_producto', models.ForeignKey(blank=True, db_column='id_producto', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='desperdicio_diario', to='productos.producto')),
+                ('id_tipo_no_conformidad', models.ForeignKey(db_column='id_tipo_no_conformidad', on_delete=django.db.models.deletion.CASCADE, related_name='desperdicio_diario', to='produccion.tiponoconformidad')),
+            ],
+            options={
+                'db_table': 'desperdicio_diario',
+                'ordering': ['fecha', 'id_linea_produccion', 'id_producto', 'id_tipo_no_conformidad'],
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'id_linea_produccion', 'id_producto', 'id_tipo_no_conformidad'), name='desperdicio_diario_unico')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProduccionDiaria',
+            fields=[
+                ('id_produccion_diaria', models.AutoField(primary_key=True, serialize=False)),
+                ('fecha', models.DateField()),
+                ('ots', models.IntegerField(default=0)),
+                ('ots_completadas', models.IntegerField(default=0)),
+                ('cantidad_planificada', models.IntegerField(default=0)),
+                ('cantidad_planificada_completada', models.IntegerField(default=0)),
+                ('cantidad_producida', models.IntegerField(default=0)),
+                ('cantidad_cumplida', models.IntegerField(default=0)),
+                ('produccion_bruta', models.IntegerField(default=0)),
+                ('desperdicio', models.IntegerField(default=0)),
+                ('minutos_programados', models.FloatField(default=0)),
+                ('minutos_ideales', models.FloatField(default=0)),
+                ('minutos_ejecucion', models.FloatField(default=0)),
+                ('minutos_pausa', models.FloatField(default=0)),
+                ('minutos_ejecucion_tarde', models.FloatField(default=0)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                ('id_linea_produccion', models.ForeignKey(db_column='id_linea_produccion', on_delete=django.db.models.deletion.CASCADE, related_name='produccion_diaria', to='produccion.lineaproduccion')),
+                ('id_producto', models.ForeignKey(blank=True, db_column='id_producto', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='produccion_diaria', to='productos.producto')),
+            ],
+            options={
+                'db_table': 'produccion_diaria',
+                'ordering': ['fecha', 'id_linea_produccion', 'id_producto'],
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'id_linea_produccion', 'id_producto'), name='produccion_diaria_unica')],
+            },
+        ),
+    ]
@@ -1,3 +1,103 @@
 from django.db import models
 
-# Create your models here.
+from produccion.models import LineaProduccion, TipoNoConformidad
+from productos.models import Producto
+
+
+class ProduccionDiaria(models.Model):
+    """
+    Tabla de hechos: producción por día × línea × producto (el día es el de
+    'hora_inicio_programada' de la OT, igual que en los reportes).
+    Se mantiene sola (ver reportes/services.py) y se reconstruye con
+    'manage.py recalcular_produccion_diaria'. La migración solo crea la tabla:
+    el historial anterior se carga corriendo ese comando una vez después de migrar.
+
+    'cantidad_planificada' suma todas las OTs del día; el resto de las métricas
+    cuenta solo las OTs Completadas (como los reportes de cumplimiento y OEE).
+    """
+    id_produccion_diaria = models.AutoField(primary_key=True)
+    fecha = models.DateField()
+    id_linea_produccion = models.ForeignKey(
+        LineaProduccion,
+        on_delete=models.CASCADE,
+        db_column="id_linea_produccion",
+        related_name="produccion_diaria"
+    )
+    # Null si la OP de la OT no tiene producto
+    id_producto = models.ForeignKey(
+        Producto,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        db_column="id_producto",
+        related_name="produccion_diaria"
+    )
+
+    ots = models.IntegerField(default=0)
+    ots_completadas = models.IntegerField(default=0)
+    cantidad_planificada = models.IntegerField(default=0)
+    cantidad_planificada_completada = models.IntegerField(default=0)
+    cantidad_producida = models.IntegerField(default=0)
+    # Producida por OTs terminadas a tiempo (día de fin real <= día de fin programado)
+    cantidad_cumplida = models.IntegerField(default=0)
+    produccion_bruta = models.IntegerField(default=0)
+    desperdicio = models.IntegerField(default=0)
+
+    minutos_programados = models.FloatField(default=0)
+    # Minutos que hubiera llevado la producción bruta a la tasa ideal (cant_por_hora)
+    minutos_ideales = models.FloatField(default=0)
+    # Solo OTs con hora de inicio y fin real
+    minutos_ejecucion = models.FloatField(default=0)
+    minutos_pausa = models.FloatField(default=0)
+    minutos_ejecucion_tarde = models.FloatField(default=0)
+
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "produccion_diaria"
+        ordering = ['fecha', 'id_linea_produccion', 'id_producto']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fecha', 'id_linea_produccion', 'id_producto'], name='produccion_diaria_unica'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} - Línea {self.id_linea_produccion_id} - Producto {self.id_producto_id}"
+
+
+class DesperdicioDiario(models.Model):
+    """ Desperdicio (todas las No Conformidades) por día × línea × producto × causa. """
+    id_desperdicio_diario = models.AutoField(primary_key=True)
+    fecha = models.DateField()
+    id_linea_produccion = models.ForeignKey(
+        LineaProduccion,
+        on_delete=models.CASCADE,
+        db_column="id_linea_produccion",
+        related_name="desperdicio_diario"
+    )
+    id_producto = models.ForeignKey(
+        Producto,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        db_column="id_producto",
+        related_name="desperdicio_diario"
+    )
+    id_tipo_no_conformidad = models.ForeignKey(
+        TipoNoConformidad,
+        on_delete=models.CASCADE,
+        db_column="id_tipo_no_conformidad",
+        related_name="desperdicio_diario"
+    )
+    cantidad = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = "desperdicio_diario"
+        ordering = ['fecha', 'id_linea_produccion', 'id_producto', 'id_tipo_no_conformidad']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fecha', 'id_linea_produccion', 'id_producto', 'id_tipo_no_conformidad'],
+                name='desperdicio_diario_unico'
+            ),
+        ]
@@ -0,0 +1,388 @@
+import threading
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+from dateutil.relativedelta import relativedelta
+from django.db import transaction
+from django.db.models import F, FloatField, IntegerField, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from produccion.models import LineaProduccion, NoConformidad, OrdenDeTrabajo, PausaOT
+from recetas.models import ProductoLinea
+from stock.concurrencia import bloquear_items
+from .cache_reportes import FUENTE_PRODUCCION, invalidar_rango
+from .models import DesperdicioDiario, ProduccionDiaria
+
+
+# ===================================================================
+# TABLA DE HECHOS DE PRODUCCIÓN DIARIA
+# Los reportes de cumplimiento, desperdicio y OEE leen 'produccion_diaria'
+# (día × línea × producto) en vez de recorrer OTs, No Conformidades y pausas
+# en cada request. Las filas de un día / línea se recalculan enteras desde las
+# OTs (es idempotente): las señales de OrdenDeTrabajo, NoConformidad y PausaOT
+# marcan el día / línea y se recalcula al confirmar la transacción.
+# Cada recálculo toma un advisory lock por (día, línea) antes de leer las OTs:
+# dos requests que cierran OTs del mismo día / línea se recalculan de a uno y
+# el segundo ya lee las OTs del primero.
+# Las OTs creadas o cambiadas sin señales se marcan a mano (ver reportes/signals.py).
+# ===================================================================
+
+ESTADO_COMPLETADA = 'Completada'
+
+DIAS_POR_TANDA = 31  # Días que se recalculan por consulta en la reconstrucción completa
+
+_pendientes = threading.local()
+
+
+def _dia(momento) -> date:
+    return timezone.localtime(momento).date()
+
+
+def _minutos(delta) -> float:
+    return delta.total_seconds() / 60.0
+
+
+def _limites(desde: date, hasta: date):
+    """ [inicio del día 'desde', inicio del día siguiente a 'hasta') como datetimes aware. """
+    return (
+        timezone.make_aware(datetime.combine(desde, time.min)),
+        timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min)),
+    )
+
+
+def _bloquear_dias(desde: date, hasta: date, lineas_ids=None):
+    """
+    Advisory lock (hasta el fin de la transacción) de cada (día, línea) del rango.
+    La clave es un hash: si dos pares coinciden solo se esperan de más.
+    """
+    if lineas_ids is None:
+        lineas_ids = LineaProduccion.objects.values_list('pk', flat=True)
+    lineas_ids = list(lineas_ids)
+    claves = [
+        ((desde + timedelta(days=dia)).toordinal() * 100003 + linea_id) % 2147483647
+        for dia in range((hasta - desde).days + 1)
+        for linea_id in lineas_ids
+    ]
+    bloquear_items("produccion_diaria", claves)
+
+
+# ------------------------------------------------------------------
+# Cálculo
+# ------------------------------------------------------------------
+def recalcular_produccion_diaria(desde: date, hasta: date, lineas_ids=None):
+    """
+    Reconstruye las filas de [desde, hasta] (solo de esas líneas, si se indican)
+    a partir de las OTs. Devuelve la cantidad de filas de producción creadas.
+    """
+    with transaction.atomic():
+        _bloquear_dias(desde, hasta, lineas_ids)
+        hechos, desperdicios = _calcular_hechos(desde, hasta, lineas_ids)
+
+        for modelo in (ProduccionDiaria, DesperdicioDiario):
+            filas_viejas = modelo.objects.filter(fecha__range=(desde, hasta))
+            if lineas_ids is not None:
+                filas_viejas = filas_viejas.filter(id_linea_produccion_id__in=lineas_ids)
+            filas_viejas.delete()
+
+        ProduccionDiaria.objects.bulk_create(hechos.values())
+        DesperdicioDiario.objects.bulk_create([
+            DesperdicioDiario(
+                fecha=fecha, id_linea_produccion_id=linea_id, id_producto_id=producto_id,
+                id_tipo_no_conformidad_id=tipo_id, cantidad=cantidad
+            )
+            for (fecha, linea_id, producto_id, tipo_id), cantidad in desperdicios.items()
+        ])
+    invalidar_rango(FUENTE_PRODUCCION, desde, hasta)
+    return len(hechos)
+
+
+def _calcular_hechos(desde: date, hasta: date, lineas_ids=None):
+    """
+    Filas de producción ({(día, línea, producto): ProduccionDiaria}) y desperdicio
+    ({(día, línea, producto, causa): cantidad}) de las OTs de [desde, hasta].
+    """
+    inicio, fin = _limites(desde, hasta)
+    ots = OrdenDeTrabajo.objects.filter(hora_inicio_programada__gte=inicio, hora_inicio_programada__lt=fin)
+    if lineas_ids is not None:
+        ots = ots.filter(id_linea_produccion_id__in=lineas_ids)
+
+    filas_ots = list(ots.values_list(
+        'id_orden_trabajo', 'id_linea_produccion_id', 'id_orden_produccion__id_producto_id',
+        'id_estado_orden_trabajo__descripcion', 'hora_inicio_programada', 'hora_fin_programada',
+        'hora_inicio_real', 'hora_fin_real', 'cantidad_programada', 'cantidad_producida', 'produccion_bruta'
+    ))
+
+    desperdicio_por_ot = defaultdict(int)
+    desperdicio_por_causa = defaultdict(lambda: defaultdict(int))  # {ot: {tipo: cantidad}}
+    for ot_id, tipo_id, cantidad in NoConformidad.objects.filter(
+        id_orden_trabajo__in=ots.values('pk')
+    ).values('id_orden_trabajo_id', 'id_tipo_no_conformidad_id').annotate(
+        total=Sum('cant_desperdiciada')
+    ).values_list('id_orden_trabajo_id', 'id_tipo_no_conformidad_id', 'total'):
+        desperdicio_por_ot[ot_id] += cantidad or 0
+        desperdicio_por_causa[ot_id][tipo_id] += cantidad or 0
+
+    pausa_por_ot = dict(PausaOT.objects.filter(
+        id_orden_trabajo__in=ots.values('pk')
+    ).values('id_orden_trabajo_id').annotate(
+        total=Sum('duracion_minutos')
+    ).values_list('id_orden_trabajo_id', 'total'))
+
+    # Tasa ideal (cant_por_hora) de cada par producto / línea
+    tasa_ideal = {
+        (producto_id, linea_id): cant_por_hora
+        for producto_id, linea_id, cant_por_hora in ProductoLinea.objects.filter(
+            id_linea_produccion_id__in={fila[1] for fila in filas_ots}
+        ).values_list('id_producto_id', 'id_linea_produccion_id', 'cant_por_hora')
+    }
+
+    hechos = {}
+    desperdicios = defaultdict(int)
+    for (ot_id, linea_id, producto_id, estado, inicio_prog, fin_prog, inicio_real, fin_real,
+         programada, producida, bruta) in filas_ots:
+        clave = (_dia(inicio_prog), linea_id, producto_id)
+        hecho = hechos.get(clave)
+        if hecho is None:
+            hecho = hechos[clave] = ProduccionDiaria(
+                fecha=clave[0], id_linea_produccion_id=linea_id, id_producto_id=producto_id
+            )
+        hecho.ots += 1
+        hecho.cantidad_planificada += programada or 0
+
+        for tipo_id, cantidad in desperdicio_por_causa[ot_id].items():
+            desperdicios[clave + (tipo_id,)] += cantidad
+
+        if estado != ESTADO_COMPLETADA:
+            continue
+        hecho.ots_completadas += 1
+        hecho.cantidad_planificada_completada += programada or 0
+        hecho.cantidad_producida += producida or 0
+        hecho.produccion_bruta += bruta or 0
+        hecho.desperdicio += desperdicio_por_ot[ot_id]
+        hecho.minutos_programados += _minutos(fin_prog - inicio_prog)
+
+        cant_por_hora = tasa_ideal.get((producto_id, linea_id))
+        if bruta and cant_por_hora and cant_por_hora > 0:
+            hecho.minutos_ideales += bruta / float(cant_por_hora) * 60
+
+        if fin_real is None:
+            continue
+        termino_tarde = _dia(fin_real) > _dia(fin_prog)
+        if not termino_tarde:
+            hecho.cantidad_cumplida += producida or 0
+        if inicio_real is not None:
+            minutos_ejecucion = _minutos(fin_real - inicio_real)
+            hecho.minutos_ejecucion += minutos_ejecucion
+            hecho.minutos_pausa += pausa_por_ot.get(ot_id) or 0
+            if termino_tarde:
+                hecho.minutos_ejecucion_tarde += minutos_ejecucion
+    return hechos, desperdicios
+
+
+def reconstruir_produccion_diaria(desde: date = None, hasta: date = None):
+    """
+    Recalcula toda la tabla (o el rango indicado) en tandas de DIAS_POR_TANDA días.
+    Sin fechas, va de la primera a la última OT. Devuelve (días, filas).
+    """
+    if desde is None or hasta is None:
+        primera = OrdenDeTrabajo.objects.order_by('hora_inicio_programada').values_list('hora_inicio_programada', flat=True).first()
+        ultima = OrdenDeTrabajo.objects.order_by('-hora_inicio_programada').values_list('hora_inicio_programada', flat=True).first()
+        if primera is None:
+            # Sin OTs no hay nada que recalcular: la tabla queda vacía
+            ProduccionDiaria.objects.all().delete()
+            DesperdicioDiario.objects.all().delete()
+            return 0, 0
+        desde = desde or _dia(primera)
+        hasta = hasta or _dia(ultima)
+
+    filas = 0
+    tanda_desde = desde
+    while tanda_desde <= hasta:
+        tanda_hasta = min(hasta, tanda_desde + timedelta(days=DIAS_POR_TANDA - 1))
+        filas += recalcular_produccion_diaria(tanda_desde, tanda_hasta)
+        tanda_desde = tanda_hasta + timedelta(days=1)
+    return (hasta - desde).days + 1, filas
+
+
+# ------------------------------------------------------------------
+# Mantenimiento incremental
+# ------------------------------------------------------------------
+def marcar_produccion_diaria(linea_id, hora_inicio_programada):
+    """
+    Marca el día / línea de una OT para recalcularlo al confirmar la transacción
+    (fuera de una transacción, en el momento). Varias marcas del mismo request
+    se recalculan una sola vez.
+    """
+    if hora_inicio_programada is None:
+        return
+    marcados = getattr(_pendientes, "marcados", None)
+    if marcados is None:
+        marcados = _pendientes.marcados = set()
+    marcados.add((_dia(hora_inicio_programada), linea_id))
+    transaction.on_commit(_recalcular_marcados)
+
+
+def _recalcular_marcados():
+    marcados = getattr(_pendientes, "marcados", None)
+    if not marcados:
+        return
+    _pendientes.marcados = set()
+
+    lineas_por_dia = defaultdict(set)
+    for fecha, linea_id in marcados:
+        lineas_por_dia[fecha].add(linea_id)
+    for fecha, lineas_ids in sorted(lineas_por_dia.items()):
+        recalcular_produccion_diaria(fecha, fecha, lineas_ids)
+
+
+# ------------------------------------------------------------------
+# Lectura (reportes)
+# ------------------------------------------------------------------
+CAMPOS_ENTEROS = (
+    'ots', 'ots_completadas', 'cantidad_planificada', 'cantidad_planificada_completada',
+    'cantidad_producida', 'cantidad_cumplida', 'produccion_bruta', 'desperdicio',
+)
+CAMPOS_MINUTOS = (
+    'minutos_programados', 'minutos_ideales', 'minutos_ejecucion', 'minutos_pausa', 'minutos_ejecucion_tarde',
+)
+
+
+def _a_fecha(momento) -> date:
+    return momento.date() if isinstance(momento, datetime) else momento
+
+
+def _sumas():
+    return {
+        **{campo: Coalesce(Sum(campo), Value(0), output_field=IntegerField()) for campo in CAMPOS_ENTEROS},
+        **{campo: Coalesce(Sum(campo), Value(0.0), output_field=FloatField()) for campo in CAMPOS_MINUTOS},
+    }
+
+
+def totales_produccion(fecha_desde, fecha_hasta, **filtros):
+    """ Totales de la tabla de hechos en el rango (1 consulta). Acepta datetimes o dates. """
+    return ProduccionDiaria.objects.filter(
+        fecha__range=(_a_fecha(fecha_desde), _a_fecha(fecha_hasta)), **filtros
+    ).aggregate(**_sumas())
+
+
+# ------------------------------------------------------------------
+# OEE
+# Los tres factores salen de los mismos totales, así que el OEE de cualquier
+# agrupación (día / semana / mes, por línea o por producto) es una sola consulta
+# agrupada sobre 'produccion_diaria' y el cálculo de los factores en Python.
+# ------------------------------------------------------------------
+PERIODOS_OEE = {
+    'dia': lambda campo: F(campo),
+    'semana': TruncWeek,
+    'mes': TruncMonth,
+}
+
+# Campos (id, nombre) por los que se puede abrir el OEE
+DIMENSIONES_OEE = {
+    'linea': ('id_linea_produccion', 'id_linea_produccion__descripcion'),
+    'producto': ('id_producto', 'id_producto__nombre'),
+}
+
+
+def factores_oee(totales):
+    """ Disponibilidad, rendimiento, calidad y OEE (factores de 0.0 a 1.0) de unos totales. """
+    # Disponibilidad ajustada: tiempo de ejecución menos pausas y ejecución de OTs terminadas tarde
+    disponibilidad = 0.0
+    if totales['minutos_ejecucion'] > 0:
+        perdidas = totales['minutos_pausa'] + totales['minutos_ejecucion_tarde']
+        disponibilidad = max(0, totales['minutos_ejecucion'] - perdidas) / totales['minutos_ejecucion']
+
+    # Rendimiento: tiempo ideal (a 'cant_por_hora') sobre tiempo programado
+    rendimiento = 0.0
+    if totales['ots_completadas'] and totales['minutos_programados'] > 0:
+        rendimiento = totales['minutos_ideales'] / totales['minutos_programados']
+
+    # Calidad: piezas buenas sobre producción bruta
+    calidad = 0.0
+    if totales['produccion_bruta'] > 0:
+        piezas_buenas = max(0, totales['produccion_bruta'] - totales['desperdicio'])
+        calidad = piezas_buenas / float(totales['produccion_bruta'])
+
+    return {
+        "disponibilidad": disponibilidad,
+        "rendimiento": rendimiento,
+        "calidad": calidad,
+        "oee": disponibilidad * rendimiento * calidad,
+    }
+
+
+def _periodos(desde: date, hasta: date, periodo):
+    """ [(inicio del período, inicio recortado al rango, fin recortado al rango)] entre desde y hasta. """
+    if periodo is None:
+        return [(None, desde, hasta)]
+
+    if periodo == 'mes':
+        inicio = desde.replace(day=1)
+        paso = relativedelta(months=1)
+    elif periodo == 'semana':
+        inicio = desde - timedelta(days=desde.weekday())
+        paso = timedelta(days=7)
+    else:
+        inicio = desde
+        paso = timedelta(days=1)
+
+    periodos = []
+    while inicio <= hasta:
+        siguiente = inicio + paso
+        periodos.append((inicio, max(inicio, desde), min(siguiente - timedelta(days=1), hasta)))
+        inicio = siguiente
+    return periodos
+
+
+def calcular_oee(fecha_desde, fecha_hasta, periodo='mes', por=None, **filtros):
+    """
+    OEE de [fecha_desde, fecha_hasta] en una sola consulta, agrupado por período
+    ('dia', 'semana', 'mes' o None para todo el rango) y, si se indica, por
+    'linea' o 'producto' (ver DIMENSIONES_OEE). 'filtros' se aplica a la tabla de
+    hechos (ej. id_linea_produccion=3).
+
+    Devuelve una fila por período (y línea / producto) con 'periodo_inicio',
+    'periodo_fin' (recortados al rango), 'id' y 'nombre' del grupo (si hay 'por'),
+    los 'totales' y los 'factores'. Los períodos sin producción salen en 0, así
+    cada línea / producto tiene todos los períodos del rango.
+    """
+    desde, hasta = _a_fecha(fecha_desde), _a_fecha(fecha_hasta)
+    consulta = ProduccionDiaria.objects.filter(fecha__range=(desde, hasta), **filtros)
+
+    campos = []
+    if periodo is not None:
+        consulta = consulta.annotate(periodo=PERIODOS_OEE[periodo]('fecha'))
+        campos.append('periodo')
+    if por is not None:
+        campos.extend(DIMENSIONES_OEE[por])
+
+    if campos:
+        filas = consulta.values(*campos).annotate(**_sumas()).order_by()
+    else:
+        filas = [consulta.aggregate(**_sumas())]
+
+    totales_por_clave = {}
+    grupos = {}  # {id: nombre}
+    for fila in filas:
+        grupo = fila[DIMENSIONES_OEE[por][0]] if por is not None else None
+        if por is not None:
+            grupos[grupo] = fila[DIMENSIONES_OEE[por][1]]
+        totales_por_clave[(fila.get('periodo'), grupo)] = {
+            campo: fila[campo] for campo in CAMPOS_ENTEROS + CAMPOS_MINUTOS
+        }
+    if por is None:
+        grupos = {None: None}
+
+    ceros = {**{campo: 0 for campo in CAMPOS_ENTEROS}, **{campo: 0.0 for campo in CAMPOS_MINUTOS}}
+    resultado = []
+    # Los grupos sin nombre (ej. OTs sin producto) van al final
+    for grupo, nombre in sorted(grupos.items(), key=lambda item: (item[1] is None, item[1] or '', item[0] or 0)):
+        for inicio, periodo_inicio, periodo_fin in _periodos(desde, hasta, periodo):
+            totales = totales_por_clave.get((inicio, grupo), ceros)
+            fila = {"periodo_inicio": periodo_inicio, "periodo_fin": periodo_fin}
+            if por is not None:
+                fila.update({"id": grupo, "nombre": nombre})
+            fila.update({"totales": totales, "factores": factores_oee(totales)})
+            resultado.append(fila)
+    return resultado
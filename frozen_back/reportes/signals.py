@@ -0,0 +1,99 @@
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from produccion.models import NoConformidad, OrdenDeTrabajo, PausaOT
+from productos.models import Producto
+from ventas.models import OrdenVenta, OrdenVentaProducto
+from .cache_reportes import (
+    FUENTE_DESPERDICIO, FUENTE_PRODUCCION, FUENTE_VENTAS, invalidar_fuente, invalidar_reportes
+)
+from .services import marcar_produccion_diaria
+
+
+# ------------------------------------------------------------------
+# Tabla de hechos de producción diaria y caché de reportes de producción
+# ------------------------------------------------------------------
+# Quien cambie OTs sin señales (ver stock/signals.py) llama a
+# marcar_produccion_diaria() (y, si cambia algo que los reportes leen directo de
+# las OTs, como el estado, a invalidar_reportes()).
+# Recalcular la producción diaria ya invalida los reportes de esos días.
+
+@receiver(pre_save, sender=OrdenDeTrabajo)
+def recordar_valores_anteriores_de_ot(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    # Si la OT se mueve de día o de línea, el día / línea de origen también cambia
+    # (se marca en post_save: fuera de una transacción se recalcula en el momento)
+    instance._valores_anteriores = OrdenDeTrabajo.objects.filter(pk=instance.pk).values_list(
+        'id_linea_produccion_id', 'hora_inicio_programada', 'hora_fin_programada'
+    ).first()
+
+
+@receiver(post_save, sender=OrdenDeTrabajo)
+@receiver(post_delete, sender=OrdenDeTrabajo)
+def ot_modificada(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    actual = (instance.id_linea_produccion_id, instance.hora_inicio_programada, instance.hora_fin_programada)
+    anterior = getattr(instance, '_valores_anteriores', None) or actual
+    instance._valores_anteriores = None
+
+    if anterior[:2] != actual[:2]:
+        marcar_produccion_diaria(*anterior[:2])
+    marcar_produccion_diaria(*actual[:2])
+    # Reportes que leen las OTs directo (por inicio o por fin programado)
+    invalidar_reportes(FUENTE_PRODUCCION, *actual[1:], *anterior[1:])
+
+
+@receiver(post_save, sender=NoConformidad)
+@receiver(post_delete, sender=NoConformidad)
+@receiver(post_save, sender=PausaOT)
+@receiver(post_delete, sender=PausaOT)
+def marcar_dia_de_ot_relacionada(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Sin instanciar la OT (en un borrado en cascada puede no existir más)
+    ot = OrdenDeTrabajo.objects.filter(pk=instance.id_orden_trabajo_id).values_list(
+        'id_linea_produccion_id', 'hora_inicio_programada', 'id_orden_produccion__fecha_creacion'
+    ).first()
+    if ot is None:
+        return
+    marcar_produccion_diaria(*ot[:2])
+    if sender is NoConformidad:
+        # Los reportes de desperdicio por causa / producto filtran por la creación de la OP
+        invalidar_reportes(FUENTE_DESPERDICIO, ot[2])
+
+
+# ------------------------------------------------------------------
+# Caché de reportes de ventas (por fecha de la OV)
+# ------------------------------------------------------------------
+
+@receiver(post_save, sender=OrdenVenta)
+@receiver(post_delete, sender=OrdenVenta)
+def invalidar_reportes_de_ov(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidar_reportes(FUENTE_VENTAS, instance.fecha)
+
+
+@receiver(post_save, sender=OrdenVentaProducto)
+@receiver(post_delete, sender=OrdenVentaProducto)
+def invalidar_reportes_de_ov_producto(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    fecha = OrdenVenta.objects.filter(pk=instance.id_orden_venta_id).values_list('fecha', flat=True).first()
+    invalidar_reportes(FUENTE_VENTAS, fecha)
+
+
+# ------------------------------------------------------------------
+# Productos: el precio entra en los totales de ventas y el nombre en los
+# reportes por producto, de cualquier mes
+# ------------------------------------------------------------------
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def invalidar_reportes_de_producto(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    for fuente in (FUENTE_VENTAS, FUENTE_PRODUCCION, FUENTE_DESPERDICIO):
+        invalidar_fuente(fuente)
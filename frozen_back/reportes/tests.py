@@ -1,3 +1,250 @@
-from django.test import TestCase
+import io
+import zipfile
+from datetime import date, datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from produccion.models import (
+    EstadoOrdenProduccion, EstadoOrdenTrabajo, LineaProduccion, NoConformidad, OrdenDeTrabajo,
+    OrdenProduccion, PausaOT, TipoNoConformidad, estado_linea_produccion,
+)
+from productos.models import Producto, TipoProducto, Unidad
+from recetas.models import ProductoLinea
+from . import exportacion
+from .cache_reportes import (
+    FUENTE_PRODUCCION, FUENTE_VENTAS, invalidar_fuente, invalidar_reportes, obtener_reporte,
+)
+from .models import DesperdicioDiario, ProduccionDiaria
+from .services import calcular_oee, reconstruir_produccion_diaria, recalcular_produccion_diaria
+
+DIA = date(2025, 6, 2)
+
+CACHE_DE_PRUEBA = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'reportes': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'reportes-tests'},
+}
+
+
+def _hora(dia, hora, minuto=0):
+    return timezone.make_aware(datetime.combine(dia, datetime.min.time()).replace(hour=hora, minute=minuto))
+
+
+@override_settings(CACHES=CACHE_DE_PRUEBA)
+class ProduccionDiariaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.linea = LineaProduccion.objects.create(
+            descripcion="L1", id_estado_linea_produccion=estado_linea_produccion.objects.create(descripcion="Disponible")
+        )
+        cls.producto = Producto.objects.create(
+            nombre="P1", descripcion="P1", precio=1, id_tipo_producto=TipoProducto.objects.create(descripcion="t"),
+            id_unidad=Unidad.objects.create(descripcion="u"), dias_duracion=1, umbral_minimo=0
+        )
+        ProductoLinea.objects.create(id_producto=cls.producto, id_linea_produccion=cls.linea, cant_por_hora=60)
+        cls.op = OrdenProduccion.objects.create(
+            id_estado_orden_produccion=EstadoOrdenProduccion.objects.create(descripcion="En proceso"),
+            id_producto=cls.producto, cantidad=150
+        )
+        cls.pendiente = EstadoOrdenTrabajo.objects.create(descripcion="Pendiente")
+        cls.completada = EstadoOrdenTrabajo.objects.create(descripcion="Completada")
+        cls.tipo_nc = TipoNoConformidad.objects.create(nombre="Rotura")
+
+    def _ots(self):
+        """
+        Una OT completada a tiempo (con desperdicio y una pausa) y una pendiente, el
+        mismo día. La No Conformidad deja la producida en 100 - 10.
+        """
+        completada = OrdenDeTrabajo.objects.create(
+            id_orden_produccion=self.op, id_linea_produccion=self.linea, id_estado_orden_trabajo=self.completada,
+            cantidad_programada=100, hora_inicio_programada=_hora(DIA, 10), hora_fin_programada=_hora(DIA, 12),
+            hora_inicio_real=_hora(DIA, 10), hora_fin_real=_hora(DIA, 11, 40),
+            produccion_bruta=90,
+        )
+        NoConformidad.objects.create(id_orden_trabajo=completada, id_tipo_no_conformidad=self.tipo_nc, cant_desperdiciada=10)
+        PausaOT.objects.create(id_orden_trabajo=completada, motivo="Limpieza", duracion_minutos=20, activa=False)
+        OrdenDeTrabajo.objects.create(
+            id_orden_produccion=self.op, id_linea_produccion=self.linea, id_estado_orden_trabajo=self.pendiente,
+            cantidad_programada=50, hora_inicio_programada=_hora(DIA, 14), hora_fin_programada=_hora(DIA, 15),
+        )
+        return completada
+
+    def test_recalcular(self):
+        self._ots()
+        self.assertEqual(recalcular_produccion_diaria(DIA, DIA), 1)
+
+        hecho = ProduccionDiaria.objects.get()
+        self.assertEqual(
+            (hecho.fecha, hecho.ots, hecho.ots_completadas, hecho.cantidad_planificada,
+             hecho.cantidad_planificada_completada, hecho.cantidad_producida, hecho.cantidad_cumplida,
+             hecho.produccion_bruta, hecho.desperdicio),
+            (DIA, 2, 1, 150, 100, 90, 90, 90, 10)
+        )
+        self.assertEqual(
+            (hecho.minutos_programados, hecho.minutos_ideales, hecho.minutos_ejecucion,
+             hecho.minutos_pausa, hecho.minutos_ejecucion_tarde),
+            (120, 90, 100, 20, 0)
+        )
+        self.assertEqual(
+            list(DesperdicioDiario.objects.values_list('fecha', 'id_tipo_no_conformidad_id', 'cantidad')),
+            [(DIA, self.tipo_nc.pk, 10)]
+        )
+
+    def test_recalcular_es_idempotente(self):
+        self._ots()
+        recalcular_produccion_diaria(DIA, DIA)
+        recalcular_produccion_diaria(DIA - timedelta(days=1), DIA + timedelta(days=1))
+        self.assertEqual(ProduccionDiaria.objects.count(), 1)
+        self.assertEqual(DesperdicioDiario.objects.count(), 1)
+
+    def test_las_senales_mantienen_la_tabla(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            completada = self._ots()
+        incremental = list(ProduccionDiaria.objects.values())
+        self.assertEqual(len(incremental), 1)
+
+        # Moverla de día recalcula el de origen y el de destino
+        with self.captureOnCommitCallbacks(execute=True):
+            completada.hora_inicio_programada += timedelta(days=1)
+            completada.hora_fin_programada += timedelta(days=1)
+            completada.save()
+        self.assertEqual(
+            sorted(ProduccionDiaria.objects.values_list('fecha', 'ots')),
+            [(DIA, 1), (DIA + timedelta(days=1), 1)]
+        )
+
+        # Reconstruir desde cero da lo mismo que el mantenimiento incremental
+        campos = ('fecha', 'id_linea_produccion_id', 'id_producto_id', 'ots', 'cantidad_producida', 'minutos_pausa')
+        antes = sorted(ProduccionDiaria.objects.values_list(*campos))
+        reconstruir_produccion_diaria()
+        self.assertEqual(sorted(ProduccionDiaria.objects.values_list(*campos)), antes)
+
+    def test_calcular_oee(self):
+        self._ots()
+        recalcular_produccion_diaria(DIA, DIA)
+
+        total, = calcular_oee(DIA, DIA, periodo=None)
+        factores = total["factores"]
+        self.assertAlmostEqual(factores["disponibilidad"], 0.8)
+        self.assertAlmostEqual(factores["rendimiento"], 0.75)
+        self.assertAlmostEqual(factores["calidad"], 80 / 90)
+        self.assertAlmostEqual(factores["oee"], 0.8 * 0.75 * 80 / 90)
+
+    def test_calcular_oee_por_dia_y_linea(self):
+        self._ots()
+        recalcular_produccion_diaria(DIA, DIA)
+
+        filas = calcular_oee(DIA - timedelta(days=1), DIA + timedelta(days=1), periodo='dia', por='linea')
+        self.assertEqual([fila["periodo_inicio"] for fila in filas], [DIA - timedelta(days=1), DIA, DIA + timedelta(days=1)])
+        self.assertEqual({fila["nombre"] for fila in filas}, {"L1"})
+        self.assertEqual([fila["totales"]["ots"] for fila in filas], [0, 2, 0])
+        self.assertEqual(filas[0]["factores"]["oee"], 0)
+
+
+@override_settings(CACHES=CACHE_DE_PRUEBA)
+class CacheReportesTests(TestCase):
+
+    DESDE = date(2025, 1, 1)
+    HASTA = date(2025, 1, 31)
+
+    def setUp(self):
+        self.calculos = 0
+        caches['reportes'].clear()
+
+    def _calcular(self, cacheable=True):
+        def calcular():
+            self.calculos += 1
+            return {"calculo": self.calculos}, cacheable
+        return calcular
+
+    def _reporte(self, fuentes=(FUENTE_VENTAS,), parametros=None, cacheable=True):
+        return obtener_reporte(
+            "prueba", list(fuentes), self.DESDE, self.HASTA, parametros or {}, self._calcular(cacheable)
+        )
+
+    def test_se_calcula_una_vez(self):
+        self.assertEqual(self._reporte(), {"calculo": 1})
+        self.assertEqual(self._reporte(), {"calculo": 1})
+        self.assertEqual(self._reporte(parametros={"linea": 1}), {"calculo": 2})
+
+    def test_no_cacheable(self):
+        self._reporte(cacheable=False)
+        self._reporte(cacheable=False)
+        self.assertEqual(self.calculos, 2)
+
+    def test_invalidar_el_mes_del_rango(self):
+        self._reporte()
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidar_reportes(FUENTE_VENTAS, date(2025, 1, 15))
+        self.assertEqual(self._reporte(), {"calculo": 2})
+
+    def test_otro_mes_u_otra_fuente_no_invalidan(self):
+        self._reporte()
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidar_reportes(FUENTE_VENTAS, date(2025, 2, 1), None)
+            invalidar_reportes(FUENTE_PRODUCCION, date(2025, 1, 15))
+        self.assertEqual(self._reporte(), {"calculo": 1})
+
+    def test_se_invalida_al_confirmar(self):
+        self._reporte()
+        with self.captureOnCommitCallbacks(execute=False):
+            invalidar_reportes(FUENTE_VENTAS, date(2025, 1, 15))
+            self.assertEqual(self._reporte(), {"calculo": 1})
+
+    def test_invalidar_fuente(self):
+        self._reporte()
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidar_fuente(FUENTE_VENTAS)
+        self.assertEqual(self._reporte(), {"calculo": 2})
+
+    def test_cambio_de_producto_invalida_meses_pasados(self):
+        producto = Producto.objects.create(
+            nombre="P1", descripcion="P1", precio=1, id_tipo_producto=TipoProducto.objects.create(descripcion="t"),
+            id_unidad=Unidad.objects.create(descripcion="u"), dias_duracion=1, umbral_minimo=0
+        )
+        self._reporte()
+        with self.captureOnCommitCallbacks(execute=True):
+            producto.precio = 2
+            producto.save()
+        self.assertEqual(self._reporte(), {"calculo": 2})
+
+
+class ExportacionXlsxTests(SimpleTestCase):
+
+    def _leer(self, filas, encabezados=("a", "b")):
+        contenido = b''.join(exportacion._xlsx(list(encabezados), filas))
+        archivo = zipfile.ZipFile(io.BytesIO(contenido))
+        hojas = sorted(nombre for nombre in archivo.namelist() if nombre.startswith('xl/worksheets/'))
+        return archivo, [archivo.read(hoja).decode('utf-8') for hoja in hojas]
+
+    def test_sin_filas(self):
+        archivo, hojas = self._leer(iter([]))
+        self.assertEqual(len(hojas), 1)
+        self.assertEqual(hojas[0].count('<row '), 1)
+        self.assertIsNone(archivo.testzip())
+
+    def test_divide_en_hojas(self):
+        with mock.patch.object(exportacion, 'FILAS_POR_HOJA', 2):
+            archivo, hojas = self._leer(([i, f"fila {i}"] for i in range(5)))
+
+        self.assertEqual([hoja.count('<row ') for hoja in hojas], [3, 3, 2])
+        # Cada hoja repite el encabezado y numera desde la fila 2
+        for hoja in hojas:
+            self.assertIn('<row r="1"><c r="A1" t="inlineStr"><is><t xml:space="preserve">a</t>', hoja)
+        self.assertIn('<row r="2"><c r="A2"><v>4</v></c>', hojas[2])
+        libro = archivo.read('xl/workbook.xml').decode('utf-8')
+        self.assertEqual(libro.count('<sheet '), 3)
+        self.assertEqual(archivo.read('[Content_Types].xml').decode('utf-8').count('worksheets/sheet'), 3)
+
+    def test_hoja_justa(self):
+        with mock.patch.object(exportacion, 'FILAS_POR_HOJA', 2):
+            _, hojas = self._leer([[1, 2], [3, 4]])
+        self.assertEqual([hoja.count('<row ') for hoja in hojas], [3])
+
+    def test_texto_escapado(self):
+        _, hojas = self._leer([["<&>", "con\x01control"]])
+        self.assertIn('&lt;&amp;&gt;', hojas[0])
+        self.assertIn('concontrol', hojas[0])
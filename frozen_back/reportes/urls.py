@@ -61,6 +61,14 @@ urlpatterns = [
          views.ReporteOEEGeneral.as_view(),
          name='reporte-oee'),
 
+    path('oee/por-linea/', 
+         views.ReporteOEEPorLinea.as_view(),
+         name='reporte-oee-por-linea'),
+
+    path('oee/por-producto/', 
+         views.ReporteOEEPorProducto.as_view(),
+         name='reporte-oee-por-producto'),
+
     path('ventas/ventas-por-tipo/', 
          views.ReporteVolumenPorTipo.as_view(),
          name='ventas-por-tipo'),
@@ -88,4 +96,8 @@ urlpatterns = [
     path('ventas/ventas-por-tipo-producto/', 
          views.ReporteDistribucionProductoPorTipo.as_view(),
          name='ventas-por-tipo-producto'),
+
+    path('tablero/', 
+         views.ReporteTablero.as_view(),
+         name='reporte-tablero'),
 ]
\ No newline at end of file
@@ -1,3 +1,5 @@
+from functools import wraps
+
 from django.shortcuts import render
 from rest_framework.views import APIView
 from rest_framework import status
@@ -5,7 +7,6 @@ from rest_framework.response import Response
 from django.db.models import Sum, F, Count, fields, Subquery, OuterRef, Avg
 from django.db.models.functions import TruncDate, TruncMonth, TruncWeek, ExtractYear, ExtractDay
 from datetime import datetime, timedelta # Asegúrate de importar timedelta si usas el helper
-from dateutil.relativedelta import relativedelta
 
 # --- ¡IMPORTANTE! ---
 # Ahora importas los modelos desde sus apps correspondientes
@@ -15,7 +16,12 @@ from produccion.models import OrdenDeTrabajo, NoConformidad, EstadoOrdenTrabajo,
 from stock.models import LoteProduccionMateria
 from productos.models import Producto
 from materias_primas.models import MateriaPrima
-from django.db.models import Sum, F, Count, Value, CharField, FloatField, Q, DateField, Case, When, BooleanField, ExpressionWrapper, DurationField
+from .models import ProduccionDiaria
+from . import indicadores
+from .services import PERIODOS_OEE, calcular_oee, totales_produccion
+from .cache_reportes import FUENTE_DESPERDICIO, FUENTE_PRODUCCION, FUENTE_VENTAS, obtener_reporte
+from .exportacion import FORMATOS, error_formato, filas_de_datos, respuesta_exportada
+from django.db.models import Sum, F, Count, Value, CharField, FloatField, Q, DateField, Case, When, BooleanField, ExpressionWrapper, DurationField, QuerySet
 from django.db.models.functions import TruncDate, Coalesce, Cast
 
 from django.utils import timezone
@@ -40,10 +46,80 @@ def parsear_fechas(request):
         return None, None
 
 
+def cachear_reporte(*fuentes):
+    """
+    Decorador de clase para los reportes con rango de fechas: cachea la respuesta
+    del GET por clase + parámetros (ver reportes/cache_reportes.py). 'fuentes' son
+    los datos de los que lee el reporte, para invalidarlo cuando cambian.
+    """
+    def decorar(vista):
+        get = vista.get
+
+        @wraps(get)
+        def get_cacheado(self, request, *args, **kwargs):
+            fecha_desde, fecha_hasta = parsear_fechas(request)
+            if fecha_desde is None:
+                return get(self, request, *args, **kwargs)
+
+            # Fechas efectivas: sin parámetros o con los valores por defecto, la misma clave
+            # (el formato de exportación no cambia los datos)
+            parametros = {
+                clave: sorted(valores) for clave, valores in request.query_params.lists() if clave != 'formato'
+            }
+            parametros['fecha_desde'] = fecha_desde.strftime('%Y-%m-%d')
+            parametros['fecha_hasta'] = fecha_hasta.strftime('%Y-%m-%d')
+
+            calculada = []
+
+            def calcular():
+                respuesta = get(self, request, *args, **kwargs)
+                calculada.append(respuesta)
+                datos = list(respuesta.data) if isinstance(respuesta.data, QuerySet) else respuesta.data
+                return datos, respuesta.status_code == status.HTTP_200_OK
+
+            # La clase de la instancia (no 'vista'): las subclases tienen su propia clave
+            datos = obtener_reporte(
+                type(self).__qualname__, fuentes, fecha_desde, fecha_hasta, parametros, calcular
+            )
+            return calculada[0] if calculada else Response(datos)
+
+        vista.get = get_cacheado
+        return vista
+    return decorar
+
+
+def exportable(vista):
+    """
+    Decorador de clase: con ?formato=csv|xlsx el GET del reporte se descarga como
+    archivo (ver reportes/exportacion.py) en vez de devolver JSON.
+    """
+    get = vista.get
+
+    @wraps(get)
+    def get_exportable(self, request, *args, **kwargs):
+        formato = request.query_params.get('formato')
+        if formato is None:
+            return get(self, request, *args, **kwargs)
+        if formato not in FORMATOS:
+            return error_formato()
+
+        respuesta = get(self, request, *args, **kwargs)
+        if respuesta.status_code != status.HTTP_200_OK:
+            return respuesta
+        encabezados, filas = filas_de_datos(respuesta.data)
+        nombre = request.resolver_match.url_name if request.resolver_match else type(self).__name__
+        return respuesta_exportada(formato, encabezados, filas, nombre)
+
+    vista.get = get_exportable
+    return vista
+
+
 # --- VISTAS DE REPORTES ---
 
 ### 1. Reportes de Producción
 
+@exportable
+@cachear_reporte(FUENTE_PRODUCCION)
 class ReporteProduccionDiaria(APIView):
     """
     API para gráfico de serie temporal (ej. líneas apiladas).
@@ -96,6 +172,8 @@ class ReporteProduccionDiaria(APIView):
         return Response(reporte)
 
 
+@exportable
+@cachear_reporte(FUENTE_PRODUCCION)
 class ReporteProduccionPorProducto(APIView):
     """
     API para gráfico de torta o barras (Pie chart / Bar chart).
@@ -150,6 +228,7 @@ class ReporteProduccionPorProducto(APIView):
 
 ### 2. Reporte de Consumo
 
+@exportable
 class ReporteConsumoMateriaPrima(APIView):
     """
     API para gráfico de barras o serie temporal.
@@ -184,6 +263,8 @@ class ReporteConsumoMateriaPrima(APIView):
 
 ### 3. Reporte de Desperdicio
 
+@exportable
+@cachear_reporte(FUENTE_DESPERDICIO)
 class ReporteDesperdicioPorCausa(APIView):
     """
     API para gráfico de torta o barras (Pareto).
@@ -198,25 +279,15 @@ class ReporteDesperdicioPorCausa(APIView):
         if fecha_desde is None:
             return Response({"error": "Formato de fecha inválido."}, status=400)
 
-        # 1. FILTRADO: Usamos la fecha de creación de la Orden de Producción (OP), 
-        #    accediendo a través de la Orden de Trabajo (OT).
-        query = NoConformidad.objects.filter(
-            # Cadena de FKs: NC -> OT -> OP -> fecha_creacion
-            id_orden_trabajo__id_orden_produccion__fecha_creacion__range=(fecha_desde, fecha_hasta)
-        )
-
-        # 2. AGRUPACIÓN: Agrupar por el Tipo de No Conformidad (causa estandarizada)
-        reporte = query.values(
-            # Agrupamos por el nombre del TipoNoConformidad
-            causa=F('id_tipo_no_conformidad__nombre') 
-        ).annotate(
-            total_desperdiciado=Sum('cant_desperdiciada')
-        ).order_by('-total_desperdiciado')
+        # Total por Tipo de No Conformidad (causa estandarizada), por creación de la OP
+        reporte = indicadores.consultar_desperdicio_por_causa(fecha_desde, fecha_hasta)
 
         # Salida: [{"causa": "Falla de Empaque", "total_desperdiciado": 150}, ...]
         return Response(reporte)
 
 
+@exportable
+@cachear_reporte(FUENTE_DESPERDICIO)
 class ReporteDesperdicioPorProducto(APIView):
     """
     API para gráfico de barras.
@@ -252,70 +323,26 @@ class ReporteDesperdicioPorProducto(APIView):
         return Response(reporte)
     
 
+@exportable
+@cachear_reporte(FUENTE_PRODUCCION)
 class ReporteTasaDeDesperdicio(APIView):
     """
     Calcula la Tasa de Desperdicio (Total Desperdiciado / Total Programado de OTs Completadas)
     basándose ÚNICAMENTE en las Órdenes de Trabajo que han sido Completadas.
+    Lee la tabla de hechos de producción diaria (ProduccionDiaria).
     """
     def get(self, request, *args, **kwargs):
         fecha_desde, fecha_hasta = parsear_fechas(request)
         if fecha_desde is None:
             return Response({"error": "Formato de fecha inválido. Usar YYYY-MM-DD."}, status=400)
 
-        rango_fecha_filtro = (fecha_desde, fecha_hasta)
-        
-        # --- 0. Definir el conjunto base de OTs Completadas en el rango de fecha ---
-        # Filtramos las OTs que terminaron dentro del rango o que iniciaron en el rango y se completaron
-        ots_completadas = OrdenDeTrabajo.objects.filter(
-            id_estado_orden_trabajo__descripcion='Completada',  # Filtro esencial
-            hora_inicio_programada__range=rango_fecha_filtro
-        )
-
-        # 1. CALCULAR EL TOTAL DESPERDICIADO (NUMERADOR)
-        # 🚨 CAMBIO: Filtramos las No Conformidades que pertenecen a las OTs COMPLETADAS
-        total_desperdiciado_query = NoConformidad.objects.filter(
-            # Filtra las NCs que tienen una OT cuya hora_inicio_programada cae en el rango
-            id_orden_trabajo__hora_inicio_programada__range=rango_fecha_filtro,
-            # Filtra las NCs cuya OT está en estado 'Completada'
-            id_orden_trabajo__id_estado_orden_trabajo__descripcion='Completada' 
-        ).aggregate(
-            total_desperdiciado=Coalesce(
-                Sum('cant_desperdiciada'), 
-                Value(0.0), 
-                output_field=FloatField() 
-            )
-        )
-        total_desperdiciado = total_desperdiciado_query.get('total_desperdiciado', 0.0)
-
-        # 2. CALCULAR EL TOTAL PROGRAMADO (DENOMINADOR)
-        # 🚨 CAMBIO: Sumamos SOLO la cantidad programada de las OTs Completadas
-        total_producido_query = ots_completadas.aggregate(
-            total_programado=Coalesce(
-                Sum('cantidad_programada'), 
-                Value(0.0),
-                output_field=FloatField() 
-            )
-        )
-        total_programado = total_producido_query.get('total_programado', 0.0)
-        
-        # 3. CÁLCULO DE LA TASA
-        tasa_desperdicio = 0.0
-        
-        if total_programado > 0:
-            # Tasa de desperdicio = (Desperdiciado total / Programado en OTs completadas) * 100
-            tasa_desperdicio = (total_desperdiciado / total_programado) * 100.0
-
-        resultado = {
-            "fecha_desde": fecha_desde.strftime('%Y-%m-%d'),
-            "fecha_hasta": fecha_hasta.strftime('%Y-%m-%d'),
-            "total_programado_completado": total_programado,
-            "total_desperdiciado": total_desperdiciado,
-            "tasa_desperdicio_porcentaje": round(tasa_desperdicio, 2)
-        }
-
-        return Response(resultado)
+        # Totales de las OTs Completadas en el rango (tabla de hechos de producción diaria)
+        totales = totales_produccion(fecha_desde, fecha_hasta)
+        return Response(indicadores.tasa_desperdicio(totales, fecha_desde, fecha_hasta))
     
 
+@exportable
+@cachear_reporte(FUENTE_PRODUCCION)
 class ReporteCumplimientoPlan(APIView):
     """
     API para calcular el Porcentaje de Cumplimiento de Adherencia (PCA) por Cantidad (Volumen).
@@ -389,6 +416,8 @@ class ReporteCumplimientoPlan(APIView):
 
         return Response(resultado)
     
+@exportable
+@cachear_reporte(FUENTE_PRODUCCION)
 class ReporteCumplimientoPlanMensual(APIView):
     """
     API para calcular el Porcentaje de Cumplimiento de Adherencia (PCA) agrupado por mes.
@@ -399,51 +428,18 @@ class ReporteCumplimientoPlanMensual(APIView):
         if fecha_desde is None or fecha_hasta is None:
             return Response({"error": "Debe proporcionar fechas válidas (desde, hasta) en formato YYYY-MM-DD."}, status=400)
 
-        # 1. ANOTAR LAS OTs con el mes, año y si cumplió la fecha programada
-        ots_base = OrdenDeTrabajo.objects.filter(
-            hora_inicio_programada__range=(fecha_desde, fecha_hasta),
+        # 1. AGRUPAR POR MES la tabla de hechos de producción diaria
+        # (planificado: todas las OTs; cumplido: producido por OTs Completadas a tiempo)
+        resultados_agrupados = ProduccionDiaria.objects.filter(
+            fecha__range=(fecha_desde.date(), fecha_hasta.date()),
         ).annotate(
-            # Campo para agrupar: Mes de la hora de inicio programada
-            mes_reporte=TruncMonth('hora_inicio_programada'),
-            
-            # Campos para verificar cumplimiento
-            dia_fin_real=F('hora_fin_real__date'),
-            dia_fin_programado=F('hora_fin_programada__date')
-        ).annotate(
-            cumplio_fecha=Case(
-                When(
-                    # Criterio de cumplimiento: Día de fin real <= Día de fin programado
-                    dia_fin_real__lte=F('dia_fin_programado'), 
-                    # El estado debe ser 'Completada' y la hora_fin_real no nula
-                    id_estado_orden_trabajo__descripcion='Completada',
-                    hora_fin_real__isnull=False,
-                    then=Value(True)
-                ),
-                default=Value(False),
-                output_field=BooleanField()
-            )
-        )
-        
-        # 2. AGREGAR Y AGRUPAR POR MES
-        resultados_agrupados = ots_base.values('mes_reporte').annotate(
-            # Denominador: Total planificado para ese mes
-            total_planificado=Coalesce(Sum('cantidad_programada'), Value(0.0), output_field=FloatField()),
-            
-            # Numerador: Suma de la cantidad_programada SOLO de las que cumplieron
-            total_cumplido_adherencia=Coalesce(
-                Sum(
-                    Case(
-                        When(cumplio_fecha=True, then='cantidad_producida'),
-                        default=Value(0),
-                        output_field=FloatField()
-                    )
-                ), 
-                Value(0.0),
-                output_field=FloatField()
-            )
+            mes_reporte=TruncMonth('fecha')
+        ).values('mes_reporte').annotate(
+            total_planificado=Coalesce(Sum('cantidad_planificada'), Value(0.0), output_field=FloatField()),
+            total_cumplido_adherencia=Coalesce(Sum('cantidad_cumplida'), Value(0.0), output_field=FloatField())
         ).order_by('mes_reporte')
         
-        # 3. Formatear resultados y calcular PCA por mes
+        # 2. Formatear resultados y calcular PCA por mes
         reporte = []
         for item in resultados_agrupados:
             planificado = item['total_planificado']
@@ -461,6 +457,8 @@ class ReporteCumplimientoPlanMensual(APIView):
             
         return Response(reporte)
     
+@exportable
+@cachear_reporte(FUENTE_PRODUCCION)
 class ReporteCumplimientoPlanSemanal(APIView):
     """
     API para calcular el Porcentaje de Cumplimiento de Adherencia (PCA) agrupado por semana.
@@ -471,51 +469,18 @@ class ReporteCumplimientoPlanSemanal(APIView):
         if fecha_desde is None or fecha_hasta is None:
             return Response({"error": "Debe proporcionar fechas válidas (desde, hasta) en formato YYYY-MM-DD."}, status=400)
 
-        # 1. ANOTAR LAS OTs con la semana y si cumplió la fecha programada
-        ots_base = OrdenDeTrabajo.objects.filter(
-            hora_inicio_programada__range=(fecha_desde, fecha_hasta),
+        # 1. AGRUPAR POR SEMANA la tabla de hechos de producción diaria
+        # (planificado: todas las OTs; cumplido: producido por OTs Completadas a tiempo)
+        resultados_agrupados = ProduccionDiaria.objects.filter(
+            fecha__range=(fecha_desde.date(), fecha_hasta.date()),
         ).annotate(
-            # Campo para agrupar: Trunca a la fecha de inicio de la semana
-            semana_reporte=TruncWeek('hora_inicio_programada'),
-            
-            # Campos para verificar cumplimiento
-            dia_fin_real=F('hora_fin_real__date'),
-            dia_fin_programado=F('hora_fin_programada__date')
-        ).annotate(
-            cumplio_fecha=Case(
-                When(
-                    # Criterio de cumplimiento: Día de fin real <= Día de fin programado
-                    dia_fin_real__lte=F('dia_fin_programado'), 
-                    # El estado debe ser 'Completada' y la hora_fin_real no nula
-                    id_estado_orden_trabajo__descripcion='Completada',
-                    hora_fin_real__isnull=False,
-                    then=Value(True)
-                ),
-                default=Value(False),
-                output_field=BooleanField()
-            )
-        )
-        
-        # 2. AGREGAR Y AGRUPAR POR SEMANA
-        resultados_agrupados = ots_base.values('semana_reporte').annotate(
-            # Denominador: Total planificado para esa semana
-            total_planificado=Coalesce(Sum('cantidad_programada'), Value(0.0), output_field=FloatField()),
-            
-            # Numerador: Suma de la cantidad_programada SOLO de las que cumplieron
-            total_cumplido_adherencia=Coalesce(
-                Sum(
-                    Case(
-                        When(cumplio_fecha=True, then='cantidad_producida'),
-                        default=Value(0),
-                        output_field=FloatField()
-                    )
-                ), 
-                Value(0.0),
-                output_field=FloatField()
-            )
+            semana_reporte=TruncWeek('fecha')
+        ).values('semana_reporte').annotate(
+            total_planificado=Coalesce(Sum('cantidad_planificada'), Value(0.0), output_field=FloatField()),
+            total_cumplido_adherencia=Coalesce(Sum('cantidad_cumplida'), Value(0.0), output_field=FloatField())
         ).order_by('semana_reporte')
         
-        # 3. Formatear resultados y calcular PCA por semana
+        # 2. Formatear resultados y calcular PCA por semana
         reporte = []
         for item in resultados_agrupados:
             planificado = item['total_planificado']
@@ -534,6 +499,7 @@ class ReporteCumplimientoPlanSemanal(APIView):
             
         return Response(reporte)
     
+@exportable
 class LineasProduccionYEstado(APIView):
     """
     Devuelve la lista de TODAS las líneas de producción, mostrando su nombre 
@@ -571,278 +537,83 @@ class LineasProduccionYEstado(APIView):
 # 1. FACTOR DE CALIDAD
 # ====================================================================
 
+@exportable
+@cachear_reporte(FUENTE_PRODUCCION)
 class ReporteFactorCalidadOEE(APIView):
     """ API para calcular el Factor de Calidad del OEE (Producción Bruta - Desperdicio). """
-    
-    def _calculate_factor_calidad(self, fecha_desde, fecha_hasta):
-        rango_fecha_filtro = (fecha_desde, fecha_hasta)
-        
-        # 1. CALCULAR LA PRODUCCIÓN BRUTA TOTAL (VOLUMEN REAL)
-        produccion_bruta_total_query = OrdenDeTrabajo.objects.filter(
-            hora_inicio_programada__range=rango_fecha_filtro,
-            id_estado_orden_trabajo__descripcion='Completada'
-        ).aggregate(
-            produccion_bruta_total=Coalesce(Sum('produccion_bruta'), Value(0.0), output_field=FloatField())
-        )
-        produccion_bruta_total = produccion_bruta_total_query.get('produccion_bruta_total', 0.0)
-
-        # 2. CALCULAR EL TOTAL DESPERDICIADO (PÉRDIDAS)
-        total_desperdiciado_query = NoConformidad.objects.filter(
-            id_orden_trabajo__hora_inicio_programada__range=rango_fecha_filtro,
-            id_orden_trabajo__id_estado_orden_trabajo__descripcion='Completada'
-        ).aggregate(
-            total_desperdiciado=Coalesce(Sum('cant_desperdiciada'), Value(0.0), output_field=FloatField())
-        )
-        total_desperdiciado = total_desperdiciado_query.get('total_desperdiciado', 0.0)
-
-        # 3. CÁLCULO DEL FACTOR CALIDAD (Factor puro: 0.0 a 1.0)
-        factor_calidad = 0.0
-        
-        if produccion_bruta_total > 0:
-            piezas_buenas = produccion_bruta_total - total_desperdiciado
-            piezas_buenas_seguro = max(0, piezas_buenas) 
-            factor_calidad = (piezas_buenas_seguro / produccion_bruta_total)
-        
-        return factor_calidad, {
-            "produccion_bruta_total": produccion_bruta_total,
-            "total_desperdiciado": total_desperdiciado,
-        }
-        
     def get(self, request, *args, **kwargs):
         fecha_desde, fecha_hasta = parsear_fechas(request)
         if fecha_desde is None:
             return Response({"error": "Formato de fecha inválido. Usar YYYY-MM-DD."}, status=400)
-            
-        factor_calidad, data = self._calculate_factor_calidad(fecha_desde, fecha_hasta)
-        
-        resultado = {
-            "fecha_desde": fecha_desde.strftime('%Y-%m-%d'),
-            "fecha_hasta": fecha_hasta.strftime('%Y-%m-%d'),
-            "produccion_bruta_total": data['produccion_bruta_total'],
-            "total_desperdiciado": data['total_desperdiciado'],
-            "factor_calidad_oee": round(factor_calidad * 100.0, 2)
-        }
-        return Response(resultado)
+
+        # Producción bruta y desperdicio de las OTs Completadas (tabla de hechos de producción diaria)
+        totales = totales_produccion(fecha_desde, fecha_hasta)
+        return Response(indicadores.factor_calidad(totales, fecha_desde, fecha_hasta))
 
 # ====================================================================
 # 2. FACTOR DE RENDIMIENTO
 # ====================================================================
 
+@exportable
+@cachear_reporte(FUENTE_PRODUCCION)
 class ReporteFactorRendimientoOEE(APIView):
     """
     API para calcular el Factor de Rendimiento del OEE, usando el tiempo programado 
     como denominador y la tasa ideal (cant_por_hora) de ProductoLinea.
     """
-
-    def _calculate_factor_rendimiento(self, fecha_desde, fecha_hasta):
-        rango_fecha_filtro = (fecha_desde, fecha_hasta)
-        
-        ots_completadas = OrdenDeTrabajo.objects.filter(
-            hora_inicio_programada__range=rango_fecha_filtro,
-            id_estado_orden_trabajo__descripcion='Completada'
-        ).select_related('id_orden_produccion', 'id_linea_produccion')
-
-        if not ots_completadas.exists():
-            return 0.0, {}
-
-        # --- A. CÁLCULO DEL DENOMINADOR: TIEMPO DE FUNCIONAMIENTO (PROGRAMADO) ---
-        tiempo_programado_total_delta = ots_completadas.aggregate(
-            total_delta=Coalesce(
-                Sum(F('hora_fin_programada') - F('hora_inicio_programada')),
-                Value(timedelta(seconds=0)),
-                output_field=fields.DurationField()
-            )
-        )['total_delta']
-
-        tiempo_funcionamiento_minutos = tiempo_programado_total_delta.total_seconds() / 60
-        
-        if tiempo_funcionamiento_minutos <= 0:
-            return 0.0, {"tiempo_funcionamiento_minutos": 0.0, "produccion_bruta_total": 0.0}
-
-        # --- B. CÁLCULO DEL NUMERADOR: TIEMPO DE PRODUCCIÓN IDEAL REQUERIDO ---
-        
-        # Subquery para obtener la tasa ideal (cant_por_hora)
-        tasa_ideal_subquery = ProductoLinea.objects.filter(
-            id_linea_produccion=OuterRef('id_linea_produccion'), 
-            id_producto=OuterRef('id_orden_produccion__id_producto') 
-        ).values('cant_por_hora')[:1] 
-
-        ots_anotadas = ots_completadas.annotate(
-            cant_por_hora_ideal=Subquery(tasa_ideal_subquery, output_field=fields.IntegerField())
-        )
-        
-        ots_con_tiempo_ideal = ots_anotadas.annotate(
-            tiempo_ideal_ot=Case(
-                When(cant_por_hora_ideal__isnull=True, then=Value(0.0)),
-                When(cant_por_hora_ideal__lte=0, then=Value(0.0)),
-                default=ExpressionWrapper(
-                    (F('produccion_bruta') / Cast('cant_por_hora_ideal', FloatField())) * 60,
-                    output_field=FloatField()
-                )
-            )
-        )
-
-        agregacion_ideal = ots_con_tiempo_ideal.aggregate(
-            produccion_ideal_requerida_minutos=Coalesce(Sum('tiempo_ideal_ot'), Value(0.0), output_field=FloatField()),
-            produccion_bruta_total=Coalesce(Sum('produccion_bruta'), Value(0.0), output_field=FloatField())
-        )
-        
-        produccion_ideal_requerida_minutos = agregacion_ideal['produccion_ideal_requerida_minutos']
-        produccion_bruta_total = agregacion_ideal['produccion_bruta_total']
-
-
-        # --- C. CÁLCULO DEL FACTOR RENDIMIENTO (Factor puro: 0.0 a 1.0) ---
-        factor_rendimiento = 0.0
-        if tiempo_funcionamiento_minutos > 0:
-             factor_rendimiento = (produccion_ideal_requerida_minutos / tiempo_funcionamiento_minutos)
-        
-        return factor_rendimiento, {
-            "produccion_bruta_total": produccion_bruta_total,
-            "tiempo_funcionamiento_minutos": tiempo_funcionamiento_minutos,
-            "tiempo_ideal_requerido_minutos": produccion_ideal_requerida_minutos
-        }
-
     def get(self, request, *args, **kwargs):
         fecha_desde, fecha_hasta = parsear_fechas(request)
         if fecha_desde is None:
             return Response({"error": "Formato de fecha inválido. Usar YYYY-MM-DD."}, status=400)
-            
-        factor_rendimiento, data = self._calculate_factor_rendimiento(fecha_desde, fecha_hasta)
-        
-        resultado = {
-            "fecha_desde": fecha_desde.strftime('%Y-%m-%d'),
-            "fecha_hasta": fecha_hasta.strftime('%Y-%m-%d'),
-            "produccion_bruta_total": data.get("produccion_bruta_total", 0.0),
-            "tiempo_funcionamiento_minutos": round(data.get("tiempo_funcionamiento_minutos", 0.0), 2),
-            "tiempo_ideal_requerido_minutos": round(data.get("tiempo_ideal_requerido_minutos", 0.0), 2),
-            "factor_rendimiento_oee": round(factor_rendimiento * 100.0, 2)
-        }
-        return Response(resultado)
+
+        # OTs Completadas del rango (tabla de hechos de producción diaria)
+        totales = totales_produccion(fecha_desde, fecha_hasta)
+        return Response(indicadores.factor_rendimiento(totales, fecha_desde, fecha_hasta))
 
 # ====================================================================
 # 3. FACTOR DE DISPONIBILIDAD AJUSTADA
 # ====================================================================
 
+@exportable
+@cachear_reporte(FUENTE_PRODUCCION)
 class ReporteDisponibilidadAjustada(APIView):
     """
     API que calcula el indicador de Disponibilidad Ajustada (Eficacia Operativa).
-    Utiliza el método original de agregación directa (Sum('pausas__duracion_minutos')).
+    Lee la tabla de hechos de producción diaria (ProduccionDiaria).
     """
-    
-    def _calculate_disponibilidad_ajustada(self, fecha_desde, fecha_hasta):
-        rango_fecha_filtro = (fecha_desde, fecha_hasta)
-        
-        # 1. Conjunto Base: OTs Completadas y con tiempos reales en el rango
-        ots_base = OrdenDeTrabajo.objects.filter(
-            id_estado_orden_trabajo__descripcion='Completada',
-            hora_inicio_real__isnull=False,
-            hora_fin_real__isnull=False,
-            hora_inicio_programada__range=rango_fecha_filtro
-        )
-        
-        # 2. Anotar el Tiempo de Carga Ajustado y el indicador de penalización
-        ots_anotadas = ots_base.annotate(
-            # 2.1. Tiempo de Carga Ajustado (Tiempo Transcurrido Bruto)
-            tiempo_carga_ajustado_td=ExpressionWrapper(
-                F('hora_fin_real') - F('hora_inicio_real'),
-                output_field=fields.DurationField()
-            ),
-            
-            # 2.2. Diferencia de Fechas (DurationField)
-            retraso_fecha_td=ExpressionWrapper(
-                F('hora_fin_real__date') - F('hora_fin_programada__date'),
-                output_field=fields.DurationField()
-            ),
-            
-        ).annotate(
-            # Indicador de Tarde: Verificamos si la duración es mayor a 0 segundos
-            termino_tarde=Case(
-                When(retraso_fecha_td__gt=timedelta(seconds=0), then=Value(True)), 
-                default=Value(False),
-                output_field=fields.BooleanField()
-            )
-        )
-
-        # 3. Agregación de Totales (Sumas)
-        # 🚨 USANDO AGREGACIÓN DIRECTA: Sum('pausas__duracion_minutos')
-        reporte_agregado = ots_anotadas.aggregate(
-            # 3.1. Total de Pausas (Pérdidas por Paradas) en minutos
-            total_perdida_pausas_minutos=Coalesce(
-                Sum('pausas__duracion_minutos'), # ⬅️ USADO TAL CUAL ESTABA
-                Value(0.0), # Usamos 0.0 para consistencia con FloatField
-                output_field=FloatField()
-            ),
-            
-            # 3.2. Suma del Tiempo de Carga Ajustado Total (Denominador Bruto) en segundos
-            total_tiempo_carga_segundos=Coalesce(
-                Sum(F('tiempo_carga_ajustado_td')),
-                Value(timedelta(0)),
-                output_field=fields.DurationField()
-            ),
-            
-            # 3.3. TIEMPO PERDIDO POR DISCIPLINIDAD DE FECHA (Penalización)
-            total_penalizado_tarde_segundos=Coalesce(
-                Sum(
-                    Case(
-                        When(termino_tarde=True, then='tiempo_carga_ajustado_td'),
-                        default=Value(timedelta(0)),
-                        output_field=fields.DurationField()
-                    )
-                ),
-                Value(timedelta(0)),
-                output_field=fields.DurationField()
-            )
-        )
-
-        # 4. Cálculo final y Conversión a Minutos
-        total_tiempo_carga_segundos = reporte_agregado['total_tiempo_carga_segundos'].total_seconds()
-        total_tiempo_carga_minutos = total_tiempo_carga_segundos / 60.0
-        
-        total_perdida_pausas = reporte_agregado['total_perdida_pausas_minutos']
-        total_penalizado_tarde = reporte_agregado['total_penalizado_tarde_segundos'].total_seconds() / 60.0
-
-        # Pérdidas Totales = Pausas + Penalización por Tarde
-        perdidas_totales = total_perdida_pausas + total_penalizado_tarde
-
-        # Tiempo Operación Neto = Tiempo Carga Bruto - Pérdidas Totales
-        tiempo_operacion_neto = total_tiempo_carga_minutos - perdidas_totales
-        
-        # Tasa de Disponibilidad Ajustada (Factor puro: 0.0 a 1.0)
-        disponibilidad_ajustada = 0.0
-        if total_tiempo_carga_minutos > 0:
-            # Aseguramos que el factor no sea negativo
-            disponibilidad_ajustada = max(0, tiempo_operacion_neto) / total_tiempo_carga_minutos
-            
-        # Devolver el factor (0.0 a 1.0) y los datos clave
-        return disponibilidad_ajustada, {
-             "total_tiempo_carga_minutos": total_tiempo_carga_minutos,
-             "total_perdida_pausas": total_perdida_pausas,
-             "total_penalizado_tarde": total_penalizado_tarde
-        }
-
     def get(self, request, *args, **kwargs):
         fecha_desde, fecha_hasta = parsear_fechas(request)
         if fecha_desde is None:
             return Response({"error": "Formato de fecha inválido. Usar YYYY-MM-DD."}, status=400)
-            
-        factor_disponibilidad, data = self._calculate_disponibilidad_ajustada(fecha_desde, fecha_hasta)
-        
-        # Formato de respuesta para el endpoint individual (como porcentaje)
-        resultado = {
-            "fecha_desde": fecha_desde.strftime('%Y-%m-%d'),
-            "fecha_hasta": fecha_hasta.strftime('%Y-%m-%d'),
-            "total_tiempo_ejecucion_minutos": round(data['total_tiempo_carga_minutos'], 2),
-            "total_tiempo_perdido_pausas_minutos": round(data['total_perdida_pausas'], 2),
-            "total_penalizado_por_fecha_minutos": round(data['total_penalizado_tarde'], 2),
-            "disponibilidad_ajustada_porcentaje": round(factor_disponibilidad * 100.0, 2)
-        }
-        return Response(resultado)
+
+        # OTs Completadas y con tiempos reales en el rango (tabla de hechos de producción diaria)
+        totales = totales_produccion(fecha_desde, fecha_hasta)
+        return Response(indicadores.disponibilidad_ajustada(totales, fecha_desde, fecha_hasta))
 
 # ====================================================================
 # 4. OEE GENERAL
 # ====================================================================
 
+def parsear_periodo_oee(request, por_defecto):
+    """ Período del OEE ('dia', 'semana', 'mes' o 'total') de los query params; None si es inválido. """
+    periodo = request.query_params.get('periodo', por_defecto)
+    if periodo == 'total':
+        return None, True
+    return periodo, periodo in PERIODOS_OEE
+
+
+@exportable
+@cachear_reporte(FUENTE_PRODUCCION)
 class ReporteOEEGeneral(APIView):
+    """
+    OEE (Disponibilidad x Rendimiento x Calidad) por período, en una sola consulta
+    a la tabla de hechos de producción diaria.
+
+    Filtros (Query Params):
+    - ?fecha_desde=YYYY-MM-DD
+    - ?fecha_hasta=YYYY-MM-DD
+    - ?periodo=mes|semana|dia|total (por defecto, mes)
+    """
     def get(self, request, *args, **kwargs):
         # Asumimos que parsear_fechas devuelve objetos datetime.
         fecha_desde_global, fecha_hasta_global = parsear_fechas(request)
@@ -851,68 +622,82 @@ class ReporteOEEGeneral(APIView):
             # Si el rango es inválido, retornamos una lista vacía o un error claro.
             return Response({"error": "Rango de fechas inválido o nulo."}, status=400)
 
-        resultados_mensuales = []
-        
-        # Preparamos las instancias de las vistas de factores (OPTIMAL)
-        disponibilidad_view = ReporteDisponibilidadAjustada()
-        rendimiento_view = ReporteFactorRendimientoOEE()
-        calidad_view = ReporteFactorCalidadOEE()
+        periodo, periodo_valido = parsear_periodo_oee(request, 'mes')
+        if not periodo_valido:
+            return Response({"error": "Período inválido. Usar dia, semana, mes o total."}, status=400)
 
-        # Inicializar el bucle mensual
-        fecha_actual_desde = fecha_desde_global
-        
-        # 1. Bucle principal para iterar mes a mes
-        # Usamos el primer día del mes para la comparación (más robusto)
-        while fecha_actual_desde.date() <= fecha_hasta_global.date():
-            
-            # 2. Calcular el primer día del próximo mes (para el avance y el límite)
-            # El uso de relativedelta requiere la importación (python-dateutil)
-            fecha_proximo_mes = fecha_actual_desde.replace(day=1) + relativedelta(months=1)
-            
-            # 3. Establecer el fin del periodo de cálculo: 
-            # Es el final del mes, PERO sin exceder la fecha_hasta_global.
-            fecha_actual_hasta = fecha_proximo_mes - timedelta(seconds=1)
-            
-            # 4. Ajustar el fin del periodo si excede la fecha de fin global
-            if fecha_actual_hasta > fecha_hasta_global:
-                fecha_actual_hasta = fecha_hasta_global
-
-            # 5. Si la fecha_actual_desde es posterior a la fecha_actual_hasta ajustada,
-            # (solo ocurre si la fecha_desde_global es, por ejemplo, el 31/01 y la fecha_hasta_global es el 01/02),
-            # salimos del bucle. Esto ayuda a evitar cálculos con rango inverso.
-            if fecha_actual_desde > fecha_actual_hasta:
-                break
-
-            # 6. Calcular los 3 factores para el PERIODO ACTUAL [fecha_actual_desde, fecha_actual_hasta]
-            # NOTA: Los métodos internos deben devolver un float entre 0.0 y 1.0 (ej. 0.85)
-            factor_disponibilidad, _ = disponibilidad_view._calculate_disponibilidad_ajustada(fecha_actual_desde, fecha_actual_hasta)
-            factor_rendimiento, _ = rendimiento_view._calculate_factor_rendimiento(fecha_actual_desde, fecha_actual_hasta)
-            factor_calidad, _ = calidad_view._calculate_factor_calidad(fecha_actual_desde, fecha_actual_hasta)
-
-            # 7. CÁLCULO FINAL DEL OEE
-            factor_oee = factor_disponibilidad * factor_rendimiento * factor_calidad
-            
-            # 8. Guardar el resultado del mes
-            resultados_mensuales.append({
-                # Usamos el primer día del mes para representar el período
-                "periodo_inicio": fecha_actual_desde.strftime('%Y-%m-%d'),
-                "periodo_fin": fecha_actual_hasta.strftime('%Y-%m-%d'),
-                "disponibilidad": round(factor_disponibilidad * 100.0, 2),
-                "rendimiento": round(factor_rendimiento * 100.0, 2),
-                "calidad": round(factor_calidad * 100.0, 2),
-                "oee_total": round(factor_oee * 100.0, 2),
+        # Un resultado por período (recortado al rango), con los períodos sin producción en 0
+        filas = calcular_oee(fecha_desde_global, fecha_hasta_global, periodo=periodo)
+        return Response([indicadores.formatear_oee(fila) for fila in filas])
+
+
+@exportable
+@cachear_reporte(FUENTE_PRODUCCION)
+class ReporteOEEPorDimension(APIView):
+    """
+    Apertura del OEE por línea o por producto (ver subclases). Sin 'periodo', un
+    resultado por línea / producto para todo el rango.
+
+    Filtros (Query Params):
+    - ?fecha_desde=YYYY-MM-DD
+    - ?fecha_hasta=YYYY-MM-DD
+    - ?periodo=mes|semana|dia|total (por defecto, total)
+    - ?id_linea_produccion=ID / ?id_producto=ID (opcionales)
+    """
+    por = None
+    nombre_desconocido = None
+
+    def get(self, request, *args, **kwargs):
+        fecha_desde, fecha_hasta = parsear_fechas(request)
+        if fecha_desde is None or fecha_desde > fecha_hasta:
+            return Response({"error": "Rango de fechas inválido o nulo."}, status=400)
+
+        periodo, periodo_valido = parsear_periodo_oee(request, 'total')
+        if not periodo_valido:
+            return Response({"error": "Período inválido. Usar dia, semana, mes o total."}, status=400)
+
+        filtros = {}
+        try:
+            for campo in ('id_linea_produccion', 'id_producto'):
+                if request.query_params.get(campo):
+                    filtros[f"{campo}_id"] = int(request.query_params[campo])
+        except ValueError:
+            return Response({"error": "Los filtros id_linea_produccion e id_producto deben ser numéricos."}, status=400)
+
+        reporte = []
+        for fila in calcular_oee(fecha_desde, fecha_hasta, periodo=periodo, por=self.por, **filtros):
+            totales = fila['totales']
+            reporte.append({
+                "id": fila['id'],
+                "nombre": fila['nombre'] or self.nombre_desconocido,
+                **indicadores.formatear_oee(fila),
+                "produccion_bruta": totales['produccion_bruta'],
+                "desperdicio": totales['desperdicio'],
+                "ots_completadas": totales['ots_completadas'],
             })
-            
-            # 9. Mover al inicio del próximo mes para la siguiente iteración
-            fecha_actual_desde = fecha_proximo_mes
+        return Response(reporte)
+
 
-        return Response(resultados_mensuales)
+class ReporteOEEPorLinea(ReporteOEEPorDimension):
+    """ OEE por línea de producción. """
+    por = 'linea'
+    nombre_desconocido = 'Línea Desconocida'
+
+
+class ReporteOEEPorProducto(ReporteOEEPorDimension):
+    """ OEE por producto (las OTs de OPs sin producto van como 'Producto Desconocido'). """
+    por = 'producto'
+    nombre_desconocido = 'Producto Desconocido'
 
 
 # ====================================================================
 # 1. INDICADORES DE VENTAS Y CANALES
+# Los reportes de ventas (secciones 1 y 2) salen de una sola pasada por las OVs
+# del rango: indicadores.resumen_ventas, la misma que usa el tablero de indicadores.
 # ====================================================================
 
+@exportable
+@cachear_reporte(FUENTE_VENTAS)
 class ReporteVolumenPorTipo(APIView):
     """ Calcula el volumen de ventas (conteo de órdenes) por canal (tipo_venta). """
     def get(self, request):
@@ -920,59 +705,25 @@ class ReporteVolumenPorTipo(APIView):
         if fecha_desde is None:
             return Response({"error": "Fechas inválidas."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # 1. Agrupar por tipo de venta y contar órdenes
-        resultados_agrupados = OrdenVenta.objects.filter(
-            fecha__range=(fecha_desde, fecha_hasta)
-        ).values('tipo_venta').annotate(
-            conteo_ordenes=Sum(Value(1))
-        )
-
-        # 2. Calcular el total global para sacar porcentajes
-        total_global = sum(item['conteo_ordenes'] for item in resultados_agrupados)
-        
-        # 3. Formatear
-        reporte = []
-        for item in resultados_agrupados:
-            porcentaje = (item['conteo_ordenes'] / total_global) * 100 if total_global > 0 else 0.0
-            reporte.append({
-                "tipo_venta": item['tipo_venta'],
-                "ordenes_contadas": item['conteo_ordenes'],
-                "porcentaje": round(porcentaje, 2)
-            })
-
-        return Response(reporte)
+        resumen = indicadores.resumen_ventas(fecha_desde, fecha_hasta)
+        return Response(indicadores.volumen_por_tipo(resumen, fecha_desde, fecha_hasta))
 
 
+@exportable
+@cachear_reporte(FUENTE_VENTAS)
 class ReporteTiempoCicloVenta(APIView):
     """ Calcula el Tiempo de Ciclo de Venta (Lead Time) promedio para órdenes completadas. """
     def get(self, request):
         fecha_desde, fecha_hasta = parsear_fechas(request)
         if fecha_desde is None:
             return Response({"error": "Fechas inválidas."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # 1. Calcular el promedio de la duración (fecha_entrega - fecha)
-        # Filtramos solo órdenes completadas que caen en el rango por fecha de creación
-        tiempo_ciclo_agregado = OrdenVenta.objects.filter(
-            fecha__range=(fecha_desde, fecha_hasta),
-            fecha_entrega__isnull=False # Asegura que la orden esté completada
-        ).aggregate(
-            duracion_promedio=Avg(
-                F('fecha_entrega') - F('fecha')
-            )
-        )
 
-        duracion_delta = tiempo_ciclo_agregado.get('duracion_promedio')
-        
-        # 2. Formatear a un valor legible (Ej: días o segundos)
-        promedio_dias = duracion_delta.total_seconds() / (60 * 60 * 24) if duracion_delta else 0.0
-
-        reporte = {
-            "tiempo_ciclo_promedio_dias": round(promedio_dias, 2),
-            "total_ordenes_completadas": OrdenVenta.objects.filter(fecha__range=(fecha_desde, fecha_hasta), fecha_entrega__isnull=False).count()
-        }
-        return Response(reporte)
+        resumen = indicadores.resumen_ventas(fecha_desde, fecha_hasta)
+        return Response(indicadores.tiempo_ciclo_venta(resumen, fecha_desde, fecha_hasta))
 
 
+@exportable
+@cachear_reporte(FUENTE_VENTAS)
 class ReporteCumplimientoFecha(APIView):
     """ Calcula la Tasa de Cumplimiento de Fecha Estimada (fecha_entrega <= fecha_estimada). """
     def get(self, request):
@@ -980,43 +731,15 @@ class ReporteCumplimientoFecha(APIView):
         if fecha_desde is None:
             return Response({"error": "Fechas inválidas."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # 1. Filtrar solo órdenes con tiempos de cumplimiento relevantes
-        ots_completadas = OrdenVenta.objects.filter(
-            fecha__range=(fecha_desde, fecha_hasta),
-            fecha_entrega__isnull=False,
-            fecha_estimada__isnull=False
-        )
-        
-        total_completadas = ots_completadas.count()
-
-        if total_completadas == 0:
-            return Response({"tasa_cumplimiento": 0.0, "total_ordenes_analizadas": 0})
-        
-        # 2. Contar órdenes que cumplieron la fecha (fecha_entrega <= fecha_estimada)
-        cumplimiento_agregado = ots_completadas.aggregate(
-            ordenes_cumplidas=Sum(
-                Case(
-                    # Nota: Usamos __date para comparar solo la parte de la fecha, ignorando la hora
-                    When(fecha_entrega__date__lte=F('fecha_estimada'), then=Value(1)),
-                    default=Value(0)
-                )
-            )
-        )
-        
-        ordenes_cumplidas = cumplimiento_agregado['ordenes_cumplidas'] or 0
-        tasa_cumplimiento = (ordenes_cumplidas / total_completadas) * 100.0
-
-        reporte = {
-            "tasa_cumplimiento": round(tasa_cumplimiento, 2),
-            "ordenes_cumplidas": ordenes_cumplidas,
-            "total_ordenes_analizadas": total_completadas
-        }
-        return Response(reporte)
+        resumen = indicadores.resumen_ventas(fecha_desde, fecha_hasta)
+        return Response(indicadores.cumplimiento_fecha(resumen, fecha_desde, fecha_hasta))
 
 # ====================================================================
 # 2. INDICADORES FINANCIEROS Y TRANSACCIONALES
 # ====================================================================
 
+@exportable
+@cachear_reporte(FUENTE_VENTAS)
 class ReporteTotalDineroVentas(APIView):
     """ Calcula la Suma Total de Dinero en Ventas. """
     def get(self, request):
@@ -1024,42 +747,25 @@ class ReporteTotalDineroVentas(APIView):
         if fecha_desde is None:
             return Response({"error": "Fechas inválidas."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # 1. Calcular la multiplicación de cantidad * precio (asumiendo que OrdenVenta tiene campo 'fecha')
-        total_dinero = OrdenVentaProducto.objects.filter(
-            id_orden_venta__fecha__range=(fecha_desde, fecha_hasta)
-        ).aggregate(
-            total_ventas=Coalesce(
-                Sum(F('cantidad') * F('id_producto__precio')), # Usamos F('id_producto__precio')
-                Value(0.0),
-                output_field=FloatField()
-            )
-        )['total_ventas']
-
-        return Response({
-            "total_dinero_ventas": round(total_dinero, 2)
-        })
+        resumen = indicadores.resumen_ventas(fecha_desde, fecha_hasta)
+        return Response(indicadores.total_dinero_ventas(resumen, fecha_desde, fecha_hasta))
 
 
+@exportable
+@cachear_reporte(FUENTE_VENTAS)
 class ReporteValorPedidoPromedio(APIView):
     """ Calcula el Valor de Pedido Promedio (AOV). """
     def get(self, request):
-        # 1. Reutilizamos el cálculo de Suma Total de Dinero en Ventas
-        total_dinero_response = ReporteTotalDineroVentas().get(request).data
-        total_dinero = total_dinero_response.get('total_dinero_ventas', 0.0)
-        
-        # 2. Contar el número total de órdenes
         fecha_desde, fecha_hasta = parsear_fechas(request)
-        total_ordenes = OrdenVenta.objects.filter(fecha__range=(fecha_desde, fecha_hasta)).count()
-        
-        # 3. Calcular AOV
-        aov = (total_dinero / total_ordenes) if total_ordenes > 0 else 0.0
+        if fecha_desde is None:
+            return Response({"error": "Fechas inválidas."}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response({
-            "valor_pedido_promedio": round(aov, 2),
-            "total_ordenes": total_ordenes
-        })
+        resumen = indicadores.resumen_ventas(fecha_desde, fecha_hasta)
+        return Response(indicadores.valor_pedido_promedio(resumen, fecha_desde, fecha_hasta))
 
 
+@exportable
+@cachear_reporte(FUENTE_VENTAS)
 class ReporteProductosPorVenta(APIView):
     """ Calcula la Cantidad Promedio de Productos (unidades) por Venta. """
     def get(self, request):
@@ -1067,28 +773,14 @@ class ReporteProductosPorVenta(APIView):
         if fecha_desde is None:
             return Response({"error": "Fechas inválidas."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # 1. Sumar todas las cantidades de productos vendidos
-        total_unidades = OrdenVentaProducto.objects.filter(
-            id_orden_venta__fecha__range=(fecha_desde, fecha_hasta)
-        ).aggregate(
-            total=Coalesce(Sum('cantidad'), Value(0))
-        )['total']
-        
-        # 2. Contar el número total de órdenes
-        total_ordenes = OrdenVenta.objects.filter(fecha__range=(fecha_desde, fecha_hasta)).count()
-
-        # 3. Calcular promedio
-        promedio = (total_unidades / total_ordenes) if total_ordenes > 0 else 0.0
-
-        return Response({
-            "unidades_promedio_por_venta": round(promedio, 2),
-            "total_unidades_vendidas": total_unidades
-        })
+        resumen = indicadores.resumen_ventas(fecha_desde, fecha_hasta)
+        return Response(indicadores.productos_por_venta(resumen, fecha_desde, fecha_hasta))
 
 # ====================================================================
 # 3. INDICADORES DE PRODUCTO
 # ====================================================================
 
+@exportable
 class ReporteDistribucionProductoPorTipo(APIView):
     """ Calcula la Distribución de Productos por Tipo en el catálogo. """
     def get(self, request):
@@ -1112,4 +804,44 @@ class ReporteDistribucionProductoPorTipo(APIView):
                 "porcentaje": round(porcentaje, 2)
             })
 
-        return Response(reporte)
\ No newline at end of file
+        return Response(reporte)
+
+# ====================================================================
+# 4. TABLERO DE INDICADORES
+# ====================================================================
+
+class ReporteTablero(APIView):
+    """
+    Varios indicadores del tablero en un solo request, para un mismo rango.
+    Los indicadores que salen de los mismos datos comparten la consulta y los
+    grupos independientes se calculan en paralelo (ver reportes/indicadores.py).
+
+    Filtros (Query Params):
+    - ?indicadores=volumen_por_tipo,valor_pedido_promedio,oee,...
+    - ?fecha_desde=YYYY-MM-DD
+    - ?fecha_hasta=YYYY-MM-DD
+    """
+    def get(self, request, *args, **kwargs):
+        fecha_desde, fecha_hasta = parsear_fechas(request)
+        if fecha_desde is None or fecha_desde > fecha_hasta:
+            return Response({"error": "Rango de fechas inválido o nulo."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Acepta ?indicadores=a,b y ?indicadores=a&indicadores=b (sin repetir, en el orden pedido)
+        pedidos = list(dict.fromkeys(
+            indicador.strip()
+            for valor in request.query_params.getlist('indicadores')
+            for indicador in valor.split(',') if indicador.strip()
+        ))
+        desconocidos = [indicador for indicador in pedidos if indicador not in indicadores.INDICADORES]
+        if not pedidos or desconocidos:
+            return Response({
+                "error": "Indicar los indicadores a calcular en 'indicadores'.",
+                "desconocidos": desconocidos,
+                "disponibles": list(indicadores.INDICADORES),
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            "fecha_desde": fecha_desde.strftime('%Y-%m-%d'),
+            "fecha_hasta": fecha_hasta.strftime('%Y-%m-%d'),
+            "indicadores": indicadores.calcular_indicadores(pedidos, fecha_desde, fecha_hasta),
+        })
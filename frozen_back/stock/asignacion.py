@@ -0,0 +1,158 @@
+from .models import LoteProduccion, LoteMateriaPrima, ReservaStock, ReservaMateriaPrima
+from .services import recalcular_stock_lotes_produccion, recalcular_stock_lotes_mp
+from .concurrencia import bloquear_items
+
+
+class AsignadorFEFO:
+    """
+    Motor de asignación FEFO (First-Expired-First-Out) compartido.
+
+    Carga los lotes candidatos de cada producto / MP UNA vez, bloqueados con
+    SELECT ... FOR UPDATE y ordenados por vencimiento (desempate por id, para que
+    el resultado sea determinístico). Las demandas (líneas de OV u OPs) se
+    asignan contra esa foto en memoria con el mismo greedy de siempre, y todas
+    las reservas se insertan con un único bulk_create al llamar a guardar().
+
+    Antes de leer los lotes toma el advisory lock del producto / MP (ver
+    stock/concurrencia.py): dos reservas del mismo item se serializan, las de
+    items distintos corren en paralelo. Para que los locks se tomen en orden,
+    llamar a precargar() con todos los items de la operación antes de asignar;
+    disponible() / asignar() cargan solos un item que haya quedado afuera.
+
+    Debe usarse dentro de una transacción (transaction.atomic o
+    ejecutar_con_reintentos): los bloqueos duran hasta el commit. Entre asignar() y guardar() no debe liberarse stock
+    por otra vía (borrado de reservas): en ese caso, guardar y crear un
+    asignador nuevo.
+    """
+
+    def __init__(self, tipo, modelo_lote, campo_item, campo_estado_lote, estado_lote,
+                 modelo_reserva, campo_demanda, campo_lote, campo_estado_reserva,
+                 estado_activa, recalcular):
+        self.tipo = tipo
+        self.modelo_lote = modelo_lote
+        self.campo_item = campo_item
+        self.modelo_reserva = modelo_reserva
+        self.campo_demanda = campo_demanda
+        self.campo_lote = campo_lote
+        self.campo_estado_reserva = campo_estado_reserva
+        self.estado_activa = estado_activa
+        self._recalcular = recalcular
+
+        # El estado del lote puede venir como instancia o como descripción (match exacto)
+        if isinstance(estado_lote, str):
+            self._filtro_estado = {f"{campo_estado_lote}__descripcion": estado_lote}
+        else:
+            self._filtro_estado = {campo_estado_lote: estado_lote}
+
+        self._lotes = {}          # {item_id: [[lote_id, libre], ...]} en orden FEFO
+        self._pendientes = []     # [(demanda, lote, cantidad), ...] sin guardar
+
+    @classmethod
+    def para_productos(cls, estado_activa, estado_lote="Disponible"):
+        """ Lotes de producto terminado -> ReservaStock (demanda = OrdenVentaProducto). """
+        return cls(
+            "pt", LoteProduccion, "id_producto_id", "id_estado_lote_produccion", estado_lote,
+            ReservaStock, "id_orden_venta_producto", "id_lote_produccion", "id_estado_reserva",
+            estado_activa, recalcular_stock_lotes_produccion,
+        )
+
+    @classmethod
+    def para_materias_primas(cls, estado_activa, estado_lote="disponible"):
+        """ Lotes de materia prima -> ReservaMateriaPrima (demanda = OrdenProduccion). """
+        return cls(
+            "mp", LoteMateriaPrima, "id_materia_prima_id", "id_estado_lote_materia_prima", estado_lote,
+            ReservaMateriaPrima, "id_orden_produccion", "id_lote_materia_prima", "id_estado_reserva_materia",
+            estado_activa, recalcular_stock_lotes_mp,
+        )
+
+    # ------------------------------------------------------------------
+    # Carga (1 consulta por llamada, bloqueando las filas)
+    # ------------------------------------------------------------------
+    def precargar(self, ids_items):
+        """ Carga y bloquea en UNA consulta los lotes con stock libre de los items que falten. """
+        faltantes = {i for i in ids_items if i not in self._lotes}
+        if not faltantes:
+            return
+
+        for item_id in faltantes:
+            self._lotes[item_id] = []
+
+        bloquear_items(self.tipo, faltantes)
+
+        lotes = self.modelo_lote.objects.select_for_update().filter(
+            stock_libre__gt=0,
+            **{f"{self.campo_item}__in": faltantes},
+            **self._filtro_estado
+        ).order_by("fecha_vencimiento", "pk").values_list("pk", self.campo_item, "stock_libre")
+
+        for lote_id, item_id, libre in lotes:
+            self._lotes[item_id].append([lote_id, libre])
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+    def disponible(self, item_id) -> int:
+        """ Stock libre del item descontando lo ya asignado en memoria. """
+        self.precargar([item_id])
+        return sum(libre for _, libre in self._lotes[item_id])
+
+    # ------------------------------------------------------------------
+    # Asignación (solo memoria hasta guardar())
+    # ------------------------------------------------------------------
+    def asignar(self, demanda, item_id, cantidad, todo_o_nada=False) -> int:
+        """
+        Reparte 'cantidad' del item sobre los lotes en orden FEFO y devuelve lo asignado.
+        Con todo_o_nada=True, si no alcanza el stock no asigna nada (devuelve 0).
+        """
+        if cantidad <= 0:
+            return 0
+        if todo_o_nada and self.disponible(item_id) < cantidad:
+            return 0
+
+        self.precargar([item_id])
+        pendiente = cantidad
+        for lote in self._lotes[item_id]:
+            if pendiente <= 0:
+                break
+            tomar = min(lote[1], pendiente)
+            if tomar <= 0:
+                continue
+            lote[1] -= tomar
+            pendiente -= tomar
+            self._pendientes.append((demanda, lote, tomar))
+
+        return cantidad - pendiente
+
+    def descartar(self, demanda):
+        """ Quita las asignaciones aún no guardadas de una demanda y devuelve el stock a sus lotes. """
+        conservadas = []
+        for pendiente in self._pendientes:
+            demanda_pendiente, lote, cantidad = pendiente
+            if demanda_pendiente is demanda:
+                lote[1] += cantidad
+            else:
+                conservadas.append(pendiente)
+        self._pendientes = conservadas
+
+    def guardar(self) -> int:
+        """ Inserta todas las reservas pendientes con un único bulk_create y actualiza los lotes. """
+        if not self._pendientes:
+            return 0
+
+        reservas = [
+            self.modelo_reserva(**{
+                # La demanda pudo guardarse después de asignar (OP nueva del MRP): se toma su pk actual
+                self.campo_demanda: demanda,
+                f"{self.campo_lote}_id": lote[0],
+                "cantidad_reservada": cantidad,
+                self.campo_estado_reserva: self.estado_activa,
+            })
+            for demanda, lote, cantidad in self._pendientes
+        ]
+        creadas = self.modelo_reserva.objects.bulk_create(reservas)
+
+        # Columnas de los lotes (ver stock/signals.py)
+        self._recalcular({lote[0] for _, lote, _ in self._pendientes})
+
+        self._pendientes = []
+        return len(creadas)
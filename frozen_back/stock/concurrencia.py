@@ -0,0 +1,207 @@
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import connection, transaction, OperationalError
+
+
+# ===================================================================
+# CONCURRENCIA DE RESERVAS
+# Ventas online, MRP y OPs reservan los mismos lotes al mismo tiempo.
+# En lugar de serializar todo detrás de una transacción global:
+#   1. Cada reserva toma un advisory lock de PostgreSQL por producto / MP
+#      (siempre en orden ascendente de id, para no generar deadlocks), así dos
+#      checkouts de productos distintos no se esperan entre sí. Los locks de una
+#      operación se piden de una vez antes de tocar lotes: las ventas, con los
+#      productos del pedido; el MRP, con todos los productos de la corrida antes
+#      del PASO 0 y todas las MPs antes del PASO 4 (siempre PT antes que MP).
+#   2. Los lotes se leen con SELECT ... FOR UPDATE (ver AsignadorFEFO).
+#   3. Si hay conflicto (deadlock / lock_timeout) se reintenta el bloque
+#      completo con backoff aleatorio. El lock_timeout es por operación: el MRP
+#      (minutos, con muchos locks) por defecto no tiene, solo espera.
+#   4. Se registran métricas de contención por operación (en memoria, por
+#      proceso: no se persisten ni se suman entre workers).
+# Fuera de PostgreSQL (sqlite local) los advisory locks y el lock_timeout se omiten.
+# ===================================================================
+
+# Espacios de claves para pg_advisory_xact_lock(int, int)
+_ESPACIO_LOCK = {
+    "pt": 7101,
+    "mp": 7102,
+    "produccion_diaria": 7103,  # (día, línea) de la tabla de hechos de reportes
+}
+
+# lock_timeout por operación: (clave de Configuracion, default en ms; 0 = sin límite)
+_LOCK_TIMEOUT_POR_OPERACION = {
+    "mrp": ("MRP_LOCK_TIMEOUT_MS", 0),
+}
+_LOCK_TIMEOUT_RESERVAS = ("RESERVAS_LOCK_TIMEOUT_MS", 2000)
+
+# SQLSTATE de conflictos que se resuelven reintentando
+_CODIGOS_CONFLICTO = {
+    "40P01",  # deadlock_detected
+    "55P03",  # lock_not_available (lock_timeout)
+    "40001",  # serialization_failure
+}
+
+
+class MetricasReservas:
+    """
+    Contadores de contención agrupados por operación.
+    Viven en memoria del proceso: cada worker de gunicorn (y el worker de
+    planificación) tiene los suyos, no se suman entre procesos y se pierden
+    al reiniciar. Por eso resumen() incluye el pid.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._datos = defaultdict(self._vacio)
+
+    @staticmethod
+    def _vacio():
+        return {
+            "intentos": 0,
+            "exitos": 0,
+            "conflictos": 0,
+            "reintentos_agotados": 0,
+            "esperas_lock": 0,
+            "espera_lock_total_seg": 0.0,
+            "espera_lock_max_seg": 0.0,
+        }
+
+    def registrar(self, operacion, **incrementos):
+        with self._lock:
+            fila = self._datos[operacion]
+            for clave, valor in incrementos.items():
+                fila[clave] += valor
+
+    def registrar_espera(self, operacion, segundos):
+        with self._lock:
+            fila = self._datos[operacion]
+            fila["esperas_lock"] += 1
+            fila["espera_lock_total_seg"] += segundos
+            fila["espera_lock_max_seg"] = max(fila["espera_lock_max_seg"], segundos)
+
+    def resumen(self):
+        with self._lock:
+            datos = {operacion: dict(fila) for operacion, fila in self._datos.items()}
+        for fila in datos.values():
+            fila["espera_lock_promedio_seg"] = (
+                fila["espera_lock_total_seg"] / fila["esperas_lock"] if fila["esperas_lock"] else 0.0
+            )
+        return {"pid": os.getpid(), "operaciones": datos}
+
+    def reiniciar(self):
+        with self._lock:
+            self._datos.clear()
+
+
+metricas_reservas = MetricasReservas()
+
+# Operación en curso (para atribuir las esperas de lock a quien las sufre)
+_operacion_actual = threading.local()
+
+
+def operacion_actual():
+    return getattr(_operacion_actual, "nombre", None) or "sin_operacion"
+
+
+def bloquear_items(tipo, ids_items):
+    """
+    Toma pg_advisory_xact_lock por cada producto ('pt') / MP ('mp') (o clave
+    del espacio 'tipo') en orden ascendente. El orden lo fija Python: un SELECT
+    por clave, uno detrás de otro. Se libera solo al terminar la transacción.
+    """
+    ids = sorted(set(ids_items))
+    if not ids or connection.vendor != "postgresql":
+        return
+
+    espacio = _ESPACIO_LOCK[tipo]
+    inicio = time.monotonic()
+    with connection.cursor() as cursor:
+        for id_item in ids:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", [espacio, id_item])
+    metricas_reservas.registrar_espera(operacion_actual(), time.monotonic() - inicio)
+
+
+@contextmanager
+def _lock_timeout(milisegundos):
+    """ Limita la espera de locks dentro del bloque (solo PostgreSQL). """
+    if connection.vendor != "postgresql" or not milisegundos:
+        yield
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("SHOW lock_timeout")
+        anterior = cursor.fetchone()[0]
+        cursor.execute("SELECT set_config('lock_timeout', %s, true)", [f"{int(milisegundos)}ms"])
+    yield
+    # Si el bloque falló, el rollback del savepoint ya deshace el set_config
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT set_config('lock_timeout', %s, true)", [anterior])
+
+
+def _es_conflicto(error):
+    causa = error.__cause__ or error
+    codigo = getattr(causa, "pgcode", None) or getattr(causa, "sqlstate", None)
+    if codigo:
+        return codigo in _CODIGOS_CONFLICTO
+    # sqlite: "database is locked"
+    return "locked" in str(error).lower()
+
+
+def _avisar(nivel, mensaje, *args):
+    """
+    Al registro de la corrida de planificación abierta en el hilo (MRP), con el
+    nivel indicado ('advertencia' / 'error'); sin corrida (ventas, OPs), a consola.
+    """
+    from planificacion import eventos
+
+    if eventos.registro_actual() is not None:
+        getattr(eventos, nivel)(mensaje, *args)
+    else:
+        print(mensaje % args)
+
+
+def ejecutar_con_reintentos(operacion, funcion, *args, **kwargs):
+    """
+    Ejecuta 'funcion' dentro de transaction.atomic (savepoint si ya hay una
+    transacción abierta) y la reintenta si choca con otra reserva.
+    Intentos y lock_timeout se configuran con RESERVAS_MAX_INTENTOS y
+    RESERVAS_LOCK_TIMEOUT_MS (tabla Configuracion); el MRP usa MRP_LOCK_TIMEOUT_MS.
+    """
+    from trazabilidad.views import get_config
+
+    max_intentos = max(1, get_config('RESERVAS_MAX_INTENTOS', 3))
+    timeout_ms = get_config(*_LOCK_TIMEOUT_POR_OPERACION.get(operacion, _LOCK_TIMEOUT_RESERVAS))
+
+    anterior = getattr(_operacion_actual, "nombre", None)
+    _operacion_actual.nombre = operacion
+    try:
+        for intento in range(1, max_intentos + 1):
+            metricas_reservas.registrar(operacion, intentos=1)
+            try:
+                with transaction.atomic(), _lock_timeout(timeout_ms):
+                    resultado = funcion(*args, **kwargs)
+            except OperationalError as e:
+                if not _es_conflicto(e):
+                    raise
+                metricas_reservas.registrar(operacion, conflictos=1)
+                if intento == max_intentos:
+                    metricas_reservas.registrar(operacion, reintentos_agotados=1)
+                    _avisar("error", "❌ [%s] Conflicto de reservas, sin más reintentos: %s", operacion, e)
+                    raise
+                espera = random.uniform(0, 0.05 * (2 ** intento))
+                _avisar(
+                    "advertencia", "⚠️ [%s] Conflicto de reservas (intento %s/%s). Reintentando en %.2fs...",
+                    operacion, intento, max_intentos, espera
+                )
+                time.sleep(espera)
+            else:
+                metricas_reservas.registrar(operacion, exitos=1)
+                return resultado
+    finally:
+        _operacion_actual.nombre = anterior
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Coalesce
+
+from stock.models import LoteProduccion, LoteMateriaPrima
+from stock.services import recalcular_stock_lotes_produccion, recalcular_stock_lotes_mp
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye desde cero las columnas stock_reservado / stock_libre de "
+        "LoteProduccion y LoteMateriaPrima a partir de las reservas 'Activas'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Solo informa cuántos lotes están desfasados, sin corregirlos.",
+        )
+
+    def handle(self, *args, **options):
+        desfasados_pt = self._desfasados(
+            LoteProduccion, Q(reservas__id_estado_reserva__descripcion="Activa")
+        )
+        desfasados_mp = self._desfasados(
+            LoteMateriaPrima, Q(reservas__id_estado_reserva_materia__descripcion="Activa")
+        )
+
+        self.stdout.write(f"🔎 Lotes de producto desfasados: {len(desfasados_pt)}")
+        for lote_id, guardado, real in desfasados_pt[:20]:
+            self.stdout.write(f"   - Lote {lote_id}: reservado guardado={guardado}, real={real}")
+        self.stdout.write(f"🔎 Lotes de materia prima desfasados: {len(desfasados_mp)}")
+        for lote_id, guardado, real in desfasados_mp[:20]:
+            self.stdout.write(f"   - Lote {lote_id}: reservado guardado={guardado}, real={real}")
+
+        if options["dry_run"]:
+            self.stdout.write(self.style.WARNING("--dry-run: no se modificó nada."))
+            return
+
+        with transaction.atomic():
+            total_pt = recalcular_stock_lotes_produccion()
+            total_mp = recalcular_stock_lotes_mp()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Recalculados {total_pt} lotes de producto y {total_mp} lotes de materia prima."
+        ))
+
+    @staticmethod
+    def _desfasados(modelo, filtro_activa):
+        """ [(id_lote, stock_reservado guardado, reservado real)] de los lotes cuyo stock no coincide. """
+        filas = modelo.objects.annotate(
+            reservado_real=Coalesce(Sum("reservas__cantidad_reservada", filter=filtro_activa), 0)
+        ).filter(
+            ~Q(stock_reservado=F("reservado_real")) | ~Q(stock_libre=F("cantidad") - F("reservado_real"))
+        ).order_by("pk").values_list("pk", "stock_reservado", "reservado_real")
+        return list(filas)
@@ -0,0 +1,88 @@
+# Generated by Django 5.2.6 on 2026-10-16 22:33
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def _reservado(Reserva, campo_lote, campo_estado):
+    return Coalesce(Subquery(
+        Reserva.objects.filter(
+            **{campo_lote: OuterRef('pk'), f'{campo_estado}__descripcion': 'Activa'}
+        ).values(campo_lote).annotate(total=Sum('cantidad_reservada')).values('total')
+    ), 0)
+
+
+def poblar_stock_lotes(apps, schema_editor):
+    """ Carga inicial de stock_reservado / stock_libre a partir de las reservas existentes. """
+    LoteProduccion = apps.get_model('stock', 'LoteProduccion')
+    LoteMateriaPrima = apps.get_model('stock', 'LoteMateriaPrima')
+    ReservaStock = apps.get_model('stock', 'ReservaStock')
+    ReservaMateriaPrima = apps.get_model('stock', 'ReservaMateriaPrima')
+
+    reservado_pt = _reservado(ReservaStock, 'id_lote_produccion', 'id_estado_reserva')
+    LoteProduccion.objects.update(stock_reservado=reservado_pt, stock_libre=F('cantidad') - reservado_pt)
+
+    reservado_mp = _reservado(ReservaMateriaPrima, 'id_lote_materia_prima', 'id_estado_reserva_materia')
+    LoteMateriaPrima.objects.update(stock_reservado=reservado_mp, stock_libre=F('cantidad') - reservado_mp)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('materias_primas', '0005_materiaprima_id_proveedor'),
+        ('productos', '0007_comboproducto_precio_unitario_imagencombo'),
+        ('stock', '0007_historicallotemateriaprima_historicalloteproduccion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicallotemateriaprima',
+            name='stock_libre',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='historicallotemateriaprima',
+            name='stock_reservado',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='historicalloteproduccion',
+            name='stock_libre',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='historicalloteproduccion',
+            name='stock_reservado',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='lotemateriaprima',
+            name='stock_libre',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='lotemateriaprima',
+            name='stock_reservado',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='loteproduccion',
+            name='stock_libre',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='loteproduccion',
+            name='stock_reservado',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='lotemateriaprima',
+            index=models.Index(fields=['id_materia_prima', 'id_estado_lote_materia_prima', 'fecha_vencimiento'], name='lote_mp_fefo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loteproduccion',
+            index=models.Index(fields=['id_producto', 'id_estado_lote_produccion', 'fecha_vencimiento'], name='lote_prod_fefo_idx'),
+        ),
+        migrations.RunPython(poblar_stock_lotes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0008_lote_stock_materializado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicallotemateriaprima',
+            name='fecha_stock',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='historicalloteproduccion',
+            name='fecha_stock',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='lotemateriaprima',
+            name='fecha_stock',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='loteproduccion',
+            name='fecha_stock',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -25,15 +25,19 @@ class LoteProduccion(models.Model):
     fecha_produccion = models.DateField(blank=True, null=True)
     fecha_vencimiento = models.DateField(blank=True, null=True)
     cantidad = models.IntegerField()
+
+    # Columnas materializadas: las mantienen las señales de stock/signals.py
+    # (alta / baja / cambio de estado de ReservaStock) y se reconstruyen con
+    # `python manage.py reconciliar_stock_lotes`.
+    stock_reservado = models.IntegerField(default=0, editable=False)  # Σ reservas 'Activas'
+    stock_libre = models.IntegerField(default=0, editable=False)      # cantidad - stock_reservado
+    # Último recálculo de las dos columnas (ese UPDATE no deja historial: lo lee el net-change del MRP)
+    fecha_stock = models.DateTimeField(null=True, blank=True, editable=False)
   
     @property
     def cantidad_reservada(self):
-        """Calcula la cantidad total reservada para este lote sumando solo las reservas 'Activas'."""
-        # --- CAMBIO CLAVE: Añadimos el filtro por el estado de la reserva ---
-        total_reservado = self.reservas.filter(id_estado_reserva__descripcion='Activa').aggregate(
-            total=models.Sum('cantidad_reservada')
-        )['total']
-        return total_reservado or 0
+        """Cantidad total reservada para este lote (solo reservas 'Activas'), sin consultar la BD."""
+        return self.stock_reservado
 
     @property
     def cantidad_disponible(self):
@@ -45,6 +49,10 @@ class LoteProduccion(models.Model):
     history = HistoricalRecords()
     class Meta:
         db_table = "lote_produccion"
+        indexes = [
+            # FEFO: lotes de un producto en un estado, ordenados por vencimiento
+            models.Index(fields=["id_producto", "id_estado_lote_produccion", "fecha_vencimiento"], name="lote_prod_fefo_idx"),
+        ]
 
 
 class LoteMateriaPrima(models.Model):
@@ -54,15 +62,16 @@ class LoteMateriaPrima(models.Model):
     cantidad = models.IntegerField()
     id_estado_lote_materia_prima = models.ForeignKey(EstadoLoteMateriaPrima, on_delete=models.CASCADE, db_column="id_estado_lote_materia_prima")
 
+    # Columnas materializadas (ver LoteProduccion): las mantienen las señales
+    # sobre ReservaMateriaPrima.
+    stock_reservado = models.IntegerField(default=0, editable=False)
+    stock_libre = models.IntegerField(default=0, editable=False)
+    fecha_stock = models.DateTimeField(null=True, blank=True, editable=False)
+
     @property
     def cantidad_reservada(self):
-        """Calcula la cantidad total reservada para este lote sumando las reservas."""
-        # Suma todas las 'cantidad_reservada' de los registros de ReservaStock
-        # que apuntan a este lote (self).
-        total_reservado = self.reservas.filter(
-            id_estado_reserva_materia__descripcion__in=["Activa"]
-        ).aggregate(total=models.Sum('cantidad_reservada'))['total']
-        return total_reservado or 0
+        """Cantidad total reservada para este lote (solo reservas 'Activas'), sin consultar la BD."""
+        return self.stock_reservado
 
     @property
     def cantidad_disponible(self):
@@ -72,6 +81,9 @@ class LoteMateriaPrima(models.Model):
     history = HistoricalRecords()
     class Meta:
         db_table = "lote_materia_prima"
+        indexes = [
+            models.Index(fields=["id_materia_prima", "id_estado_lote_materia_prima", "fecha_vencimiento"], name="lote_mp_fefo_idx"),
+        ]
 
 
 class LoteProduccionMateria(models.Model):
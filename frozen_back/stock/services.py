@@ -3,8 +3,9 @@ from django.core.mail import send_mail
 from productos.models import Producto
 from .models import LoteProduccion, EstadoLoteProduccion, LoteMateriaPrima, EstadoLoteMateriaPrima, ReservaMateriaPrima, EstadoReservaMateria, ReservaStock
 from materias_primas.models import MateriaPrima
-from django.db.models import Sum, F, Q
+from django.db.models import Sum, F, Q, OuterRef, Subquery
 from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.conf import settings
 import threading
 import requests
@@ -31,80 +32,113 @@ def cantidad_total_producto(id_producto):
 
 def get_stock_disponible_todos_los_productos():
     """
-    Devuelve un QuerySet con la cantidad total DISPONIBLE de cada producto.
+    Devuelve la cantidad total DISPONIBLE de cada producto (lista de dicts).
     Calcula el stock basándose en lotes 'Disponibles' y reservas 'Activas'.
     """
-    
-    # 1. Filtro para sumar solo la cantidad de lotes 'Disponibles'
-    filtro_lotes_disponibles = Q(
-        loteproduccion__id_estado_lote_produccion__descripcion="Disponible"
-    )
-    
-    # 2. Filtro para sumar solo la cantidad reservada de reservas 'Activas'
-    #    que pertenezcan a lotes 'Disponibles'.
-    filtro_reservas_activas = (
-        Q(loteproduccion__id_estado_lote_produccion__descripcion="Disponible") &
-        Q(loteproduccion__reservas__id_estado_reserva__descripcion='Activa')
-    )
+    # 1. Disponible de todos los productos en una sola consulta agrupada
+    disponible_por_producto = get_stock_disponible_para_productos()
 
-    # 3. Consultamos desde Producto y anotamos los totales
-    productos_con_stock = Producto.objects.annotate(
-        # Suma total de 'cantidad' de todos sus lotes 'Disponibles'
-        total_producido=Coalesce(
-            Sum('loteproduccion__cantidad', filter=filtro_lotes_disponibles), 
-            0
-        ),
-        # Suma total de 'cantidad_reservada' de sus reservas 'Activas'
-        total_reservado=Coalesce(
-            Sum('loteproduccion__reservas__cantidad_reservada', filter=filtro_reservas_activas), 
-            0
-        )
-    ).annotate(
-        # 4. Calculamos el disponible final para cada producto
-        cantidad_disponible=F('total_producido') - F('total_reservado')
-    )
-
-    # 5. Devolvemos los campos que nos interesan
+    # 2. Armamos la respuesta con los campos que nos interesan
     #    (Añado 'nombre' porque es muy útil y no tiene costo de rendimiento aquí)
-    return productos_con_stock.values(
+    productos = Producto.objects.values(
         'id_producto', 
         'nombre', 
-        'cantidad_disponible',
         'umbral_minimo',
         'descripcion'
     ).order_by('id_producto')
 
+    return [
+        {**producto, 'cantidad_disponible': disponible_por_producto.get(producto['id_producto'], 0)}
+        for producto in productos
+    ]
 
 
-def get_stock_disponible_para_producto(id_producto):
+
+def _disponible_por_id(ids, consultar):
     """
-    Devuelve la cantidad total DISPONIBLE de un producto.
-    Calcula el total reservado para cada lote sumando ÚNICAMENTE las reservas 'Activas'.
+    Resuelve {id: disponible} con la consulta agrupada 'consultar(ids_o_None)'.
+    Si se pidieron ids concretos, los que no tienen lotes disponibles vuelven en 0.
     """
-    # 1. Creamos un filtro para las reservas activas que usaremos en la suma.
-    filtro_reservas_activas = Q(reservas__id_estado_reserva__descripcion='Activa')
-
-    # 2. Anotamos cada lote con la suma de sus reservas activas.
-    lotes_con_reservas = LoteProduccion.objects.filter(
-        id_producto_id=id_producto,
-        id_estado_lote_produccion__descripcion="Disponible"
-    ).annotate(
-        total_reservado=Coalesce(Sum('reservas__cantidad_reservada', filter=filtro_reservas_activas), 0)
-    )
+    if ids is None:
+        return consultar(None)
+    ids = set(ids)
+    resultado = consultar(ids)
+    return {i: resultado.get(i, 0) for i in ids}
+
+
+# --- Columnas materializadas de los lotes (stock_reservado / stock_libre) ---
+
+def _reservado_activo_por_lote(modelo_reserva, campo_lote, filtro_activa):
+    """ Subconsulta correlacionada: Σ reservas 'Activas' del lote (0 si no tiene). """
+    return Coalesce(Subquery(
+        modelo_reserva.objects.filter(
+            filtro_activa, **{campo_lote: OuterRef('pk')}
+        ).values(campo_lote).annotate(
+            total=Sum('cantidad_reservada')
+        ).values('total')
+    ), 0)
+
 
-    # 3. Anotamos la cantidad disponible para cada lote.
-    lotes_con_disponible = lotes_con_reservas.annotate(
-        disponible=F('cantidad') - F('total_reservado')
+def recalcular_stock_lotes_produccion(ids_lotes=None):
+    """
+    Recalcula stock_reservado / stock_libre de los lotes de producto indicados
+    (None = todos) con UN solo UPDATE. Devuelve la cantidad de lotes actualizados.
+    """
+    reservado = _reservado_activo_por_lote(
+        ReservaStock, 'id_lote_produccion', Q(id_estado_reserva__descripcion='Activa')
     )
+    lotes = LoteProduccion.objects.all()
+    if ids_lotes is not None:
+        lotes = lotes.filter(pk__in=ids_lotes)
+    actualizados = lotes.update(
+        stock_reservado=reservado, stock_libre=F('cantidad') - reservado, fecha_stock=timezone.now()
+    )
+    return actualizados
+
 
-    # 4. Finalmente, sumamos el total de las cantidades disponibles de todos los lotes.
-    resultado_agregado = lotes_con_disponible.aggregate(
-        total=Sum('disponible')
+def recalcular_stock_lotes_mp(ids_lotes=None):
+    """ Igual que recalcular_stock_lotes_produccion, para lotes de materia prima. """
+    reservado = _reservado_activo_por_lote(
+        ReservaMateriaPrima, 'id_lote_materia_prima', Q(id_estado_reserva_materia__descripcion='Activa')
     )
+    lotes = LoteMateriaPrima.objects.all()
+    if ids_lotes is not None:
+        lotes = lotes.filter(pk__in=ids_lotes)
+    actualizados = lotes.update(
+        stock_reservado=reservado, stock_libre=F('cantidad') - reservado, fecha_stock=timezone.now()
+    )
+    return actualizados
+
+
+def get_stock_disponible_para_productos(ids_productos=None):
+    """
+    Versión por lote de get_stock_disponible_para_producto.
+    Recibe un iterable de ids (o None = todos) y devuelve {id_producto: disponible}
+    con UNA consulta agrupada. Los ids pedidos sin lotes disponibles vuelven en 0.
+    """
+    def consultar(ids):
+        # stock_libre = cantidad - reservas 'Activas' (columna materializada del lote)
+        lotes = LoteProduccion.objects.filter(
+            id_estado_lote_produccion__descripcion="Disponible"
+        )
+        if ids is not None:
+            lotes = lotes.filter(id_producto_id__in=ids)
+
+        filas = lotes.values('id_producto_id').annotate(
+            disponible=Sum('stock_libre')
+        ).order_by()
 
-    total_disponible = resultado_agregado.get('total') or 0
+        return {f['id_producto_id']: f['disponible'] or 0 for f in filas}
 
-    return total_disponible
+    return _disponible_por_id(ids_productos, consultar)
+
+
+def get_stock_disponible_para_producto(id_producto):
+    """
+    Devuelve la cantidad total DISPONIBLE de un producto.
+    Calcula el total reservado para cada lote sumando ÚNICAMENTE las reservas 'Activas'.
+    """
+    return get_stock_disponible_para_productos([id_producto])[id_producto]
 
 
 
@@ -118,10 +152,29 @@ def verificar_stock_y_enviar_alerta(id_producto):
     except Producto.DoesNotExist:
         return {"error": f"El producto con ID {id_producto} no existe."}
 
-    total_disponible = get_stock_disponible_para_producto(id_producto)
-    print("total disponible:", total_disponible)  # Línea de depuración
+    total_disponible = get_stock_disponible_para_productos([id_producto])[id_producto]
+    return _verificar_umbral_producto(producto, total_disponible)
+
+
+def verificar_stock_y_enviar_alertas(ids_productos):
+    """
+    Versión por lote: verifica varios productos con una consulta de productos
+    y una de disponibilidad. Devuelve la lista de resultados.
+    """
+    ids_productos = set(ids_productos)
+    if not ids_productos:
+        return []
+
+    disponibles = get_stock_disponible_para_productos(ids_productos)
+    return [
+        _verificar_umbral_producto(producto, disponibles[producto.pk])
+        for producto in Producto.objects.filter(pk__in=ids_productos)
+    ]
+
+
+def _verificar_umbral_producto(producto, total_disponible):
+    id_producto = producto.pk
     umbral = producto.umbral_minimo
-    print("umbral:", umbral)  # Línea de depuración
     alerta = total_disponible < umbral
 
     mensaje = (
@@ -206,36 +259,35 @@ def _enviar_telegram_async(mensaje):
 
 # --- INICIO DE NUEVAS FUNCIONES PARA MATERIA PRIMA ---
 
-def get_stock_disponible_para_materia_prima(id_materia_prima):
+def get_stock_disponible_para_materias_primas(ids_materias_primas=None):
     """
-    Devuelve la cantidad total DISPONIBLE de una materia prima.
-    Calcula el total reservado para cada lote sumando ÚNICAMENTE las reservas 'Activas'.
+    Versión por lote de get_stock_disponible_para_materia_prima.
+    Recibe un iterable de ids (o None = todas) y devuelve {id_materia_prima: disponible}
+    con UNA consulta agrupada. Los ids pedidos sin lotes disponibles vuelven en 0.
     """
-    
-    # 1. Filtro para reservas activas (materias primas)
-    filtro_reservas_activas = Q(reservas__id_estado_reserva_materia__descripcion='Activa')
-
-    # 2. Anotamos cada lote de MP con la suma de sus reservas activas.
-    lotes_con_reservas = LoteMateriaPrima.objects.filter(
-        id_materia_prima_id=id_materia_prima,
-        id_estado_lote_materia_prima__descripcion="disponible"
-    ).annotate(
-        total_reservado=Coalesce(Sum('reservas__cantidad_reservada', filter=filtro_reservas_activas), 0)
-    )
+    def consultar(ids):
+        # stock_libre = cantidad - reservas 'Activas' (columna materializada del lote)
+        lotes = LoteMateriaPrima.objects.filter(
+            id_estado_lote_materia_prima__descripcion="disponible"
+        )
+        if ids is not None:
+            lotes = lotes.filter(id_materia_prima_id__in=ids)
 
-    # 3. Anotamos la cantidad disponible para cada lote (stock físico - reservado).
-    lotes_con_disponible = lotes_con_reservas.annotate(
-        disponible=F('cantidad') - F('total_reservado')
-    )
+        filas = lotes.values('id_materia_prima_id').annotate(
+            disponible=Sum('stock_libre')
+        ).order_by()
 
-    # 4. Finalmente, sumamos el total de las cantidades disponibles de todos los lotes.
-    resultado_agregado = lotes_con_disponible.aggregate(
-        total=Sum('disponible')
-    )
+        return {f['id_materia_prima_id']: f['disponible'] or 0 for f in filas}
 
-    total_disponible = resultado_agregado.get('total') or 0
+    return _disponible_por_id(ids_materias_primas, consultar)
 
-    return total_disponible
+
+def get_stock_disponible_para_materia_prima(id_materia_prima):
+    """
+    Devuelve la cantidad total DISPONIBLE de una materia prima.
+    Calcula el total reservado para cada lote sumando ÚNICAMENTE las reservas 'Activas'.
+    """
+    return get_stock_disponible_para_materias_primas([id_materia_prima])[id_materia_prima]
 
 
 def verificar_stock_mp_y_enviar_alerta(id_materia_prima):
@@ -243,13 +295,29 @@ def verificar_stock_mp_y_enviar_alerta(id_materia_prima):
     Verifica el stock de una materia prima contra su umbral mínimo
     y envía una alerta por Telegram si está por debajo.
     """
-    try:
-        materia_prima = MateriaPrima.objects.get(pk=id_materia_prima)
-    except MateriaPrima.DoesNotExist:
-        print(f"Error: La materia prima con ID {id_materia_prima} no existe.")
+    verificar_stock_mp_y_enviar_alertas([id_materia_prima])
+
+
+def verificar_stock_mp_y_enviar_alertas(ids_materias_primas):
+    """
+    Versión por lote: una consulta de materias primas y una de disponibilidad.
+    """
+    ids_materias_primas = set(ids_materias_primas)
+    if not ids_materias_primas:
         return
 
-    total_disponible = get_stock_disponible_para_materia_prima(id_materia_prima)
+    materias = {mp.pk: mp for mp in MateriaPrima.objects.filter(pk__in=ids_materias_primas)}
+    disponibles = get_stock_disponible_para_materias_primas(ids_materias_primas)
+
+    for id_materia_prima in ids_materias_primas:
+        materia_prima = materias.get(id_materia_prima)
+        if materia_prima is None:
+            print(f"Error: La materia prima con ID {id_materia_prima} no existe.")
+            continue
+        _verificar_umbral_mp(materia_prima, disponibles[id_materia_prima])
+
+
+def _verificar_umbral_mp(materia_prima, total_disponible):
     umbral = materia_prima.umbral_minimo
     
     print(f"Verificando stock MP {materia_prima.nombre}: Disponible={total_disponible}, Umbral={umbral}")
@@ -0,0 +1,82 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import LoteProduccion, LoteMateriaPrima, ReservaStock, ReservaMateriaPrima
+from .services import recalcular_stock_lotes_produccion, recalcular_stock_lotes_mp
+
+
+# ------------------------------------------------------------------
+# Reservas: alta, baja (incluye borrados en cascada) y cambio de estado
+# ------------------------------------------------------------------
+# OJO: QuerySet.update() y bulk_create() NO disparan señales. Quien cambie
+# reservas así debe llamar a recalcular_stock_lotes_* con los lotes tocados.
+
+# Columnas materializadas del lote (las escribe recalcular_stock_lotes_* con un UPDATE)
+CAMPOS_STOCK_LOTE = ['stock_reservado', 'stock_libre', 'fecha_stock']
+
+# Reserva -> (FK al lote, recálculo)
+_LOTE_DE_RESERVA = {
+    ReservaStock: ('id_lote_produccion', recalcular_stock_lotes_produccion),
+    ReservaMateriaPrima: ('id_lote_materia_prima', recalcular_stock_lotes_mp),
+}
+
+
+def _refrescar_stock(lote):
+    """ El UPDATE no toca las instancias en memoria: se releen las columnas de stock. """
+    valores = type(lote).objects.filter(pk=lote.pk).values_list(*CAMPOS_STOCK_LOTE).first()
+    # (None: el lote se está borrando en cascada)
+    if valores is not None:
+        for campo, valor in zip(CAMPOS_STOCK_LOTE, valores):
+            setattr(lote, campo, valor)
+
+
+@receiver(pre_save, sender=ReservaStock)
+@receiver(pre_save, sender=ReservaMateriaPrima)
+def recordar_lote_anterior(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    # Si la reserva pasa a otro lote, el de origen también se recalcula (en post_save)
+    campo, _ = _LOTE_DE_RESERVA[sender]
+    instance._lote_anterior = sender.objects.filter(pk=instance.pk).values_list(f'{campo}_id', flat=True).first()
+
+
+@receiver(post_save, sender=ReservaStock)
+@receiver(post_delete, sender=ReservaStock)
+@receiver(post_save, sender=ReservaMateriaPrima)
+@receiver(post_delete, sender=ReservaMateriaPrima)
+def actualizar_stock_lote(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    campo, recalcular = _LOTE_DE_RESERVA[sender]
+    anterior = getattr(instance, '_lote_anterior', None)
+    instance._lote_anterior = None
+    recalcular({getattr(instance, f'{campo}_id'), anterior} - {None})
+    # Quien tenga el lote cargado en la reserva lee el stock ya recalculado
+    if sender._meta.get_field(campo).is_cached(instance):
+        _refrescar_stock(getattr(instance, campo))
+
+
+# ------------------------------------------------------------------
+# Lotes: cambia 'cantidad' (consumo, ajuste, merma)
+# ------------------------------------------------------------------
+
+@receiver(pre_save, sender=LoteProduccion)
+@receiver(pre_save, sender=LoteMateriaPrima)
+def calcular_stock_libre(sender, instance, **kwargs):
+    # Sin consultas: alcanza para lotes nuevos (todavía sin reservas)
+    instance.stock_libre = instance.cantidad - instance.stock_reservado
+
+
+@receiver(post_save, sender=LoteProduccion)
+def resincronizar_lote_produccion(sender, instance, created, raw=False, **kwargs):
+    # La instancia puede traer un stock_reservado viejo: lo recalculamos desde las reservas
+    if not created and not raw:
+        recalcular_stock_lotes_produccion([instance.pk])
+        _refrescar_stock(instance)
+
+
+@receiver(post_save, sender=LoteMateriaPrima)
+def resincronizar_lote_mp(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        recalcular_stock_lotes_mp([instance.pk])
+        _refrescar_stock(instance)
@@ -1,3 +1,160 @@
+from datetime import date
+
 from django.test import TestCase
 
-# Create your tests here.
+from productos.models import Producto, TipoProducto, Unidad
+from ventas.models import Cliente, EstadoVenta, OrdenVenta, OrdenVentaProducto, Prioridad
+from .asignacion import AsignadorFEFO
+from .models import EstadoLoteProduccion, EstadoReserva, LoteProduccion, ReservaStock
+
+
+class AsignadorFEFOTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        unidad = Unidad.objects.create(descripcion="u")
+        tipo = TipoProducto.objects.create(descripcion="t")
+        cls.producto, cls.otro_producto = [
+            Producto.objects.create(
+                nombre=nombre, descripcion=nombre, precio=1, id_tipo_producto=tipo,
+                id_unidad=unidad, dias_duracion=1, umbral_minimo=0
+            )
+            for nombre in ("P1", "P2")
+        ]
+        cls.disponible = EstadoLoteProduccion.objects.create(descripcion="Disponible")
+        vencido = EstadoLoteProduccion.objects.create(descripcion="Vencido")
+        cls.activa = EstadoReserva.objects.create(descripcion="Activa")
+
+        # Creados fuera de orden de vencimiento; el vencido no cuenta
+        cls.lote_tardio = cls._lote(cls.producto, 10, date(2025, 3, 1))
+        cls.lote_temprano = cls._lote(cls.producto, 5, date(2025, 1, 1))
+        cls.lote_medio = cls._lote(cls.producto, 5, date(2025, 2, 1))
+        cls._lote(cls.producto, 50, date(2024, 12, 1), vencido)
+        cls._lote(cls.otro_producto, 7, date(2025, 1, 1))
+
+        prioridad = Prioridad.objects.create(descripcion="Normal")
+        orden_venta = OrdenVenta.objects.create(
+            id_cliente=Cliente.objects.create(nombre="C"),
+            id_estado_venta=EstadoVenta.objects.create(descripcion="Creada"),
+            id_prioridad=prioridad,
+        )
+        cls.linea, cls.otra_linea = [
+            OrdenVentaProducto.objects.create(id_orden_venta=orden_venta, id_producto=producto, cantidad=10)
+            for producto in (cls.producto, cls.otro_producto)
+        ]
+
+    @classmethod
+    def _lote(cls, producto, cantidad, vencimiento, estado=None):
+        return LoteProduccion.objects.create(
+            id_producto=producto, cantidad=cantidad, fecha_vencimiento=vencimiento,
+            id_estado_lote_produccion=estado or cls.disponible
+        )
+
+    def setUp(self):
+        self.asignador = AsignadorFEFO.para_productos(self.activa)
+
+    def test_disponible(self):
+        self.assertEqual(self.asignador.disponible(self.producto.pk), 20)
+        self.assertEqual(self.asignador.disponible(self.otro_producto.pk), 7)
+
+    def test_precargar_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            self.asignador.precargar([self.producto.pk, self.otro_producto.pk])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.asignador.disponible(self.producto.pk), 20)
+
+    def test_asigna_primero_lo_que_vence_antes(self):
+        asignado = self.asignador.asignar(self.linea, self.producto.pk, 8)
+
+        self.assertEqual(asignado, 8)
+        self.assertEqual(
+            [(lote[0], cantidad) for _, lote, cantidad in self.asignador._pendientes],
+            [(self.lote_temprano.pk, 5), (self.lote_medio.pk, 3)]
+        )
+        self.assertEqual(self.asignador.disponible(self.producto.pk), 12)
+
+    def test_asignacion_parcial_y_todo_o_nada(self):
+        self.assertEqual(self.asignador.asignar(self.linea, self.producto.pk, 25, todo_o_nada=True), 0)
+        self.assertEqual(self.asignador.disponible(self.producto.pk), 20)
+        self.assertEqual(self.asignador.asignar(self.linea, self.producto.pk, 25), 20)
+        self.assertEqual(self.asignador.disponible(self.producto.pk), 0)
+
+    def test_descartar(self):
+        self.asignador.asignar(self.linea, self.producto.pk, 8)
+        self.asignador.asignar(self.otra_linea, self.otro_producto.pk, 3)
+        self.asignador.descartar(self.linea)
+
+        self.assertEqual(self.asignador.disponible(self.producto.pk), 20)
+        self.assertEqual(self.asignador.disponible(self.otro_producto.pk), 4)
+        self.assertEqual(len(self.asignador._pendientes), 1)
+
+    def test_guardar(self):
+        self.asignador.asignar(self.linea, self.producto.pk, 8)
+        self.assertEqual(self.asignador.guardar(), 2)
+
+        self.assertEqual(
+            sorted(ReservaStock.objects.values_list('id_lote_produccion_id', 'cantidad_reservada')),
+            sorted([(self.lote_temprano.pk, 5), (self.lote_medio.pk, 3)])
+        )
+        self.lote_medio.refresh_from_db()
+        self.assertEqual((self.lote_medio.stock_reservado, self.lote_medio.stock_libre), (3, 2))
+
+        # Un asignador nuevo ve el stock que quedó libre
+        self.assertEqual(AsignadorFEFO.para_productos(self.activa).disponible(self.producto.pk), 12)
+        self.assertEqual(self.asignador.guardar(), 0)
+
+
+class StockMaterializadoTests(TestCase):
+
+    def setUp(self):
+        producto = Producto.objects.create(
+            nombre="P1", descripcion="P1", precio=1, id_tipo_producto=TipoProducto.objects.create(descripcion="t"),
+            id_unidad=Unidad.objects.create(descripcion="u"), dias_duracion=1, umbral_minimo=0
+        )
+        disponible = EstadoLoteProduccion.objects.create(descripcion="Disponible")
+        self.lote, self.otro_lote = [
+            LoteProduccion.objects.create(
+                id_producto=producto, cantidad=cantidad, fecha_vencimiento=date(2025, 1, 1),
+                id_estado_lote_produccion=disponible
+            )
+            for cantidad in (10, 8)
+        ]
+        orden_venta = OrdenVenta.objects.create(
+            id_cliente=Cliente.objects.create(nombre="C"),
+            id_estado_venta=EstadoVenta.objects.create(descripcion="Creada"),
+            id_prioridad=Prioridad.objects.create(descripcion="Normal"),
+        )
+        self.linea = OrdenVentaProducto.objects.create(id_orden_venta=orden_venta, id_producto=producto, cantidad=4)
+        self.activa = EstadoReserva.objects.create(descripcion="Activa")
+
+    def _reservar(self, lote, cantidad):
+        return ReservaStock.objects.create(
+            id_orden_venta_producto=self.linea, id_lote_produccion=lote,
+            cantidad_reservada=cantidad, id_estado_reserva=self.activa
+        )
+
+    def _stock(self, lote):
+        return LoteProduccion.objects.values_list('stock_reservado', 'stock_libre').get(pk=lote.pk)
+
+    def test_la_reserva_refresca_su_lote(self):
+        self._reservar(self.lote, 4)
+        self.assertEqual((self.lote.stock_reservado, self.lote.stock_libre), (4, 6))
+        self.assertEqual(self._stock(self.lote), (4, 6))
+
+    def test_mover_la_reserva_a_otro_lote(self):
+        reserva = self._reservar(self.lote, 4)
+        reserva.id_lote_produccion = self.otro_lote
+        reserva.save()
+        self.assertEqual(self._stock(self.lote), (0, 10))
+        self.assertEqual(self._stock(self.otro_lote), (4, 4))
+
+        reserva.delete()
+        self.assertEqual(self._stock(self.otro_lote), (0, 8))
+
+    def test_guardar_el_lote_con_stock_viejo(self):
+        lote = LoteProduccion.objects.get(pk=self.lote.pk)
+        self._reservar(self.lote, 4)
+        lote.cantidad = 12
+        lote.save()
+        self.assertEqual((lote.stock_reservado, lote.stock_libre), (4, 8))
+        self.assertEqual(self._stock(lote), (4, 8))
@@ -14,7 +14,8 @@ from .views import (
     lista_cantidad_total_productos_view,
     obtener_lotes_de_materia_prima,
     HistorialLoteProduccionViewSet,
-    HistorialLoteMateriaPrimaViewSet
+    HistorialLoteMateriaPrimaViewSet,
+    metricas_reservas_view
 )
 
 router = DefaultRouter()
@@ -36,4 +37,5 @@ urlpatterns = [
     path("materias_primas/restar/", restar_cantidad_lote, name="restar_cantidad_lote"),
     path('materiasprimas/', listar_materias_primas, name='listar_materias_primas'),
     path('lotes-materias/por-materia/<int:id_materia_prima>/', obtener_lotes_de_materia_prima, name='obtener_lotes_de_materia_prima'),
+    path('metricas-reservas/', metricas_reservas_view, name='metricas_reservas'),
 ]
\ No newline at end of file
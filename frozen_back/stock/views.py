@@ -8,9 +8,11 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.decorators import api_view, action  # <- IMPORT IMPORTANTE
 from django_filters.rest_framework import DjangoFilterBackend
-from stock.services import get_stock_disponible_para_producto,  verificar_stock_y_enviar_alerta, get_stock_disponible_todos_los_productos, actualizar_estado_lote_producto
+from reportes.exportacion import ExportacionMixin
+from stock.services import get_stock_disponible_para_producto,  verificar_stock_y_enviar_alerta, get_stock_disponible_todos_los_productos, actualizar_estado_lote_producto, get_stock_disponible_para_materias_primas
 from django.views.decorators.csrf import csrf_exempt
 from produccion.services import procesar_ordenes_en_espera
+from stock.concurrencia import metricas_reservas
 from django.db.models import Sum
 from django.db import transaction
 from produccion.models import OrdenProduccion, EstadoOrdenProduccion
@@ -52,7 +54,8 @@ class EstadoLoteMateriaPrimaViewSet(viewsets.ModelViewSet):
 
 # ----- Lotes -----
 class LoteProduccionViewSet(viewsets.ModelViewSet):
-    queryset = LoteProduccion.objects.all()
+    # cantidad_reservada / cantidad_disponible salen de columnas del lote: solo hace falta traer los FK del serializer
+    queryset = LoteProduccion.objects.select_related('id_producto__id_unidad', 'id_estado_lote_produccion')
     serializer_class = LoteProduccionSerializer
     filter_backends = [filters.SearchFilter, DjangoFilterBackend, filters.OrderingFilter]
     search_fields = ["id_producto__nombre"]
@@ -459,21 +462,14 @@ def listar_materias_primas(request):
     except EstadoLoteMateriaPrima.DoesNotExist:
         return JsonResponse({"error": "No existe el estado 'Disponible' en la tabla estado_lote_materia_prima"}, status=500)
 
-    materias = MateriaPrima.objects.all()
+    materias = MateriaPrima.objects.select_related('id_unidad')
     data = []
 
+    # Disponible (lotes disponibles - reservas activas) de todas las MPs en una sola consulta
+    disponible_por_mp = get_stock_disponible_para_materias_primas()
+
     for materia in materias:
-        # Obtenemos todos los lotes disponibles para esta materia prima
-        lotes_disponibles = LoteMateriaPrima.objects.filter(
-            id_materia_prima=materia.id_materia_prima,
-            id_estado_lote_materia_prima=estado_disponible.id_estado_lote_materia_prima
-        )
-        
-        # Calculamos la suma de cantidad_disponible para todos los lotes
-        cantidad_disponible_total = 0
-        for lote in lotes_disponibles:
-            cantidad_disponible_total += lote.cantidad_disponible
-            # cantidad_reservada += lote.cantidad_reservada()
+        cantidad_disponible_total = disponible_por_mp.get(materia.id_materia_prima, 0)
 
         data.append({
             "id_materia_prima": materia.id_materia_prima,
@@ -488,7 +484,7 @@ def listar_materias_primas(request):
 
 
 
-class HistorialLoteProduccionViewSet(viewsets.ReadOnlyModelViewSet):
+class HistorialLoteProduccionViewSet(ExportacionMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint para ver el historial de cambios de los Lotes de Producción.
     """
@@ -498,7 +494,7 @@ class HistorialLoteProduccionViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_fields = ['history_type', 'history_user', 'id_producto', 'id_estado_lote_produccion']
     search_fields = ['history_user__usuario', 'id_producto__nombre']
 
-class HistorialLoteMateriaPrimaViewSet(viewsets.ReadOnlyModelViewSet):
+class HistorialLoteMateriaPrimaViewSet(ExportacionMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint para ver el historial de cambios de los Lotes de Materia Prima.
     """
@@ -507,3 +503,16 @@ class HistorialLoteMateriaPrimaViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['history_type', 'history_user', 'id_materia_prima', 'id_estado_lote_materia_prima']
     search_fields = ['history_user__usuario', 'id_materia_prima__nombre']
+
+
+@api_view(["GET", "DELETE"])
+def metricas_reservas_view(request):
+    """
+    Métricas de contención de reservas (intentos, conflictos, esperas de lock)
+    del worker que atiende el request. DELETE las reinicia.
+    """
+    if request.method == "DELETE":
+        metricas_reservas.reiniciar()
+        return Response({"status": "ok", "message": "Métricas de reservas reiniciadas."}, status=status.HTTP_200_OK)
+
+    return Response({"status": "ok", "metricas": metricas_reservas.resumen()}, status=status.HTTP_200_OK)
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:45
+
+import django.db.models.deletion
+import simple_history.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0007_comboproducto_precio_unitario_imagencombo'),
+        ('ventas', '0020_historicalordenventa_fecha_entrega_planificada_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistoricalOrdenVentaProducto',
+            fields=[
+                ('id_orden_venta_producto', models.IntegerField(blank=True, db_index=True)),
+                ('cantidad', models.IntegerField()),
+                ('history_id', models.AutoField(primary_key=True, serialize=False)),
+                ('history_date', models.DateTimeField(db_index=True)),
+                ('history_change_reason', models.CharField(max_length=100, null=True)),
+                ('history_type', models.CharField(choices=[('+', 'Created'), ('~', 'Changed'), ('-', 'Deleted')], max_length=1)),
+                ('history_user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('id_orden_venta', models.ForeignKey(blank=True, db_column='id_orden_venta', db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='ventas.ordenventa')),
+                ('id_producto', models.ForeignKey(blank=True, db_column='id_producto', db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='productos.producto')),
+            ],
+            options={
+                'verbose_name': 'historical orden venta producto',
+                'verbose_name_plural': 'historical orden venta productos',
+                'ordering': ('-history_date', '-history_id'),
+                'get_latest_by': ('history_date', 'history_id'),
+            },
+            bases=(simple_history.models.HistoricalChanges, models.Model),
+        ),
+    ]
@@ -151,6 +151,9 @@ class OrdenVentaProducto(models.Model):
     id_producto = models.ForeignKey(Producto, on_delete=models.CASCADE, db_column="id_producto")
     cantidad = models.IntegerField()
 
+    # Lo lee el net-change del MRP (planificacion/cambios.py): una línea editada sola no toca la OV
+    history = HistoricalRecords()
+
     class Meta:
         db_table = "orden_venta_producto"
         unique_together = (("id_orden_venta", "id_producto"),)
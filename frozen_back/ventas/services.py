@@ -1,7 +1,9 @@
 from django.db import transaction
 from .models import OrdenVentaProducto, EstadoVenta, OrdenVenta, Factura, NotaCredito
 from stock.models import LoteProduccion, ReservaStock, EstadoLoteProduccion, EstadoReserva 
-from stock.services import verificar_stock_y_enviar_alerta
+from stock.services import verificar_stock_y_enviar_alertas, recalcular_stock_lotes_produccion
+from stock.asignacion import AsignadorFEFO
+from stock.concurrencia import ejecutar_con_reintentos
 from stock.models import ReservaStock
 from django.db.models import Sum, F, Q, ExpressionWrapper, FloatField
 from collections import defaultdict
@@ -12,9 +14,11 @@ from django.db.models.functions import Coalesce
 
 # Importar modelos
 from productos.models import Producto
-from recetas.models import Receta, RecetaMateriaPrima, ProductoLinea
+from recetas.models import Receta, RecetaMateriaPrima
 from produccion.models import CalendarioProduccion, EstadoOrdenProduccion
-from stock.services import get_stock_disponible_para_producto, get_stock_disponible_para_materia_prima
+from stock.services import get_stock_disponible_para_productos, get_stock_disponible_para_materias_primas
+from planificacion.capacidad import LibroCapacidad
+from planificacion.cache_capacidad import obtener_capacidades
 
 # Constantes (Las mismas de tu planificador)
 HORAS_LABORABLES_POR_DIA = 16
@@ -68,15 +72,16 @@ def facturar_orden_y_descontar_stock(orden_venta: OrdenVenta):
         productos_afectados.add(reserva.id_orden_venta_producto.id_producto.pk)
 
     estado_utilizada, _ = EstadoReserva.objects.get_or_create(descripcion="Utilizada")
+    lotes_tocados = list(reservas.values_list('id_lote_produccion_id', flat=True))
     reservas.update(id_estado_reserva=estado_utilizada)
+    recalcular_stock_lotes_produccion(lotes_tocados)
     
     estado_facturada, _ = EstadoVenta.objects.get_or_create(descripcion__iexact="Pagada")
     orden_venta.id_estado_venta = estado_facturada
     orden_venta.save()
 
     print("Verificando umbrales de stock post-facturación...")
-    for producto_id in productos_afectados:
-        verificar_stock_y_enviar_alerta(producto_id)
+    verificar_stock_y_enviar_alertas(productos_afectados)
 
     print(f"Orden #{orden_venta.pk} facturada y stock físico descontado exitosamente.")
 
@@ -97,7 +102,9 @@ def cancelar_orden_venta(orden_venta):
     )
     
 
+    lotes_tocados = list(reservas_a_cancelar.values_list('id_lote_produccion_id', flat=True))
     reservas_a_cancelar.update(id_estado_reserva=estado_cancelada)
+    recalcular_stock_lotes_produccion(lotes_tocados)
     
     estado_orden_cancelada, _ = EstadoVenta.objects.get_or_create(descripcion__iexact="Cancelada")
     orden_venta.id_estado_venta = estado_orden_cancelada
@@ -167,7 +174,9 @@ def crear_nota_credito_y_devolver_stock(orden_venta: OrdenVenta, motivo: str = N
         )
 
     # 8. Actualizar Reservas y Orden
+    lotes_tocados = [reserva.id_lote_produccion_id for reserva in reservas_utilizadas]
     reservas_utilizadas.update(id_estado_reserva=estado_reserva_devuelta)
+    recalcular_stock_lotes_produccion(lotes_tocados)
     orden_venta.id_estado_venta = estado_orden_devuelta
     orden_venta.save()
 
@@ -190,21 +199,37 @@ def verificar_orden_completa(items):
     virtual_stock_pt_consumido = defaultdict(int)
     virtual_stock_mp_consumido = defaultdict(int)
     
-    # Para la capacidad, rastreamos cuándo se libera cada línea
-    # { linea_id: fecha_liberacion_estimada }
-    virtual_calendario_lineas = defaultdict(lambda: hoy)
+    # Para la capacidad usamos el libro de capacidad (carga real del calendario,
+    # 1 sola consulta). Las horas que "ocupa" esta simulación quedan solo en memoria.
+    libro_capacidad = LibroCapacidad(
+        HORAS_LABORABLES_POR_DIA,
+        estados_op=EstadoOrdenProduccion.objects.filter(descripcion__in=["En espera", "Pendiente de inicio"]),
+        fecha_desde=hoy
+    )
+    calendario = libro_capacidad.calendario
+    # Reglas Producto ↔ Línea (caché versionada, sin consulta por producto)
+    reglas_capacidad = obtener_capacidades()
 
     fecha_final_orden = hoy
     detalles_items = []
     es_toda_factible = True
     warning_global = None
 
+    # Disponibilidad real de todos los productos y MPs involucrados (1 consulta c/u)
+    ids_productos = {item['producto_id'] for item in items}
+    stock_real_pt_por_producto = get_stock_disponible_para_productos(ids_productos)
+    stock_real_mp_por_mp = get_stock_disponible_para_materias_primas(
+        RecetaMateriaPrima.objects.filter(
+            id_receta__id_producto__in=ids_productos
+        ).values_list('id_materia_prima_id', flat=True)
+    )
+
     for item in items:
         p_id = item['producto_id']
         cant_solicitada = int(item['cantidad'])
         
         # --- A. Consumo de Stock PT ---
-        stock_real_pt = get_stock_disponible_para_producto(p_id)
+        stock_real_pt = stock_real_pt_por_producto.get(p_id, 0)
         stock_virtual_disponible = max(0, stock_real_pt - virtual_stock_pt_consumido[p_id])
         
         tomar_de_stock = min(stock_virtual_disponible, cant_solicitada)
@@ -230,7 +255,7 @@ def verificar_orden_completa(items):
                     mp_id = ing.id_materia_prima.id_materia_prima
                     cant_necesaria = ing.cantidad * a_producir
                     
-                    stock_real_mp = get_stock_disponible_para_materia_prima(mp_id)
+                    stock_real_mp = stock_real_mp_por_mp.get(mp_id, 0)
                     # Restamos lo que ya consumieron los items anteriores de esta lista
                     stock_mp_virtual = max(0, stock_real_mp - virtual_stock_mp_consumido[mp_id])
                     
@@ -247,41 +272,26 @@ def verificar_orden_completa(items):
                 warning_global = f"Producto {p_id} sin receta."
             
             # 2. Calcular Fechas MP
-            fecha_llegada_mp = hoy + timedelta(days=max_lead_time_mp)
-            while fecha_llegada_mp.weekday() >= 5: fecha_llegada_mp += timedelta(days=1)
-            
-            fecha_inicio_prod = fecha_llegada_mp + timedelta(days=DIAS_BUFFER_RECEPCION_MP)
-            while fecha_inicio_prod.weekday() >= 5: fecha_inicio_prod += timedelta(days=1)
+            fecha_llegada_mp = calendario.habil_desde(hoy + timedelta(days=max_lead_time_mp))
+            fecha_inicio_prod = calendario.habil_desde(fecha_llegada_mp + timedelta(days=DIAS_BUFFER_RECEPCION_MP))
 
             # 3. Calcular Tiempo Máquina (Acumulativo sobre la línea)
-            capacidades = ProductoLinea.objects.filter(id_producto=p_id)
-            if capacidades.exists():
-                cap_total = capacidades.aggregate(total=Sum('cant_por_hora'))['total'] or 1
-                horas_nec = math.ceil(a_producir / cap_total)
-                dias_prod = math.ceil(horas_nec / HORAS_LABORABLES_POR_DIA)
-                
-                # Buscamos cuándo se libera la línea más ocupada
-                fecha_base_linea = fecha_inicio_prod
-                for cap in capacidades:
-                    fecha_linea = virtual_calendario_lineas[cap.id_linea_produccion]
-                    if fecha_linea > fecha_base_linea:
-                        fecha_base_linea = fecha_linea
+            capacidades = reglas_capacidad.reglas(p_id)
+            if capacidades:
+                cap_total = reglas_capacidad.capacidad_total_por_hora(p_id) or 1
+                horas_pendientes = math.ceil(a_producir / cap_total)
+                lineas_ids = [cap.id_linea_produccion_id for cap in capacidades]
                 
-                # Sumamos días de trabajo
-                fecha_fin_prod = fecha_base_linea + timedelta(days=dias_prod)
-                while fecha_fin_prod.weekday() >= 5: fecha_fin_prod += timedelta(days=1)
-                
-                # Actualizamos el calendario virtual de esas líneas
-                # (El próximo producto que use esta línea tendrá que esperar a esta fecha)
-                for cap in capacidades:
-                    virtual_calendario_lineas[cap.id_linea_produccion] = fecha_fin_prod
+                # Walk the calendar contra el libro (el próximo producto que use
+                # estas líneas ve las horas que ocupamos acá)
+                fecha_fin_prod = libro_capacidad.ocupar_horas(lineas_ids, horas_pendientes, fecha_inicio_prod) or fecha_inicio_prod
                 
                 fecha_entrega_item = fecha_fin_prod + timedelta(days=DIAS_BUFFER_ENTREGA_PT + 1)
             else:
                 fecha_entrega_item = fecha_inicio_prod # Fallback sin lineas
 
-        # Ajuste final fines de semana
-        while fecha_entrega_item.weekday() >= 5: fecha_entrega_item += timedelta(days=1)
+        # Ajuste final a día hábil (fines de semana, feriados y paradas de planta)
+        fecha_entrega_item = calendario.habil_desde(fecha_entrega_item)
 
         # Actualizar fecha global de la orden
         if fecha_entrega_item > fecha_final_orden:
@@ -319,15 +329,23 @@ def procesar_orden_venta_online(orden_venta: OrdenVenta):
     estado_sin_stock, _ = EstadoVenta.objects.get_or_create(descripcion__iexact="Cancelada por Stock") # O el estado que prefieras
     estado_reserva_activa, _ = EstadoReserva.objects.get_or_create(descripcion__iexact="Activa")
 
-    todas_reservadas = True
-    errores = []
+    # 2. Iterar productos y reservar (lotes bloqueados en 1 consulta, reservas en 1 bulk_create).
+    #    Si choca con otra reserva concurrente (deadlock / lock_timeout) se reintenta el bloque.
+    lineas = list(orden_venta.ordenventaproducto_set.select_related('id_producto'))
+
+    def _reservar_lineas():
+        errores_lineas = []
+        asignador = AsignadorFEFO.para_productos(estado_reserva_activa)
+        asignador.precargar({linea.id_producto_id for linea in lineas})
+        for linea in lineas:
+            exito_reserva = _reservar_stock_inmediato(asignador, linea)
+            if not exito_reserva:
+                errores_lineas.append(f"Falta stock para {linea.id_producto.descripcion}")
+        asignador.guardar()
+        return errores_lineas
 
-    # 2. Iterar productos y reservar
-    for linea in orden_venta.ordenventaproducto_set.all():
-        exito_reserva = _reservar_stock_inmediato(linea, estado_reserva_activa)
-        if not exito_reserva:
-            todas_reservadas = False
-            errores.append(f"Falta stock para {linea.id_producto.descripcion}")
+    errores = ejecutar_con_reintentos("venta_online", _reservar_lineas)
+    todas_reservadas = not errores
 
     # 3. Actualizar Estado de la Venta
     if todas_reservadas:
@@ -342,53 +360,11 @@ def procesar_orden_venta_online(orden_venta: OrdenVenta):
         print(f"❌ Venta Online #{orden_venta.pk} -> Falta stock")
         return {'exito': False, 'mensaje': ", ".join(errores)}
 
-def _reservar_stock_inmediato(linea_ov: OrdenVentaProducto, estado_activa: EstadoReserva) -> bool:
+def _reservar_stock_inmediato(asignador: AsignadorFEFO, linea_ov: OrdenVentaProducto) -> bool:
     """
     Intenta reservar el 100% de la cantidad solicitada.
-    Retorna True si logró reservar todo, False si falta algo.
+    Retorna True si logró reservar todo, False si falta algo (en ese caso no reserva nada).
     """
     cantidad_necesaria = linea_ov.cantidad
-    
-    filtro_reservas_activas = Q(reservas__id_estado_reserva__descripcion='Activa')
-    
-    lotes_disponibles = LoteProduccion.objects.filter(
-        id_producto=linea_ov.id_producto,
-        id_estado_lote_produccion__descripcion="Disponible"
-    ).annotate(
-        total_reservado=Coalesce(Sum('reservas__cantidad_reservada', filter=filtro_reservas_activas), 0)
-    ).annotate(
-        # --- CORRECCIÓN AQUÍ ---
-        # Usamos ExpressionWrapper para manejar la resta entre Entero y Flotante
-        disponible_real=ExpressionWrapper(
-            F('cantidad') - F('total_reservado'),
-            output_field=FloatField()
-        )
-    ).filter(
-        disponible_real__gt=0
-    ).order_by('fecha_vencimiento')
-
-    # Verificamos si hay suficiente stock TOTAL antes de empezar a reservar
-    total_existente = sum(l.disponible_real for l in lotes_disponibles)
-    
-    # Nota: Al comparar floats, es bueno tener cuidado, pero para stock suele funcionar directo
-    if total_existente < cantidad_necesaria:
-        return False 
-
-    cantidad_pendiente = cantidad_necesaria
-    
-    for lote in lotes_disponibles:
-        if cantidad_pendiente <= 0: break
-        
-        a_tomar = min(lote.disponible_real, cantidad_pendiente)
-        
-        ReservaStock.objects.create(
-            id_orden_venta_producto=linea_ov,
-            id_lote_produccion=lote,
-            cantidad_reservada=a_tomar,
-            id_estado_reserva=estado_activa
-        )
-        cantidad_pendiente -= a_tomar
-
-    # Usamos una pequeña tolerancia para comparación de floats si es necesario, 
-    # o simplemente comparamos con 0 si tus cantidades son enteras.
-    return cantidad_pendiente <= 0
\ No newline at end of file
+    reservado = asignador.asignar(linea_ov, linea_ov.id_producto_id, cantidad_necesaria, todo_o_nada=True)
+    return reservado >= cantidad_necesaria
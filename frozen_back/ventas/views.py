@@ -6,6 +6,7 @@ from rest_framework.response import Response
 from django.views.decorators.csrf import csrf_exempt
 from django.http import JsonResponse
 from django_filters.rest_framework import DjangoFilterBackend
+from reportes.exportacion import ExportacionMixin
 from rest_framework.decorators import action
 from django.conf import settings
 from empleados.models import Empleado
@@ -550,7 +551,7 @@ class NotaCreditoViewSet(viewsets.ModelViewSet):
 
 
 
-class HistorialOrdenVentaViewSet(viewsets.ReadOnlyModelViewSet):
+class HistorialOrdenVentaViewSet(ExportacionMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet de solo-lectura para ver el log global de todas las Órdenes de Venta.
     """
@@ -560,7 +561,7 @@ class HistorialOrdenVentaViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_fields = ['history_type', 'history_user', 'id_estado_venta', 'id_cliente']
     search_fields = ['history_user__usuario', 'id_cliente__nombre']
 
-class HistorialNotaCreditoViewSet(viewsets.ReadOnlyModelViewSet):
+class HistorialNotaCreditoViewSet(ExportacionMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet de solo-lectura para ver el log global de todas las Notas de Crédito.
     """